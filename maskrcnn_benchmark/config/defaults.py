@@ -84,6 +84,17 @@ _C.DATALOADER.SIZE_DIVISIBILITY = 0
 # is compatible. This groups portrait images together, and landscape images
 # are not batched with portrait images.
 _C.DATALOADER.ASPECT_RATIO_GROUPING = True
+# Directory where the image sizes of the datasets are cached, keyed by the
+# dataset name and a fingerprint of its annotations. If empty, they are
+# cached in OUTPUT_DIR/image_metadata
+_C.DATALOADER.METADATA_CACHE_DIR = ""
+# If True, each batch contains images with similar sizes once resized and
+# padded, which reduces the padding in the batches. This replaces the aspect
+# ratio grouping
+_C.DATALOADER.SIZE_BUCKETING = False
+# Number of batches among which the images are bucketed. Larger windows give
+# less padding, but batches further away from the sampling order
+_C.DATALOADER.SIZE_BUCKETING_WINDOW = 64
 
 
 # ---------------------------------------------------------------------------- #
@@ -136,6 +147,10 @@ _C.MODEL.RPN.ASPECT_RATIOS = (0.5, 1.0, 2.0)
 # Remove RPN anchors that go outside the image by RPN_STRADDLE_THRESH pixels
 # Set to -1 or a large value, e.g. 100000, to disable pruning anchors
 _C.MODEL.RPN.STRADDLE_THRESH = 0
+# Maximum number of anchor grids and visibility masks cached by the anchor
+# generator, which are reused when the sizes of the feature maps and of the
+# images repeat. Set to 0 to disable the cache
+_C.MODEL.RPN.ANCHOR_CACHE_SIZE = 64
 # Minimum overlap required between an anchor and ground-truth box for the
 # (anchor, gt box) pair to be a positive example (IoU >= FG_IOU_THRESHOLD
 # ==> positive RPN example)
@@ -204,6 +219,14 @@ _C.MODEL.ROI_HEADS.NMS = 0.5
 # Maximum number of detections to return per image (100 is based on the limit
 # established for the COCO dataset)
 _C.MODEL.ROI_HEADS.DETECTIONS_PER_IMG = 100
+# Type of NMS: "greedy", or "fast" (Fast NMS) or "matrix" (Matrix NMS), which
+# are computed on dense matrices of the TOP_K boxes of each class, without any
+# sequential loop
+_C.MODEL.ROI_HEADS.NMS_TYPE = "greedy"
+_C.MODEL.ROI_HEADS.NMS_TOP_K = 200
+# Decay of the scores of Matrix NMS: "gaussian" or "linear"
+_C.MODEL.ROI_HEADS.MATRIX_NMS_KERNEL = "gaussian"
+_C.MODEL.ROI_HEADS.MATRIX_NMS_SIGMA = 2.0
 
 
 _C.MODEL.ROI_BOX_HEAD = CN()
@@ -236,6 +259,12 @@ _C.MODEL.ROI_MASK_HEAD.SHARE_BOX_FEATURE_EXTRACTOR = True
 # Whether or not resize and translate masks to the input image.
 _C.MODEL.ROI_MASK_HEAD.POSTPROCESS_MASKS = False
 _C.MODEL.ROI_MASK_HEAD.POSTPROCESS_MASKS_THRESHOLD = 0.5
+# Maximum memory (in MB) used by the intermediate buffers when pasting the
+# masks of an image, which are resampled in chunks of that size
+_C.MODEL.ROI_MASK_HEAD.POSTPROCESS_MASKS_MEMORY_BUDGET = 256
+# Number of threads used to compute the mask targets of the images of a
+# batch in parallel during training, 0 to compute them sequentially
+_C.MODEL.ROI_MASK_HEAD.TARGET_NUM_WORKERS = 0
 # Dilation
 _C.MODEL.ROI_MASK_HEAD.DILATION = 1
 # GN
@@ -300,6 +329,8 @@ _C.MODEL.RETINANET.ANCHOR_SIZES = (32, 64, 128, 256, 512)
 _C.MODEL.RETINANET.ASPECT_RATIOS = (0.5, 1.0, 2.0)
 _C.MODEL.RETINANET.ANCHOR_STRIDES = (8, 16, 32, 64, 128)
 _C.MODEL.RETINANET.STRADDLE_THRESH = 0
+# See MODEL.RPN.ANCHOR_CACHE_SIZE
+_C.MODEL.RETINANET.ANCHOR_CACHE_SIZE = 64
 
 # Anchor scales per octave
 _C.MODEL.RETINANET.OCTAVE = 2.0
@@ -347,6 +378,12 @@ _C.MODEL.RETINANET.INFERENCE_TH = 0.05
 # NMS threshold used in RetinaNet
 _C.MODEL.RETINANET.NMS_TH = 0.4
 
+# Type of NMS used in RetinaNet, see MODEL.ROI_HEADS.NMS_TYPE
+_C.MODEL.RETINANET.NMS_TYPE = "greedy"
+_C.MODEL.RETINANET.NMS_TOP_K = 200
+_C.MODEL.RETINANET.MATRIX_NMS_KERNEL = "gaussian"
+_C.MODEL.RETINANET.MATRIX_NMS_SIGMA = 2.0
+
 
 # ---------------------------------------------------------------------------- #
 # FBNet options
@@ -425,6 +462,19 @@ _C.TEST.EXPECTED_RESULTS_SIGMA_TOL = 4
 _C.TEST.IMS_PER_BATCH = 8
 # Number of detections per image
 _C.TEST.DETECTIONS_PER_IMG = 100
+# If not empty, a directory on a filesystem shared by all the processes,
+# through which the predictions are gathered instead of torch.distributed
+_C.TEST.GATHER_SHARED_DIR = ""
+# Number of processes used by the evaluation of the predictions, 0 to
+# evaluate in the main process
+_C.TEST.EVAL_NUM_WORKERS = 0
+# Implementation of the COCO evaluation: "pycocotools" for the COCOeval of
+# pycocotools, or "fast" for the vectorized FastCOCOeval, which gives the
+# same results and uses TEST.EVAL_NUM_WORKERS processes
+_C.TEST.COCO_EVAL_BACKEND = "pycocotools"
+# If True, the frozen batch normalizations, and those of the BatchNorm2d
+# layers, are folded into the preceding convolutions before the inference
+_C.TEST.FOLD_BATCH_NORM = False
 
 # ---------------------------------------------------------------------------- #
 # Test-time augmentations for bounding box detection
@@ -447,6 +497,28 @@ _C.TEST.BBOX_AUG.MAX_SIZE = 4000
 # Horizontal flip at each scale
 _C.TEST.BBOX_AUG.SCALE_H_FLIP = False
 
+# ---------------------------------------------------------------------------- #
+# Pipelined inference: the data loading, the model, the transfer of the
+# outputs to the CPU and their conversion to the evaluation format (e.g.
+# resizing, mask pasting and RLE encoding for COCO) run concurrently
+# ---------------------------------------------------------------------------- #
+_C.TEST.PIPELINE = CN()
+_C.TEST.PIPELINE.ENABLED = False
+# Maximum number of batches waiting between two stages of the pipeline
+_C.TEST.PIPELINE.QUEUE_SIZE = 4
+# Number of threads converting the outputs of the model
+_C.TEST.PIPELINE.NUM_CONVERT_WORKERS = 4
+
+# ---------------------------------------------------------------------------- #
+# Streaming of the predictions: each process writes them to shard files in
+# the inference output folder as they are produced, as compact records with
+# run-length encoded masks, instead of keeping them all in memory
+# ---------------------------------------------------------------------------- #
+_C.TEST.STREAM_PREDICTIONS = CN()
+_C.TEST.STREAM_PREDICTIONS.ENABLED = False
+# Number of images whose predictions are stored in a shard file
+_C.TEST.STREAM_PREDICTIONS.IMAGES_PER_SHARD = 500
+
 
 # ---------------------------------------------------------------------------- #
 # Misc options
@@ -15,6 +15,15 @@ class DatasetCatalog(object):
             "img_dir": "coco/val2017",
             "ann_file": "coco/annotations/instances_val2017.json"
         },
+        # images packed with tools/pack_images.py
+        "coco_2017_train_packed": {
+            "img_shards": "coco/train2017_packed",
+            "ann_file": "coco/annotations/instances_train2017.json"
+        },
+        "coco_2017_val_packed": {
+            "img_shards": "coco/val2017_packed",
+            "ann_file": "coco/annotations/instances_val2017.json"
+        },
         "coco_2014_train": {
             "img_dir": "coco/train2014",
             "ann_file": "coco/annotations/instances_train2014.json"
@@ -112,11 +121,21 @@ class DatasetCatalog(object):
             data_dir = DatasetCatalog.DATA_DIR
             attrs = DatasetCatalog.DATASETS[name]
             args = dict(
-                root=os.path.join(data_dir, attrs["img_dir"]),
                 ann_file=os.path.join(data_dir, attrs["ann_file"]),
             )
+            factory = "COCODataset"
+            if "img_shards" in attrs:
+                args["image_shards"] = os.path.join(data_dir, attrs["img_shards"])
+                factory = "PackedCOCODataset"
+            else:
+                args["root"] = os.path.join(data_dir, attrs["img_dir"])
+            # use the columnar annotation cache if it has been compiled,
+            # see tools/compile_coco_annotation_cache.py
+            annotation_cache = os.path.splitext(args["ann_file"])[0] + "_cache"
+            if os.path.isdir(annotation_cache):
+                args["annotation_cache"] = annotation_cache
             return dict(
-                factory="COCODataset",
+                factory=factory,
                 args=args,
             )
         elif "voc" in name:
@@ -126,8 +145,12 @@ class DatasetCatalog(object):
                 data_dir=os.path.join(data_dir, attrs["data_dir"]),
                 split=attrs["split"],
             )
+            factory = "PascalVOCDataset"
+            if "img_shards" in attrs:
+                args["image_shards"] = os.path.join(data_dir, attrs["img_shards"])
+                factory = "PackedPascalVOCDataset"
             return dict(
-                factory="PascalVOCDataset",
+                factory=factory,
                 args=args,
             )
         raise RuntimeError("Dataset not available: {}".format(name))
@@ -41,6 +41,45 @@ at::Tensor ROIAlign_backward(const at::Tensor& grad,
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return ROIAlign_backward_cpu(grad, rois, spatial_scale, pooled_height, pooled_width, batch_size, channels, height, width, sampling_ratio);
 }
 
+// Pools each roi from the feature map of its level, levels[i] being the
+// index in features of the level of rois[i]
+at::Tensor MultiLevelROIAlign_forward(const std::vector<at::Tensor>& features,
+                                      const at::Tensor& rois,
+                                      const at::Tensor& levels,
+                                      const std::vector<double>& spatial_scales,
+                                      const int pooled_height,
+                                      const int pooled_width,
+                                      const int sampling_ratio) {
+  if (rois.type().is_cuda()) {
+#ifdef WITH_CUDA
+    return MultiLevelROIAlign_forward_cuda(features, rois, levels, spatial_scales, pooled_height, pooled_width, sampling_ratio);
+#else
+    AT_ERROR("Not compiled with GPU support");
+#endif
+  }
+  return MultiLevelROIAlign_forward_cpu(features, rois, levels, spatial_scales, pooled_height, pooled_width, sampling_ratio);
+}
+
+std::vector<at::Tensor> MultiLevelROIAlign_backward(const at::Tensor& grad,
+                                                    const at::Tensor& rois,
+                                                    const at::Tensor& levels,
+                                                    const std::vector<double>& spatial_scales,
+                                                    const int pooled_height,
+                                                    const int pooled_width,
+                                                    const int batch_size,
+                                                    const int channels,
+                                                    const std::vector<int64_t>& heights,
+                                                    const std::vector<int64_t>& widths,
+                                                    const int sampling_ratio) {
+  if (grad.type().is_cuda()) {
+#ifdef WITH_CUDA
+    return MultiLevelROIAlign_backward_cuda(grad, rois, levels, spatial_scales, pooled_height, pooled_width, batch_size, channels, heights, widths, sampling_ratio);
+#else
+    AT_ERROR("Not compiled with GPU support");
+#endif
+  }
+  return MultiLevelROIAlign_backward_cpu(grad, rois, levels, spatial_scales, pooled_height, pooled_width, batch_size, channels, heights, widths, sampling_ratio);
+}
@@ -1,6 +1,8 @@
 // Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 #include "cpu/vision.h"
 
+#include <ATen/Parallel.h>
+
 // implementation taken from Caffe2
 template <typename T>
 struct PreCalc {
@@ -110,97 +112,136 @@ void pre_calc_for_bilinear_interpolate(
   }
 }
 
+// geometry of the sampling grid of a roi, shared by the forward and the backward
 template <typename T>
-void ROIAlignForward_cpu_kernel(
-    const int nthreads,
-    const T* bottom_data,
-    const T& spatial_scale,
-    const int channels,
+struct ROIGrid {
+  int batch_ind;
+  T start_h;
+  T start_w;
+  T bin_size_h;
+  T bin_size_w;
+  int bin_grid_h;
+  int bin_grid_w;
+};
+
+template <typename T>
+ROIGrid<T> roi_grid(
+    const T* roi,
+    const T spatial_scale,
+    const int pooled_height,
+    const int pooled_width,
+    const int sampling_ratio) {
+  ROIGrid<T> grid;
+  grid.batch_ind = roi[0];
+
+  // Do not using rounding; this implementation detail is critical
+  grid.start_w = roi[1] * spatial_scale;
+  grid.start_h = roi[2] * spatial_scale;
+  T roi_end_w = roi[3] * spatial_scale;
+  T roi_end_h = roi[4] * spatial_scale;
+
+  // Force malformed ROIs to be 1x1
+  T roi_width = std::max(roi_end_w - grid.start_w, (T)1.);
+  T roi_height = std::max(roi_end_h - grid.start_h, (T)1.);
+  grid.bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
+  grid.bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
+
+  // We use roi_bin_grid to sample the grid and mimic integral
+  grid.bin_grid_h = (sampling_ratio > 0)
+      ? sampling_ratio
+      : ceil(roi_height / pooled_height); // e.g., = 2
+  grid.bin_grid_w =
+      (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
+  return grid;
+}
+
+// computes the bilinear interpolation weights of all the sampling points of
+// a roi, which are shared by all the channels
+template <typename T>
+void pre_calc_for_roi(
+    const ROIGrid<T>& grid,
     const int height,
     const int width,
     const int pooled_height,
     const int pooled_width,
+    std::vector<PreCalc<T>>& pre_calc) {
+  pre_calc.resize(
+      grid.bin_grid_h * grid.bin_grid_w * pooled_width * pooled_height);
+  pre_calc_for_bilinear_interpolate(
+      height,
+      width,
+      pooled_height,
+      pooled_width,
+      grid.bin_grid_h,
+      grid.bin_grid_w,
+      grid.start_h,
+      grid.start_w,
+      grid.bin_size_h,
+      grid.bin_size_w,
+      grid.bin_grid_h,
+      grid.bin_grid_w,
+      pre_calc);
+}
+
+// size and scale of a feature map, a single feature map being the special
+// case of a one level pyramid
+template <typename T>
+struct FeatureLevel {
+  int height;
+  int width;
+  T spatial_scale;
+};
+
+// roi_levels gives the level of each roi, or is null when there is a single
+// level
+template <typename T>
+void ROIAlignForward_cpu_kernel(
+    const int n_rois,
+    const std::vector<const T*>& bottom_data,
+    const std::vector<FeatureLevel<T>>& levels,
+    const int64_t* roi_levels,
+    const int channels,
+    const int pooled_height,
+    const int pooled_width,
     const int sampling_ratio,
     const T* bottom_rois,
-    //int roi_cols,
     T* top_data) {
-  //AT_ASSERT(roi_cols == 4 || roi_cols == 5);
-  int roi_cols = 5;
-
-  int n_rois = nthreads / channels / pooled_width / pooled_height;
-  // (n, c, ph, pw) is an element in the pooled output
-  // can be parallelized using omp
-  // #pragma omp parallel for num_threads(32)
-  for (int n = 0; n < n_rois; n++) {
-    int index_n = n * channels * pooled_width * pooled_height;
-
-    // roi could have 4 or 5 columns
-    const T* offset_bottom_rois = bottom_rois + n * roi_cols;
-    int roi_batch_ind = 0;
-    if (roi_cols == 5) {
-      roi_batch_ind = offset_bottom_rois[0];
-      offset_bottom_rois++;
-    }
+  // the (roi, channel) pairs are split among the threads, and each thread
+  // computes the interpolation weights of a roi once for all its channels
+  at::parallel_for(0, n_rois * channels, channels, [&](int64_t begin, int64_t end) {
+    std::vector<PreCalc<T>> pre_calc;
+    int current_roi = -1;
+    int level = 0;
+    ROIGrid<T> grid;
+    T count = 1;
+
+    for (int64_t index_n_c = begin; index_n_c < end; index_n_c++) {
+      int n = index_n_c / channels;
+      int c = index_n_c % channels;
+      if (n != current_roi) {
+        level = roi_levels ? roi_levels[n] : 0;
+        const FeatureLevel<T>& fl = levels[level];
+        grid = roi_grid(
+            bottom_rois + n * 5, fl.spatial_scale, pooled_height, pooled_width,
+            sampling_ratio);
+        pre_calc_for_roi(grid, fl.height, fl.width, pooled_height, pooled_width, pre_calc);
+        // We do average (integral) pooling inside a bin
+        count = grid.bin_grid_h * grid.bin_grid_w; // e.g. = 4
+        current_roi = n;
+      }
 
-    // Do not using rounding; this implementation detail is critical
-    T roi_start_w = offset_bottom_rois[0] * spatial_scale;
-    T roi_start_h = offset_bottom_rois[1] * spatial_scale;
-    T roi_end_w = offset_bottom_rois[2] * spatial_scale;
-    T roi_end_h = offset_bottom_rois[3] * spatial_scale;
-    // T roi_start_w = round(offset_bottom_rois[0] * spatial_scale);
-    // T roi_start_h = round(offset_bottom_rois[1] * spatial_scale);
-    // T roi_end_w = round(offset_bottom_rois[2] * spatial_scale);
-    // T roi_end_h = round(offset_bottom_rois[3] * spatial_scale);
-
-    // Force malformed ROIs to be 1x1
-    T roi_width = std::max(roi_end_w - roi_start_w, (T)1.);
-    T roi_height = std::max(roi_end_h - roi_start_h, (T)1.);
-    T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
-    T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
-
-    // We use roi_bin_grid to sample the grid and mimic integral
-    int roi_bin_grid_h = (sampling_ratio > 0)
-        ? sampling_ratio
-        : ceil(roi_height / pooled_height); // e.g., = 2
-    int roi_bin_grid_w =
-        (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
-
-    // We do average (integral) pooling inside a bin
-    const T count = roi_bin_grid_h * roi_bin_grid_w; // e.g. = 4
-
-    // we want to precalculate indices and weights shared by all channels,
-    // this is the key point of optimization
-    std::vector<PreCalc<T>> pre_calc(
-        roi_bin_grid_h * roi_bin_grid_w * pooled_width * pooled_height);
-    pre_calc_for_bilinear_interpolate(
-        height,
-        width,
-        pooled_height,
-        pooled_width,
-        roi_bin_grid_h,
-        roi_bin_grid_w,
-        roi_start_h,
-        roi_start_w,
-        bin_size_h,
-        bin_size_w,
-        roi_bin_grid_h,
-        roi_bin_grid_w,
-        pre_calc);
-
-      for (int c = 0; c < channels; c++) {
-      int index_n_c = index_n + c * pooled_width * pooled_height;
+      const int plane_size = levels[level].height * levels[level].width;
       const T* offset_bottom_data =
-          bottom_data + (roi_batch_ind * channels + c) * height * width;
+          bottom_data[level] + (grid.batch_ind * channels + c) * plane_size;
+      T* offset_top_data = top_data + index_n_c * pooled_height * pooled_width;
       int pre_calc_index = 0;
 
       for (int ph = 0; ph < pooled_height; ph++) {
         for (int pw = 0; pw < pooled_width; pw++) {
-          int index = index_n_c + ph * pooled_width + pw;
-
           T output_val = 0.;
-          for (int iy = 0; iy < roi_bin_grid_h; iy++) {
-            for (int ix = 0; ix < roi_bin_grid_w; ix++) {
-              PreCalc<T> pc = pre_calc[pre_calc_index];
+          for (int iy = 0; iy < grid.bin_grid_h; iy++) {
+            for (int ix = 0; ix < grid.bin_grid_w; ix++) {
+              const PreCalc<T>& pc = pre_calc[pre_calc_index];
               output_val += pc.w1 * offset_bottom_data[pc.pos1] +
                   pc.w2 * offset_bottom_data[pc.pos2] +
                   pc.w3 * offset_bottom_data[pc.pos3] +
@@ -211,11 +252,77 @@ void ROIAlignForward_cpu_kernel(
           }
           output_val /= count;
 
-          top_data[index] = output_val;
+          offset_top_data[ph * pooled_width + pw] = output_val;
         } // for pw
       } // for ph
-    } // for c
-  } // for n
+    } // for index_n_c
+  });
+}
+
+template <typename T>
+void ROIAlignBackward_cpu_kernel(
+    const int n_rois,
+    const T* top_diff,
+    const std::vector<FeatureLevel<T>>& levels,
+    const int64_t* roi_levels,
+    const int channels,
+    const int pooled_height,
+    const int pooled_width,
+    const int sampling_ratio,
+    const T* bottom_rois,
+    const std::vector<T*>& bottom_diff) {
+  // the gradients of different channels are accumulated in different planes
+  // of bottom_diff, so the channels are split among the threads, and each
+  // thread computes the interpolation weights of each roi once
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    std::vector<PreCalc<T>> pre_calc;
+
+    for (int n = 0; n < n_rois; n++) {
+      const int level = roi_levels ? roi_levels[n] : 0;
+      const FeatureLevel<T>& fl = levels[level];
+      ROIGrid<T> grid = roi_grid(
+          bottom_rois + n * 5, fl.spatial_scale, pooled_height, pooled_width,
+          sampling_ratio);
+      pre_calc_for_roi(grid, fl.height, fl.width, pooled_height, pooled_width, pre_calc);
+      const T count = grid.bin_grid_h * grid.bin_grid_w;
+
+      for (int64_t c = begin; c < end; c++) {
+        T* offset_bottom_diff = bottom_diff[level] +
+            (grid.batch_ind * channels + c) * fl.height * fl.width;
+        const T* offset_top_diff =
+            top_diff + (n * channels + c) * pooled_height * pooled_width;
+        int pre_calc_index = 0;
+
+        for (int ph = 0; ph < pooled_height; ph++) {
+          for (int pw = 0; pw < pooled_width; pw++) {
+            const T top_diff_this_bin =
+                offset_top_diff[ph * pooled_width + pw] / count;
+            for (int iy = 0; iy < grid.bin_grid_h; iy++) {
+              for (int ix = 0; ix < grid.bin_grid_w; ix++) {
+                const PreCalc<T>& pc = pre_calc[pre_calc_index];
+                // the weights of the points outside of the feature map are 0
+                offset_bottom_diff[pc.pos1] += top_diff_this_bin * pc.w1;
+                offset_bottom_diff[pc.pos2] += top_diff_this_bin * pc.w2;
+                offset_bottom_diff[pc.pos3] += top_diff_this_bin * pc.w3;
+                offset_bottom_diff[pc.pos4] += top_diff_this_bin * pc.w4;
+
+                pre_calc_index += 1;
+              }
+            }
+          } // for pw
+        } // for ph
+      } // for c
+    } // for n
+  });
+}
+
+static void check_roi_levels_cpu(const at::Tensor& levels, const int num_levels) {
+  if (levels.numel() == 0) {
+    return;
+  }
+  AT_CHECK(levels.min().item<int64_t>() >= 0 &&
+               levels.max().item<int64_t>() < num_levels,
+           "the roi levels must be in [0, ", num_levels, ")");
 }
 
 at::Tensor ROIAlign_forward_cpu(const at::Tensor& input,
@@ -233,25 +340,184 @@ at::Tensor ROIAlign_forward_cpu(const at::Tensor& input,
   auto width = input.size(3);
 
   auto output = at::empty({num_rois, channels, pooled_height, pooled_width}, input.options());
-  auto output_size = num_rois * pooled_height * pooled_width * channels;
 
   if (output.numel() == 0) {
     return output;
   }
 
+  auto input_ = input.contiguous();
+  auto rois_ = rois.contiguous();
   AT_DISPATCH_FLOATING_TYPES(input.type(), "ROIAlign_forward", [&] {
+    std::vector<const scalar_t*> bottom_data = {input_.data<scalar_t>()};
+    std::vector<FeatureLevel<scalar_t>> levels = {
+        {(int)height, (int)width, (scalar_t)spatial_scale}};
+    ROIAlignForward_cpu_kernel<scalar_t>(
+         num_rois,
+         bottom_data,
+         levels,
+         nullptr,
+         channels,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         rois_.data<scalar_t>(),
+         output.data<scalar_t>());
+  });
+  return output;
+}
+
+at::Tensor ROIAlign_backward_cpu(const at::Tensor& grad,
+                                 const at::Tensor& rois,
+                                 const float spatial_scale,
+                                 const int pooled_height,
+                                 const int pooled_width,
+                                 const int batch_size,
+                                 const int channels,
+                                 const int height,
+                                 const int width,
+                                 const int sampling_ratio) {
+  AT_ASSERTM(!grad.type().is_cuda(), "grad must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+
+  auto num_rois = rois.size(0);
+  auto grad_input = at::zeros({batch_size, channels, height, width}, grad.options());
+
+  if (grad.numel() == 0) {
+    return grad_input;
+  }
+
+  auto grad_ = grad.contiguous();
+  auto rois_ = rois.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(grad.type(), "ROIAlign_backward", [&] {
+    std::vector<FeatureLevel<scalar_t>> levels = {
+        {height, width, (scalar_t)spatial_scale}};
+    std::vector<scalar_t*> bottom_diff = {grad_input.data<scalar_t>()};
+    ROIAlignBackward_cpu_kernel<scalar_t>(
+         num_rois,
+         grad_.data<scalar_t>(),
+         levels,
+         nullptr,
+         channels,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         rois_.data<scalar_t>(),
+         bottom_diff);
+  });
+  return grad_input;
+}
+
+at::Tensor MultiLevelROIAlign_forward_cpu(const std::vector<at::Tensor>& features,
+                                          const at::Tensor& rois,
+                                          const at::Tensor& levels,
+                                          const std::vector<double>& spatial_scales,
+                                          const int pooled_height,
+                                          const int pooled_width,
+                                          const int sampling_ratio) {
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+  AT_ASSERTM(!levels.type().is_cuda(), "levels must be a CPU tensor");
+  AT_ASSERTM(features.size() == spatial_scales.size(),
+             "there must be one spatial scale per feature map");
+  AT_ASSERTM(levels.numel() == rois.size(0), "there must be one level per roi");
+
+  const int num_levels = features.size();
+  auto num_rois = rois.size(0);
+  auto channels = features[0].size(1);
+  std::vector<at::Tensor> features_;
+  for (const auto& feature : features) {
+    AT_ASSERTM(!feature.type().is_cuda(), "features must be CPU tensors");
+    AT_ASSERTM(feature.size(1) == channels,
+               "all the feature maps must have the same number of channels");
+    features_.push_back(feature.contiguous());
+  }
+
+  auto output = at::empty({num_rois, channels, pooled_height, pooled_width},
+                          features[0].options());
+
+  if (output.numel() == 0) {
+    return output;
+  }
+
+  auto rois_ = rois.contiguous();
+  auto levels_ = levels.contiguous().to(at::kLong);
+  check_roi_levels_cpu(levels_, num_levels);
+  AT_DISPATCH_FLOATING_TYPES(features[0].type(), "MultiLevelROIAlign_forward", [&] {
+    std::vector<const scalar_t*> bottom_data;
+    std::vector<FeatureLevel<scalar_t>> feature_levels;
+    for (int l = 0; l < num_levels; l++) {
+      bottom_data.push_back(features_[l].data<scalar_t>());
+      feature_levels.push_back({(int)features_[l].size(2),
+                                (int)features_[l].size(3),
+                                (scalar_t)spatial_scales[l]});
+    }
     ROIAlignForward_cpu_kernel<scalar_t>(
-         output_size,
-         input.data<scalar_t>(),
-         spatial_scale,
+         num_rois,
+         bottom_data,
+         feature_levels,
+         levels_.data<int64_t>(),
          channels,
-         height,
-         width,
          pooled_height,
          pooled_width,
          sampling_ratio,
-         rois.data<scalar_t>(),
+         rois_.data<scalar_t>(),
          output.data<scalar_t>());
   });
   return output;
 }
+
+std::vector<at::Tensor> MultiLevelROIAlign_backward_cpu(const at::Tensor& grad,
+                                                        const at::Tensor& rois,
+                                                        const at::Tensor& levels,
+                                                        const std::vector<double>& spatial_scales,
+                                                        const int pooled_height,
+                                                        const int pooled_width,
+                                                        const int batch_size,
+                                                        const int channels,
+                                                        const std::vector<int64_t>& heights,
+                                                        const std::vector<int64_t>& widths,
+                                                        const int sampling_ratio) {
+  AT_ASSERTM(!grad.type().is_cuda(), "grad must be a CPU tensor");
+  AT_ASSERTM(!rois.type().is_cuda(), "rois must be a CPU tensor");
+  AT_ASSERTM(!levels.type().is_cuda(), "levels must be a CPU tensor");
+  AT_ASSERTM(heights.size() == spatial_scales.size() &&
+                 widths.size() == spatial_scales.size(),
+             "there must be one spatial scale per feature map");
+
+  const int num_levels = spatial_scales.size();
+  auto num_rois = rois.size(0);
+  std::vector<at::Tensor> grad_inputs;
+  for (int l = 0; l < num_levels; l++) {
+    grad_inputs.push_back(
+        at::zeros({batch_size, channels, heights[l], widths[l]}, grad.options()));
+  }
+
+  if (grad.numel() == 0) {
+    return grad_inputs;
+  }
+
+  auto grad_ = grad.contiguous();
+  auto rois_ = rois.contiguous();
+  auto levels_ = levels.contiguous().to(at::kLong);
+  check_roi_levels_cpu(levels_, num_levels);
+  AT_DISPATCH_FLOATING_TYPES(grad.type(), "MultiLevelROIAlign_backward", [&] {
+    std::vector<FeatureLevel<scalar_t>> feature_levels;
+    std::vector<scalar_t*> bottom_diff;
+    for (int l = 0; l < num_levels; l++) {
+      feature_levels.push_back(
+          {(int)heights[l], (int)widths[l], (scalar_t)spatial_scales[l]});
+      bottom_diff.push_back(grad_inputs[l].data<scalar_t>());
+    }
+    ROIAlignBackward_cpu_kernel<scalar_t>(
+         num_rois,
+         grad_.data<scalar_t>(),
+         feature_levels,
+         levels_.data<int64_t>(),
+         channels,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         rois_.data<scalar_t>(),
+         bottom_diff);
+  });
+  return grad_inputs;
+}
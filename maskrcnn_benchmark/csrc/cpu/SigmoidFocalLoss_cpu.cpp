@@ -0,0 +1,166 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+// CPU version of SigmoidFocalLoss_cuda.cu, with the same formulas
+#include "cpu/vision.h"
+
+#include <ATen/Parallel.h>
+
+#include <cfloat>
+#include <cmath>
+
+template <typename T>
+void SigmoidFocalLossForward_cpu_kernel(
+    const int num_samples,
+    const T* logits,
+    const int* targets,
+    const int num_classes,
+    const float gamma,
+    const float alpha,
+    T* losses) {
+  const T zn = (1.0 - alpha);
+  const T zp = (alpha);
+
+  // each thread computes the losses of contiguous rows of logits
+  at::parallel_for(0, num_samples, 64, [&](int64_t begin, int64_t end) {
+    for (int64_t n = begin; n < end; n++) {
+      const int t = targets[n];
+      const T* logits_n = logits + n * num_classes;
+      T* losses_n = losses + n * num_classes;
+      for (int d = 0; d < num_classes; d++) {
+        // class 0 is the background, and the classes start at 1
+        const T c1 = (t == (d + 1));
+        // targets of -1 are ignored
+        const T c2 = (t >= 0 & t != (d + 1));
+
+        // p = 1. / 1. + expf(-x); p = sigmoid(x)
+        const T x = logits_n[d];
+        const T p = 1. / (1. + std::exp(-x));
+
+        // (1-p)**gamma * log(p)
+        T term1 = std::pow((1. - p), gamma) * std::log(std::max(p, (T)FLT_MIN));
+
+        // p**gamma * log(1-p), computed in a numerically stable way
+        T term2 = std::pow(p, gamma) *
+            (-1. * x * (x >= 0) - std::log(1. + std::exp(x - 2. * x * (x >= 0))));
+
+        losses_n[d] = -c1 * term1 * zp - c2 * term2 * zn;
+      } // for d
+    } // for n
+  });
+}
+
+template <typename T>
+void SigmoidFocalLossBackward_cpu_kernel(
+    const int num_samples,
+    const T* logits,
+    const int* targets,
+    const T* d_losses,
+    const int num_classes,
+    const float gamma,
+    const float alpha,
+    T* d_logits) {
+  const T zn = (1.0 - alpha);
+  const T zp = (alpha);
+
+  at::parallel_for(0, num_samples, 64, [&](int64_t begin, int64_t end) {
+    for (int64_t n = begin; n < end; n++) {
+      const int t = targets[n];
+      const T* logits_n = logits + n * num_classes;
+      const T* d_losses_n = d_losses + n * num_classes;
+      T* d_logits_n = d_logits + n * num_classes;
+      for (int d = 0; d < num_classes; d++) {
+        const T c1 = (t == (d + 1));
+        const T c2 = (t >= 0 & t != (d + 1));
+
+        const T x = logits_n[d];
+        const T p = 1. / (1. + std::exp(-x));
+
+        // (1-p)**g * (1 - p - g*p*log(p))
+        T term1 = std::pow((1. - p), gamma) *
+            (1. - p - (p * gamma * std::log(std::max(p, (T)FLT_MIN))));
+
+        // (p**g) * (g*(1-p)*log(1-p) - p)
+        T term2 = std::pow(p, gamma) *
+            ((-1. * x * (x >= 0) - std::log(1. + std::exp(x - 2. * x * (x >= 0)))) *
+                 (1. - p) * gamma - p);
+
+        d_logits_n[d] = (-c1 * term1 * zp - c2 * term2 * zn) * d_losses_n[d];
+      } // for d
+    } // for n
+  });
+}
+
+at::Tensor SigmoidFocalLoss_forward_cpu(
+    const at::Tensor& logits,
+    const at::Tensor& targets,
+    const int num_classes,
+    const float gamma,
+    const float alpha) {
+  AT_ASSERTM(!logits.type().is_cuda(), "logits must be a CPU tensor");
+  AT_ASSERTM(!targets.type().is_cuda(), "targets must be a CPU tensor");
+  AT_ASSERTM(logits.dim() == 2, "logits should be NxClass");
+  AT_ASSERTM(logits.size(1) == num_classes, "logits should have num_classes columns");
+  AT_ASSERTM(targets.dim() == 1, "targets should be N");
+  AT_ASSERTM(targets.size(0) == logits.size(0), "logits and targets sizes should match");
+
+  const int num_samples = logits.size(0);
+
+  auto losses = at::empty({num_samples, logits.size(1)}, logits.options());
+
+  if (losses.numel() == 0) {
+    return losses;
+  }
+
+  auto logits_ = logits.contiguous();
+  auto targets_ = targets.contiguous().to(at::kInt);
+  AT_DISPATCH_FLOATING_TYPES(logits.type(), "SigmoidFocalLoss_forward", [&] {
+    SigmoidFocalLossForward_cpu_kernel<scalar_t>(
+         num_samples,
+         logits_.data<scalar_t>(),
+         targets_.data<int>(),
+         num_classes,
+         gamma,
+         alpha,
+         losses.data<scalar_t>());
+  });
+  return losses;
+}
+
+at::Tensor SigmoidFocalLoss_backward_cpu(
+    const at::Tensor& logits,
+    const at::Tensor& targets,
+    const at::Tensor& d_losses,
+    const int num_classes,
+    const float gamma,
+    const float alpha) {
+  AT_ASSERTM(!logits.type().is_cuda(), "logits must be a CPU tensor");
+  AT_ASSERTM(!targets.type().is_cuda(), "targets must be a CPU tensor");
+  AT_ASSERTM(!d_losses.type().is_cuda(), "d_losses must be a CPU tensor");
+  AT_ASSERTM(logits.dim() == 2, "logits should be NxClass");
+  AT_ASSERTM(logits.size(1) == num_classes, "logits should have num_classes columns");
+  AT_ASSERTM(targets.dim() == 1, "targets should be N");
+  AT_ASSERTM(d_losses.sizes() == logits.sizes(), "d_losses and logits sizes should match");
+
+  const int num_samples = logits.size(0);
+
+  auto d_logits = at::zeros({num_samples, num_classes}, logits.options());
+
+  if (d_logits.numel() == 0) {
+    return d_logits;
+  }
+
+  auto logits_ = logits.contiguous();
+  auto targets_ = targets.contiguous().to(at::kInt);
+  auto d_losses_ = d_losses.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(logits.type(), "SigmoidFocalLoss_backward", [&] {
+    SigmoidFocalLossBackward_cpu_kernel<scalar_t>(
+         num_samples,
+         logits_.data<scalar_t>(),
+         targets_.data<int>(),
+         d_losses_.data<scalar_t>(),
+         num_classes,
+         gamma,
+         alpha,
+         d_logits.data<scalar_t>());
+  });
+  return d_logits;
+}
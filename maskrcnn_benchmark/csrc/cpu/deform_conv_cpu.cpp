@@ -0,0 +1,819 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+// CPU version of cuda/deform_conv_cuda.cu and cuda/deform_conv_kernel_cuda.cu.
+// The columns have the same layout as in the CUDA implementation, and the
+// kernels of the (modulated) deformable convolutions are shared, a null mask
+// meaning that the convolution is not modulated.
+#include "cpu/vision.h"
+
+#include <ATen/Parallel.h>
+
+#include <cmath>
+
+
+template <typename T>
+T deformable_bilinear_cpu(const T* bottom_data, const int height,
+                          const int width, T h, T w) {
+  int h_low = std::floor(h);
+  int w_low = std::floor(w);
+  int h_high = h_low + 1;
+  int w_high = w_low + 1;
+
+  T lh = h - h_low;
+  T lw = w - w_low;
+  T hh = 1 - lh, hw = 1 - lw;
+
+  T v1 = 0;
+  if (h_low >= 0 && w_low >= 0)
+    v1 = bottom_data[h_low * width + w_low];
+  T v2 = 0;
+  if (h_low >= 0 && w_high <= width - 1)
+    v2 = bottom_data[h_low * width + w_high];
+  T v3 = 0;
+  if (h_high <= height - 1 && w_low >= 0)
+    v3 = bottom_data[h_high * width + w_low];
+  T v4 = 0;
+  if (h_high <= height - 1 && w_high <= width - 1)
+    v4 = bottom_data[h_high * width + w_high];
+
+  T w1 = hh * hw, w2 = hh * lw, w3 = lh * hw, w4 = lh * lw;
+
+  return (w1 * v1 + w2 * v2 + w3 * v3 + w4 * v4);
+}
+
+// derivative of the bilinear interpolation with respect to h (bp_dir = 0)
+// or w (bp_dir = 1)
+template <typename T>
+T deformable_coordinate_weight_cpu(T argmax_h, T argmax_w, const int height,
+                                   const int width, const T* im_data,
+                                   const int bp_dir) {
+  if (argmax_h <= -1 || argmax_h >= height || argmax_w <= -1 ||
+      argmax_w >= width) {
+    // empty
+    return 0;
+  }
+
+  int argmax_h_low = std::floor(argmax_h);
+  int argmax_w_low = std::floor(argmax_w);
+  int argmax_h_high = argmax_h_low + 1;
+  int argmax_w_high = argmax_w_low + 1;
+
+  T weight = 0;
+
+  if (bp_dir == 0) {
+    if (argmax_h_low >= 0 && argmax_w_low >= 0)
+      weight += -1 * (argmax_w_low + 1 - argmax_w) * im_data[argmax_h_low * width + argmax_w_low];
+    if (argmax_h_low >= 0 && argmax_w_high <= width - 1)
+      weight += -1 * (argmax_w - argmax_w_low) * im_data[argmax_h_low * width + argmax_w_high];
+    if (argmax_h_high <= height - 1 && argmax_w_low >= 0)
+      weight += (argmax_w_low + 1 - argmax_w) * im_data[argmax_h_high * width + argmax_w_low];
+    if (argmax_h_high <= height - 1 && argmax_w_high <= width - 1)
+      weight += (argmax_w - argmax_w_low) * im_data[argmax_h_high * width + argmax_w_high];
+  } else if (bp_dir == 1) {
+    if (argmax_h_low >= 0 && argmax_w_low >= 0)
+      weight += -1 * (argmax_h_low + 1 - argmax_h) * im_data[argmax_h_low * width + argmax_w_low];
+    if (argmax_h_low >= 0 && argmax_w_high <= width - 1)
+      weight += (argmax_h_low + 1 - argmax_h) * im_data[argmax_h_low * width + argmax_w_high];
+    if (argmax_h_high <= height - 1 && argmax_w_low >= 0)
+      weight += -1 * (argmax_h - argmax_h_low) * im_data[argmax_h_high * width + argmax_w_low];
+    if (argmax_h_high <= height - 1 && argmax_w_high <= width - 1)
+      weight += (argmax_h - argmax_h_low) * im_data[argmax_h_high * width + argmax_w_high];
+  }
+
+  return weight;
+}
+
+template <typename T>
+void deformable_im2col_cpu_kernel(
+    const T* data_im, const T* data_offset, const T* data_mask,
+    const int channels, const int height, const int width,
+    const int kernel_h, const int kernel_w, const int pad_h, const int pad_w,
+    const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w,
+    const int channel_per_deformable_group, const int batch_size,
+    const int deformable_group, const int height_col, const int width_col,
+    T* data_col) {
+  const int col_size = height_col * width_col;
+  // each (channel, image) pair fills its own rows of the columns
+  at::parallel_for(0, channels * batch_size, 1, [&](int64_t begin, int64_t end) {
+    for (int64_t index = begin; index < end; index++) {
+      const int c_im = index / batch_size;
+      const int b_col = index % batch_size;
+      const int deformable_group_index = c_im / channel_per_deformable_group;
+      const int offset_index = b_col * deformable_group + deformable_group_index;
+
+      const T* data_im_ptr = data_im + (b_col * channels + c_im) * height * width;
+      const T* data_offset_ptr = data_offset + offset_index * 2 * kernel_h * kernel_w * col_size;
+      const T* data_mask_ptr = data_mask == nullptr ? nullptr :
+          data_mask + offset_index * kernel_h * kernel_w * col_size;
+
+      for (int i = 0; i < kernel_h; ++i) {
+        for (int j = 0; j < kernel_w; ++j) {
+          const int k = i * kernel_w + j;
+          T* data_col_ptr = data_col +
+              ((c_im * kernel_h * kernel_w + k) * batch_size + b_col) * col_size;
+          const T* offset_h_ptr = data_offset_ptr + 2 * k * col_size;
+          const T* offset_w_ptr = offset_h_ptr + col_size;
+
+          for (int h_col = 0; h_col < height_col; ++h_col) {
+            for (int w_col = 0; w_col < width_col; ++w_col) {
+              const int pos = h_col * width_col + w_col;
+              const T h_im = h_col * stride_h - pad_h + i * dilation_h + offset_h_ptr[pos];
+              const T w_im = w_col * stride_w - pad_w + j * dilation_w + offset_w_ptr[pos];
+              T val = static_cast<T>(0);
+              if (h_im > -1 && w_im > -1 && h_im < height && w_im < width) {
+                val = deformable_bilinear_cpu(data_im_ptr, height, width, h_im, w_im);
+              }
+              if (data_mask_ptr != nullptr) {
+                val *= data_mask_ptr[k * col_size + pos];
+              }
+              data_col_ptr[pos] = val;
+            }
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename T>
+void deformable_col2im_cpu_kernel(
+    const T* data_col, const T* data_offset, const T* data_mask,
+    const int channels, const int height, const int width,
+    const int kernel_h, const int kernel_w, const int pad_h, const int pad_w,
+    const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w,
+    const int channel_per_deformable_group, const int batch_size,
+    const int deformable_group, const int height_col, const int width_col,
+    T* grad_im) {
+  const int col_size = height_col * width_col;
+  // the gradients of different channels are accumulated in different planes
+  // of grad_im, so the channels are split among the threads
+  at::parallel_for(0, channels, 1, [&](int64_t begin, int64_t end) {
+    for (int64_t c = begin; c < end; c++) {
+      const int deformable_group_index = c / channel_per_deformable_group;
+      for (int b = 0; b < batch_size; b++) {
+        const int offset_index = b * deformable_group + deformable_group_index;
+        const T* data_offset_ptr = data_offset + offset_index * 2 * kernel_h * kernel_w * col_size;
+        const T* data_mask_ptr = data_mask == nullptr ? nullptr :
+            data_mask + offset_index * kernel_h * kernel_w * col_size;
+        T* grad_im_ptr = grad_im + (b * channels + c) * height * width;
+
+        for (int i = 0; i < kernel_h; ++i) {
+          for (int j = 0; j < kernel_w; ++j) {
+            const int k = i * kernel_w + j;
+            const T* data_col_ptr = data_col +
+                ((c * kernel_h * kernel_w + k) * batch_size + b) * col_size;
+            const T* offset_h_ptr = data_offset_ptr + 2 * k * col_size;
+            const T* offset_w_ptr = offset_h_ptr + col_size;
+
+            for (int h_out = 0; h_out < height_col; ++h_out) {
+              for (int w_out = 0; w_out < width_col; ++w_out) {
+                const int pos = h_out * width_col + w_out;
+                const T h_im = h_out * stride_h - pad_h + i * dilation_h + offset_h_ptr[pos];
+                const T w_im = w_out * stride_w - pad_w + j * dilation_w + offset_w_ptr[pos];
+                if (h_im <= -1 || w_im <= -1 || h_im >= height || w_im >= width) {
+                  continue;
+                }
+                T top_grad = data_col_ptr[pos];
+                if (data_mask_ptr != nullptr) {
+                  top_grad *= data_mask_ptr[k * col_size + pos];
+                }
+
+                // same weights as the bilinear interpolation of the forward
+                const int h_low = std::floor(h_im);
+                const int w_low = std::floor(w_im);
+                const T lh = h_im - h_low, lw = w_im - w_low;
+                const T hh = 1 - lh, hw = 1 - lw;
+                if (h_low >= 0 && w_low >= 0)
+                  grad_im_ptr[h_low * width + w_low] += hh * hw * top_grad;
+                if (h_low >= 0 && w_low + 1 <= width - 1)
+                  grad_im_ptr[h_low * width + w_low + 1] += hh * lw * top_grad;
+                if (h_low + 1 <= height - 1 && w_low >= 0)
+                  grad_im_ptr[(h_low + 1) * width + w_low] += lh * hw * top_grad;
+                if (h_low + 1 <= height - 1 && w_low + 1 <= width - 1)
+                  grad_im_ptr[(h_low + 1) * width + w_low + 1] += lh * lw * top_grad;
+              }
+            }
+          }
+        }
+      }
+    }
+  });
+}
+
+template <typename T>
+void deformable_col2im_coord_cpu_kernel(
+    const T* data_col, const T* data_im, const T* data_offset, const T* data_mask,
+    const int channels, const int height, const int width,
+    const int kernel_h, const int kernel_w, const int pad_h, const int pad_w,
+    const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int batch_size,
+    const int deformable_group, const int height_col, const int width_col,
+    T* grad_offset, T* grad_mask) {
+  const int col_size = height_col * width_col;
+  const int offset_channels = 2 * kernel_h * kernel_w * deformable_group;
+  const int channel_per_deformable_group = channels / deformable_group;
+  // each (image, offset channel) pair computes its own plane of grad_offset
+  at::parallel_for(0, batch_size * offset_channels, 1, [&](int64_t begin, int64_t end) {
+    for (int64_t index = begin; index < end; index++) {
+      const int b = index / offset_channels;
+      const int c = index % offset_channels;
+      const int deformable_group_index = c / (2 * kernel_h * kernel_w);
+      const int offset_c = c - deformable_group_index * 2 * kernel_h * kernel_w;
+      const int bp_dir = offset_c % 2;
+      const int k = offset_c / 2;
+      const int i = k / kernel_w;
+      const int j = k % kernel_w;
+      const int offset_index = b * deformable_group + deformable_group_index;
+
+      const T* offset_h_ptr = data_offset + (offset_index * 2 * kernel_h * kernel_w + 2 * k) * col_size;
+      const T* offset_w_ptr = offset_h_ptr + col_size;
+      const T* data_mask_ptr = data_mask == nullptr ? nullptr :
+          data_mask + (offset_index * kernel_h * kernel_w + k) * col_size;
+      // the gradient of the mask is computed with the offsets along h
+      T* grad_mask_ptr = (data_mask == nullptr || bp_dir != 0) ? nullptr :
+          grad_mask + (offset_index * kernel_h * kernel_w + k) * col_size;
+      T* grad_offset_ptr = grad_offset + index * col_size;
+
+      for (int pos = 0; pos < col_size; ++pos) {
+        grad_offset_ptr[pos] = 0;
+        if (grad_mask_ptr != nullptr) {
+          grad_mask_ptr[pos] = 0;
+        }
+      }
+
+      for (int cnt = 0; cnt < channel_per_deformable_group; ++cnt) {
+        const int c_im = deformable_group_index * channel_per_deformable_group + cnt;
+        const T* data_im_ptr = data_im + (b * channels + c_im) * height * width;
+        const T* data_col_ptr = data_col +
+            ((c_im * kernel_h * kernel_w + k) * batch_size + b) * col_size;
+
+        for (int h = 0; h < height_col; ++h) {
+          for (int w = 0; w < width_col; ++w) {
+            const int pos = h * width_col + w;
+            const T inv_h = h * stride_h - pad_h + i * dilation_h + offset_h_ptr[pos];
+            const T inv_w = w * stride_w - pad_w + j * dilation_w + offset_w_ptr[pos];
+            if (inv_h <= -1 || inv_w <= -1 || inv_h >= height || inv_w >= width) {
+              continue;
+            }
+            const T col = data_col_ptr[pos];
+            const T weight = deformable_coordinate_weight_cpu(
+                inv_h, inv_w, height, width, data_im_ptr, bp_dir);
+            if (data_mask_ptr == nullptr) {
+              grad_offset_ptr[pos] += weight * col;
+            } else {
+              grad_offset_ptr[pos] += weight * col * data_mask_ptr[pos];
+            }
+            if (grad_mask_ptr != nullptr) {
+              grad_mask_ptr[pos] += col * deformable_bilinear_cpu(
+                  data_im_ptr, height, width, inv_h, inv_w);
+            }
+          }
+        }
+      }
+    }
+  });
+}
+
+static void deformable_im2col_cpu(
+    const at::Tensor data_im, const at::Tensor data_offset,
+    const at::Tensor* data_mask, const int batch_size, const int channels,
+    const int height, const int width, const int height_col,
+    const int width_col, const int ksize_h, const int ksize_w,
+    const int pad_h, const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int deformable_group,
+    at::Tensor data_col) {
+  const int channel_per_deformable_group = channels / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(data_im.type(), "deformable_im2col_cpu", [&] {
+    deformable_im2col_cpu_kernel<scalar_t>(
+        data_im.data<scalar_t>(), data_offset.data<scalar_t>(),
+        data_mask == nullptr ? nullptr : data_mask->data<scalar_t>(),
+        channels, height, width, ksize_h, ksize_w, pad_h, pad_w,
+        stride_h, stride_w, dilation_h, dilation_w,
+        channel_per_deformable_group, batch_size, deformable_group,
+        height_col, width_col, data_col.data<scalar_t>());
+  });
+}
+
+static void deformable_col2im_cpu(
+    const at::Tensor data_col, const at::Tensor data_offset,
+    const at::Tensor* data_mask, const int batch_size, const int channels,
+    const int height, const int width, const int height_col,
+    const int width_col, const int ksize_h, const int ksize_w,
+    const int pad_h, const int pad_w, const int stride_h, const int stride_w,
+    const int dilation_h, const int dilation_w, const int deformable_group,
+    at::Tensor grad_im) {
+  const int channel_per_deformable_group = channels / deformable_group;
+
+  AT_DISPATCH_FLOATING_TYPES(data_col.type(), "deformable_col2im_cpu", [&] {
+    deformable_col2im_cpu_kernel<scalar_t>(
+        data_col.data<scalar_t>(), data_offset.data<scalar_t>(),
+        data_mask == nullptr ? nullptr : data_mask->data<scalar_t>(),
+        channels, height, width, ksize_h, ksize_w, pad_h, pad_w,
+        stride_h, stride_w, dilation_h, dilation_w,
+        channel_per_deformable_group, batch_size, deformable_group,
+        height_col, width_col, grad_im.data<scalar_t>());
+  });
+}
+
+static void deformable_col2im_coord_cpu(
+    const at::Tensor data_col, const at::Tensor data_im,
+    const at::Tensor data_offset, const at::Tensor* data_mask,
+    const int batch_size, const int channels, const int height,
+    const int width, const int height_col, const int width_col,
+    const int ksize_h, const int ksize_w, const int pad_h, const int pad_w,
+    const int stride_h, const int stride_w, const int dilation_h,
+    const int dilation_w, const int deformable_group, at::Tensor grad_offset,
+    at::Tensor* grad_mask) {
+  AT_DISPATCH_FLOATING_TYPES(data_col.type(), "deformable_col2im_coord_cpu", [&] {
+    deformable_col2im_coord_cpu_kernel<scalar_t>(
+        data_col.data<scalar_t>(), data_im.data<scalar_t>(),
+        data_offset.data<scalar_t>(),
+        data_mask == nullptr ? nullptr : data_mask->data<scalar_t>(),
+        channels, height, width, ksize_h, ksize_w, pad_h, pad_w,
+        stride_h, stride_w, dilation_h, dilation_w, batch_size,
+        deformable_group, height_col, width_col,
+        grad_offset.data<scalar_t>(),
+        grad_mask == nullptr ? nullptr : grad_mask->data<scalar_t>());
+  });
+}
+
+static void deform_conv_shape_check_cpu(
+    at::Tensor input, at::Tensor offset, at::Tensor* gradOutput,
+    at::Tensor weight, int kH, int kW, int dH, int dW, int padH, int padW,
+    int dilationH, int dilationW, int group, int deformable_group) {
+  AT_CHECK(weight.ndimension() == 4,
+           "4D weight tensor (nOutputPlane,nInputPlane,kH,kW) expected, "
+           "but got: ", weight.ndimension());
+
+  AT_CHECK(weight.is_contiguous(), "weight tensor has to be contiguous");
+
+  AT_CHECK(kW > 0 && kH > 0,
+           "kernel size should be greater than zero, but got kH: ", kH,
+           " kW: ", kW);
+
+  AT_CHECK((weight.size(2) == kH && weight.size(3) == kW),
+           "kernel size should be consistent with weight, but got kH: ", kH,
+           " kW: ", kW, " weight.size(2): ", weight.size(2),
+           ", weight.size(3): ", weight.size(3));
+
+  AT_CHECK(dW > 0 && dH > 0,
+           "stride should be greater than zero, but got dH: ", dH, " dW: ", dW);
+
+  AT_CHECK(dilationW > 0 && dilationH > 0,
+           "dilation should be greater than 0, but got dilationH: ", dilationH,
+           " dilationW: ", dilationW);
+
+  int ndim = input.ndimension();
+  int dimf = 0;
+  int dimh = 1;
+  int dimw = 2;
+
+  if (ndim == 4) {
+    dimf++;
+    dimh++;
+    dimw++;
+  }
+
+  AT_CHECK(ndim == 3 || ndim == 4,
+           "3D or 4D input tensor expected but got: ", ndim);
+
+  long nInputPlane = weight.size(1) * group;
+  long inputHeight = input.size(dimh);
+  long inputWidth = input.size(dimw);
+  long nOutputPlane = weight.size(0);
+  long outputHeight =
+      (inputHeight + 2 * padH - (dilationH * (kH - 1) + 1)) / dH + 1;
+  long outputWidth =
+      (inputWidth + 2 * padW - (dilationW * (kW - 1) + 1)) / dW + 1;
+
+  AT_CHECK(nInputPlane % deformable_group == 0,
+           "input channels must divide deformable group size");
+
+  AT_CHECK(outputWidth >= 1 && outputHeight >= 1,
+           "Given input size: (", nInputPlane, " x ", inputHeight, " x ",
+           inputWidth, "). Calculated output size: (", nOutputPlane, " x ",
+           outputHeight, " x ", outputWidth, "). Output size is too small");
+
+  AT_CHECK(input.size(1) == nInputPlane,
+           "invalid number of input planes, expected: ", nInputPlane,
+           ", but got: ", input.size(1));
+
+  AT_CHECK((inputHeight >= kH && inputWidth >= kW),
+           "input image is smaller than kernel");
+
+  AT_CHECK((offset.size(2) == outputHeight && offset.size(3) == outputWidth),
+           "invalid spatial size of offset, expected height: ", outputHeight,
+           " width: ", outputWidth, ", but got height: ", offset.size(2),
+           " width: ", offset.size(3));
+
+  AT_CHECK((offset.size(1) == deformable_group * 2 * kH * kW),
+           "invalid number of channels of offset");
+
+  if (gradOutput != NULL) {
+    AT_CHECK(gradOutput->size(dimf) == nOutputPlane,
+             "invalid number of gradOutput planes, expected: ", nOutputPlane,
+             ", but got: ", gradOutput->size(dimf));
+
+    AT_CHECK((gradOutput->size(dimh) == outputHeight &&
+              gradOutput->size(dimw) == outputWidth),
+             "invalid size of gradOutput, expected height: ", outputHeight,
+             " width: ", outputWidth, ", but got height: ",
+             gradOutput->size(dimh), " width: ", gradOutput->size(dimw));
+  }
+}
+
+int deform_conv_forward_cpu(at::Tensor input, at::Tensor weight,
+                            at::Tensor offset, at::Tensor output,
+                            at::Tensor columns, at::Tensor ones, int kW,
+                            int kH, int dW, int dH, int padW, int padH,
+                            int dilationW, int dilationH, int group,
+                            int deformable_group, int im2col_step) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+
+  deform_conv_shape_check_cpu(input, offset, NULL, weight, kH, kW, dH, dW,
+                              padH, padW, dilationH, dilationW, group,
+                              deformable_group);
+
+  input = input.contiguous();
+  offset = offset.contiguous();
+  weight = weight.contiguous();
+
+  int batch = 1;
+  if (input.ndimension() == 3) {
+    // Force batch
+    batch = 0;
+    input = input.unsqueeze(0);
+    offset = offset.unsqueeze(0);
+  }
+
+  long batchSize = input.size(0);
+  long nInputPlane = input.size(1);
+  long inputHeight = input.size(2);
+  long inputWidth = input.size(3);
+
+  long nOutputPlane = weight.size(0);
+
+  long outputWidth =
+      (inputWidth + 2 * padW - (dilationW * (kW - 1) + 1)) / dW + 1;
+  long outputHeight =
+      (inputHeight + 2 * padH - (dilationH * (kH - 1) + 1)) / dH + 1;
+
+  AT_CHECK((offset.size(0) == batchSize), "invalid batch size of offset");
+
+  output = output.view({batchSize / im2col_step, im2col_step, nOutputPlane,
+                        outputHeight, outputWidth});
+  columns = at::zeros(
+      {nInputPlane * kW * kH, im2col_step * outputHeight * outputWidth},
+      input.options());
+
+  input = input.view({batchSize / im2col_step, im2col_step, nInputPlane,
+                      inputHeight, inputWidth});
+  offset =
+      offset.view({batchSize / im2col_step, im2col_step,
+                   deformable_group * 2 * kH * kW, outputHeight, outputWidth});
+
+  at::Tensor output_buffer =
+      at::zeros({batchSize / im2col_step, nOutputPlane,
+                 im2col_step * outputHeight, outputWidth},
+                output.options());
+
+  output_buffer = output_buffer.view(
+      {output_buffer.size(0), group, output_buffer.size(1) / group,
+       output_buffer.size(2), output_buffer.size(3)});
+
+  weight = weight.view({group, weight.size(0) / group, weight.size(1),
+                        weight.size(2), weight.size(3)});
+
+  for (int elt = 0; elt < batchSize / im2col_step; elt++) {
+    deformable_im2col_cpu(input[elt], offset[elt], nullptr, im2col_step,
+                          nInputPlane, inputHeight, inputWidth, outputHeight,
+                          outputWidth, kH, kW, padH, padW, dH, dW, dilationH,
+                          dilationW, deformable_group, columns);
+
+    auto columns_g = columns.view({group, columns.size(0) / group, columns.size(1)});
+    for (int g = 0; g < group; g++) {
+      output_buffer[elt][g].flatten(1).addmm_(weight[g].flatten(1), columns_g[g]);
+    }
+  }
+
+  output_buffer = output_buffer.view({batchSize / im2col_step, nOutputPlane,
+                                      im2col_step, outputHeight, outputWidth});
+  output.copy_(output_buffer.transpose(1, 2));
+
+  return 1;
+}
+
+int deform_conv_backward_input_cpu(at::Tensor input, at::Tensor offset,
+                                   at::Tensor gradOutput, at::Tensor gradInput,
+                                   at::Tensor gradOffset, at::Tensor weight,
+                                   at::Tensor columns, int kW, int kH, int dW,
+                                   int dH, int padW, int padH, int dilationW,
+                                   int dilationH, int group,
+                                   int deformable_group, int im2col_step) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+
+  deform_conv_shape_check_cpu(input, offset, &gradOutput, weight, kH, kW, dH,
+                              dW, padH, padW, dilationH, dilationW, group,
+                              deformable_group);
+  AT_ASSERTM(gradInput.is_contiguous(), "gradInput tensor has to be contiguous");
+  AT_ASSERTM(gradOffset.is_contiguous(), "gradOffset tensor has to be contiguous");
+
+  input = input.contiguous();
+  offset = offset.contiguous();
+  gradOutput = gradOutput.contiguous();
+  weight = weight.contiguous();
+
+  if (input.ndimension() == 3) {
+    // Force batch
+    input = input.unsqueeze(0);
+    offset = offset.unsqueeze(0);
+    gradOutput = gradOutput.unsqueeze(0);
+  }
+
+  long batchSize = input.size(0);
+  long nInputPlane = input.size(1);
+  long inputHeight = input.size(2);
+  long inputWidth = input.size(3);
+
+  long nOutputPlane = weight.size(0);
+
+  long outputWidth =
+      (inputWidth + 2 * padW - (dilationW * (kW - 1) + 1)) / dW + 1;
+  long outputHeight =
+      (inputHeight + 2 * padH - (dilationH * (kH - 1) + 1)) / dH + 1;
+
+  AT_CHECK((offset.size(0) == batchSize), "invalid batch size of offset");
+  columns = at::zeros(
+      {nInputPlane * kW * kH, im2col_step * outputHeight * outputWidth},
+      input.options());
+
+  // change order of grad output, so that the images of each step are
+  // contiguous along the columns
+  gradOutput = gradOutput.view({batchSize / im2col_step, im2col_step,
+                                nOutputPlane, outputHeight, outputWidth})
+                   .transpose(1, 2)
+                   .contiguous()
+                   .view({batchSize / im2col_step, group, nOutputPlane / group,
+                          im2col_step * outputHeight * outputWidth});
+
+  gradInput = gradInput.view({batchSize / im2col_step, im2col_step, nInputPlane,
+                              inputHeight, inputWidth});
+  input = input.view({batchSize / im2col_step, im2col_step, nInputPlane,
+                      inputHeight, inputWidth});
+  gradOffset = gradOffset.view({batchSize / im2col_step, im2col_step,
+                                deformable_group * 2 * kH * kW, outputHeight,
+                                outputWidth});
+  offset =
+      offset.view({batchSize / im2col_step, im2col_step,
+                   deformable_group * 2 * kH * kW, outputHeight, outputWidth});
+
+  weight = weight.view({group, weight.size(0) / group, weight.size(1),
+                        weight.size(2), weight.size(3)});
+  auto columns_g = columns.view({group, columns.size(0) / group, columns.size(1)});
+
+  for (int elt = 0; elt < batchSize / im2col_step; elt++) {
+    for (int g = 0; g < group; g++) {
+      columns_g[g].addmm_(weight[g].flatten(1).transpose(0, 1),
+                          gradOutput[elt][g], 0.0f, 1.0f);
+    }
+
+    deformable_col2im_coord_cpu(columns, input[elt], offset[elt], nullptr,
+                                im2col_step, nInputPlane, inputHeight,
+                                inputWidth, outputHeight, outputWidth, kH, kW,
+                                padH, padW, dH, dW, dilationH, dilationW,
+                                deformable_group, gradOffset[elt], nullptr);
+
+    deformable_col2im_cpu(columns, offset[elt], nullptr, im2col_step,
+                          nInputPlane, inputHeight, inputWidth, outputHeight,
+                          outputWidth, kH, kW, padH, padW, dH, dW, dilationH,
+                          dilationW, deformable_group, gradInput[elt]);
+  }
+
+  return 1;
+}
+
+int deform_conv_backward_parameters_cpu(
+    at::Tensor input, at::Tensor offset, at::Tensor gradOutput,
+    at::Tensor gradWeight,  // at::Tensor gradBias,
+    at::Tensor columns, at::Tensor ones, int kW, int kH, int dW, int dH,
+    int padW, int padH, int dilationW, int dilationH, int group,
+    int deformable_group, float scale, int im2col_step) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+
+  deform_conv_shape_check_cpu(input, offset, &gradOutput, gradWeight, kH, kW,
+                              dH, dW, padH, padW, dilationH, dilationW, group,
+                              deformable_group);
+
+  input = input.contiguous();
+  offset = offset.contiguous();
+  gradOutput = gradOutput.contiguous();
+
+  if (input.ndimension() == 3) {
+    // Force batch
+    input = input.unsqueeze(0);
+    offset = offset.unsqueeze(0);
+    gradOutput = gradOutput.unsqueeze(0);
+  }
+
+  long batchSize = input.size(0);
+  long nInputPlane = input.size(1);
+  long inputHeight = input.size(2);
+  long inputWidth = input.size(3);
+
+  long nOutputPlane = gradWeight.size(0);
+
+  long outputWidth =
+      (inputWidth + 2 * padW - (dilationW * (kW - 1) + 1)) / dW + 1;
+  long outputHeight =
+      (inputHeight + 2 * padH - (dilationH * (kH - 1) + 1)) / dH + 1;
+
+  AT_CHECK((offset.size(0) == batchSize), "invalid batch size of offset");
+
+  columns = at::zeros(
+      {nInputPlane * kW * kH, im2col_step * outputHeight * outputWidth},
+      input.options());
+
+  at::Tensor gradOutputBuffer =
+      gradOutput.view({batchSize / im2col_step, im2col_step, nOutputPlane,
+                       outputHeight, outputWidth})
+          .transpose(1, 2)
+          .contiguous()
+          .view({batchSize / im2col_step, group, nOutputPlane / group,
+                 im2col_step * outputHeight * outputWidth});
+
+  input = input.view({batchSize / im2col_step, im2col_step, nInputPlane,
+                      inputHeight, inputWidth});
+  offset =
+      offset.view({batchSize / im2col_step, im2col_step,
+                   deformable_group * 2 * kH * kW, outputHeight, outputWidth});
+
+  auto gradWeight_g = gradWeight.view({group, gradWeight.size(0) / group, -1});
+  auto columns_g = columns.view({group, columns.size(0) / group, columns.size(1)});
+
+  for (int elt = 0; elt < batchSize / im2col_step; elt++) {
+    deformable_im2col_cpu(input[elt], offset[elt], nullptr, im2col_step,
+                          nInputPlane, inputHeight, inputWidth, outputHeight,
+                          outputWidth, kH, kW, padH, padW, dH, dW, dilationH,
+                          dilationW, deformable_group, columns);
+
+    for (int g = 0; g < group; g++) {
+      gradWeight_g[g].addmm_(gradOutputBuffer[elt][g],
+                             columns_g[g].transpose(1, 0), 1.0, scale);
+    }
+  }
+
+  return 1;
+}
+
+void modulated_deform_conv_cpu_forward(
+    at::Tensor input, at::Tensor weight, at::Tensor bias, at::Tensor ones,
+    at::Tensor offset, at::Tensor mask, at::Tensor output, at::Tensor columns,
+    int kernel_h, int kernel_w, const int stride_h, const int stride_w,
+    const int pad_h, const int pad_w, const int dilation_h,
+    const int dilation_w, const int group, const int deformable_group,
+    const bool with_bias) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_CHECK(input.is_contiguous(), "input tensor has to be contiguous");
+  AT_CHECK(weight.is_contiguous(), "weight tensor has to be contiguous");
+
+  const int batch = input.size(0);
+  const int channels = input.size(1);
+  const int height = input.size(2);
+  const int width = input.size(3);
+
+  const int channels_out = weight.size(0);
+  const int channels_kernel = weight.size(1);
+  const int kernel_h_ = weight.size(2);
+  const int kernel_w_ = weight.size(3);
+
+  AT_CHECK(kernel_h_ == kernel_h && kernel_w_ == kernel_w,
+           "Input shape and kernel shape wont match: (", kernel_h, " x ",
+           kernel_w, " vs ", kernel_h_, " x ", kernel_w_, ").");
+  AT_CHECK(channels == channels_kernel * group,
+           "Input shape and kernel channels wont match: (", channels, " vs ",
+           channels_kernel * group, ").");
+
+  const int height_out =
+      (height + 2 * pad_h - (dilation_h * (kernel_h - 1) + 1)) / stride_h + 1;
+  const int width_out =
+      (width + 2 * pad_w - (dilation_w * (kernel_w - 1) + 1)) / stride_w + 1;
+
+  auto offset_ = offset.contiguous();
+  auto mask_ = mask.contiguous();
+
+  // resize output
+  output = output.view({batch, channels_out, height_out, width_out}).zero_();
+  // resize temporary columns
+  columns =
+      at::zeros({channels * kernel_h * kernel_w, 1 * height_out * width_out},
+                input.options());
+
+  auto output_g = output.view({batch, group, channels_out / group,
+                               height_out * width_out});
+  auto weight_g = weight.view({group, channels_out / group, -1});
+  auto columns_g = columns.view({group, columns.size(0) / group, columns.size(1)});
+
+  for (int b = 0; b < batch; b++) {
+    at::Tensor mask_b = mask_[b];
+    deformable_im2col_cpu(
+        input[b], offset_[b], &mask_b, 1, channels, height, width, height_out,
+        width_out, kernel_h, kernel_w, pad_h, pad_w, stride_h, stride_w,
+        dilation_h, dilation_w, deformable_group, columns);
+
+    for (int g = 0; g < group; g++) {
+      output_g[b][g].addmm_(weight_g[g], columns_g[g]);
+    }
+  }
+
+  if (with_bias) {
+    output += bias.view({1, bias.size(0), 1, 1});
+  }
+}
+
+void modulated_deform_conv_cpu_backward(
+    at::Tensor input, at::Tensor weight, at::Tensor bias, at::Tensor ones,
+    at::Tensor offset, at::Tensor mask, at::Tensor columns,
+    at::Tensor grad_input, at::Tensor grad_weight, at::Tensor grad_bias,
+    at::Tensor grad_offset, at::Tensor grad_mask, at::Tensor grad_output,
+    int kernel_h, int kernel_w, int stride_h, int stride_w, int pad_h,
+    int pad_w, int dilation_h, int dilation_w, int group, int deformable_group,
+    const bool with_bias) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_CHECK(input.is_contiguous(), "input tensor has to be contiguous");
+  AT_CHECK(weight.is_contiguous(), "weight tensor has to be contiguous");
+  AT_CHECK(grad_input.is_contiguous() && grad_offset.is_contiguous() &&
+               grad_mask.is_contiguous() && grad_weight.is_contiguous(),
+           "gradient tensors have to be contiguous");
+
+  const int batch = input.size(0);
+  const int channels = input.size(1);
+  const int height = input.size(2);
+  const int width = input.size(3);
+
+  const int channels_out = weight.size(0);
+  const int channels_kernel = weight.size(1);
+  const int kernel_h_ = weight.size(2);
+  const int kernel_w_ = weight.size(3);
+  AT_CHECK(kernel_h_ == kernel_h && kernel_w_ == kernel_w,
+           "Input shape and kernel shape wont match: (", kernel_h, " x ",
+           kernel_w, " vs ", kernel_h_, " x ", kernel_w_, ").");
+  AT_CHECK(channels == channels_kernel * group,
+           "Input shape and kernel channels wont match: (", channels, " vs ",
+           channels_kernel * group, ").");
+
+  const int height_out =
+      (height + 2 * pad_h - (dilation_h * (kernel_h - 1) + 1)) / stride_h + 1;
+  const int width_out =
+      (width + 2 * pad_w - (dilation_w * (kernel_w - 1) + 1)) / stride_w + 1;
+
+  auto offset_ = offset.contiguous();
+  auto mask_ = mask.contiguous();
+
+  columns = at::zeros({channels * kernel_h * kernel_w, height_out * width_out},
+                      input.options());
+
+  auto grad_output_g = grad_output.contiguous().view(
+      {batch, group, channels_out / group, height_out * width_out});
+  auto weight_g = weight.view({group, channels_out / group, -1});
+  auto grad_weight_g = grad_weight.view({group, channels_out / group, -1});
+  auto columns_g = columns.view({group, columns.size(0) / group, columns.size(1)});
+
+  for (int b = 0; b < batch; b++) {
+    at::Tensor mask_b = mask_[b];
+    at::Tensor grad_mask_b = grad_mask[b];
+
+    for (int g = 0; g < group; g++) {
+      columns_g[g].addmm_(weight_g[g].transpose(0, 1), grad_output_g[b][g],
+                          0.0f, 1.0f);
+    }
+
+    // gradient w.r.t. input coordinate data
+    deformable_col2im_coord_cpu(
+        columns, input[b], offset_[b], &mask_b, 1, channels, height, width,
+        height_out, width_out, kernel_h, kernel_w, pad_h, pad_w, stride_h,
+        stride_w, dilation_h, dilation_w, deformable_group, grad_offset[b],
+        &grad_mask_b);
+    // gradient w.r.t. input data
+    deformable_col2im_cpu(
+        columns, offset_[b], &mask_b, 1, channels, height, width, height_out,
+        width_out, kernel_h, kernel_w, pad_h, pad_w, stride_h, stride_w,
+        dilation_h, dilation_w, deformable_group, grad_input[b]);
+
+    // gradient w.r.t. weight, dWeight should accumulate across the batch and
+    // group
+    deformable_im2col_cpu(
+        input[b], offset_[b], &mask_b, 1, channels, height, width, height_out,
+        width_out, kernel_h, kernel_w, pad_h, pad_w, stride_h, stride_w,
+        dilation_h, dilation_w, deformable_group, columns);
+
+    for (int g = 0; g < group; g++) {
+      grad_weight_g[g].addmm_(grad_output_g[b][g], columns_g[g].transpose(0, 1));
+    }
+  }
+
+  if (with_bias) {
+    grad_bias.add_(grad_output_g.sum({0, 3}).view({-1}));
+  }
+}
@@ -0,0 +1,302 @@
+// Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+// CPU version of cuda/deform_pool_cuda.cu and cuda/deform_pool_kernel_cuda.cu
+#include "cpu/vision.h"
+
+#include <ATen/Parallel.h>
+
+#include <algorithm>
+#include <cmath>
+
+
+template <typename T>
+T deform_psroi_bilinear_cpu(const T* data, const T x, const T y,
+                            const int width, const int height) {
+  int x1 = std::floor(x);
+  int x2 = std::ceil(x);
+  int y1 = std::floor(y);
+  int y2 = std::ceil(y);
+  T dist_x = static_cast<T>(x - x1);
+  T dist_y = static_cast<T>(y - y1);
+  T value11 = data[y1 * width + x1];
+  T value12 = data[y2 * width + x1];
+  T value21 = data[y1 * width + x2];
+  T value22 = data[y2 * width + x2];
+  return (1 - dist_x) * (1 - dist_y) * value11 + (1 - dist_x) * dist_y * value12 +
+      dist_x * (1 - dist_y) * value21 + dist_x * dist_y * value22;
+}
+
+// sampling area of the bin (ph, pw) of a roi, shared by the forward and the
+// backward
+template <typename T>
+struct DeformPSROIBin {
+  int roi_batch_ind;
+  T roi_width;
+  T roi_height;
+  T sub_bin_size_h;
+  T sub_bin_size_w;
+  T hstart;
+  T wstart;
+  int trans_index_x;
+  int trans_index_y;
+  int c;
+};
+
+template <typename T>
+DeformPSROIBin<T> deform_psroi_bin(
+    const int n, const int ctop, const int ph, const int pw,
+    const T* bottom_rois, const T* bottom_trans, const int no_trans,
+    const T spatial_scale, const T trans_std, const int pooled_height,
+    const int pooled_width, const int sample_per_part, const int group_size,
+    const int part_size, const int num_classes, const int channels_each_class) {
+  DeformPSROIBin<T> bin;
+  const T* offset_bottom_rois = bottom_rois + n * 5;
+  bin.roi_batch_ind = offset_bottom_rois[0];
+  T roi_start_w = static_cast<T>(std::round(offset_bottom_rois[1])) * spatial_scale - 0.5;
+  T roi_start_h = static_cast<T>(std::round(offset_bottom_rois[2])) * spatial_scale - 0.5;
+  T roi_end_w = static_cast<T>(std::round(offset_bottom_rois[3]) + 1.) * spatial_scale - 0.5;
+  T roi_end_h = static_cast<T>(std::round(offset_bottom_rois[4]) + 1.) * spatial_scale - 0.5;
+
+  // Force too small ROIs to be 1x1
+  bin.roi_width = std::max(roi_end_w - roi_start_w, static_cast<T>(0.1)); //avoid 0
+  bin.roi_height = std::max(roi_end_h - roi_start_h, static_cast<T>(0.1));
+
+  // Compute w and h at bottom
+  T bin_size_h = bin.roi_height / static_cast<T>(pooled_height);
+  T bin_size_w = bin.roi_width / static_cast<T>(pooled_width);
+
+  bin.sub_bin_size_h = bin_size_h / static_cast<T>(sample_per_part);
+  bin.sub_bin_size_w = bin_size_w / static_cast<T>(sample_per_part);
+
+  int part_h = std::floor(static_cast<T>(ph) / pooled_height * part_size);
+  int part_w = std::floor(static_cast<T>(pw) / pooled_width * part_size);
+  int class_id = ctop / channels_each_class;
+  bin.trans_index_x = (((n * num_classes + class_id) * 2) * part_size + part_h) * part_size + part_w;
+  bin.trans_index_y = (((n * num_classes + class_id) * 2 + 1) * part_size + part_h) * part_size + part_w;
+  T trans_x = no_trans ? static_cast<T>(0) : bottom_trans[bin.trans_index_x] * trans_std;
+  T trans_y = no_trans ? static_cast<T>(0) : bottom_trans[bin.trans_index_y] * trans_std;
+
+  bin.wstart = static_cast<T>(pw) * bin_size_w + roi_start_w + trans_x * bin.roi_width;
+  bin.hstart = static_cast<T>(ph) * bin_size_h + roi_start_h + trans_y * bin.roi_height;
+
+  int gw = std::floor(static_cast<T>(pw) * group_size / pooled_width);
+  int gh = std::floor(static_cast<T>(ph) * group_size / pooled_height);
+  gw = std::min(std::max(gw, 0), group_size - 1);
+  gh = std::min(std::max(gh, 0), group_size - 1);
+  bin.c = (ctop * group_size + gh) * group_size + gw;
+  return bin;
+}
+
+template <typename T>
+void DeformablePSROIPoolForward_cpu_kernel(
+    const int num_rois, const T* bottom_data, const T spatial_scale,
+    const int channels, const int height, const int width,
+    const int pooled_height, const int pooled_width, const T* bottom_rois,
+    const T* bottom_trans, const int no_trans, const T trans_std,
+    const int sample_per_part, const int output_dim, const int group_size,
+    const int part_size, const int num_classes, const int channels_each_class,
+    T* top_data, T* top_count) {
+  // the (roi, output channel) pairs are split among the threads
+  at::parallel_for(0, num_rois * output_dim, 1, [&](int64_t begin, int64_t end) {
+    for (int64_t index_n_c = begin; index_n_c < end; index_n_c++) {
+      int n = index_n_c / output_dim;
+      int ctop = index_n_c % output_dim;
+      for (int ph = 0; ph < pooled_height; ph++) {
+        for (int pw = 0; pw < pooled_width; pw++) {
+          DeformPSROIBin<T> bin = deform_psroi_bin(
+              n, ctop, ph, pw, bottom_rois, bottom_trans, no_trans,
+              spatial_scale, trans_std, pooled_height, pooled_width,
+              sample_per_part, group_size, part_size, num_classes,
+              channels_each_class);
+          const T* offset_bottom_data =
+              bottom_data + (bin.roi_batch_ind * channels + bin.c) * height * width;
+
+          T sum = 0;
+          int count = 0;
+          for (int ih = 0; ih < sample_per_part; ih++) {
+            for (int iw = 0; iw < sample_per_part; iw++) {
+              T w = bin.wstart + iw * bin.sub_bin_size_w;
+              T h = bin.hstart + ih * bin.sub_bin_size_h;
+              // bilinear interpolation
+              if (w < -0.5 || w > width - 0.5 || h < -0.5 || h > height - 0.5) {
+                continue;
+              }
+              w = std::min(std::max(w, static_cast<T>(0.)), static_cast<T>(width - 1.));
+              h = std::min(std::max(h, static_cast<T>(0.)), static_cast<T>(height - 1.));
+              sum += deform_psroi_bilinear_cpu(offset_bottom_data, w, h, width, height);
+              count++;
+            }
+          }
+          const int index = (index_n_c * pooled_height + ph) * pooled_width + pw;
+          top_data[index] = count == 0 ? static_cast<T>(0) : sum / count;
+          top_count[index] = count;
+        } // for pw
+      } // for ph
+    } // for index_n_c
+  });
+}
+
+template <typename T>
+void DeformablePSROIPoolBackwardAcc_cpu_kernel(
+    const int num_rois, const T* top_diff, const T* top_count,
+    const T spatial_scale, const int channels, const int height,
+    const int width, const int pooled_height, const int pooled_width,
+    const int output_dim, T* bottom_data_diff, T* bottom_trans_diff,
+    const T* bottom_data, const T* bottom_rois, const T* bottom_trans,
+    const int no_trans, const T trans_std, const int sample_per_part,
+    const int group_size, const int part_size, const int num_classes,
+    const int channels_each_class) {
+  // each output channel accumulates the gradients of its own input channels,
+  // and the output channels of a class share the gradients of its offsets,
+  // so the output channels are split among the threads by whole classes
+  const int channels_per_task = no_trans ? 1 : channels_each_class;
+  at::parallel_for(0, output_dim / channels_per_task, 1, [&](int64_t begin, int64_t end) {
+    for (int ctop = begin * channels_per_task; ctop < end * channels_per_task; ctop++) {
+      for (int n = 0; n < num_rois; n++) {
+        for (int ph = 0; ph < pooled_height; ph++) {
+          for (int pw = 0; pw < pooled_width; pw++) {
+            const int index = ((n * output_dim + ctop) * pooled_height + ph) * pooled_width + pw;
+            if (top_count[index] <= 0) {
+              continue;
+            }
+            DeformPSROIBin<T> bin = deform_psroi_bin(
+                n, ctop, ph, pw, bottom_rois, bottom_trans, no_trans,
+                spatial_scale, trans_std, pooled_height, pooled_width,
+                sample_per_part, group_size, part_size, num_classes,
+                channels_each_class);
+            T diff_val = top_diff[index] / top_count[index];
+            const int bottom_index_base = (bin.roi_batch_ind * channels + bin.c) * height * width;
+            const T* offset_bottom_data = bottom_data + bottom_index_base;
+            T* offset_bottom_data_diff = bottom_data_diff + bottom_index_base;
+
+            for (int ih = 0; ih < sample_per_part; ih++) {
+              for (int iw = 0; iw < sample_per_part; iw++) {
+                T w = bin.wstart + iw * bin.sub_bin_size_w;
+                T h = bin.hstart + ih * bin.sub_bin_size_h;
+                // bilinear interpolation
+                if (w < -0.5 || w > width - 0.5 || h < -0.5 || h > height - 0.5) {
+                  continue;
+                }
+                w = std::min(std::max(w, static_cast<T>(0.)), static_cast<T>(width - 1.));
+                h = std::min(std::max(h, static_cast<T>(0.)), static_cast<T>(height - 1.));
+                // backward on feature
+                int x0 = std::floor(w);
+                int x1 = std::ceil(w);
+                int y0 = std::floor(h);
+                int y1 = std::ceil(h);
+                T dist_x = w - x0, dist_y = h - y0;
+                T q00 = (1 - dist_x) * (1 - dist_y);
+                T q01 = (1 - dist_x) * dist_y;
+                T q10 = dist_x * (1 - dist_y);
+                T q11 = dist_x * dist_y;
+                offset_bottom_data_diff[y0 * width + x0] += q00 * diff_val;
+                offset_bottom_data_diff[y1 * width + x0] += q01 * diff_val;
+                offset_bottom_data_diff[y0 * width + x1] += q10 * diff_val;
+                offset_bottom_data_diff[y1 * width + x1] += q11 * diff_val;
+
+                if (no_trans) {
+                  continue;
+                }
+                T U00 = offset_bottom_data[y0 * width + x0];
+                T U01 = offset_bottom_data[y1 * width + x0];
+                T U10 = offset_bottom_data[y0 * width + x1];
+                T U11 = offset_bottom_data[y1 * width + x1];
+                T diff_x = (U11 * dist_y + U10 * (1 - dist_y) - U01 * dist_y - U00 * (1 - dist_y)) * trans_std * diff_val;
+                diff_x *= bin.roi_width;
+                T diff_y = (U11 * dist_x + U01 * (1 - dist_x) - U10 * dist_x - U00 * (1 - dist_x)) * trans_std * diff_val;
+                diff_y *= bin.roi_height;
+
+                bottom_trans_diff[bin.trans_index_x] += diff_x;
+                bottom_trans_diff[bin.trans_index_y] += diff_y;
+              }
+            }
+          } // for pw
+        } // for ph
+      } // for n
+    } // for ctop
+  });
+}
+
+void deform_psroi_pooling_cpu_forward(
+    at::Tensor input, at::Tensor bbox, at::Tensor trans, at::Tensor out,
+    at::Tensor top_count, const int no_trans, const float spatial_scale,
+    const int output_dim, const int group_size, const int pooled_size,
+    const int part_size, const int sample_per_part, const float trans_std) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_CHECK(input.is_contiguous(), "input tensor has to be contiguous");
+  AT_CHECK(out.is_contiguous() && top_count.is_contiguous(),
+           "output tensors have to be contiguous");
+
+  const int channels = input.size(1);
+  const int height = input.size(2);
+  const int width = input.size(3);
+  const int channels_trans = no_trans ? 2 : trans.size(1);
+
+  const int num_bbox = bbox.size(0);
+  AT_CHECK(num_bbox == out.size(0),
+           "Output shape and bbox number wont match: (", out.size(0), " vs ",
+           num_bbox, ").");
+
+  const int num_classes = no_trans ? 1 : channels_trans / 2;
+  const int channels_each_class = no_trans ? output_dim : output_dim / num_classes;
+
+  if (out.numel() == 0) {
+    return;
+  }
+
+  auto bbox_ = bbox.contiguous();
+  auto trans_ = no_trans ? trans : trans.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(input.type(), "deformable_psroi_pool_forward", [&] {
+    DeformablePSROIPoolForward_cpu_kernel<scalar_t>(
+        num_bbox, input.data<scalar_t>(), static_cast<scalar_t>(spatial_scale),
+        channels, height, width, pooled_size, pooled_size,
+        bbox_.data<scalar_t>(), no_trans ? nullptr : trans_.data<scalar_t>(),
+        no_trans, static_cast<scalar_t>(trans_std), sample_per_part,
+        output_dim, group_size, part_size, num_classes, channels_each_class,
+        out.data<scalar_t>(), top_count.data<scalar_t>());
+  });
+}
+
+void deform_psroi_pooling_cpu_backward(
+    at::Tensor out_grad, at::Tensor input, at::Tensor bbox, at::Tensor trans,
+    at::Tensor top_count, at::Tensor input_grad, at::Tensor trans_grad,
+    const int no_trans, const float spatial_scale, const int output_dim,
+    const int group_size, const int pooled_size, const int part_size,
+    const int sample_per_part, const float trans_std) {
+  AT_ASSERTM(!input.type().is_cuda(), "input must be a CPU tensor");
+  AT_CHECK(out_grad.is_contiguous(), "out_grad tensor has to be contiguous");
+  AT_CHECK(input.is_contiguous(), "input tensor has to be contiguous");
+  AT_CHECK(input_grad.is_contiguous() && (no_trans || trans_grad.is_contiguous()),
+           "gradient tensors have to be contiguous");
+
+  const int channels = input.size(1);
+  const int height = input.size(2);
+  const int width = input.size(3);
+  const int channels_trans = no_trans ? 2 : trans.size(1);
+
+  const int num_bbox = bbox.size(0);
+  AT_CHECK(num_bbox == out_grad.size(0),
+           "Output shape and bbox number wont match: (", out_grad.size(0),
+           " vs ", num_bbox, ").");
+
+  const int num_classes = no_trans ? 1 : channels_trans / 2;
+  const int channels_each_class = no_trans ? output_dim : output_dim / num_classes;
+
+  if (out_grad.numel() == 0) {
+    return;
+  }
+
+  auto bbox_ = bbox.contiguous();
+  auto trans_ = no_trans ? trans : trans.contiguous();
+  auto top_count_ = top_count.contiguous();
+  AT_DISPATCH_FLOATING_TYPES(out_grad.type(), "deformable_psroi_pool_backward_acc", [&] {
+    DeformablePSROIPoolBackwardAcc_cpu_kernel<scalar_t>(
+        num_bbox, out_grad.data<scalar_t>(), top_count_.data<scalar_t>(),
+        static_cast<scalar_t>(spatial_scale), channels, height, width,
+        pooled_size, pooled_size, output_dim, input_grad.data<scalar_t>(),
+        no_trans ? nullptr : trans_grad.data<scalar_t>(),
+        input.data<scalar_t>(), bbox_.data<scalar_t>(),
+        no_trans ? nullptr : trans_.data<scalar_t>(), no_trans,
+        static_cast<scalar_t>(trans_std), sample_per_part, group_size,
+        part_size, num_classes, channels_each_class);
+  });
+}
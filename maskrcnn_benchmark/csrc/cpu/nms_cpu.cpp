@@ -1,6 +1,11 @@
 // Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 #include "cpu/vision.h"
 
+#include <ATen/Parallel.h>
+
+#include <algorithm>
+#include <numeric>
+
 
 template <typename scalar_t>
 at::Tensor nms_cpu_kernel(const at::Tensor& dets,
@@ -73,3 +78,186 @@ at::Tensor nms_cpu(const at::Tensor& dets,
   });
   return result;
 }
+
+
+// number of boxes whose suppression by a box is stored in a mask word
+static const int kNmsBlockSize = 64;
+
+// greedy NMS of boxes sorted in decreasing order of score, which stops once
+// max_keep boxes are kept (no limit if max_keep <= 0). The boxes are split
+// in blocks of kNmsBlockSize and mask[i * num_blocks + b] is the set of boxes
+// of block b suppressed by box i. The rows of the mask are computed by block
+// of rows, in parallel over the blocks of columns, and only for the rows of
+// the boxes that are not suppressed yet, so that the rows that are never
+// reached because of max_keep are never computed.
+template <typename scalar_t>
+void nms_sorted_cpu_kernel(const scalar_t* x1,
+                           const scalar_t* y1,
+                           const scalar_t* x2,
+                           const scalar_t* y2,
+                           const scalar_t* areas,
+                           const int64_t num_boxes,
+                           const float threshold,
+                           const int64_t max_keep,
+                           std::vector<int64_t>& keep) {
+  const int64_t num_blocks = (num_boxes + kNmsBlockSize - 1) / kNmsBlockSize;
+  std::vector<uint64_t> removed(num_blocks, 0);
+  std::vector<uint64_t> mask(kNmsBlockSize * num_blocks);
+
+  for (int64_t row_block = 0; row_block < num_blocks; row_block++) {
+    const int64_t row_start = row_block * kNmsBlockSize;
+    const int rows = std::min<int64_t>(kNmsBlockSize, num_boxes - row_start);
+    const uint64_t rows_mask = rows == kNmsBlockSize ? ~0ULL : (1ULL << rows) - 1;
+    const uint64_t alive = ~removed[row_block] & rows_mask;
+    if (alive == 0) {
+      continue;
+    }
+
+    at::parallel_for(row_block, num_blocks, 4, [&](int64_t begin, int64_t end) {
+      for (int64_t col_block = begin; col_block < end; col_block++) {
+        const int64_t col_start = col_block * kNmsBlockSize;
+        const int cols = std::min<int64_t>(kNmsBlockSize, num_boxes - col_start);
+        for (int r = 0; r < rows; r++) {
+          if (!(alive & (1ULL << r))) {
+            continue;
+          }
+          const int64_t i = row_start + r;
+          auto ix1 = x1[i];
+          auto iy1 = y1[i];
+          auto ix2 = x2[i];
+          auto iy2 = y2[i];
+          auto iarea = areas[i];
+          uint64_t bits = 0;
+          // a box only suppresses the boxes of lower scores
+          const int c_start = col_block == row_block ? r + 1 : 0;
+          for (int c = c_start; c < cols; c++) {
+            const int64_t j = col_start + c;
+            auto xx1 = std::max(ix1, x1[j]);
+            auto yy1 = std::max(iy1, y1[j]);
+            auto xx2 = std::min(ix2, x2[j]);
+            auto yy2 = std::min(iy2, y2[j]);
+
+            auto w = std::max(static_cast<scalar_t>(0), xx2 - xx1 + 1);
+            auto h = std::max(static_cast<scalar_t>(0), yy2 - yy1 + 1);
+            auto inter = w * h;
+            auto ovr = inter / (iarea + areas[j] - inter);
+            if (ovr >= threshold)
+              bits |= 1ULL << c;
+          }
+          mask[r * num_blocks + col_block] = bits;
+        }
+      }
+    });
+
+    for (int r = 0; r < rows; r++) {
+      if (removed[row_block] & (1ULL << r)) {
+        continue;
+      }
+      keep.push_back(row_start + r);
+      if (max_keep > 0 && static_cast<int64_t>(keep.size()) >= max_keep) {
+        return;
+      }
+      const uint64_t* mask_r = mask.data() + r * num_blocks;
+      for (int64_t col_block = row_block; col_block < num_blocks; col_block++) {
+        removed[col_block] |= mask_r[col_block];
+      }
+    }
+  }
+}
+
+template <typename scalar_t>
+at::Tensor batched_nms_cpu_kernel(const at::Tensor& dets,
+                                  const at::Tensor& scores,
+                                  const at::Tensor& groups,
+                                  const float threshold,
+                                  const int64_t max_keep) {
+  auto ndets = dets.size(0);
+  auto dets_ = dets.contiguous();
+  auto scores_ = scores.contiguous();
+  auto groups_ = groups.contiguous().to(at::kLong);
+  auto d = dets_.data<scalar_t>();
+  auto s = scores_.data<scalar_t>();
+  auto g = groups_.data<int64_t>();
+
+  // the boxes of a group are contiguous and sorted in decreasing order of
+  // score, ties being broken by index to be deterministic
+  std::vector<int64_t> order(ndets);
+  std::iota(order.begin(), order.end(), 0);
+  std::sort(order.begin(), order.end(), [&](int64_t a, int64_t b) {
+    if (g[a] != g[b])
+      return g[a] < g[b];
+    if (s[a] != s[b])
+      return s[a] > s[b];
+    return a < b;
+  });
+
+  std::vector<scalar_t> x1(ndets), y1(ndets), x2(ndets), y2(ndets), areas(ndets);
+  std::vector<int64_t> group_starts;
+  for (int64_t k = 0; k < ndets; k++) {
+    auto box = d + order[k] * 4;
+    x1[k] = box[0];
+    y1[k] = box[1];
+    x2[k] = box[2];
+    y2[k] = box[3];
+    areas[k] = (x2[k] - x1[k] + 1) * (y2[k] - y1[k] + 1);
+    if (k == 0 || g[order[k]] != g[order[k - 1]]) {
+      group_starts.push_back(k);
+    }
+  }
+  const int64_t num_groups = group_starts.size();
+  group_starts.push_back(ndets);
+
+  // the groups are independent, so they are processed in parallel, and the
+  // blocks of a group are only processed in parallel when the groups are not
+  std::vector<std::vector<int64_t>> keeps(num_groups);
+  at::parallel_for(0, num_groups, 1, [&](int64_t begin, int64_t end) {
+    for (int64_t k = begin; k < end; k++) {
+      const int64_t start = group_starts[k];
+      nms_sorted_cpu_kernel<scalar_t>(
+          x1.data() + start,
+          y1.data() + start,
+          x2.data() + start,
+          y2.data() + start,
+          areas.data() + start,
+          group_starts[k + 1] - start,
+          threshold,
+          max_keep,
+          keeps[k]);
+    }
+  });
+
+  int64_t num_keep = 0;
+  for (const auto& keep : keeps) {
+    num_keep += keep.size();
+  }
+  at::Tensor keep_t = at::empty({num_keep}, dets.options().dtype(at::kLong));
+  auto keep = keep_t.data<int64_t>();
+  for (int64_t k = 0; k < num_groups; k++) {
+    for (auto i : keeps[k]) {
+      *keep++ = order[group_starts[k] + i];
+    }
+  }
+  return keep_t;
+}
+
+at::Tensor batched_nms_cpu(const at::Tensor& dets,
+                           const at::Tensor& scores,
+                           const at::Tensor& groups,
+                           const float threshold,
+                           const int64_t max_keep) {
+  AT_ASSERTM(!dets.type().is_cuda(), "dets must be a CPU tensor");
+  AT_ASSERTM(!scores.type().is_cuda(), "scores must be a CPU tensor");
+  AT_ASSERTM(!groups.type().is_cuda(), "groups must be a CPU tensor");
+  AT_ASSERTM(dets.type() == scores.type(), "dets should have the same type as scores");
+  AT_ASSERTM(groups.numel() == dets.size(0), "there must be one group per box");
+
+  if (dets.numel() == 0) {
+    return at::empty({0}, dets.options().dtype(at::kLong).device(at::kCPU));
+  }
+
+  at::Tensor result;
+  AT_DISPATCH_FLOATING_TYPES(dets.type(), "batched_nms", [&] {
+    result = batched_nms_cpu_kernel<scalar_t>(dets, scores, groups, threshold, max_keep);
+  });
+  return result;
+}
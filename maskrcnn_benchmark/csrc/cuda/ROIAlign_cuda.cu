@@ -344,3 +344,289 @@ at::Tensor ROIAlign_backward_cuda(const at::Tensor& grad,
   THCudaCheck(cudaGetLastError());
   return grad_input;
 }
+
+
+// the feature maps of a pyramid are passed by value to the kernels, which
+// bounds the number of levels
+#define ROI_ALIGN_MAX_LEVELS 8
+
+template <typename T, typename D>
+struct FeatureLevels {
+  D* data[ROI_ALIGN_MAX_LEVELS];
+  int height[ROI_ALIGN_MAX_LEVELS];
+  int width[ROI_ALIGN_MAX_LEVELS];
+  T spatial_scale[ROI_ALIGN_MAX_LEVELS];
+};
+
+template <typename T>
+__global__ void RoIAlignMultiLevelForward(const int nthreads,
+    const FeatureLevels<T, const T> levels, const int64_t* roi_levels,
+    const int channels,
+    const int pooled_height, const int pooled_width,
+    const int sampling_ratio,
+    const T* bottom_rois, T* top_data) {
+  CUDA_1D_KERNEL_LOOP(index, nthreads) {
+    // (n, c, ph, pw) is an element in the pooled output
+    int pw = index % pooled_width;
+    int ph = (index / pooled_width) % pooled_height;
+    int c = (index / pooled_width / pooled_height) % channels;
+    int n = index / pooled_width / pooled_height / channels;
+
+    const int level = roi_levels[n];
+    const int height = levels.height[level];
+    const int width = levels.width[level];
+    const T spatial_scale = levels.spatial_scale[level];
+
+    const T* offset_bottom_rois = bottom_rois + n * 5;
+    int roi_batch_ind = offset_bottom_rois[0];
+
+    // Do not using rounding; this implementation detail is critical
+    T roi_start_w = offset_bottom_rois[1] * spatial_scale;
+    T roi_start_h = offset_bottom_rois[2] * spatial_scale;
+    T roi_end_w = offset_bottom_rois[3] * spatial_scale;
+    T roi_end_h = offset_bottom_rois[4] * spatial_scale;
+
+    // Force malformed ROIs to be 1x1
+    T roi_width = max(roi_end_w - roi_start_w, (T)1.);
+    T roi_height = max(roi_end_h - roi_start_h, (T)1.);
+    T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
+    T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
+
+    const T* offset_bottom_data = levels.data[level] + (roi_batch_ind * channels + c) * height * width;
+
+    // We use roi_bin_grid to sample the grid and mimic integral
+    int roi_bin_grid_h = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_height / pooled_height); // e.g., = 2
+    int roi_bin_grid_w = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
+
+    // We do average (integral) pooling inside a bin
+    const T count = roi_bin_grid_h * roi_bin_grid_w; // e.g. = 4
+
+    T output_val = 0.;
+    for (int iy = 0; iy < roi_bin_grid_h; iy ++) // e.g., iy = 0, 1
+    {
+      const T y = roi_start_h + ph * bin_size_h + static_cast<T>(iy + .5f) * bin_size_h / static_cast<T>(roi_bin_grid_h); // e.g., 0.5, 1.5
+      for (int ix = 0; ix < roi_bin_grid_w; ix ++)
+      {
+        const T x = roi_start_w + pw * bin_size_w + static_cast<T>(ix + .5f) * bin_size_w / static_cast<T>(roi_bin_grid_w);
+
+        T val = bilinear_interpolate(offset_bottom_data, height, width, y, x, index);
+        output_val += val;
+      }
+    }
+    output_val /= count;
+
+    top_data[index] = output_val;
+  }
+}
+
+template <typename T>
+__global__ void RoIAlignMultiLevelBackwardFeature(const int nthreads, const T* top_diff,
+    const FeatureLevels<T, T> levels, const int64_t* roi_levels,
+    const int channels,
+    const int pooled_height, const int pooled_width,
+    const int sampling_ratio,
+    const T* bottom_rois) {
+  CUDA_1D_KERNEL_LOOP(index, nthreads) {
+    // (n, c, ph, pw) is an element in the pooled output
+    int pw = index % pooled_width;
+    int ph = (index / pooled_width) % pooled_height;
+    int c = (index / pooled_width / pooled_height) % channels;
+    int n = index / pooled_width / pooled_height / channels;
+
+    const int level = roi_levels[n];
+    const int height = levels.height[level];
+    const int width = levels.width[level];
+    const T spatial_scale = levels.spatial_scale[level];
+
+    const T* offset_bottom_rois = bottom_rois + n * 5;
+    int roi_batch_ind = offset_bottom_rois[0];
+
+    // Do not using rounding; this implementation detail is critical
+    T roi_start_w = offset_bottom_rois[1] * spatial_scale;
+    T roi_start_h = offset_bottom_rois[2] * spatial_scale;
+    T roi_end_w = offset_bottom_rois[3] * spatial_scale;
+    T roi_end_h = offset_bottom_rois[4] * spatial_scale;
+
+    // Force malformed ROIs to be 1x1
+    T roi_width = max(roi_end_w - roi_start_w, (T)1.);
+    T roi_height = max(roi_end_h - roi_start_h, (T)1.);
+    T bin_size_h = static_cast<T>(roi_height) / static_cast<T>(pooled_height);
+    T bin_size_w = static_cast<T>(roi_width) / static_cast<T>(pooled_width);
+
+    T* offset_bottom_diff = levels.data[level] + (roi_batch_ind * channels + c) * height * width;
+
+    const T top_diff_this_bin = top_diff[index];
+
+    // We use roi_bin_grid to sample the grid and mimic integral
+    int roi_bin_grid_h = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_height / pooled_height); // e.g., = 2
+    int roi_bin_grid_w = (sampling_ratio > 0) ? sampling_ratio : ceil(roi_width / pooled_width);
+
+    // We do average (integral) pooling inside a bin
+    const T count = roi_bin_grid_h * roi_bin_grid_w; // e.g. = 4
+
+    for (int iy = 0; iy < roi_bin_grid_h; iy ++) // e.g., iy = 0, 1
+    {
+      const T y = roi_start_h + ph * bin_size_h + static_cast<T>(iy + .5f) * bin_size_h / static_cast<T>(roi_bin_grid_h); // e.g., 0.5, 1.5
+      for (int ix = 0; ix < roi_bin_grid_w; ix ++)
+      {
+        const T x = roi_start_w + pw * bin_size_w + static_cast<T>(ix + .5f) * bin_size_w / static_cast<T>(roi_bin_grid_w);
+
+        T w1, w2, w3, w4;
+        int x_low, x_high, y_low, y_high;
+
+        bilinear_interpolate_gradient(height, width, y, x,
+            w1, w2, w3, w4,
+            x_low, x_high, y_low, y_high,
+            index);
+
+        T g1 = top_diff_this_bin * w1 / count;
+        T g2 = top_diff_this_bin * w2 / count;
+        T g3 = top_diff_this_bin * w3 / count;
+        T g4 = top_diff_this_bin * w4 / count;
+
+        if (x_low >= 0 && x_high >= 0 && y_low >= 0 && y_high >= 0)
+        {
+          atomicAdd(offset_bottom_diff + y_low * width + x_low, static_cast<T>(g1));
+          atomicAdd(offset_bottom_diff + y_low * width + x_high, static_cast<T>(g2));
+          atomicAdd(offset_bottom_diff + y_high * width + x_low, static_cast<T>(g3));
+          atomicAdd(offset_bottom_diff + y_high * width + x_high, static_cast<T>(g4));
+        } // if
+      } // ix
+    } // iy
+  } // CUDA_1D_KERNEL_LOOP
+} // RoIAlignMultiLevelBackward
+
+
+static void check_roi_levels_cuda(const at::Tensor& levels, const int num_levels) {
+  if (levels.numel() == 0) {
+    return;
+  }
+  // the kernels index the per-level arrays with the levels without any check
+  AT_CHECK(levels.min().item<int64_t>() >= 0 &&
+               levels.max().item<int64_t>() < num_levels,
+           "the roi levels must be in [0, ", num_levels, ")");
+}
+
+at::Tensor MultiLevelROIAlign_forward_cuda(const std::vector<at::Tensor>& features,
+                                           const at::Tensor& rois,
+                                           const at::Tensor& levels,
+                                           const std::vector<double>& spatial_scales,
+                                           const int pooled_height,
+                                           const int pooled_width,
+                                           const int sampling_ratio) {
+  AT_ASSERTM(rois.type().is_cuda(), "rois must be a CUDA tensor");
+  AT_ASSERTM(levels.type().is_cuda(), "levels must be a CUDA tensor");
+  AT_ASSERTM(features.size() == spatial_scales.size(),
+             "there must be one spatial scale per feature map");
+  AT_ASSERTM(features.size() <= ROI_ALIGN_MAX_LEVELS, "too many feature maps");
+  AT_ASSERTM(levels.numel() == rois.size(0), "there must be one level per roi");
+
+  const int num_levels = features.size();
+  auto num_rois = rois.size(0);
+  auto channels = features[0].size(1);
+  std::vector<at::Tensor> features_;
+  for (const auto& feature : features) {
+    AT_ASSERTM(feature.type().is_cuda(), "features must be CUDA tensors");
+    AT_ASSERTM(feature.size(1) == channels,
+               "all the feature maps must have the same number of channels");
+    features_.push_back(feature.contiguous());
+  }
+
+  auto output = at::empty({num_rois, channels, pooled_height, pooled_width}, features[0].options());
+  auto output_size = num_rois * pooled_height * pooled_width * channels;
+  cudaStream_t stream = at::cuda::getCurrentCUDAStream();
+
+  dim3 grid(std::min(THCCeilDiv((long)output_size, 512L), 4096L));
+  dim3 block(512);
+
+  if (output.numel() == 0) {
+    THCudaCheck(cudaGetLastError());
+    return output;
+  }
+
+  auto levels_ = levels.contiguous().to(at::kLong);
+  check_roi_levels_cuda(levels_, num_levels);
+  AT_DISPATCH_FLOATING_TYPES(features[0].type(), "MultiLevelROIAlign_forward", [&] {
+    FeatureLevels<scalar_t, const scalar_t> feature_levels;
+    for (int l = 0; l < num_levels; l++) {
+      feature_levels.data[l] = features_[l].data<scalar_t>();
+      feature_levels.height[l] = features_[l].size(2);
+      feature_levels.width[l] = features_[l].size(3);
+      feature_levels.spatial_scale[l] = spatial_scales[l];
+    }
+    RoIAlignMultiLevelForward<scalar_t><<<grid, block, 0, stream>>>(
+         output_size,
+         feature_levels,
+         levels_.data<int64_t>(),
+         channels,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         rois.contiguous().data<scalar_t>(),
+         output.data<scalar_t>());
+  });
+  THCudaCheck(cudaGetLastError());
+  return output;
+}
+
+std::vector<at::Tensor> MultiLevelROIAlign_backward_cuda(const at::Tensor& grad,
+                                                         const at::Tensor& rois,
+                                                         const at::Tensor& levels,
+                                                         const std::vector<double>& spatial_scales,
+                                                         const int pooled_height,
+                                                         const int pooled_width,
+                                                         const int batch_size,
+                                                         const int channels,
+                                                         const std::vector<int64_t>& heights,
+                                                         const std::vector<int64_t>& widths,
+                                                         const int sampling_ratio) {
+  AT_ASSERTM(grad.type().is_cuda(), "grad must be a CUDA tensor");
+  AT_ASSERTM(rois.type().is_cuda(), "rois must be a CUDA tensor");
+  AT_ASSERTM(levels.type().is_cuda(), "levels must be a CUDA tensor");
+  AT_ASSERTM(heights.size() == spatial_scales.size() &&
+                 widths.size() == spatial_scales.size(),
+             "there must be one spatial scale per feature map");
+  AT_ASSERTM(spatial_scales.size() <= ROI_ALIGN_MAX_LEVELS, "too many feature maps");
+
+  const int num_levels = spatial_scales.size();
+  std::vector<at::Tensor> grad_inputs;
+  for (int l = 0; l < num_levels; l++) {
+    grad_inputs.push_back(
+        at::zeros({batch_size, channels, heights[l], widths[l]}, grad.options()));
+  }
+
+  cudaStream_t stream = at::cuda::getCurrentCUDAStream();
+
+  dim3 grid(std::min(THCCeilDiv((long)grad.numel(), 512L), 4096L));
+  dim3 block(512);
+
+  // handle possibly empty gradients
+  if (grad.numel() == 0) {
+    THCudaCheck(cudaGetLastError());
+    return grad_inputs;
+  }
+
+  auto levels_ = levels.contiguous().to(at::kLong);
+  check_roi_levels_cuda(levels_, num_levels);
+  AT_DISPATCH_FLOATING_TYPES(grad.type(), "MultiLevelROIAlign_backward", [&] {
+    FeatureLevels<scalar_t, scalar_t> feature_levels;
+    for (int l = 0; l < num_levels; l++) {
+      feature_levels.data[l] = grad_inputs[l].data<scalar_t>();
+      feature_levels.height[l] = heights[l];
+      feature_levels.width[l] = widths[l];
+      feature_levels.spatial_scale[l] = spatial_scales[l];
+    }
+    RoIAlignMultiLevelBackwardFeature<scalar_t><<<grid, block, 0, stream>>>(
+         grad.numel(),
+         grad.contiguous().data<scalar_t>(),
+         feature_levels,
+         levels_.data<int64_t>(),
+         channels,
+         pooled_height,
+         pooled_width,
+         sampling_ratio,
+         rois.contiguous().data<scalar_t>());
+  });
+  THCudaCheck(cudaGetLastError());
+  return grad_inputs;
+}
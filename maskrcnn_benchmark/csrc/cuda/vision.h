@@ -36,6 +36,26 @@ at::Tensor ROIAlign_backward_cuda(const at::Tensor& grad,
                                   const int width,
                                   const int sampling_ratio);
 
+at::Tensor MultiLevelROIAlign_forward_cuda(const std::vector<at::Tensor>& features,
+                                           const at::Tensor& rois,
+                                           const at::Tensor& levels,
+                                           const std::vector<double>& spatial_scales,
+                                           const int pooled_height,
+                                           const int pooled_width,
+                                           const int sampling_ratio);
+
+std::vector<at::Tensor> MultiLevelROIAlign_backward_cuda(const at::Tensor& grad,
+                                                         const at::Tensor& rois,
+                                                         const at::Tensor& levels,
+                                                         const std::vector<double>& spatial_scales,
+                                                         const int pooled_height,
+                                                         const int pooled_width,
+                                                         const int batch_size,
+                                                         const int channels,
+                                                         const std::vector<int64_t>& heights,
+                                                         const std::vector<int64_t>& widths,
+                                                         const int sampling_ratio);
+
 
 std::tuple<at::Tensor, at::Tensor> ROIPool_forward_cuda(const at::Tensor& input,
                                 const at::Tensor& rois,
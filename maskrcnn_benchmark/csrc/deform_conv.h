@@ -38,7 +38,11 @@ int deform_conv_forward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return deform_conv_forward_cpu(
+      input, weight, offset, output, columns, ones,
+      kW, kH, dW, dH, padW, padH, dilationW, dilationH,
+      group, deformable_group, im2col_step
+  );
 }
 
 
@@ -73,7 +77,11 @@ int deform_conv_backward_input(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return deform_conv_backward_input_cpu(
+      input, offset, gradOutput, gradInput, gradOffset, weight, columns,
+      kW, kH, dW, dH, padW, padH, dilationW, dilationH,
+      group, deformable_group, im2col_step
+  );
 }
 
 
@@ -108,7 +116,11 @@ int deform_conv_backward_parameters(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return deform_conv_backward_parameters_cpu(
+      input, offset, gradOutput, gradWeight, columns, ones,
+      kW, kH, dW, dH, padW, padH, dilationW, dilationH,
+      group, deformable_group, scale, im2col_step
+  );
 }
 
 
@@ -145,7 +157,12 @@ void modulated_deform_conv_forward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return modulated_deform_conv_cpu_forward(
+      input, weight, bias, ones, offset, mask, output, columns,
+      kernel_h, kernel_w, stride_h, stride_w,
+      pad_h, pad_w, dilation_h, dilation_w,
+      group, deformable_group, with_bias
+  );
 }
 
 
@@ -187,5 +204,10 @@ void modulated_deform_conv_backward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return modulated_deform_conv_cpu_backward(
+      input, weight, bias, ones, offset, mask, columns,
+      grad_input, grad_weight, grad_bias, grad_offset, grad_mask, grad_output,
+      kernel_h, kernel_w, stride_h, stride_w, pad_h, pad_w, dilation_h, dilation_w,
+      group, deformable_group, with_bias
+  );
 }
\ No newline at end of file
@@ -34,7 +34,11 @@ void deform_psroi_pooling_forward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return deform_psroi_pooling_cpu_forward(
+      input, bbox, trans, out, top_count,
+      no_trans, spatial_scale, output_dim, group_size,
+      pooled_size, part_size, sample_per_part, trans_std
+  );
 }
 
 
@@ -66,5 +70,9 @@ void deform_psroi_pooling_backward(
     AT_ERROR("Not compiled with GPU support");
 #endif
   }
-  AT_ERROR("Not implemented on the CPU");
+  return deform_psroi_pooling_cpu_backward(
+      out_grad, input, bbox, trans, top_count, input_grad, trans_grad,
+      no_trans, spatial_scale, output_dim, group_size, pooled_size,
+      part_size, sample_per_part, trans_std
+  );
 }
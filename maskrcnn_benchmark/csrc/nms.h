@@ -26,3 +26,18 @@ at::Tensor nms(const at::Tensor& dets,
   at::Tensor result = nms_cpu(dets, scores, threshold);
   return result;
 }
+
+// Performs NMS independently for the boxes of each group, keeping at most
+// max_keep boxes per group (all of them if max_keep <= 0). The kept indices
+// are sorted by group, then in decreasing order of score.
+at::Tensor batched_nms(const at::Tensor& dets,
+                       const at::Tensor& scores,
+                       const at::Tensor& groups,
+                       const float threshold,
+                       const int64_t max_keep) {
+  if (dets.type().is_cuda()) {
+    // the groups are handled with an offset of the boxes on the GPU
+    AT_ERROR("Not implemented on the GPU");
+  }
+  return batched_nms_cpu(dets, scores, groups, threshold, max_keep);
+}
@@ -8,8 +8,11 @@
 
 PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
   m.def("nms", &nms, "non-maximum suppression");
+  m.def("batched_nms", &batched_nms, "non-maximum suppression of groups of boxes");
   m.def("roi_align_forward", &ROIAlign_forward, "ROIAlign_forward");
   m.def("roi_align_backward", &ROIAlign_backward, "ROIAlign_backward");
+  m.def("multilevel_roi_align_forward", &MultiLevelROIAlign_forward, "MultiLevelROIAlign_forward");
+  m.def("multilevel_roi_align_backward", &MultiLevelROIAlign_backward, "MultiLevelROIAlign_backward");
   m.def("roi_pool_forward", &ROIPool_forward, "ROIPool_forward");
   m.def("roi_pool_backward", &ROIPool_backward, "ROIPool_backward");
   m.def("sigmoid_focalloss_forward", &SigmoidFocalLoss_forward, "SigmoidFocalLoss_forward");
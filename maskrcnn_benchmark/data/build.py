@@ -1,8 +1,9 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
-import bisect
 import copy
 import logging
+import os
 
+import numpy as np
 import torch.utils.data
 from maskrcnn_benchmark.utils.comm import get_world_size
 from maskrcnn_benchmark.utils.imports import import_file
@@ -12,6 +13,8 @@ from . import datasets as D
 from . import samplers
 
 from .collate_batch import BatchCollator, BBoxAugCollator
+from .image_metadata import ImageMetadataCache, compute_image_sizes
+from .image_metadata import compute_resized_sizes
 from .transforms import build_transforms
 
 
@@ -36,9 +39,9 @@ def build_dataset(dataset_list, transforms, dataset_catalog, is_train=True):
         args = data["args"]
         # for COCODataset, we want to remove images without annotations
         # during training
-        if data["factory"] == "COCODataset":
+        if data["factory"] in ("COCODataset", "PackedCOCODataset"):
             args["remove_images_without_annotations"] = is_train
-        if data["factory"] == "PascalVOCDataset":
+        if data["factory"] in ("PascalVOCDataset", "PackedPascalVOCDataset"):
             args["use_difficult"] = not is_train
         args["transforms"] = transforms
         # make dataset from factory
@@ -61,7 +64,10 @@ def make_data_sampler(dataset, shuffle, distributed):
     if distributed:
         return samplers.DistributedSampler(dataset, shuffle=shuffle)
     if shuffle:
-        sampler = torch.utils.data.sampler.RandomSampler(dataset)
+        # shuffled with the epoch as seed, so that the sampling can be resumed
+        sampler = samplers.DistributedSampler(
+            dataset, num_replicas=1, rank=0, shuffle=True
+        )
     else:
         sampler = torch.utils.data.sampler.SequentialSampler(dataset)
     return sampler
@@ -70,26 +76,33 @@ def make_data_sampler(dataset, shuffle, distributed):
 def _quantize(x, bins):
     bins = copy.copy(bins)
     bins = sorted(bins)
-    quantized = list(map(lambda y: bisect.bisect_right(bins, y), x))
-    return quantized
+    quantized = np.searchsorted(bins, np.asarray(x, dtype=np.float64), side="right")
+    return quantized.tolist()
 
 
-def _compute_aspect_ratios(dataset):
-    aspect_ratios = []
-    for i in range(len(dataset)):
-        img_info = dataset.get_img_info(i)
-        aspect_ratio = float(img_info["height"]) / float(img_info["width"])
-        aspect_ratios.append(aspect_ratio)
-    return aspect_ratios
+def _compute_aspect_ratios(dataset, image_sizes=None):
+    if image_sizes is None:
+        image_sizes = compute_image_sizes(dataset)
+    image_sizes = image_sizes.astype(np.float64)
+    return image_sizes[:, 0] / image_sizes[:, 1]
 
 
 def make_batch_data_sampler(
-    dataset, sampler, aspect_grouping, images_per_batch, num_iters=None, start_iter=0
+    dataset, sampler, aspect_grouping, images_per_batch, num_iters=None, start_iter=0,
+    image_sizes=None, resized_image_sizes=None, size_divisibility=0, bucket_window=64,
+    sampler_state=None,
 ):
-    if aspect_grouping:
+    if resized_image_sizes is not None:
+        # batches of images with similar padded sizes, which subsumes the
+        # aspect ratio grouping
+        batch_sampler = samplers.SizeBucketedBatchSampler(
+            sampler, resized_image_sizes, images_per_batch, size_divisibility,
+            bucket_window, drop_uneven=False,
+        )
+    elif aspect_grouping:
         if not isinstance(aspect_grouping, (list, tuple)):
             aspect_grouping = [aspect_grouping]
-        aspect_ratios = _compute_aspect_ratios(dataset)
+        aspect_ratios = _compute_aspect_ratios(dataset, image_sizes)
         group_ids = _quantize(aspect_ratios, aspect_grouping)
         batch_sampler = samplers.GroupedBatchSampler(
             sampler, group_ids, images_per_batch, drop_uneven=False
@@ -100,12 +113,41 @@ def make_batch_data_sampler(
         )
     if num_iters is not None:
         batch_sampler = samplers.IterationBasedBatchSampler(
-            batch_sampler, num_iters, start_iter
+            batch_sampler, num_iters, start_iter, sampler_state
         )
     return batch_sampler
 
 
-def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
+def _log_padding_stats(batch_sampler, dataset_name):
+    if isinstance(batch_sampler, samplers.IterationBasedBatchSampler):
+        batch_sampler = batch_sampler.batch_sampler
+    stats = batch_sampler.padding_stats()
+    # the same images, batched in the sampler order
+    sampled_ids = list(batch_sampler.sampler)
+    batch_size = batch_sampler.batch_size
+    unbucketed_stats = samplers.compute_padding_stats(
+        [sampled_ids[i:i + batch_size] for i in range(0, len(sampled_ids), batch_size)],
+        batch_sampler.image_sizes,
+        batch_sampler.size_divisibility,
+    )
+    logger = logging.getLogger(__name__)
+    logger.info(
+        "Padding in the batches of {}: {:.1%} of the pixels ({:.1%} without "
+        "size bucketing)".format(
+            dataset_name, stats["padding_waste"], unbucketed_stats["padding_waste"]
+        )
+    )
+
+
+def make_data_loader(
+    cfg, is_train=True, is_distributed=False, start_iter=0, sampler_state=None
+):
+    """
+    Arguments:
+        sampler_state (dict, optional): state of the training data sampler,
+            as returned by IterationBasedBatchSampler.state_dict, from which
+            the sampling is resumed
+    """
     num_gpus = get_world_size()
     if is_train:
         images_per_batch = cfg.SOLVER.IMS_PER_BATCH
@@ -126,6 +168,7 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
         shuffle = False if not is_distributed else True
         num_iters = None
         start_iter = 0
+        sampler_state = None
 
     if images_per_gpu > 1:
         logger = logging.getLogger(__name__)
@@ -159,12 +202,40 @@ def make_data_loader(cfg, is_train=True, is_distributed=False, start_iter=0):
         # save category_id to label name mapping
         save_labels(datasets, cfg.OUTPUT_DIR)
 
+    # the image sizes are cached along with a fingerprint of the annotations
+    metadata_cache_dir = cfg.DATALOADER.METADATA_CACHE_DIR
+    if not metadata_cache_dir and cfg.OUTPUT_DIR:
+        metadata_cache_dir = os.path.join(cfg.OUTPUT_DIR, "image_metadata")
+    metadata_cache = ImageMetadataCache(metadata_cache_dir)
+    # for training, the datasets are concatenated into a single one
+    dataset_names = ["+".join(dataset_list)] if is_train else dataset_list
+
+    # without transforms, the sizes of the images in the batches are not known
+    size_bucketing = cfg.DATALOADER.SIZE_BUCKETING and transforms is not None
+    if is_train:
+        min_size, max_size = cfg.INPUT.MIN_SIZE_TRAIN, cfg.INPUT.MAX_SIZE_TRAIN
+    else:
+        min_size, max_size = cfg.INPUT.MIN_SIZE_TEST, cfg.INPUT.MAX_SIZE_TEST
+    if isinstance(min_size, (list, tuple)):
+        # the images are resized to a random size: bucket them by their largest
+        min_size = max(min_size)
+
     data_loaders = []
-    for dataset in datasets:
+    for dataset, dataset_name in zip(datasets, dataset_names):
         sampler = make_data_sampler(dataset, shuffle, is_distributed)
+        image_sizes = None
+        resized_image_sizes = None
+        if aspect_grouping or size_bucketing:
+            image_sizes = metadata_cache.get_image_sizes(dataset, dataset_name)
+        if size_bucketing:
+            resized_image_sizes = compute_resized_sizes(image_sizes, min_size, max_size)
         batch_sampler = make_batch_data_sampler(
-            dataset, sampler, aspect_grouping, images_per_gpu, num_iters, start_iter
+            dataset, sampler, aspect_grouping, images_per_gpu, num_iters, start_iter,
+            image_sizes, resized_image_sizes, cfg.DATALOADER.SIZE_DIVISIBILITY,
+            cfg.DATALOADER.SIZE_BUCKETING_WINDOW, sampler_state,
         )
+        if size_bucketing:
+            _log_padding_stats(batch_sampler, dataset_name)
         collator = BBoxAugCollator() if not is_train and cfg.TEST.BBOX_AUG.ENABLED else \
             BatchCollator(cfg.DATALOADER.SIZE_DIVISIBILITY)
         num_workers = cfg.DATALOADER.NUM_WORKERS
@@ -4,5 +4,13 @@ from .coco import COCODataset
 from .voc import PascalVOCDataset
 from .concat_dataset import ConcatDataset
 from .abstract import AbstractDataset
+from .packed import PackedCOCODataset, PackedPascalVOCDataset
 
-__all__ = ["COCODataset", "ConcatDataset", "PascalVOCDataset", "AbstractDataset"]
+__all__ = [
+    "COCODataset",
+    "ConcatDataset",
+    "PascalVOCDataset",
+    "AbstractDataset",
+    "PackedCOCODataset",
+    "PackedPascalVOCDataset",
+]
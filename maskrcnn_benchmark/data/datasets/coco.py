@@ -1,10 +1,17 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import logging
+import os
+
+import numpy as np
 import torch
 import torchvision
+from PIL import Image
 
 from maskrcnn_benchmark.structures.bounding_box import BoxList
 from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+from maskrcnn_benchmark.structures.segmentation_mask import PackedPolygonList
 from maskrcnn_benchmark.structures.keypoint import PersonKeypoints
+from maskrcnn_benchmark.data.datasets.coco_cache import COCOAnnotationCache
 
 
 min_keypoints_per_image = 10
@@ -38,9 +45,36 @@ def has_valid_annotation(anno):
 
 class COCODataset(torchvision.datasets.coco.CocoDetection):
     def __init__(
-        self, ann_file, root, remove_images_without_annotations, transforms=None
+        self, ann_file, root, remove_images_without_annotations, transforms=None,
+        annotation_cache=None,
     ):
+        """
+        Arguments:
+            annotation_cache (str, optional): directory of a cache compiled
+                from ann_file by compile_coco_annotation_cache. If given,
+                the annotation file is only parsed if self.coco is used,
+                e.g. for evaluation.
+        """
+        if annotation_cache is not None:
+            self._init_from_cache(
+                ann_file, root, remove_images_without_annotations, annotation_cache
+            )
+        else:
+            self._init_from_json(ann_file, root, remove_images_without_annotations)
+
+        self.json_category_id_to_contiguous_id = {
+            v: i + 1 for i, v in enumerate(self.categories)
+        }
+        self.contiguous_category_id_to_json_id = {
+            v: k for k, v in self.json_category_id_to_contiguous_id.items()
+        }
+        self.id_to_img_map = {k: v for k, v in enumerate(self.ids)}
+        self._transforms = transforms
+
+    def _init_from_json(self, ann_file, root, remove_images_without_annotations):
         super(COCODataset, self).__init__(root, ann_file)
+        self.ann_file = ann_file
+        self._cache = None
         # sort indices for reproducible results
         self.ids = sorted(self.ids)
 
@@ -56,17 +90,84 @@ class COCODataset(torchvision.datasets.coco.CocoDetection):
 
         self.categories = {cat['id']: cat['name'] for cat in self.coco.cats.values()}
 
-        self.json_category_id_to_contiguous_id = {
-            v: i + 1 for i, v in enumerate(self.coco.getCatIds())
-        }
-        self.contiguous_category_id_to_json_id = {
-            v: k for k, v in self.json_category_id_to_contiguous_id.items()
-        }
-        self.id_to_img_map = {k: v for k, v in enumerate(self.ids)}
-        self._transforms = transforms
+    def _init_from_cache(
+        self, ann_file, root, remove_images_without_annotations, annotation_cache
+    ):
+        self.root = root
+        self.ann_file = ann_file
+        self._coco = None
+        self._cache = COCOAnnotationCache(annotation_cache)
+        if os.path.exists(ann_file) and self._cache.is_stale(ann_file):
+            logger = logging.getLogger(__name__)
+            logger.warning(
+                "{} was modified after the annotation cache {} was compiled".format(
+                    ann_file, annotation_cache
+                )
+            )
+
+        # the images are already sorted by id in the cache
+        rows = np.arange(len(self._cache))
+        if remove_images_without_annotations:
+            rows = rows[self._cache.valid_images]
+        self._rows = rows
+        self.ids = self._cache.image_ids[rows].tolist()
+
+        self.categories = {cat_id: name for cat_id, name in self._cache.categories}
+        # lookup array from json category ids to contiguous ids, -1 for the
+        # ids which are not a category
+        json_ids = np.array(list(self.categories.keys()), dtype=np.int64)
+        self._contiguous_id_lut = np.full(json_ids.max() + 1, -1, dtype=np.int64)
+        self._contiguous_id_lut[json_ids] = np.arange(1, len(json_ids) + 1)
+
+    def _contiguous_ids(self, category_ids):
+        lut = self._contiguous_id_lut
+        in_lut = (category_ids >= 0) & (category_ids < len(lut))
+        classes = np.full(len(category_ids), -1, dtype=np.int64)
+        classes[in_lut] = lut[category_ids[in_lut]]
+        if (classes < 0).any():
+            raise KeyError(
+                "Unknown category ids: {}".format(
+                    sorted(set(category_ids[classes < 0].tolist()))
+                )
+            )
+        return classes
+
+    @property
+    def coco(self):
+        # only loaded on first use when the dataset comes from a cache
+        if self._coco is None:
+            from pycocotools.coco import COCO
+
+            self._coco = COCO(self.ann_file)
+        return self._coco
+
+    @coco.setter
+    def coco(self, coco):
+        self._coco = coco
+
+    def __len__(self):
+        return len(self.ids)
 
     def __getitem__(self, idx):
-        img, anno = super(COCODataset, self).__getitem__(idx)
+        if self._cache is not None:
+            img, target = self._get_from_cache(idx)
+        else:
+            img, target = self._get_from_json(idx)
+
+        target = target.clip_to_image(remove_empty=True)
+
+        if self._transforms is not None:
+            img, target = self._transforms(img, target)
+
+        return img, target, idx
+
+    def load_image(self, file_name):
+        return Image.open(os.path.join(self.root, file_name)).convert("RGB")
+
+    def _get_from_json(self, idx):
+        img_id = self.ids[idx]
+        anno = self.coco.loadAnns(self.coco.getAnnIds(imgIds=img_id))
+        img = self.load_image(self.coco.loadImgs(img_id)[0]["file_name"])
 
         # filter crowd annotations
         # TODO might be better to add an extra field
@@ -83,6 +184,7 @@ class COCODataset(torchvision.datasets.coco.CocoDetection):
 
         if anno and "segmentation" in anno[0]:
             masks = [obj["segmentation"] for obj in anno]
+            masks = PackedPolygonList(masks, img.size)
             masks = SegmentationMask(masks, img.size, mode='poly')
             target.add_field("masks", masks)
 
@@ -91,14 +193,50 @@ class COCODataset(torchvision.datasets.coco.CocoDetection):
             keypoints = PersonKeypoints(keypoints, img.size)
             target.add_field("keypoints", keypoints)
 
-        target = target.clip_to_image(remove_empty=True)
+        return img, target
 
-        if self._transforms is not None:
-            img, target = self._transforms(img, target)
+    def _get_from_cache(self, idx):
+        row = self._rows[idx]
+        img = self.load_image(self._cache.get_img_info(row)["file_name"])
 
-        return img, target, idx
+        anno = self._cache.get_annotations(row)
+        boxes = torch.from_numpy(anno["boxes"])
+        target = BoxList(boxes, img.size, mode="xywh").convert("xyxy")
+
+        classes = self._contiguous_ids(anno["category_ids"])
+        target.add_field("labels", torch.from_numpy(classes))
+
+        if len(boxes) > 0 and self._cache.has_segmentation:
+            masks = PackedPolygonList.from_buffers(
+                torch.from_numpy(anno["coords"]),
+                torch.from_numpy(anno["poly_offsets"]),
+                torch.from_numpy(anno["instance_offsets"]),
+                img.size,
+            )
+            masks = SegmentationMask(masks, img.size, mode='poly')
+            target.add_field("masks", masks)
+
+        if len(boxes) > 0 and self._cache.has_keypoints:
+            keypoints = PersonKeypoints(torch.from_numpy(anno["keypoints"]), img.size)
+            target.add_field("keypoints", keypoints)
+
+        return img, target
 
     def get_img_info(self, index):
+        if self._cache is not None:
+            return self._cache.get_img_info(self._rows[index])
         img_id = self.id_to_img_map[index]
         img_data = self.coco.imgs[img_id]
         return img_data
+
+    def get_image_sizes(self):
+        """
+        Returns an (N, 2) array with the (height, width) of each image.
+        """
+        if self._cache is not None:
+            return self._cache.image_sizes[self._rows][:, ::-1]
+        imgs = self.coco.imgs
+        return np.array(
+            [[imgs[img_id]["height"], imgs[img_id]["width"]] for img_id in self.ids],
+            dtype=np.int64,
+        ).reshape(-1, 2)
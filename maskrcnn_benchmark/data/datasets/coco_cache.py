@@ -0,0 +1,226 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Columnar, memory-mappable cache of a COCO annotation file.
+
+The annotations are stored as one numpy array per field, with the
+annotations of each image contiguous, so that a dataset can be built in
+milliseconds and the arrays are shared between the data loader workers
+through the page cache instead of being duplicated in each of them.
+"""
+import json
+import os
+import shutil
+
+import numpy as np
+
+from maskrcnn_benchmark.structures.segmentation_mask import _concat_ranges
+
+CACHE_VERSION = 1
+META_FILE = "meta.json"
+
+
+def compile_coco_annotation_cache(ann_file, cache_dir):
+    """
+    Compiles a COCO annotation file into a columnar cache in cache_dir.
+
+    Images are sorted by id, and the annotations of each image are kept in
+    the order of the annotation file, as in pycocotools.
+    """
+    # imported here to avoid a circular import with coco.py
+    from maskrcnn_benchmark.data.datasets.coco import has_valid_annotation
+
+    with open(ann_file, "r") as f:
+        dataset = json.load(f)
+
+    images = sorted(dataset["images"], key=lambda img: img["id"])
+    row_of_image = {img["id"]: row for row, img in enumerate(images)}
+    annos = [[] for _ in images]
+    for ann in dataset.get("annotations", []):
+        annos[row_of_image[ann["image_id"]]].append(ann)
+    flat_annos = [ann for anno in annos for ann in anno]
+
+    has_segmentation = any("segmentation" in ann for ann in flat_annos)
+    has_keypoints = len(flat_annos) > 0 and all(
+        "keypoints" in ann for ann in flat_annos
+    )
+
+    arrays = {}
+    arrays["image_ids"] = np.array([img["id"] for img in images], dtype=np.int64)
+    arrays["image_sizes"] = np.array(
+        [[img["width"], img["height"]] for img in images], dtype=np.int64
+    ).reshape(-1, 2)
+    arrays["file_names"] = np.array(
+        [img["file_name"].encode("utf-8") for img in images], dtype=np.bytes_
+    )
+    arrays["valid_images"] = np.array(
+        [has_valid_annotation(anno) for anno in annos], dtype=np.bool_
+    )
+    arrays["ann_offsets"] = _lengths_to_offsets([len(anno) for anno in annos])
+
+    arrays["boxes"] = np.array(
+        [ann["bbox"] for ann in flat_annos], dtype=np.float32
+    ).reshape(-1, 4)
+    arrays["category_ids"] = np.array(
+        [ann["category_id"] for ann in flat_annos], dtype=np.int64
+    )
+    arrays["iscrowd"] = np.array(
+        [ann.get("iscrowd", 0) for ann in flat_annos], dtype=np.bool_
+    )
+
+    if has_segmentation:
+        coords = []
+        poly_lengths = []
+        ann_poly_lengths = []
+        for ann in flat_annos:
+            segmentation = ann.get("segmentation", [])
+            num_polygons = 0
+            # crowd regions are stored as RLEs, and are never used as targets
+            if isinstance(segmentation, list):
+                for p in segmentation:
+                    # same filtering as PolygonInstance
+                    if len(p) >= 6:
+                        num_vertices = len(p) // 2
+                        coords.extend(p[: 2 * num_vertices])
+                        poly_lengths.append(num_vertices)
+                        num_polygons += 1
+            ann_poly_lengths.append(num_polygons)
+        arrays["poly_coords"] = np.array(coords, dtype=np.float32).reshape(-1, 2)
+        arrays["poly_offsets"] = _lengths_to_offsets(poly_lengths)
+        arrays["ann_poly_offsets"] = _lengths_to_offsets(ann_poly_lengths)
+
+    if has_keypoints:
+        arrays["keypoints"] = np.array(
+            [ann["keypoints"] for ann in flat_annos], dtype=np.float32
+        ).reshape(len(flat_annos), -1)
+
+    meta = dict(
+        version=CACHE_VERSION,
+        ann_file=os.path.abspath(ann_file),
+        ann_file_size=os.path.getsize(ann_file),
+        ann_file_mtime=os.path.getmtime(ann_file),
+        # in the order of the annotation file, which defines the contiguous ids
+        categories=[[cat["id"], cat["name"]] for cat in dataset["categories"]],
+        has_segmentation=has_segmentation,
+        has_keypoints=has_keypoints,
+    )
+
+    # write everything in a temporary directory first, so that an
+    # interrupted compilation never leaves a partial cache behind
+    tmp_dir = cache_dir.rstrip(os.sep) + ".tmp"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_dir, name + ".npy"), array)
+    with open(os.path.join(tmp_dir, META_FILE), "w") as f:
+        json.dump(meta, f)
+    if os.path.exists(cache_dir):
+        shutil.rmtree(cache_dir)
+    os.rename(tmp_dir, cache_dir)
+
+
+def _lengths_to_offsets(lengths):
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)
+    return offsets
+
+
+class COCOAnnotationCache(object):
+    """
+    Read-only view of a cache written by compile_coco_annotation_cache.
+    All the arrays are memory-mapped, and only the path is pickled, so that
+    sending the cache to the data loader workers is free.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, META_FILE), "r") as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != CACHE_VERSION:
+            raise RuntimeError(
+                "Annotation cache {} has version {}, expected {}. "
+                "Please compile it again.".format(
+                    cache_dir, self.meta["version"], CACHE_VERSION
+                )
+            )
+        self._load_arrays()
+
+    def _load_arrays(self):
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".npy"):
+                path = os.path.join(self.cache_dir, name)
+                setattr(self, name[: -len(".npy")], np.load(path, mmap_mode="r"))
+
+    def __getstate__(self):
+        return {"cache_dir": self.cache_dir, "meta": self.meta}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._load_arrays()
+
+    @property
+    def has_segmentation(self):
+        return self.meta["has_segmentation"]
+
+    @property
+    def has_keypoints(self):
+        return self.meta["has_keypoints"]
+
+    @property
+    def categories(self):
+        return self.meta["categories"]
+
+    def is_stale(self, ann_file):
+        """
+        Whether ann_file was modified after the cache was compiled.
+        """
+        return (
+            os.path.getsize(ann_file) != self.meta["ann_file_size"]
+            or os.path.getmtime(ann_file) != self.meta["ann_file_mtime"]
+        )
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def get_img_info(self, row):
+        width, height = self.image_sizes[row].tolist()
+        return {
+            "id": int(self.image_ids[row]),
+            "file_name": self.file_names[row].decode("utf-8"),
+            "width": width,
+            "height": height,
+        }
+
+    def get_annotations(self, row, remove_crowd=True):
+        """
+        Returns the annotations of the image at row as a dict of arrays:
+        boxes (xywh), category_ids and, if present in the annotation file,
+        keypoints and the polygons in flat form (coords, poly_offsets and
+        instance_offsets, see PackedPolygonList). As in PackedPolygonList,
+        instances without any valid polygon are dropped from the polygons.
+        """
+        start, end = self.ann_offsets[row: row + 2].tolist()
+        anns = np.arange(start, end)
+        if remove_crowd:
+            anns = anns[~self.iscrowd[start:end]]
+
+        # fancy indexing copies the data out of the memory-mapped arrays
+        annotations = {
+            "boxes": self.boxes[anns],
+            "category_ids": self.category_ids[anns],
+        }
+        if self.has_segmentation:
+            poly_starts = self.ann_poly_offsets[anns]
+            instance_lengths = self.ann_poly_offsets[anns + 1] - poly_starts
+            polys = _concat_ranges(poly_starts, instance_lengths)
+            vertex_starts = self.poly_offsets[polys]
+            poly_lengths = self.poly_offsets[polys + 1] - vertex_starts
+            vertices = _concat_ranges(vertex_starts, poly_lengths)
+            annotations["coords"] = self.poly_coords[vertices]
+            annotations["poly_offsets"] = _lengths_to_offsets(poly_lengths)
+            annotations["instance_offsets"] = _lengths_to_offsets(
+                instance_lengths[instance_lengths > 0]
+            )
+        if self.has_keypoints:
+            annotations["keypoints"] = self.keypoints[anns]
+        return annotations
@@ -1,6 +1,6 @@
 from maskrcnn_benchmark.data import datasets
 
-from .coco import coco_evaluation
+from .coco import coco_evaluation, make_coco_prediction_converter
 from .voc import voc_evaluation
 
 
@@ -25,3 +25,20 @@ def evaluate(dataset, predictions, output_folder, **kwargs):
     else:
         dataset_name = dataset.__class__.__name__
         raise NotImplementedError("Unsupported dataset type {}.".format(dataset_name))
+
+
+def make_prediction_converter(dataset, **kwargs):
+    """
+    Returns a function converting the prediction for one image to the
+    format used by the evaluation of dataset, which can be called while
+    inference is running, or None if the dataset has no such conversion.
+    The function takes the index of the image in the dataset and its
+    prediction (BoxList), and its outputs are passed to evaluate as
+    `converted_predictions`, a list in image order.
+    Args:
+        dataset: Dataset object
+        **kwargs: the arguments of evaluate.
+    """
+    if isinstance(dataset, datasets.COCODataset):
+        return make_coco_prediction_converter(dataset=dataset, **kwargs)
+    return None
@@ -1,4 +1,8 @@
+import functools
+
 from .coco_eval import do_coco_evaluation
+from .coco_eval import prepare_image_for_coco
+from .coco_results import concat_coco_results
 
 
 def coco_evaluation(
@@ -9,7 +13,20 @@ def coco_evaluation(
     iou_types,
     expected_results,
     expected_results_sigma_tol,
+    converted_predictions=None,
+    num_workers=0,
+    coco_eval_backend="pycocotools",
 ):
+    coco_results = None
+    if converted_predictions is not None:
+        # concatenate the results of prepare_image_for_coco of all the images
+        coco_results = {
+            iou_type: concat_coco_results(
+                (converted[iou_type] for converted in converted_predictions),
+                iou_type,
+            )
+            for iou_type in iou_types
+        }
     return do_coco_evaluation(
         dataset=dataset,
         predictions=predictions,
@@ -18,4 +35,15 @@ def coco_evaluation(
         iou_types=iou_types,
         expected_results=expected_results,
         expected_results_sigma_tol=expected_results_sigma_tol,
+        coco_results=coco_results,
+        num_workers=num_workers,
+        eval_backend=coco_eval_backend,
+    )
+
+
+def make_coco_prediction_converter(dataset, iou_types, box_only, **_):
+    if box_only:
+        return None
+    return functools.partial(
+        prepare_image_for_coco, dataset=dataset, iou_types=iou_types
     )
@@ -0,0 +1,164 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Columnar COCO detection and keypoint results.
+
+Instead of one dict per detection, the results are stored as a dict of
+numpy arrays with one row per detection:
+    image_id (int64), category_id (int64), score (float32), and
+    bbox (float32, N x 4, xywh) for bbox results or
+    keypoints (float32, N x 3K) for keypoint results.
+
+They are built directly from the BoxList tensors, and are converted to
+the annotations of pycocotools only once, when they are loaded for the
+evaluation, without writing and parsing a json file.
+"""
+import copy
+import json
+
+import numpy as np
+
+
+def is_columnar_results(coco_results):
+    return isinstance(coco_results, dict)
+
+
+def json_category_id_lut(dataset):
+    """
+    Returns an array mapping the contiguous category ids of dataset to
+    the json category ids, so that labels can be remapped by indexing.
+    """
+    mapping = dataset.contiguous_category_id_to_json_id
+    lut = np.full(max(mapping.keys()) + 1, -1, dtype=np.int64)
+    lut[list(mapping.keys())] = list(mapping.values())
+    return lut
+
+
+def make_columnar_results(image_id, labels, scores, category_lut, **columns):
+    """
+    Arguments:
+        image_id (int): the json id of the image
+        labels (Tensor): the contiguous category ids of the detections
+        scores (Tensor)
+        category_lut (np.ndarray): see json_category_id_lut
+        columns (Tensor): the bbox or keypoints of the detections
+    """
+    labels = labels.numpy()
+    results = {
+        "image_id": np.full(len(labels), image_id, dtype=np.int64),
+        "category_id": category_lut[labels],
+        "score": scores.numpy().astype(np.float32, copy=False),
+    }
+    for name, values in columns.items():
+        results[name] = values.reshape(len(labels), -1).numpy().astype(
+            np.float32, copy=False
+        )
+    return results
+
+
+def empty_columnar_results(iou_type):
+    width = {"bbox": 4, "keypoints": 0}[iou_type]
+    return {
+        "image_id": np.zeros(0, dtype=np.int64),
+        "category_id": np.zeros(0, dtype=np.int64),
+        "score": np.zeros(0, dtype=np.float32),
+        iou_type: np.zeros((0, width), dtype=np.float32),
+    }
+
+
+def concat_coco_results(coco_results, iou_type):
+    """
+    Concatenates the results of several images, either columnar results,
+    or lists of dicts as for segm results.
+    """
+    coco_results = list(coco_results)
+    if not coco_results or not is_columnar_results(coco_results[0]):
+        return [result for results in coco_results for result in results]
+    # the width of the keypoints is only known from non-empty results
+    non_empty = [results for results in coco_results if len(results["score"])]
+    if not non_empty:
+        return empty_columnar_results(iou_type)
+    return {
+        name: np.concatenate([results[name] for results in non_empty])
+        for name in non_empty[0].keys()
+    }
+
+
+def columnar_results_to_list(coco_results, start=0, end=None):
+    """
+    Returns the rows start:end of columnar results as the usual list of
+    dicts of the COCO results format.
+    """
+    keys = ["image_id", "category_id"]
+    keys += [name for name in ("bbox", "keypoints") if name in coco_results]
+    keys += ["score"]
+    columns = [coco_results[key][start:end].tolist() for key in keys]
+    return [dict(zip(keys, row)) for row in zip(*columns)]
+
+
+def write_columnar_results_json(coco_results, json_result_file, chunk_size=10000):
+    """
+    Writes columnar results to a json file in the COCO results format,
+    converting chunk_size detections at a time.
+    """
+    num_results = len(coco_results["score"])
+    with open(json_result_file, "w") as f:
+        f.write("[")
+        for start in range(0, num_results, chunk_size):
+            chunk = columnar_results_to_list(coco_results, start, start + chunk_size)
+            if start > 0:
+                f.write(", ")
+            # strip the brackets of the list of the chunk
+            f.write(json.dumps(chunk)[1:-1])
+        f.write("]")
+
+
+def load_columnar_results(coco_gt, coco_results):
+    """
+    Equivalent of coco_gt.loadRes for columnar results, with the fields
+    added by loadRes to each annotation computed for all of them at once.
+    """
+    from pycocotools.coco import COCO
+
+    image_ids = coco_results["image_id"]
+    unknown_ids = np.setdiff1d(image_ids, np.array(coco_gt.getImgIds()))
+    assert len(unknown_ids) == 0, "Results do not correspond to current coco set"
+
+    res = COCO()
+    res.dataset["info"] = copy.deepcopy(coco_gt.dataset.get("info", {}))
+    res.dataset["images"] = [img for img in coco_gt.dataset["images"]]
+    res.dataset["categories"] = copy.deepcopy(coco_gt.dataset["categories"])
+
+    num_results = len(image_ids)
+    ids = np.arange(1, num_results + 1)
+    columns = {
+        "image_id": image_ids,
+        "category_id": coco_results["category_id"],
+        "score": coco_results["score"],
+        "id": ids,
+    }
+    if "bbox" in coco_results:
+        # computed in double precision, as loadRes does on the json values
+        bbox = coco_results["bbox"].astype(np.float64)
+        x1, y1 = bbox[:, 0], bbox[:, 1]
+        x2, y2 = x1 + bbox[:, 2], y1 + bbox[:, 3]
+        columns["bbox"] = bbox
+        columns["segmentation"] = np.stack(
+            [x1, y1, x1, y2, x2, y2, x2, y1], axis=1
+        )[:, None]
+        columns["area"] = bbox[:, 2] * bbox[:, 3]
+        columns["iscrowd"] = np.zeros(num_results, dtype=np.int64)
+    else:
+        keypoints = coco_results["keypoints"].astype(np.float64)
+        x = keypoints[:, 0::3]
+        y = keypoints[:, 1::3]
+        x0, x1 = x.min(axis=1), x.max(axis=1)
+        y0, y1 = y.min(axis=1), y.max(axis=1)
+        columns["keypoints"] = keypoints
+        columns["area"] = (x1 - x0) * (y1 - y0)
+        columns["bbox"] = np.stack([x0, y0, x1 - x0, y1 - y0], axis=1)
+
+    keys = list(columns.keys())
+    values = [columns[key].tolist() for key in keys]
+    res.dataset["annotations"] = [dict(zip(keys, row)) for row in zip(*values)]
+    res.createIndex()
+    return res
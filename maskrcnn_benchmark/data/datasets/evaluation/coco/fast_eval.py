@@ -0,0 +1,451 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Faster drop-in replacement of the COCOeval class of pycocotools.
+
+evaluate() computes the IoUs and matches the detections of each (image,
+category) pair with numpy, all the IoU thresholds at once, and the pairs
+can be processed by a pool of processes. accumulate() computes the
+precision of all the IoU thresholds at once. The results are the same as
+the ones of pycocotools, in the same attributes (ious, evalImgs, eval,
+stats).
+"""
+import copy
+import datetime
+import multiprocessing
+import time
+
+import numpy as np
+import pycocotools.mask as mask_util
+from pycocotools.cocoeval import COCOeval
+
+
+def _compute_iou(dt, gt, iou_type, oks_sigmas):
+    if iou_type == "keypoints":
+        return _compute_oks(dt, gt, oks_sigmas)
+    return np.asarray(
+        mask_util.iou(dt["geometry"], gt["geometry"], gt["iscrowd"].tolist()),
+        dtype=np.float64,
+    )
+
+
+def _compute_oks(dt, gt, sigmas):
+    """
+    Same as COCOeval.computeOks, for all the pairs of detections and
+    gt at once.
+    """
+    variances = (sigmas * 2) ** 2
+    d = dt["geometry"].reshape(len(dt["ids"]), -1, 3)
+    g = gt["geometry"].reshape(len(gt["ids"]), -1, 3)
+    xd, yd = d[:, None, :, 0], d[:, None, :, 1]
+    xg, yg, vg = g[None, :, :, 0], g[None, :, :, 1], g[None, :, :, 2]
+    visible = vg > 0
+    has_visible = visible.any(axis=2, keepdims=True)
+
+    # distance to the keypoints if some are visible, and otherwise to
+    # the region of twice the size of the gt box
+    bbox = gt["bbox"][None, :, None, :]
+    x0 = bbox[..., 0] - bbox[..., 2]
+    x1 = bbox[..., 0] + bbox[..., 2] * 2
+    y0 = bbox[..., 1] - bbox[..., 3]
+    y1 = bbox[..., 1] + bbox[..., 3] * 2
+    dx_out = np.maximum(0, x0 - xd) + np.maximum(0, xd - x1)
+    dy_out = np.maximum(0, y0 - yd) + np.maximum(0, yd - y1)
+    dx = np.where(has_visible, xd - xg, dx_out)
+    dy = np.where(has_visible, yd - yg, dy_out)
+
+    area = gt["area"][None, :, None]
+    e = (dx ** 2 + dy ** 2) / variances / (area + np.spacing(1)) / 2
+    used = np.where(has_visible, visible, True)
+    return (np.exp(-e) * used).sum(axis=2) / used.sum(axis=2)
+
+
+def _last_argmax(values):
+    """
+    Index of the maximum along the last axis, the last one in case of ties.
+    """
+    size = values.shape[-1]
+    return size - 1 - np.argmax(values[..., ::-1], axis=-1)
+
+
+def _dense_ranks(values):
+    """
+    Ranks of the values, equal for equal values.
+    """
+    flat = values.ravel()
+    order = np.argsort(flat, kind="mergesort")
+    ranks = np.empty(len(flat), dtype=np.int64)
+    ranks[order] = np.cumsum(np.r_[False, np.diff(flat[order]) != 0])
+    return ranks.reshape(values.shape)
+
+
+def _match(ious, dt_ids, gt_ids, gt_ignore, gt_iscrowd, iou_thresholds):
+    """
+    Greedy matching of COCOeval.evaluateImg, for all the area ranges and
+    IoU thresholds at once.
+
+    The detections are sorted by decreasing score, and each of them is
+    matched with the available gt of highest IoU above the threshold,
+    preferring the non-ignored gt. In case of ties, COCOeval picks the last
+    gt, in the order where the ignored gt are last, which is the last one
+    in the original order as the ignored and non-ignored gt are never tied.
+
+    Arguments:
+        ious (np.ndarray[D, G])
+        gt_ignore (np.ndarray[A, G]): the ignore flags for each area range
+    Returns:
+        dt_matches (np.ndarray[A, T, D]), gt_matches (np.ndarray[A, T, G])
+        and dt_ignore (np.ndarray[A, T, D]), with the gt in the original order
+    """
+    num_dt, num_gt = ious.shape
+    num_areas = gt_ignore.shape[0]
+    num_thresholds = len(iou_thresholds)
+    num_rows = num_areas * num_thresholds
+
+    # the ranks of the IoUs preserve their order and ties, so that adding
+    # an offset to the non-ignored gt ranks them first without rounding
+    ranks = _dense_ranks(ious)
+    offset = ranks.max() + 1
+    thresholds = np.minimum(iou_thresholds, 1 - 1e-10)
+    above = ious[:, None, None, :] >= thresholds[None, None, :, None]
+    keys = ranks[:, None, None, :] + offset * ~gt_ignore[None, :, None, :]
+    # [D, A * T, G], -1 for the gt which can't be matched
+    keys = np.where(above, keys, -1).reshape(num_dt, num_rows, num_gt)
+    row_gt_ignore = np.repeat(gt_ignore, num_thresholds, axis=0)
+
+    dt_matches = np.zeros((num_rows, num_dt))
+    gt_matches = np.zeros((num_rows, num_gt))
+    dt_ignore = np.zeros((num_rows, num_dt))
+    rows = np.arange(num_rows)
+
+    # Best gt of each detection if all the gt were available. The greedy
+    # matching gives the same result until a detection picks a non-crowd gt
+    # already picked by a previous detection.
+    best = _last_argmax(keys)
+    matched = keys[np.arange(num_dt)[:, None], rows[None, :], best] >= 0
+    picked = (best[..., None] == np.arange(num_gt)) & matched[..., None]
+    picked &= ~gt_iscrowd
+    conflicts = (np.cumsum(picked, axis=0) > 1) & picked
+    conflicts = conflicts.any(axis=(1, 2))
+    first_conflict = np.argmax(conflicts) if conflicts.any() else num_dt
+
+    d, r = np.nonzero(matched[:first_conflict].T)[::-1]
+    g = best[d, r]
+    dt_matches[r, d] = gt_ids[g]
+    dt_ignore[r, d] = row_gt_ignore[r, g]
+    if gt_iscrowd.any():
+        # a crowd gt keeps the id of the last detection matched with it
+        cells = r * num_gt + g
+        _, last = np.unique(cells[::-1], return_index=True)
+        last = len(cells) - 1 - last
+        r, g, d = r[last], g[last], d[last]
+    gt_matches[r, g] = dt_ids[d]
+
+    for d in range(first_conflict, num_dt):
+        available = (gt_matches == 0) | gt_iscrowd
+        row_keys = np.where(available, keys[d], -1)
+        best = _last_argmax(row_keys)
+        matched = row_keys[rows, best] >= 0
+        if not matched.any():
+            continue
+        r, g = rows[matched], best[matched]
+        dt_matches[r, d] = gt_ids[g]
+        dt_ignore[r, d] = row_gt_ignore[r, g]
+        gt_matches[r, g] = dt_ids[d]
+
+    shape = (num_areas, num_thresholds)
+    return (
+        dt_matches.reshape(shape + (num_dt,)),
+        gt_matches.reshape(shape + (num_gt,)),
+        dt_ignore.reshape(shape + (num_dt,)),
+    )
+
+
+def _evaluate_pair(task, params):
+    """
+    Evaluates the detections of an (image, category) pair for all the area
+    ranges, and returns the IoUs of COCOeval.computeIoU followed by the
+    per-image results of COCOeval.evaluateImg.
+    """
+    img_id, cat_id, dt, gt = task
+    iou_type, iou_thresholds, area_ranges, max_det, oks_sigmas = params
+    num_thresholds = len(iou_thresholds)
+    num_areas = len(area_ranges)
+
+    # sort dt highest score first
+    order = np.argsort(-dt["scores"], kind="mergesort")[:max_det]
+    dt = {
+        key: [value[i] for i in order] if isinstance(value, list) else value[order]
+        for key, value in dt.items()
+    }
+    num_dt, num_gt = len(dt["ids"]), len(gt["ids"])
+
+    area_ranges = np.asarray(area_ranges, dtype=np.float64)
+    gt_ignore = gt["ignore"][None, :] | (
+        (gt["area"][None, :] < area_ranges[:, :1])
+        | (gt["area"][None, :] > area_ranges[:, 1:])
+    )
+    if num_dt > 0 and num_gt > 0:
+        ious = _compute_iou(dt, gt, iou_type, oks_sigmas)
+        dt_matches, gt_matches, dt_ignore = _match(
+            ious, dt["ids"], gt["ids"], gt_ignore, gt["iscrowd"], iou_thresholds
+        )
+    else:
+        ious = []
+        dt_matches = np.zeros((num_areas, num_thresholds, num_dt))
+        gt_matches = np.zeros((num_areas, num_thresholds, num_gt))
+        dt_ignore = np.zeros((num_areas, num_thresholds, num_dt))
+    # set unmatched detections outside of area range to ignore
+    dt_out = (dt["area"][None, :] < area_ranges[:, :1]) | (
+        dt["area"][None, :] > area_ranges[:, 1:]
+    )
+    dt_ignore = np.logical_or(
+        dt_ignore, np.logical_and(dt_matches == 0, dt_out[:, None, :])
+    )
+    # sort gt ignore last
+    gt_order = np.argsort(gt_ignore, axis=1, kind="mergesort")
+    areas = np.arange(num_areas)[:, None]
+    thresholds = np.arange(num_thresholds)[None, :, None]
+    return (
+        ious, dt["ids"], dt["scores"], gt["ids"], gt_order, gt_ignore[areas, gt_order],
+        dt_matches, gt_matches[areas[:, :, None], thresholds, gt_order[:, None, :]],
+        dt_ignore,
+    )
+
+
+def _evaluate_pairs(args):
+    tasks, params = args
+    return [_evaluate_pair(task, params) for task in tasks]
+
+
+def _to_arrays(anns, iou_type, is_gt):
+    """
+    Converts the annotations of an (image, category) pair to arrays, with
+    the geometry used to compute the IoUs.
+    """
+    arrays = {
+        "ids": np.array([ann["id"] for ann in anns], dtype=np.int64),
+        "area": np.array([ann["area"] for ann in anns], dtype=np.float64),
+    }
+    if iou_type == "segm":
+        arrays["geometry"] = [ann["segmentation"] for ann in anns]
+    elif iou_type == "bbox":
+        arrays["geometry"] = np.array(
+            [ann["bbox"] for ann in anns], dtype=np.float64
+        ).reshape(-1, 4)
+    elif len(anns) > 0:
+        arrays["geometry"] = np.array(
+            [ann["keypoints"] for ann in anns], dtype=np.float64
+        ).reshape(len(anns), -1)
+    else:
+        arrays["geometry"] = np.zeros((0, 0))
+    if is_gt:
+        arrays["iscrowd"] = np.array(
+            [int(ann["iscrowd"]) for ann in anns], dtype=np.bool_
+        )
+        arrays["ignore"] = np.array(
+            [bool(ann["ignore"]) for ann in anns], dtype=np.bool_
+        )
+        if iou_type == "keypoints":
+            arrays["bbox"] = np.array(
+                [ann["bbox"] for ann in anns], dtype=np.float64
+            ).reshape(-1, 4)
+    else:
+        arrays["scores"] = np.array([ann["score"] for ann in anns], dtype=np.float64)
+    return arrays
+
+
+class FastCOCOeval(COCOeval):
+    """
+    COCOeval with vectorized evaluate() and accumulate(). The (image,
+    category) pairs are evaluated by num_workers processes if num_workers
+    is greater than 0.
+    """
+
+    def __init__(self, cocoGt=None, cocoDt=None, iouType="segm", num_workers=0):
+        super(FastCOCOeval, self).__init__(cocoGt, cocoDt, iouType)
+        self.num_workers = num_workers
+
+    def _tasks(self, cat_ids):
+        p = self.params
+        for img_id in p.imgIds:
+            for cat_id in cat_ids:
+                if p.useCats:
+                    gt = self._gts[img_id, cat_id]
+                    dt = self._dts[img_id, cat_id]
+                else:
+                    gt = [g for c in p.catIds for g in self._gts[img_id, c]]
+                    dt = [d for c in p.catIds for d in self._dts[img_id, c]]
+                if len(gt) == 0 and len(dt) == 0:
+                    continue
+                yield (
+                    img_id, cat_id,
+                    _to_arrays(dt, p.iouType, is_gt=False),
+                    _to_arrays(gt, p.iouType, is_gt=True),
+                )
+
+    def evaluate(self):
+        tic = time.time()
+        print("Running per image evaluation...")
+        p = self.params
+        if p.useSegm is not None:
+            p.iouType = "segm" if p.useSegm == 1 else "bbox"
+        print("Evaluate annotation type *{}*".format(p.iouType))
+        p.imgIds = list(np.unique(p.imgIds))
+        if p.useCats:
+            p.catIds = list(np.unique(p.catIds))
+        p.maxDets = sorted(p.maxDets)
+        self.params = p
+
+        self._prepare()
+        cat_ids = p.catIds if p.useCats else [-1]
+        params = (
+            p.iouType, np.asarray(p.iouThrs), p.areaRng, p.maxDets[-1],
+            np.asarray(p.kpt_oks_sigmas) if p.iouType == "keypoints" else None,
+        )
+
+        # the pairs are sent to the workers in chunks, to amortize the
+        # communication costs
+        chunk_size = 64
+        tasks = list(self._tasks(cat_ids))
+        chunks = (
+            (tasks[start: start + chunk_size], params)
+            for start in range(0, len(tasks), chunk_size)
+        )
+        if self.num_workers > 0:
+            pool = multiprocessing.Pool(self.num_workers)
+            chunk_results = pool.imap(_evaluate_pairs, chunks)
+        else:
+            pool = None
+            chunk_results = map(_evaluate_pairs, chunks)
+
+        # evalImgs is indexed by category, area range and image, as in COCOeval
+        num_images = len(p.imgIds)
+        num_areas = len(p.areaRng)
+        image_index = {img_id: i for i, img_id in enumerate(p.imgIds)}
+        cat_index = {cat_id: k for k, cat_id in enumerate(cat_ids)}
+        self.evalImgs = [None] * (len(cat_ids) * num_areas * num_images)
+        # the pairs without gt nor detections have no IoU, as in COCOeval
+        self.ious = {
+            (img_id, cat_id): [] for img_id in p.imgIds for cat_id in cat_ids
+        }
+        pairs = ((task[0], task[1]) for task in tasks)
+        for results in chunk_results:
+            for result in results:
+                img_id, cat_id = next(pairs)
+                offset = cat_index[cat_id] * num_areas * num_images + image_index[img_id]
+                (ious, dt_ids, dt_scores, gt_ids, gt_order, gt_ignore,
+                 dt_matches, gt_matches, dt_ignore) = result
+                self.ious[img_id, cat_id] = ious
+                dt_ids, dt_scores = dt_ids.tolist(), dt_scores.tolist()
+                for a, area_range in enumerate(p.areaRng):
+                    self.evalImgs[offset + a * num_images] = {
+                        "image_id": img_id,
+                        "category_id": cat_id,
+                        "aRng": area_range,
+                        "maxDet": p.maxDets[-1],
+                        "dtIds": dt_ids,
+                        "gtIds": gt_ids[gt_order[a]].tolist(),
+                        "dtMatches": dt_matches[a],
+                        "gtMatches": gt_matches[a],
+                        "dtScores": dt_scores,
+                        "gtIgnore": gt_ignore[a].astype(np.int64),
+                        "dtIgnore": dt_ignore[a],
+                    }
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+        self._paramsEval = copy.deepcopy(self.params)
+        toc = time.time()
+        print("DONE (t={:0.2f}s).".format(toc - tic))
+
+    def accumulate(self, p=None):
+        print("Accumulating evaluation results...")
+        tic = time.time()
+        if not self.evalImgs:
+            print("Please run evaluate() first")
+        if p is None:
+            p = self.params
+        p.catIds = p.catIds if p.useCats == 1 else [-1]
+        T = len(p.iouThrs)
+        R = len(p.recThrs)
+        K = len(p.catIds) if p.useCats else 1
+        A = len(p.areaRng)
+        M = len(p.maxDets)
+        # -1 for the precision of absent categories
+        precision = -np.ones((T, R, K, A, M))
+        recall = -np.ones((T, K, A, M))
+        scores = -np.ones((T, R, K, A, M))
+
+        _pe = self._paramsEval
+        cat_ids = _pe.catIds if _pe.useCats else [-1]
+        set_k = set(cat_ids)
+        set_a = set(map(tuple, _pe.areaRng))
+        set_m = set(_pe.maxDets)
+        set_i = set(_pe.imgIds)
+        k_list = [n for n, k in enumerate(p.catIds) if k in set_k]
+        m_list = [m for n, m in enumerate(p.maxDets) if m in set_m]
+        a_list = [n for n, a in enumerate(map(tuple, p.areaRng)) if a in set_a]
+        i_list = [n for n, i in enumerate(p.imgIds) if i in set_i]
+        I0 = len(_pe.imgIds)
+        A0 = len(_pe.areaRng)
+        rec_thresholds = np.asarray(p.recThrs)
+        for k, k0 in enumerate(k_list):
+            Nk = k0 * A0 * I0
+            for a, a0 in enumerate(a_list):
+                Na = a0 * I0
+                E = [self.evalImgs[Nk + Na + i] for i in i_list]
+                E = [e for e in E if e is not None]
+                if len(E) == 0:
+                    continue
+                gt_ignore = np.concatenate([e["gtIgnore"] for e in E])
+                npig = np.count_nonzero(gt_ignore == 0)
+                if npig == 0:
+                    continue
+                for m, max_det in enumerate(m_list):
+                    dt_scores = np.concatenate([e["dtScores"][0:max_det] for e in E])
+                    # mergesort is used to be consistent with pycocotools
+                    inds = np.argsort(-dt_scores, kind="mergesort")
+                    dt_scores_sorted = dt_scores[inds]
+                    dtm = np.concatenate(
+                        [e["dtMatches"][:, 0:max_det] for e in E], axis=1
+                    )[:, inds]
+                    dt_ig = np.concatenate(
+                        [e["dtIgnore"][:, 0:max_det] for e in E], axis=1
+                    )[:, inds]
+                    tps = np.logical_and(dtm, np.logical_not(dt_ig))
+                    fps = np.logical_and(np.logical_not(dtm), np.logical_not(dt_ig))
+                    tp_sum = np.cumsum(tps, axis=1).astype(dtype=float)
+                    fp_sum = np.cumsum(fps, axis=1).astype(dtype=float)
+
+                    nd = tp_sum.shape[1]
+                    rc = tp_sum / npig
+                    pr = tp_sum / (fp_sum + tp_sum + np.spacing(1))
+                    recall[:, k, a, m] = rc[:, -1] if nd else 0
+                    if nd == 0:
+                        precision[:, :, k, a, m] = 0
+                        scores[:, :, k, a, m] = 0
+                        continue
+                    # make the precision monotonically decreasing
+                    pr = np.maximum.accumulate(pr[:, ::-1], axis=1)[:, ::-1]
+                    for t in range(T):
+                        pi = np.searchsorted(rc[t], rec_thresholds, side="left")
+                        # recall thresholds which are never reached have a
+                        # precision of 0
+                        reached = pi < nd
+                        q = np.zeros(R)
+                        ss = np.zeros(R)
+                        q[reached] = pr[t, pi[reached]]
+                        ss[reached] = dt_scores_sorted[pi[reached]]
+                        precision[t, :, k, a, m] = q
+                        scores[t, :, k, a, m] = ss
+        self.eval = {
+            "params": p,
+            "counts": [T, R, K, A, M],
+            "date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "precision": precision,
+            "recall": recall,
+            "scores": scores,
+        }
+        toc = time.time()
+        print("DONE (t={:0.2f}s).".format(toc - tic))
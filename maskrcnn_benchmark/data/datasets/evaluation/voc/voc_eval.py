@@ -2,32 +2,23 @@
 # (See https://github.com/chainer/chainercv/blob/master/chainercv/evaluations/eval_detection_voc.py)
 from __future__ import division
 
+import multiprocessing
 import os
-from collections import defaultdict
 import numpy as np
-from maskrcnn_benchmark.structures.bounding_box import BoxList
-from maskrcnn_benchmark.structures.boxlist_ops import boxlist_iou
+from maskrcnn_benchmark.structures.segmentation_mask import _concat_ranges
 
 
-def do_voc_evaluation(dataset, predictions, output_folder, logger):
+def do_voc_evaluation(dataset, predictions, output_folder, logger, num_workers=0):
     # TODO need to make the use_07_metric format available
     # for the user to choose
-    pred_boxlists = []
-    gt_boxlists = []
-    for image_id, prediction in enumerate(predictions):
-        img_info = dataset.get_img_info(image_id)
-        image_width = img_info["width"]
-        image_height = img_info["height"]
-        prediction = prediction.resize((image_width, image_height))
-        pred_boxlists.append(prediction)
-
-        gt_boxlist = dataset.get_groundtruth(image_id)
-        gt_boxlists.append(gt_boxlist)
-    result = eval_detection_voc(
-        pred_boxlists=pred_boxlists,
-        gt_boxlists=gt_boxlists,
+    gt = load_voc_groundtruth(dataset)
+    detections = voc_detections_to_arrays(predictions, gt["sizes"])
+    result = eval_detection_voc_arrays(
+        detections=detections,
+        gt=gt,
         iou_thresh=0.5,
         use_07_metric=True,
+        num_workers=num_workers,
     )
     result_str = "mAP: {:.4f}\n".format(result["map"])
     for i, ap in enumerate(result["ap"]):
@@ -43,6 +34,57 @@ def do_voc_evaluation(dataset, predictions, output_folder, logger):
     return result
 
 
+def _boxlists_to_arrays(boxlists, fields):
+    """
+    Concatenates the boxes and fields of a list of BoxList in numpy arrays,
+    with the index of the image of each box in "image_ids".
+    """
+    def cat(arrays, empty):
+        return np.concatenate(arrays) if arrays else empty
+
+    arrays = {
+        "image_ids": np.repeat(
+            np.arange(len(boxlists)), [len(boxlist) for boxlist in boxlists]
+        ),
+        "boxes": cat(
+            [boxlist.bbox.numpy().reshape(-1, 4) for boxlist in boxlists],
+            np.zeros((0, 4), dtype=np.float32),
+        ),
+        "sizes": np.array(
+            [boxlist.size for boxlist in boxlists], dtype=np.int64
+        ).reshape(-1, 2),
+    }
+    for field in fields:
+        arrays[field] = cat(
+            [boxlist.get_field(field).numpy() for boxlist in boxlists], np.zeros(0)
+        )
+    return arrays
+
+
+def load_voc_groundtruth(dataset):
+    """
+    Loads the ground truth of all the images of dataset in numpy arrays:
+    the boxes (xyxy), labels and difficult flags of all the objects, the
+    index of the image of each object in "image_ids", and the (width,
+    height) of each image in "sizes". The annotations of each image are
+    read only once.
+    """
+    gt_boxlists = [dataset.get_groundtruth(i) for i in range(len(dataset))]
+    return _boxlists_to_arrays(gt_boxlists, ("labels", "difficult"))
+
+
+def voc_detections_to_arrays(predictions, sizes):
+    """
+    Resizes the predictions to the image sizes, and concatenates them in
+    numpy arrays, as load_voc_groundtruth.
+    """
+    pred_boxlists = [
+        prediction.resize(tuple(size)).convert("xyxy")
+        for prediction, size in zip(predictions, sizes.tolist())
+    ]
+    return _boxlists_to_arrays(pred_boxlists, ("labels", "scores"))
+
+
 def eval_detection_voc(pred_boxlists, gt_boxlists, iou_thresh=0.5, use_07_metric=False):
     """Evaluate on voc dataset.
     Args:
@@ -63,6 +105,19 @@ def eval_detection_voc(pred_boxlists, gt_boxlists, iou_thresh=0.5, use_07_metric
     return {"ap": ap, "map": np.nanmean(ap)}
 
 
+def eval_detection_voc_arrays(
+    detections, gt, iou_thresh=0.5, use_07_metric=False, num_workers=0
+):
+    """Same as eval_detection_voc, with the detections and the ground truth
+    given as arrays, see load_voc_groundtruth.
+    """
+    prec, rec = calc_detection_voc_prec_rec_arrays(
+        detections, gt, iou_thresh=iou_thresh, num_workers=num_workers
+    )
+    ap = calc_detection_voc_ap(prec, rec, use_07_metric=use_07_metric)
+    return {"ap": ap, "map": np.nanmean(ap)}
+
+
 def calc_detection_voc_prec_rec(gt_boxlists, pred_boxlists, iou_thresh=0.5):
     """Calculate precision and recall based on evaluation code of PASCAL VOC.
     This function calculates precision and recall of
@@ -70,88 +125,136 @@ def calc_detection_voc_prec_rec(gt_boxlists, pred_boxlists, iou_thresh=0.5):
     images.
     The code is based on the evaluation code used in PASCAL VOC Challenge.
    """
-    n_pos = defaultdict(int)
-    score = defaultdict(list)
-    match = defaultdict(list)
-    for gt_boxlist, pred_boxlist in zip(gt_boxlists, pred_boxlists):
-        pred_bbox = pred_boxlist.bbox.numpy()
-        pred_label = pred_boxlist.get_field("labels").numpy()
-        pred_score = pred_boxlist.get_field("scores").numpy()
-        gt_bbox = gt_boxlist.bbox.numpy()
-        gt_label = gt_boxlist.get_field("labels").numpy()
-        gt_difficult = gt_boxlist.get_field("difficult").numpy()
-
-        for l in np.unique(np.concatenate((pred_label, gt_label)).astype(int)):
-            pred_mask_l = pred_label == l
-            pred_bbox_l = pred_bbox[pred_mask_l]
-            pred_score_l = pred_score[pred_mask_l]
-            # sort by score
-            order = pred_score_l.argsort()[::-1]
-            pred_bbox_l = pred_bbox_l[order]
-            pred_score_l = pred_score_l[order]
-
-            gt_mask_l = gt_label == l
-            gt_bbox_l = gt_bbox[gt_mask_l]
-            gt_difficult_l = gt_difficult[gt_mask_l]
-
-            n_pos[l] += np.logical_not(gt_difficult_l).sum()
-            score[l].extend(pred_score_l)
-
-            if len(pred_bbox_l) == 0:
-                continue
-            if len(gt_bbox_l) == 0:
-                match[l].extend((0,) * pred_bbox_l.shape[0])
-                continue
-
-            # VOC evaluation follows integer typed bounding boxes.
-            pred_bbox_l = pred_bbox_l.copy()
-            pred_bbox_l[:, 2:] += 1
-            gt_bbox_l = gt_bbox_l.copy()
-            gt_bbox_l[:, 2:] += 1
-            iou = boxlist_iou(
-                BoxList(pred_bbox_l, gt_boxlist.size),
-                BoxList(gt_bbox_l, gt_boxlist.size),
-            ).numpy()
-            gt_index = iou.argmax(axis=1)
-            # set -1 if there is no matching ground truth
-            gt_index[iou.max(axis=1) < iou_thresh] = -1
-            del iou
-
-            selec = np.zeros(gt_bbox_l.shape[0], dtype=bool)
-            for gt_idx in gt_index:
-                if gt_idx >= 0:
-                    if gt_difficult_l[gt_idx]:
-                        match[l].append(-1)
-                    else:
-                        if not selec[gt_idx]:
-                            match[l].append(1)
-                        else:
-                            match[l].append(0)
-                    selec[gt_idx] = True
-                else:
-                    match[l].append(0)
+    return calc_detection_voc_prec_rec_arrays(
+        detections=_boxlists_to_arrays(pred_boxlists, ("labels", "scores")),
+        gt=_boxlists_to_arrays(gt_boxlists, ("labels", "difficult")),
+        iou_thresh=iou_thresh,
+    )
+
+
+def calc_detection_voc_prec_rec_arrays(detections, gt, iou_thresh=0.5, num_workers=0):
+    """Same as calc_detection_voc_prec_rec, with the detections and the
+    ground truth given as arrays, see load_voc_groundtruth. The detections
+    of each class are matched at once over the whole dataset, and the
+    classes are processed by num_workers processes if num_workers > 0.
+    """
+    det_labels = detections["labels"].astype(np.int64)
+    gt_labels = gt["labels"].astype(np.int64)
+    labels = np.unique(np.concatenate((det_labels, gt_labels)))
+    tasks = (
+        (
+            detections["image_ids"][det_labels == l],
+            detections["boxes"][det_labels == l],
+            detections["scores"][det_labels == l],
+            gt["image_ids"][gt_labels == l],
+            gt["boxes"][gt_labels == l],
+            gt["difficult"][gt_labels == l].astype(np.bool_),
+            iou_thresh,
+        )
+        for l in labels
+    )
+    if num_workers > 0:
+        pool = multiprocessing.Pool(num_workers)
+        results = pool.map(_calc_class_prec_rec, tasks)
+        pool.close()
+        pool.join()
+    else:
+        results = [_calc_class_prec_rec(task) for task in tasks]
 
-    n_fg_class = max(n_pos.keys()) + 1
+    n_fg_class = int(labels.max()) + 1 if len(labels) > 0 else 0
     prec = [None] * n_fg_class
     rec = [None] * n_fg_class
+    for l, (prec_l, rec_l) in zip(labels, results):
+        prec[l] = prec_l
+        rec[l] = rec_l
+    return prec, rec
+
+
+def _voc_iou(boxes1, boxes2):
+    """
+    IoU of the pairs of boxes1 and boxes2, computed as boxlist_iou does
+    on VOC boxes, which follow integer typed bounding boxes.
+    """
+    boxes1 = boxes1.copy()
+    boxes1[:, 2:] += 1
+    boxes2 = boxes2.copy()
+    boxes2[:, 2:] += 1
+    TO_REMOVE = 1
+    area1 = (boxes1[:, 2] - boxes1[:, 0] + TO_REMOVE) * (
+        boxes1[:, 3] - boxes1[:, 1] + TO_REMOVE
+    )
+    area2 = (boxes2[:, 2] - boxes2[:, 0] + TO_REMOVE) * (
+        boxes2[:, 3] - boxes2[:, 1] + TO_REMOVE
+    )
+    lt = np.maximum(boxes1[:, :2], boxes2[:, :2])
+    rb = np.minimum(boxes1[:, 2:], boxes2[:, 2:])
+    wh = np.clip(rb - lt + TO_REMOVE, 0, None)
+    inter = wh[:, 0] * wh[:, 1]
+    return inter / (area1 + area2 - inter)
+
+
+def _calc_class_prec_rec(args):
+    """
+    Matches the detections of a class with its ground truth over the whole
+    dataset. As in the VOC evaluation, each detection is assigned to the gt
+    of highest IoU in its image, and is a true positive if the IoU is above
+    iou_thresh and the gt was not assigned to a detection of higher score.
+    """
+    (det_image_ids, det_boxes, det_scores, gt_image_ids, gt_boxes,
+     gt_difficult, iou_thresh) = args
+    n_pos = np.logical_not(gt_difficult).sum()
+
+    # detections sorted by image and by decreasing score in each image
+    order = np.lexsort((-det_scores, det_image_ids))
+    det_image_ids = det_image_ids[order]
+    det_boxes = det_boxes[order]
+    det_scores = det_scores[order]
+    # gt sorted by image, in their original order in each image
+    order = np.argsort(gt_image_ids, kind="mergesort")
+    gt_image_ids = gt_image_ids[order]
+    gt_boxes = gt_boxes[order]
+    gt_difficult = gt_difficult[order]
 
-    for l in n_pos.keys():
-        score_l = np.array(score[l])
-        match_l = np.array(match[l], dtype=np.int8)
+    # all the pairs of a detection and a gt of the same image
+    gt_starts = np.searchsorted(gt_image_ids, det_image_ids, side="left")
+    gt_counts = np.searchsorted(gt_image_ids, det_image_ids, side="right") - gt_starts
+    pair_dets = np.repeat(np.arange(len(det_scores)), gt_counts)
+    pair_gts = _concat_ranges(gt_starts, gt_counts)
+    iou = _voc_iou(det_boxes[pair_dets], gt_boxes[pair_gts])
 
-        order = score_l.argsort()[::-1]
-        match_l = match_l[order]
+    # gt of highest IoU of each detection, the first one in case of ties
+    has_gt = gt_counts > 0
+    pair_starts = (np.cumsum(gt_counts) - gt_counts)[has_gt]
+    match = np.zeros(len(det_scores), dtype=np.int8)
+    if len(pair_starts) > 0:
+        max_iou = np.maximum.reduceat(iou, pair_starts)
+        is_max = iou == np.repeat(max_iou, gt_counts[has_gt])
+        pair_index = np.where(is_max, np.arange(len(iou)), len(iou))
+        best_gts = pair_gts[np.minimum.reduceat(pair_index, pair_starts)]
+
+        dets = np.nonzero(has_gt)[0][max_iou >= iou_thresh]
+        best_gts = best_gts[max_iou >= iou_thresh]
+        # a gt is only a true positive for the first detection assigned to it
+        _, first = np.unique(best_gts, return_index=True)
+        is_first = np.zeros(len(best_gts), dtype=np.bool_)
+        is_first[first] = True
+        match[dets] = np.where(
+            gt_difficult[best_gts], -1, np.where(is_first, 1, 0)
+        )
 
-        tp = np.cumsum(match_l == 1)
-        fp = np.cumsum(match_l == 0)
+    order = det_scores.argsort()[::-1]
+    match = match[order]
 
-        # If an element of fp + tp is 0,
-        # the corresponding element of prec[l] is nan.
-        prec[l] = tp / (fp + tp)
-        # If n_pos[l] is 0, rec[l] is None.
-        if n_pos[l] > 0:
-            rec[l] = tp / n_pos[l]
+    tp = np.cumsum(match == 1)
+    fp = np.cumsum(match == 0)
 
+    # If an element of fp + tp is 0,
+    # the corresponding element of prec is nan.
+    prec = tp / (fp + tp)
+    # If n_pos is 0, rec is None.
+    rec = None
+    if n_pos > 0:
+        rec = tp / n_pos
     return prec, rec
 
 
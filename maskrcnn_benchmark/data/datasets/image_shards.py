@@ -0,0 +1,178 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Packed image storage: the encoded bytes of many images are concatenated in
+a few large shard files, and an index gives the shard, offset and length of
+each image. Reading an image is then a slice of a memory-mapped file
+instead of opening a small file, which is much faster on network
+filesystems.
+
+A packed directory contains:
+    index.npz: the keys (sorted), shard ids, offsets and lengths of the images
+    shard-00000.bin, shard-00001.bin, ...: the concatenated image bytes
+"""
+import io
+import mmap
+import os
+import shutil
+
+import numpy as np
+from PIL import Image
+
+INDEX_FILE = "index.npz"
+SHARD_FILE = "shard-{:05d}.bin"
+
+
+class ImageShardWriter(object):
+    """
+    Writes images in a packed directory. Images are appended to the current
+    shard until it exceeds max_shard_size bytes, and the index is written
+    by close().
+
+    Example:
+        with ImageShardWriter("datasets/coco/train2017_packed") as writer:
+            for file_name in file_names:
+                writer.add_file(file_name, os.path.join(img_dir, file_name))
+    """
+
+    def __init__(self, output_dir, max_shard_size=2 ** 30):
+        self.output_dir = output_dir
+        self.max_shard_size = max_shard_size
+        # write everything in a temporary directory first, so that an
+        # interrupted run never leaves a partial directory behind
+        self._tmp_dir = output_dir.rstrip(os.sep) + ".tmp"
+        if os.path.exists(self._tmp_dir):
+            shutil.rmtree(self._tmp_dir)
+        os.makedirs(self._tmp_dir)
+
+        self.keys = []
+        self.shard_ids = []
+        self.offsets = []
+        self.lengths = []
+        self._shard = None
+        self._shard_id = -1
+        self._shard_size = 0
+
+    @property
+    def num_shards(self):
+        return self._shard_id + 1
+
+    def _next_shard(self):
+        if self._shard is not None:
+            self._shard.close()
+        self._shard_id += 1
+        self._shard_size = 0
+        path = os.path.join(self._tmp_dir, SHARD_FILE.format(self._shard_id))
+        self._shard = open(path, "wb")
+
+    def add(self, key, data):
+        """
+        Arguments:
+            key (str): the name under which the image is read back
+            data (bytes): the encoded image
+        """
+        if self._shard is None or (
+            self._shard_size > 0 and self._shard_size + len(data) > self.max_shard_size
+        ):
+            self._next_shard()
+        self._shard.write(data)
+        self.keys.append(key)
+        self.shard_ids.append(self._shard_id)
+        self.offsets.append(self._shard_size)
+        self.lengths.append(len(data))
+        self._shard_size += len(data)
+
+    def add_file(self, key, path):
+        with open(path, "rb") as f:
+            self.add(key, f.read())
+
+    def close(self):
+        if self._shard is not None:
+            self._shard.close()
+            self._shard = None
+
+        keys = np.array([key.encode("utf-8") for key in self.keys], dtype=np.bytes_)
+        if len(np.unique(keys)) != len(keys):
+            raise ValueError("Keys of a packed image directory must be unique")
+        # keys are sorted so that they can be looked up with a binary search
+        order = np.argsort(keys, kind="stable")
+        np.savez(
+            os.path.join(self._tmp_dir, INDEX_FILE),
+            keys=keys[order],
+            shard_ids=np.array(self.shard_ids, dtype=np.int64)[order],
+            offsets=np.array(self.offsets, dtype=np.int64)[order],
+            lengths=np.array(self.lengths, dtype=np.int64)[order],
+        )
+        if os.path.exists(self.output_dir):
+            shutil.rmtree(self.output_dir)
+        os.rename(self._tmp_dir, self.output_dir)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            if self._shard is not None:
+                self._shard.close()
+            shutil.rmtree(self._tmp_dir)
+
+
+class ImageShardReader(object):
+    """
+    Reads the images of a packed directory written by ImageShardWriter.
+    The shards are memory-mapped on first use in each process, and only
+    the index is pickled, so the reader can be sent to data loader workers.
+    """
+
+    def __init__(self, packed_dir):
+        self.packed_dir = packed_dir
+        index = np.load(os.path.join(packed_dir, INDEX_FILE))
+        self.keys = index["keys"]
+        self.shard_ids = index["shard_ids"]
+        self.offsets = index["offsets"]
+        self.lengths = index["lengths"]
+        self._shards = {}
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _position(self, key):
+        key = key.encode("utf-8")
+        position = np.searchsorted(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            raise KeyError(key.decode("utf-8"))
+        return position
+
+    def __contains__(self, key):
+        try:
+            self._position(key)
+        except KeyError:
+            return False
+        return True
+
+    def _get_shard(self, shard_id):
+        shard = self._shards.get(shard_id)
+        if shard is None:
+            path = os.path.join(self.packed_dir, SHARD_FILE.format(shard_id))
+            with open(path, "rb") as f:
+                shard = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._shards[shard_id] = shard
+        return shard
+
+    def get_bytes(self, key):
+        position = self._position(key)
+        shard = self._get_shard(int(self.shard_ids[position]))
+        offset = int(self.offsets[position])
+        return shard[offset: offset + int(self.lengths[position])]
+
+    def open_image(self, key):
+        """
+        Returns the image stored under key as an RGB PIL Image.
+        """
+        return Image.open(io.BytesIO(self.get_bytes(key))).convert("RGB")
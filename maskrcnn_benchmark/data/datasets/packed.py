@@ -0,0 +1,48 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Datasets reading their images from a packed directory (see image_shards.py)
+instead of one file per image. Packed directories are written with
+tools/pack_images.py.
+"""
+import os
+
+from maskrcnn_benchmark.data.datasets.coco import COCODataset
+from maskrcnn_benchmark.data.datasets.image_shards import ImageShardReader
+from maskrcnn_benchmark.data.datasets.voc import PascalVOCDataset
+
+
+class PackedCOCODataset(COCODataset):
+    """
+    COCODataset whose images are stored in a packed directory, under
+    their file_name in the annotation file.
+    """
+
+    def __init__(
+        self, ann_file, image_shards, remove_images_without_annotations,
+        transforms=None, annotation_cache=None,
+    ):
+        super(PackedCOCODataset, self).__init__(
+            ann_file, image_shards, remove_images_without_annotations,
+            transforms=transforms, annotation_cache=annotation_cache,
+        )
+        self.image_shards = ImageShardReader(image_shards)
+
+    def load_image(self, file_name):
+        return self.image_shards.open_image(file_name)
+
+
+class PackedPascalVOCDataset(PascalVOCDataset):
+    """
+    PascalVOCDataset whose images are stored in a packed directory, under
+    their path relative to the JPEGImages directory. The annotations are
+    still read from data_dir.
+    """
+
+    def __init__(self, data_dir, image_shards, split, use_difficult=False, transforms=None):
+        super(PackedPascalVOCDataset, self).__init__(
+            data_dir, split, use_difficult=use_difficult, transforms=transforms
+        )
+        self.image_shards = ImageShardReader(image_shards)
+
+    def load_image(self, img_id):
+        return self.image_shards.open_image(os.path.basename(self._imgpath % img_id))
@@ -1,5 +1,7 @@
+import logging
 import os
 
+import numpy as np
 import torch
 import torch.utils.data
 from PIL import Image
@@ -40,6 +42,9 @@ class PascalVOCDataset(torch.utils.data.Dataset):
         "tvmonitor",
     )
 
+    # version of the format of the annotation index
+    INDEX_VERSION = 1
+
     def __init__(self, data_dir, split, use_difficult=False, transforms=None):
         self.root = data_dir
         self.image_set = split
@@ -49,6 +54,9 @@ class PascalVOCDataset(torch.utils.data.Dataset):
         self._annopath = os.path.join(self.root, "Annotations", "%s.xml")
         self._imgpath = os.path.join(self.root, "JPEGImages", "%s.jpg")
         self._imgsetpath = os.path.join(self.root, "ImageSets", "Main", "%s.txt")
+        self._indexpath = os.path.join(
+            self.root, "ImageSets", "Main", "%s_annotations.npz"
+        )
 
         with open(self._imgsetpath % self.image_set) as f:
             self.ids = f.readlines()
@@ -59,9 +67,11 @@ class PascalVOCDataset(torch.utils.data.Dataset):
         self.class_to_ind = dict(zip(cls, range(len(cls))))
         self.categories = dict(zip(range(len(cls)), cls))
 
+        self._load_annotation_index()
+
     def __getitem__(self, index):
         img_id = self.ids[index]
-        img = Image.open(self._imgpath % img_id).convert("RGB")
+        img = self.load_image(img_id)
 
         target = self.get_groundtruth(index)
         target = target.clip_to_image(remove_empty=True)
@@ -74,18 +84,30 @@ class PascalVOCDataset(torch.utils.data.Dataset):
     def __len__(self):
         return len(self.ids)
 
-    def get_groundtruth(self, index):
-        img_id = self.ids[index]
-        anno = ET.parse(self._annopath % img_id).getroot()
-        anno = self._preprocess_annotation(anno)
+    def load_image(self, img_id):
+        return Image.open(self._imgpath % img_id).convert("RGB")
 
-        height, width = anno["im_info"]
-        target = BoxList(anno["boxes"], (width, height), mode="xyxy")
-        target.add_field("labels", anno["labels"])
-        target.add_field("difficult", anno["difficult"])
+    def get_groundtruth(self, index):
+        start, end = self._ann_offsets[index: index + 2]
+        boxes = self._boxes[start:end]
+        labels = self._labels[start:end]
+        difficult = self._difficult[start:end]
+        if not self.keep_difficult:
+            boxes = boxes[~difficult]
+            labels = labels[~difficult]
+            difficult = difficult[~difficult]
+
+        height, width = self._sizes[index].tolist()
+        target = BoxList(torch.from_numpy(boxes.copy()), (width, height), mode="xyxy")
+        target.add_field("labels", torch.from_numpy(labels.copy()))
+        target.add_field("difficult", torch.from_numpy(difficult.copy()))
         return target
 
     def _preprocess_annotation(self, target):
+        """
+        Returns all the objects of an annotation, including the difficult
+        ones, as numpy arrays.
+        """
         boxes = []
         gt_classes = []
         difficult_boxes = []
@@ -93,8 +115,6 @@ class PascalVOCDataset(torch.utils.data.Dataset):
 
         for obj in target.iter("object"):
             difficult = int(obj.find("difficult").text) == 1
-            if not self.keep_difficult and difficult:
-                continue
             name = obj.find("name").text.lower().strip()
             bb = obj.find("bndbox")
             # Make pixel indexes 0-based
@@ -117,19 +137,96 @@ class PascalVOCDataset(torch.utils.data.Dataset):
         im_info = tuple(map(int, (size.find("height").text, size.find("width").text)))
 
         res = {
-            "boxes": torch.tensor(boxes, dtype=torch.float32),
-            "labels": torch.tensor(gt_classes),
-            "difficult": torch.tensor(difficult_boxes),
+            "boxes": np.array(boxes, dtype=np.float32).reshape(-1, 4),
+            "labels": np.array(gt_classes, dtype=np.int64),
+            "difficult": np.array(difficult_boxes, dtype=np.bool_),
             "im_info": im_info,
         }
         return res
 
+    def _annotation_mtimes(self):
+        return np.array(
+            [os.path.getmtime(self._annopath % img_id) for img_id in self.ids],
+            dtype=np.float64,
+        )
+
+    def _load_annotation_index(self):
+        """
+        Loads the sizes, boxes, labels and difficult flags of all the images
+        of the split from an index stored next to the split file, so that
+        the XML annotations are parsed only once. The index is rebuilt if
+        the split or any of its annotation files changed since it was saved.
+        """
+        index_file = self._indexpath % self.image_set
+        mtimes = self._annotation_mtimes()
+        ids = np.array([img_id.encode("utf-8") for img_id in self.ids], dtype=np.bytes_)
+        if os.path.exists(index_file):
+            with np.load(index_file) as index:
+                if (
+                    int(index["version"]) == self.INDEX_VERSION
+                    and np.array_equal(index["ids"], ids)
+                    and np.array_equal(index["mtimes"], mtimes)
+                ):
+                    self._set_annotation_index(index)
+                    return
+
+        annos = [
+            self._preprocess_annotation(ET.parse(self._annopath % img_id).getroot())
+            for img_id in self.ids
+        ]
+        lengths = [len(anno["labels"]) for anno in annos]
+        index = {
+            "version": np.array(self.INDEX_VERSION),
+            "ids": ids,
+            "mtimes": mtimes,
+            # (height, width) of each image
+            "sizes": np.array(
+                [anno["im_info"] for anno in annos], dtype=np.int64
+            ).reshape(-1, 2),
+            "ann_offsets": np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64),
+            "boxes": np.concatenate(
+                [anno["boxes"] for anno in annos] + [np.zeros((0, 4), np.float32)]
+            ),
+            "labels": np.concatenate(
+                [anno["labels"] for anno in annos] + [np.zeros(0, np.int64)]
+            ),
+            "difficult": np.concatenate(
+                [anno["difficult"] for anno in annos] + [np.zeros(0, np.bool_)]
+            ),
+        }
+        self._set_annotation_index(index)
+
+        # written to a temporary file first, so that concurrent processes
+        # never read a partial index
+        tmp_file = "{}.{}.tmp".format(index_file, os.getpid())
+        try:
+            with open(tmp_file, "wb") as f:
+                np.savez(f, **index)
+            os.replace(tmp_file, index_file)
+        except OSError as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            logger = logging.getLogger(__name__)
+            logger.warning(
+                "Could not save the annotation index {}: {}".format(index_file, e)
+            )
+
+    def _set_annotation_index(self, index):
+        self._sizes = index["sizes"]
+        self._ann_offsets = index["ann_offsets"]
+        self._boxes = index["boxes"]
+        self._labels = index["labels"]
+        self._difficult = index["difficult"]
+
     def get_img_info(self, index):
-        img_id = self.ids[index]
-        anno = ET.parse(self._annopath % img_id).getroot()
-        size = anno.find("size")
-        im_info = tuple(map(int, (size.find("height").text, size.find("width").text)))
-        return {"height": im_info[0], "width": im_info[1]}
+        height, width = self._sizes[index].tolist()
+        return {"height": height, "width": width}
+
+    def get_image_sizes(self):
+        """
+        Returns an (N, 2) array with the (height, width) of each image.
+        """
+        return self._sizes
 
     def map_class_id_to_class_name(self, class_id):
         return PascalVOCDataset.CLASSES[class_id]
@@ -0,0 +1,166 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Image sizes of a dataset, as needed to set up the batch samplers.
+
+The sizes are read in a single call from the datasets which keep them in an
+array (see ``get_image_sizes`` of COCODataset and PascalVOCDataset), and
+queried image by image with ``get_img_info`` otherwise. Since the latter can
+take a while for large datasets, the sizes are cached on disk under a name
+derived from the dataset name and a fingerprint of its annotation files, so
+that they are computed once, by the main process, and read by all the ranks
+of the following launches.
+"""
+import hashlib
+import logging
+import os
+import re
+
+import numpy as np
+
+from maskrcnn_benchmark.utils.comm import is_main_process
+from maskrcnn_benchmark.utils.comm import synchronize
+
+from . import datasets as D
+
+
+def compute_image_sizes(dataset):
+    """
+    Returns an (N, 2) int64 array with the (height, width) of each image
+    of the dataset.
+    """
+    if isinstance(dataset, D.ConcatDataset):
+        return np.concatenate(
+            [compute_image_sizes(d) for d in dataset.datasets]
+            + [np.zeros((0, 2), dtype=np.int64)]
+        )
+    if hasattr(dataset, "get_image_sizes"):
+        return np.asarray(dataset.get_image_sizes(), dtype=np.int64).reshape(-1, 2)
+    sizes = np.zeros((len(dataset), 2), dtype=np.int64)
+    for i in range(len(dataset)):
+        img_info = dataset.get_img_info(i)
+        sizes[i] = img_info["height"], img_info["width"]
+    return sizes
+
+
+def compute_resized_sizes(sizes, min_size, max_size):
+    """
+    Vectorized version of transforms.Resize.get_size: returns the (height,
+    width) of the images of the given (height, width) sizes once they are
+    resized such that their smallest side is min_size, and their largest
+    side is at most max_size.
+    """
+    sizes = np.asarray(sizes, dtype=np.int64).reshape(-1, 2)
+    h, w = sizes[:, 0], sizes[:, 1]
+    min_original_size = np.minimum(h, w).astype(np.float64)
+    max_original_size = np.maximum(h, w).astype(np.float64)
+    size = np.full(len(sizes), min_size, dtype=np.int64)
+    if max_size is not None:
+        too_large = max_original_size / min_original_size * min_size > max_size
+        size[too_large] = np.round(
+            max_size * min_original_size[too_large] / max_original_size[too_large]
+        )
+    resized = np.empty_like(sizes)
+    portrait = w < h
+    resized[:, 0] = np.where(portrait, (size * h / w).astype(np.int64), size)
+    resized[:, 1] = np.where(portrait, size, (size * w / h).astype(np.int64))
+    return resized
+
+
+def _annotation_files(dataset):
+    if isinstance(dataset, D.ConcatDataset):
+        files = [_annotation_files(d) for d in dataset.datasets]
+        if any(f is None for f in files):
+            return None
+        return sum(files, [])
+    ann_file = getattr(dataset, "ann_file", None)
+    if ann_file is not None:
+        return [ann_file]
+    if isinstance(dataset, D.PascalVOCDataset):
+        # the annotation index is rewritten whenever an annotation changes
+        return [
+            dataset._imgsetpath % dataset.image_set,
+            dataset._indexpath % dataset.image_set,
+        ]
+    return None
+
+
+def dataset_fingerprint(dataset):
+    """
+    Returns a hash of the type, the image ids and the annotation files of
+    the dataset, or None if its annotation files are not known.
+    """
+    files = _annotation_files(dataset)
+    if files is None:
+        return None
+    sha = hashlib.sha1()
+    sha.update(type(dataset).__name__.encode("utf-8"))
+    datasets = dataset.datasets if isinstance(dataset, D.ConcatDataset) else [dataset]
+    for d in datasets:
+        ids = getattr(d, "ids", range(len(d)))
+        sha.update(repr(len(ids)).encode("utf-8"))
+        sha.update("\n".join(str(img_id) for img_id in ids).encode("utf-8"))
+    for path in files:
+        if not os.path.exists(path):
+            return None
+        stat = os.stat(path)
+        sha.update(
+            "{}:{}:{}".format(os.path.abspath(path), stat.st_size, stat.st_mtime)
+            .encode("utf-8")
+        )
+    return sha.hexdigest()[:16]
+
+
+class ImageMetadataCache(object):
+    """
+    Caches the image sizes of the datasets in cache_dir. If cache_dir is
+    None, the sizes are computed on each call.
+    """
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = cache_dir
+
+    def cache_file(self, dataset, name):
+        if not self.cache_dir:
+            return None
+        fingerprint = dataset_fingerprint(dataset)
+        if fingerprint is None:
+            return None
+        name = re.sub(r"[^\w.+-]", "_", name)
+        return os.path.join(self.cache_dir, "{}_{}.npy".format(name, fingerprint))
+
+    def get_image_sizes(self, dataset, name):
+        """
+        Returns an (N, 2) int64 array with the (height, width) of each image
+        of the dataset. This must be called by all the processes.
+        """
+        cache_file = self.cache_file(dataset, name)
+        if cache_file is None:
+            return compute_image_sizes(dataset)
+
+        if is_main_process() and not os.path.exists(cache_file):
+            self._save(cache_file, compute_image_sizes(dataset))
+        synchronize()
+
+        try:
+            sizes = np.load(cache_file)
+        except (OSError, ValueError):
+            # e.g. the cache directory is not shared between the nodes
+            return compute_image_sizes(dataset)
+        if sizes.shape != (len(dataset), 2):
+            return compute_image_sizes(dataset)
+        return sizes
+
+    def _save(self, cache_file, sizes):
+        # written to a temporary file first, so that concurrent processes
+        # never read a partial file
+        tmp_file = "{}.{}.tmp".format(cache_file, os.getpid())
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_file, "wb") as f:
+                np.save(f, sizes)
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            logger = logging.getLogger(__name__)
+            logger.warning("Could not save the image sizes {}: {}".format(cache_file, e))
@@ -2,5 +2,13 @@
 from .distributed import DistributedSampler
 from .grouped_batch_sampler import GroupedBatchSampler
 from .iteration_based_batch_sampler import IterationBasedBatchSampler
+from .size_bucketed_batch_sampler import SizeBucketedBatchSampler
+from .size_bucketed_batch_sampler import compute_padding_stats
 
-__all__ = ["DistributedSampler", "GroupedBatchSampler", "IterationBasedBatchSampler"]
+__all__ = [
+    "DistributedSampler",
+    "GroupedBatchSampler",
+    "IterationBasedBatchSampler",
+    "SizeBucketedBatchSampler",
+    "compute_padding_stats",
+]
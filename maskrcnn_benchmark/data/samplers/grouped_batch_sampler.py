@@ -100,13 +100,19 @@ class GroupedBatchSampler(BatchSampler):
         return batches
 
     def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, start):
+        """
+        Same as iter(self), but starting from the batch of index start.
+        """
         if self._can_reuse_batches:
             batches = self._batches
             self._can_reuse_batches = False
         else:
             batches = self._prepare_batches()
         self._batches = batches
-        return iter(batches)
+        return iter(batches[start:])
 
     def __len__(self):
         if not hasattr(self, "_batches"):
@@ -1,31 +1,96 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import bisect
+import itertools
+
 from torch.utils.data.sampler import BatchSampler
 
 
 class IterationBasedBatchSampler(BatchSampler):
     """
     Wraps a BatchSampler, resampling from it until
-    a specified number of iterations have been sampled
+    a specified number of iterations have been sampled.
+
+    Each pass over the BatchSampler is identified by the iteration at which
+    it starts, which is also the epoch given to the underlying sampler. With
+    a state from state_dict, the sampling resumes at the same batch of the
+    same pass as the sampling which produced the state.
     """
 
-    def __init__(self, batch_sampler, num_iterations, start_iter=0):
+    def __init__(self, batch_sampler, num_iterations, start_iter=0, state=None):
         self.batch_sampler = batch_sampler
         self.num_iterations = num_iterations
         self.start_iter = start_iter
+        if state is not None:
+            assert state["epoch"] + state["batch"] == start_iter, (
+                "The sampler state {} does not match the start iteration {}".format(
+                    state, start_iter
+                )
+            )
+        self.state = state
+        # the iterations at which each pass over the batch sampler started
+        self._epoch_starts = []
+
+    def _iter_batches(self, start):
+        """
+        Iterates over the batches of the batch sampler from the batch of index
+        start, without building the previous batches if the batch sampler
+        has an iter_from method or is a plain BatchSampler.
+        """
+        if start == 0:
+            return iter(self.batch_sampler)
+        if hasattr(self.batch_sampler, "iter_from"):
+            return self.batch_sampler.iter_from(start)
+        if type(self.batch_sampler) is BatchSampler:
+            return self._iter_plain_batches(start)
+        return itertools.islice(iter(self.batch_sampler), start, None)
+
+    def _iter_plain_batches(self, start):
+        # a BatchSampler splits the sampled indices in order, so the indices
+        # of the first start batches are skipped directly
+        batch_size = self.batch_sampler.batch_size
+        indices = list(self.batch_sampler.sampler)[start * batch_size:]
+        for i in range(0, len(indices), batch_size):
+            batch = indices[i:i + batch_size]
+            if len(batch) < batch_size and self.batch_sampler.drop_last:
+                return
+            yield batch
 
     def __iter__(self):
         iteration = self.start_iter
+        if self.state is not None:
+            epoch, start = self.state["epoch"], self.state["batch"]
+        else:
+            epoch, start = iteration, 0
+        self._epoch_starts = []
         while iteration <= self.num_iterations:
             # if the underlying sampler has a set_epoch method, like
             # DistributedSampler, used for making each process see
             # a different split of the dataset, then set it
             if hasattr(self.batch_sampler.sampler, "set_epoch"):
-                self.batch_sampler.sampler.set_epoch(iteration)
-            for batch in self.batch_sampler:
+                self.batch_sampler.sampler.set_epoch(epoch)
+            self._epoch_starts.append(epoch)
+            for batch in self._iter_batches(start):
                 iteration += 1
                 if iteration > self.num_iterations:
                     break
                 yield batch
+            epoch, start = iteration, 0
+
+    def state_dict(self, iteration):
+        """
+        Returns the state of the sampling after the given number of
+        iterations, which can be passed to the constructor to resume it.
+        Since the data loader fetches batches ahead of the training, this
+        is not necessarily the last batch which was sampled.
+        """
+        idx = bisect.bisect_right(self._epoch_starts, iteration) - 1
+        if idx < 0:
+            raise ValueError(
+                "Iteration {} was not sampled, the first pass started "
+                "at {}".format(iteration, self._epoch_starts[:1])
+            )
+        epoch = self._epoch_starts[idx]
+        return {"epoch": epoch, "batch": iteration - epoch}
 
     def __len__(self):
         return self.num_iterations
@@ -0,0 +1,143 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import numpy as np
+import torch
+from torch.utils.data.sampler import BatchSampler
+from torch.utils.data.sampler import Sampler
+
+
+def _padded(sizes, size_divisibility):
+    if size_divisibility > 0:
+        sizes = -(-sizes // size_divisibility) * size_divisibility
+    return sizes
+
+
+def compute_padding_stats(batches, image_sizes, size_divisibility=0):
+    """
+    Returns the number of pixels of the images in the batches, the number of
+    pixels of the padded batches, as done by to_image_list, and the fraction
+    of the latter which is padding.
+
+    Arguments:
+        batches (list[list[int]]): indices of the images in each batch
+        image_sizes (array[N, 2]): (height, width) of each image, once resized
+        size_divisibility (int): the padded batches have sizes which are a
+            multiple of size_divisibility
+    """
+    image_sizes = np.asarray(image_sizes, dtype=np.int64).reshape(-1, 2)
+    batches = [batch for batch in batches if len(batch) > 0]
+    if len(batches) == 0:
+        return {"image_area": 0, "padded_area": 0, "padding_waste": 0.0}
+    lengths = np.array([len(batch) for batch in batches])
+    sizes = image_sizes[np.concatenate(batches)]
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    batch_sizes = _padded(np.maximum.reduceat(sizes, starts, axis=0), size_divisibility)
+    image_area = int(np.prod(sizes, axis=1).sum())
+    padded_area = int((np.prod(batch_sizes, axis=1) * lengths).sum())
+    return {
+        "image_area": image_area,
+        "padded_area": padded_area,
+        "padding_waste": 1.0 - float(image_area) / padded_area,
+    }
+
+
+class SizeBucketedBatchSampler(BatchSampler):
+    """
+    Wraps another sampler to yield mini-batches of indices of images with
+    similar padded sizes, so that little of each collated batch is padding.
+    The indices from the sampler are taken by windows of window_size
+    batches, which are sorted by orientation and padded size before being
+    split into batches. As in GroupedBatchSampler, the batches of each
+    window are then ordered by their first element in the sampler order,
+    and the indices of each batch follow the sampler order.
+
+    Arguments:
+        sampler (Sampler): Base sampler.
+        image_sizes (array[N, 2]): (height, width) of each image, once resized.
+        batch_size (int): Size of mini-batch.
+        size_divisibility (int): the collated batches are padded to a multiple
+            of size_divisibility.
+        window_size (int): number of batches in each window. Larger windows
+            give less padding, but batches further from the sampler order.
+        drop_uneven (bool): If ``True``, the sampler will drop the batches whose
+            size is less than ``batch_size``
+    """
+
+    def __init__(
+        self, sampler, image_sizes, batch_size, size_divisibility=0, window_size=64,
+        drop_uneven=False,
+    ):
+        if not isinstance(sampler, Sampler):
+            raise ValueError(
+                "sampler should be an instance of "
+                "torch.utils.data.Sampler, but got sampler={}".format(sampler)
+            )
+        self.sampler = sampler
+        self.image_sizes = np.asarray(image_sizes, dtype=np.int64).reshape(-1, 2)
+        self.batch_size = batch_size
+        self.size_divisibility = size_divisibility
+        self.window_size = window_size
+        self.drop_uneven = drop_uneven
+
+        # lexicographic sort key of the (orientation, height, width) of the
+        # padded images
+        padded_sizes = _padded(self.image_sizes, size_divisibility)
+        height, width = padded_sizes[:, 0], padded_sizes[:, 1]
+        portrait = (height > width).astype(np.int64)
+        max_height = int(height.max(initial=0)) + 1
+        max_width = int(width.max(initial=0)) + 1
+        self._keys = (portrait * max_height + height) * max_width + width
+
+        self._can_reuse_batches = False
+
+    def _prepare_batches(self):
+        sampled_ids = torch.as_tensor(list(self.sampler), dtype=torch.int64).numpy()
+        window = self.batch_size * self.window_size
+        batches = []
+        for start in range(0, len(sampled_ids), window):
+            ids = sampled_ids[start:start + window]
+            # the sort is stable, so that images of the same padded size
+            # stay in the sampler order
+            order = np.argsort(self._keys[ids], kind="stable")
+            window_batches = [
+                np.sort(order[i:i + self.batch_size])
+                for i in range(0, len(order), self.batch_size)
+            ]
+            window_batches.sort(key=lambda batch: batch[0])
+            batches.extend(ids[batch].tolist() for batch in window_batches)
+
+        if self.drop_uneven:
+            batches = [batch for batch in batches if len(batch) == self.batch_size]
+        return batches
+
+    def padding_stats(self):
+        """
+        Returns the padding statistics (see compute_padding_stats) of the
+        batches of the last epoch, or of the next one before the first epoch.
+        """
+        if hasattr(self, "_batches"):
+            batches = self._batches
+        else:
+            # not kept, since the sampler epoch might change before iterating
+            batches = self._prepare_batches()
+        return compute_padding_stats(batches, self.image_sizes, self.size_divisibility)
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def iter_from(self, start):
+        """
+        Same as iter(self), but starting from the batch of index start.
+        """
+        if self._can_reuse_batches:
+            batches = self._batches
+            self._can_reuse_batches = False
+        else:
+            batches = self._prepare_batches()
+        self._batches = batches
+        return iter(batches[start:])
+
+    def __len__(self):
+        if not hasattr(self, "_batches"):
+            self._batches = self._prepare_batches()
+            self._can_reuse_batches = True
+        return len(self._batches)
@@ -1,46 +1,193 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import collections
 import logging
+import queue
+import threading
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import torch
 from tqdm import tqdm
 
 from maskrcnn_benchmark.config import cfg
 from maskrcnn_benchmark.data.datasets.evaluation import evaluate
-from ..utils.comm import is_main_process, get_world_size
-from ..utils.comm import all_gather
+from maskrcnn_benchmark.data.datasets.evaluation import make_prediction_converter
+from ..utils.comm import is_main_process, get_world_size, get_rank
+from ..utils.comm import gather
 from ..utils.comm import synchronize
 from ..utils.timer import Timer, get_time_str
 from .bbox_aug import im_detect_bbox_aug
+from .prediction_store import PredictionReader, PredictionWriter
 
 
-def compute_on_dataset(model, data_loader, device, timer=None):
+def _run_model(model, images, device, timer=None):
+    with torch.no_grad():
+        if timer:
+            timer.tic()
+        if cfg.TEST.BBOX_AUG.ENABLED:
+            output = im_detect_bbox_aug(model, images, device)
+        else:
+            output = model(images.to(device))
+        if timer:
+            if not cfg.MODEL.DEVICE == 'cpu':
+                torch.cuda.synchronize()
+            timer.toc()
+    return output
+
+
+def compute_on_dataset(model, data_loader, device, timer=None, writer=None):
+    """
+    If a PredictionWriter is given, the predictions are streamed to it instead
+    of being returned.
+    """
     model.eval()
     results_dict = {}
     cpu_device = torch.device("cpu")
     for _, batch in enumerate(tqdm(data_loader)):
         images, targets, image_ids = batch
-        with torch.no_grad():
-            if timer:
-                timer.tic()
-            if cfg.TEST.BBOX_AUG.ENABLED:
-                output = im_detect_bbox_aug(model, images, device)
-            else:
-                output = model(images.to(device))
-            if timer:
-                if not cfg.MODEL.DEVICE == 'cpu':
-                    torch.cuda.synchronize()
-                timer.toc()
-            output = [o.to(cpu_device) for o in output]
+        output = _run_model(model, images, device, timer)
+        output = [o.to(cpu_device) for o in output]
+        if writer is not None:
+            for img_id, result in zip(image_ids, output):
+                writer.add(img_id, result)
+            continue
         results_dict.update(
             {img_id: result for img_id, result in zip(image_ids, output)}
         )
     return results_dict
 
 
+def _prefetch(iterable, queue_size, poll_interval=0.1):
+    """
+    Iterates over iterable in a background thread, which runs at most
+    queue_size items ahead of the consumer. If the consumer stops early (it
+    raised, or closed the generator), the thread is stopped and the items
+    waiting in the queue are released.
+    """
+    items = queue.Queue(queue_size)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # the queue may stay full if the consumer stopped: poll the stop event
+        # instead of blocking forever
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=poll_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except Exception as e:
+            put((None, e))
+            return
+        put((done, None))
+
+    # daemon, so that a producer blocked in iterable doesn't hang the process
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item, error = items.get()
+            if error is not None:
+                raise error
+            if item is done:
+                return
+            yield item
+    finally:
+        stop.set()
+        while producer.is_alive():
+            try:
+                items.get(timeout=poll_interval)
+            except queue.Empty:
+                pass
+        producer.join()
+
+
+def compute_on_dataset_pipelined(
+    model, data_loader, device, timer=None, convert=None, queue_size=4,
+    num_convert_workers=4, writer=None,
+):
+    """
+    Same as compute_on_dataset, but the stages run concurrently: the next
+    batches are loaded in a background thread while the model runs, and the
+    outputs are moved to the CPU and converted by `convert` (see
+    make_prediction_converter) in worker threads. At most queue_size batches
+    wait between two stages, which bounds the memory used. If a
+    PredictionWriter is given, the predictions are also encoded by the
+    worker threads and streamed to it instead of being returned.
+
+    Returns:
+        results_dict (dict): the prediction of each image index
+        converted_dict (dict): the output of convert for each image index,
+            empty if convert is None
+    """
+    model.eval()
+    results_dict = {}
+    converted_dict = {}
+    cpu_device = torch.device("cpu")
+    transfer_executor = ThreadPoolExecutor(1)
+    convert_executor = None
+    if convert is not None or writer is not None:
+        convert_executor = ThreadPoolExecutor(num_convert_workers)
+
+    def transfer(output, image_ids):
+        output = [o.to(cpu_device) for o in output]
+        converted, encoded = [], []
+        if convert is not None:
+            converted = [
+                convert_executor.submit(convert, img_id, result)
+                for img_id, result in zip(image_ids, output)
+            ]
+        if writer is not None:
+            encoded = [
+                convert_executor.submit(writer.encode, img_id, result)
+                for img_id, result in zip(image_ids, output)
+            ]
+            output = []
+        return image_ids, output, converted, encoded
+
+    def collect(transferred):
+        image_ids, output, converted, encoded = transferred.result()
+        results_dict.update(zip(image_ids, output))
+        converted_dict.update(
+            (img_id, result.result()) for img_id, result in zip(image_ids, converted)
+        )
+        for img_id, record in zip(image_ids, encoded):
+            writer.write(img_id, record.result())
+
+    pending = collections.deque()
+    batches = _prefetch(data_loader, queue_size)
+    try:
+        for images, targets, image_ids in tqdm(batches, total=len(data_loader)):
+            output = _run_model(model, images, device, timer)
+            pending.append(transfer_executor.submit(transfer, output, image_ids))
+            # wait for the oldest batch once the pipeline is full
+            while len(pending) > queue_size:
+                collect(pending.popleft())
+        while pending:
+            collect(pending.popleft())
+    finally:
+        # stops the loading thread if the model raised
+        batches.close()
+        transfer_executor.shutdown()
+        if convert_executor is not None:
+            convert_executor.shutdown()
+    return results_dict, converted_dict
+
+
 def _accumulate_predictions_from_multiple_gpus(predictions_per_gpu):
-    all_predictions = all_gather(predictions_per_gpu)
+    # only the main process needs the predictions of all the processes
+    all_predictions = gather(
+        predictions_per_gpu, dst=0, shared_dir=cfg.TEST.GATHER_SHARED_DIR or None
+    )
     if not is_main_process():
         return
     # merge the list of dicts
@@ -78,10 +225,44 @@ def inference(
     logger = logging.getLogger("maskrcnn_benchmark.inference")
     dataset = data_loader.dataset
     logger.info("Start evaluation on {} dataset({} images).".format(dataset_name, len(dataset)))
+    extra_args = dict(
+        box_only=box_only,
+        iou_types=iou_types,
+        expected_results=expected_results,
+        expected_results_sigma_tol=expected_results_sigma_tol,
+        num_workers=cfg.TEST.EVAL_NUM_WORKERS,
+        coco_eval_backend=cfg.TEST.COCO_EVAL_BACKEND,
+    )
     total_timer = Timer()
     inference_timer = Timer()
     total_timer.tic()
-    predictions = compute_on_dataset(model, data_loader, device, inference_timer)
+    writer = None
+    if cfg.TEST.STREAM_PREDICTIONS.ENABLED:
+        if output_folder:
+            writer = PredictionWriter(
+                os.path.join(output_folder, "predictions"), dataset, get_rank(),
+                images_per_shard=cfg.TEST.STREAM_PREDICTIONS.IMAGES_PER_SHARD,
+            )
+        else:
+            logger.warning(
+                "Streaming the predictions needs an output folder, "
+                "keeping them in memory instead"
+            )
+    convert = None
+    if cfg.TEST.PIPELINE.ENABLED:
+        convert = make_prediction_converter(dataset, **extra_args)
+        predictions, converted_predictions = compute_on_dataset_pipelined(
+            model, data_loader, device, inference_timer, convert,
+            queue_size=cfg.TEST.PIPELINE.QUEUE_SIZE,
+            num_convert_workers=cfg.TEST.PIPELINE.NUM_CONVERT_WORKERS,
+            writer=writer,
+        )
+    else:
+        predictions = compute_on_dataset(
+            model, data_loader, device, inference_timer, writer
+        )
+    if writer is not None:
+        writer.close()
     # wait for all processes to complete before measuring the time
     synchronize()
     total_time = total_timer.toc()
@@ -100,20 +281,22 @@ def inference(
         )
     )
 
-    predictions = _accumulate_predictions_from_multiple_gpus(predictions)
+    if writer is None:
+        predictions = _accumulate_predictions_from_multiple_gpus(predictions)
+    if convert is not None:
+        converted_predictions = _accumulate_predictions_from_multiple_gpus(
+            converted_predictions
+        )
+        extra_args["converted_predictions"] = converted_predictions
     if not is_main_process():
         return
 
-    if output_folder:
+    if writer is not None:
+        # the predictions of all the processes are read back lazily
+        predictions = PredictionReader(writer.output_dir, num_devices)
+    elif output_folder:
         torch.save(predictions, os.path.join(output_folder, "predictions.pth"))
 
-    extra_args = dict(
-        box_only=box_only,
-        iou_types=iou_types,
-        expected_results=expected_results,
-        expected_results_sigma_tol=expected_results_sigma_tol,
-    )
-
     return evaluate(dataset=dataset,
                     predictions=predictions,
                     output_folder=output_folder,
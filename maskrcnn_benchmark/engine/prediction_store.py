@@ -0,0 +1,175 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Streaming storage of the predictions made during inference.
+
+Each process writes compact per-image records to its own shard files as
+the predictions are produced, instead of keeping all of them in memory
+until the end of inference. The main process then reads them back lazily,
+one shard at a time, during evaluation.
+"""
+import glob
+import os
+import pickle
+
+import numpy as np
+import pycocotools.mask as mask_util
+import torch
+
+from maskrcnn_benchmark.modeling.roi_heads.mask_head.inference import Masker
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.segmentation_mask import RLEMaskList
+
+SHARD_FILE = "rank{:03d}-{:05d}.pkl"
+INDEX_FILE = "rank{:03d}-index.pkl"
+
+
+def encode_prediction(prediction, size, masker):
+    """
+    Converts a prediction to a compact record: the prediction is resized to
+    the original image size, its masks are pasted in the image and run-length
+    encoded, and its tensors are converted to numpy arrays.
+    """
+    prediction = prediction.convert("xyxy").resize(size)
+    fields = {}
+    for name in prediction.fields():
+        value = prediction.get_field(name)
+        if name == "mask" and isinstance(value, torch.Tensor):
+            width, height = size
+            # Masker is necessary only if masks haven't been already resized.
+            if list(value.shape[-2:]) != [height, width]:
+                rles = masker.encode_single_image(value, prediction)
+            else:
+                rles = [
+                    mask_util.encode(np.array(mask[0, :, :, np.newaxis], order="F"))[0]
+                    for mask in value.to(torch.uint8)
+                ]
+                for rle in rles:
+                    rle["counts"] = rle["counts"].decode("utf-8")
+            value = RLEMaskList(rles, size)
+        elif isinstance(value, torch.Tensor):
+            value = value.numpy()
+        fields[name] = value
+    return {"bbox": prediction.bbox.numpy(), "size": size, "fields": fields}
+
+
+def decode_prediction(record):
+    """
+    Inverse of encode_prediction, returns a BoxList in xyxy mode.
+    """
+    boxlist = BoxList(torch.from_numpy(record["bbox"]), record["size"], mode="xyxy")
+    for name, value in record["fields"].items():
+        if isinstance(value, np.ndarray):
+            value = torch.from_numpy(value)
+        boxlist.add_field(name, value)
+    return boxlist
+
+
+class PredictionWriter(object):
+    """
+    Writes the predictions of one process to shard files in output_dir, each
+    holding the records of images_per_shard images. Only the records of the
+    current shard are kept in memory.
+
+    encode() is thread-safe, so that the records can be computed by worker
+    threads, while write() must be called from a single thread. An image
+    written twice, e.g. when DistributedSampler pads the last ranks with
+    duplicate indices, is only recorded the first time.
+    """
+
+    def __init__(self, output_dir, dataset, rank=0, images_per_shard=500, masker=None):
+        self.output_dir = output_dir
+        self.dataset = dataset
+        self.rank = rank
+        self.images_per_shard = images_per_shard
+        if masker is None:
+            masker = Masker(threshold=0.5, padding=1)
+        self.masker = masker
+
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+        # remove the files written by this rank in a previous run
+        prefix = os.path.join(output_dir, "rank{:03d}-".format(rank))
+        for path in glob.glob(prefix + "*.pkl"):
+            os.remove(path)
+
+        self._records = {}
+        self._index = []
+        self._written = set()
+
+    def encode(self, image_id, prediction):
+        img_info = self.dataset.get_img_info(image_id)
+        size = (img_info["width"], img_info["height"])
+        return encode_prediction(prediction, size, self.masker)
+
+    def write(self, image_id, record):
+        if image_id in self._written:
+            return
+        self._written.add(image_id)
+        self._records[image_id] = record
+        if len(self._records) >= self.images_per_shard:
+            self._flush()
+
+    def add(self, image_id, prediction):
+        self.write(image_id, self.encode(image_id, prediction))
+
+    def _flush(self):
+        if not self._records:
+            return
+        shard_file = SHARD_FILE.format(self.rank, len(self._index))
+        with open(os.path.join(self.output_dir, shard_file), "wb") as f:
+            pickle.dump(self._records, f, pickle.HIGHEST_PROTOCOL)
+        self._index.append((shard_file, sorted(self._records.keys())))
+        self._records = {}
+
+    def close(self):
+        self._flush()
+        index_file = os.path.join(self.output_dir, INDEX_FILE.format(self.rank))
+        with open(index_file, "wb") as f:
+            pickle.dump(self._index, f, pickle.HIGHEST_PROTOCOL)
+
+
+class PredictionReader(object):
+    """
+    Read-only sequence of the predictions written by the PredictionWriters of
+    num_ranks processes, sorted by image id. Shards are loaded on demand and
+    only the last one is kept, so iterating over the predictions in order
+    holds a single shard in memory.
+
+    The samplers pad the last ranks with the first indices of the dataset,
+    which belong to lower ranks: an image found in the index of several
+    ranks is read from the lowest one.
+    """
+
+    def __init__(self, directory, num_ranks):
+        self.directory = directory
+        self._shard_of_image = {}
+        for rank in range(num_ranks):
+            with open(os.path.join(directory, INDEX_FILE.format(rank)), "rb") as f:
+                index = pickle.load(f)
+            for shard_file, image_ids in index:
+                for image_id in image_ids:
+                    self._shard_of_image.setdefault(image_id, shard_file)
+        self.image_ids = sorted(self._shard_of_image.keys())
+        self._shard_file = None
+        self._shard = None
+
+    def __len__(self):
+        return len(self.image_ids)
+
+    def _load_shard(self, shard_file):
+        if shard_file != self._shard_file:
+            with open(os.path.join(self.directory, shard_file), "rb") as f:
+                self._shard = pickle.load(f)
+            self._shard_file = shard_file
+        return self._shard
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        image_id = self.image_ids[idx]
+        shard = self._load_shard(self._shard_of_image[image_id])
+        return decode_prediction(shard[image_id])
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
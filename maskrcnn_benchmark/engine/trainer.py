@@ -108,6 +108,11 @@ def do_train(
                     memory=torch.cuda.max_memory_allocated() / 1024.0 / 1024.0,
                 )
             )
+        if iteration % checkpoint_period == 0 or iteration == max_iter:
+            # the state of the sampling, to resume it at the same batch
+            batch_sampler = data_loader.batch_sampler
+            if hasattr(batch_sampler, "state_dict"):
+                arguments["data_sampler"] = batch_sampler.state_dict(iteration)
         if iteration % checkpoint_period == 0:
             checkpointer.save("model_{:07d}".format(iteration), **arguments)
         if iteration == max_iter:
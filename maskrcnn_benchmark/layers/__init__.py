@@ -8,8 +8,14 @@ from .misc import ConvTranspose2d
 from .misc import BatchNorm2d
 from .misc import interpolate
 from .nms import nms
+from .nms import batched_nms
+from .nms import fast_nms
+from .nms import matrix_nms
+from .nms import multiclass_nms
 from .roi_align import ROIAlign
 from .roi_align import roi_align
+from .roi_align import MultiLevelROIAlign
+from .roi_align import multilevel_roi_align
 from .roi_pool import ROIPool
 from .roi_pool import roi_pool
 from .smooth_l1_loss import smooth_l1_loss
@@ -22,8 +28,14 @@ from .dcn.deform_pool_module import DeformRoIPooling, DeformRoIPoolingPack, Modu
 
 __all__ = [
     "nms",
+    "batched_nms",
+    "fast_nms",
+    "matrix_nms",
+    "multiclass_nms",
     "roi_align",
     "ROIAlign",
+    "multilevel_roi_align",
+    "MultiLevelROIAlign",
     "roi_pool",
     "ROIPool",
     "smooth_l1_loss",
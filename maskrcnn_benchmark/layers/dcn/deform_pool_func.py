@@ -32,8 +32,6 @@ class DeformRoIPoolingFunction(Function):
         ctx.trans_std = trans_std
 
         assert 0.0 <= ctx.trans_std <= 1.0
-        if not data.is_cuda:
-            raise NotImplementedError
 
         n = rois.shape[0]
         output = data.new_empty(n, out_channels, out_size, out_size)
@@ -63,9 +61,6 @@ class DeformRoIPoolingFunction(Function):
     @staticmethod
     @once_differentiable
     def backward(ctx, grad_output):
-        if not grad_output.is_cuda:
-            raise NotImplementedError
-
         data, rois, offset = ctx.saved_tensors
         output_count = ctx.output_count
         grad_input = torch.zeros_like(data)
@@ -1,11 +1,272 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 # from ._utils import _C
+from typing import Tuple  # noqa: F401, used by the TorchScript type comments
+
+import torch
+
 from maskrcnn_benchmark import _C
 
 from apex import amp
 
 # Only valid with fp32 inputs - give AMP the hint
 nms = amp.float_function(_C.nms)
+_batched_nms_cpu = amp.float_function(_C.batched_nms)
 
 # nms.__doc__ = """
 # This function performs Non-maximum suppresion"""
+
+
+def batched_nms(boxes, scores, idxs, nms_thresh, image_ids=None, detections_per_img=-1):
+    """
+    Performs non-maximum suppression independently for every group in `idxs`
+    (and every image in `image_ids`, if given) with a single call to `nms`.
+
+    On the GPU, boxes of different groups are translated by a group-dependent
+    offset so that they can never overlap, which turns the per-group NMS into
+    one class-agnostic NMS over all the boxes. On the CPU, or if the offsets
+    are too large for float32, the groups are processed in parallel by a CPU
+    kernel which stops the NMS of a group once detections_per_img boxes are
+    kept.
+
+    Arguments:
+        boxes (Tensor[N, 4]): boxes in (x1, y1, x2, y2) format
+        scores (Tensor[N])
+        idxs (Tensor[N]): category index of each box
+        nms_thresh (float): if <= 0, no suppression is performed
+        image_ids (Tensor[N], optional): index of the image each box belongs to
+        detections_per_img (int): if > 0, only the top detections_per_img
+            boxes of each image are kept, over all of its categories
+
+    Returns:
+        keep (Tensor[K]): int64 indices of the kept boxes, sorted in
+            decreasing order of score
+    """
+    if boxes.numel() == 0:
+        return torch.empty((0,), dtype=torch.int64, device=boxes.device)
+    if nms_thresh > 0:
+        groups = idxs
+        if image_ids is not None:
+            groups = image_ids * (idxs.max() + 1) + idxs
+        use_offsets = False
+        if boxes.is_cuda:
+            # the +2 guarantees that boxes from different groups are disjoint
+            # even with the legacy TO_REMOVE = 1 convention used for box widths
+            min_coord = boxes.min()
+            offset = int(torch.ceil(boxes.max() - min_coord)) + 2
+            # the CUDA kernel works in float32, which represents the offsets
+            # exactly only below 2 ** 24. The translated coordinates are
+            # rounded to the float32 precision at their magnitude
+            use_offsets = (int(groups.max()) + 1) * offset < 2 ** 24
+        if use_offsets:
+            group_offsets = groups.long() * offset
+            boxes_for_nms = (boxes - min_coord) + group_offsets.to(boxes)[:, None]
+            keep = nms(boxes_for_nms, scores, nms_thresh)
+        else:
+            # a group never has more than detections_per_img boxes kept
+            keep = _batched_nms_cpu(
+                boxes.cpu(), scores.cpu(), groups.cpu(), nms_thresh,
+                detections_per_img,
+            ).to(boxes.device)
+    else:
+        keep = torch.arange(len(boxes), dtype=torch.int64, device=boxes.device)
+    # the CPU kernel returns the kept indices sorted by group
+    _, order = scores[keep].sort(descending=True)
+    keep = keep[order]
+
+    if detections_per_img > 0:
+        if image_ids is None:
+            keep = keep[:detections_per_img]
+        else:
+            # rank of each kept box among the kept boxes of its image
+            kept_image_ids = image_ids[keep]
+            num_images = int(kept_image_ids.max()) + 1
+            one_hot = torch.zeros(
+                (len(keep), num_images), dtype=torch.int64, device=keep.device
+            )
+            one_hot.scatter_(1, kept_image_ids[:, None], 1)
+            rank = one_hot.cumsum(0).gather(1, kept_image_ids[:, None]).squeeze(1)
+            keep = keep[rank <= detections_per_img]
+    return keep
+
+
+def _dense_groups(scores, idxs, top_k):
+    # type: (Tensor, Tensor, int) -> Tensor
+    """
+    Returns a Tensor[G, K] with the indices of the top_k boxes of each of the G
+    groups of `idxs` in decreasing order of score, padded with -1.
+    """
+    num_boxes = scores.size(0)
+    # sort in decreasing order of score, then by group on a key made of the
+    # group and the score rank, so that the groups are contiguous whatever
+    # the range of the scores
+    _, order = scores.sort(descending=True)
+    positions = torch.arange(num_boxes, device=scores.device)
+    _, group_order = (idxs[order].long() * num_boxes + positions).sort()
+    order = order[group_order]
+    sorted_idxs = idxs[order]
+    is_start = torch.ones_like(sorted_idxs, dtype=torch.uint8)
+    is_start[1:] = sorted_idxs[1:] != sorted_idxs[:-1]
+    group = is_start.long().cumsum(0) - 1
+    starts = is_start.nonzero().squeeze(1)
+    rank = positions - starts[group]
+    # the matrices are only as large as the largest group
+    top_k = min(top_k, int(rank.max()) + 1)
+
+    in_top_k = rank < top_k
+    dense = torch.full(
+        (starts.size(0), top_k), -1, dtype=torch.int64, device=scores.device
+    )
+    dense[group[in_top_k], rank[in_top_k]] = order[in_top_k]
+    return dense
+
+
+def _dense_iou(boxes):
+    # type: (Tensor) -> Tensor
+    """
+    IoU of the boxes of each group with the boxes of lower score of the group,
+    i.e. the upper triangular part of the IoU matrix of each group.
+    """
+    TO_REMOVE = 1
+    area = (boxes[..., 2] - boxes[..., 0] + TO_REMOVE) * (
+        boxes[..., 3] - boxes[..., 1] + TO_REMOVE
+    )
+    lt = torch.max(boxes[:, :, None, :2], boxes[:, None, :, :2])
+    rb = torch.min(boxes[:, :, None, 2:], boxes[:, None, :, 2:])
+    wh = (rb - lt + TO_REMOVE).clamp(min=0)
+    inter = wh[..., 0] * wh[..., 1]
+    iou = inter / (area[:, :, None] + area[:, None, :] - inter)
+    return iou.triu(diagonal=1)
+
+
+def fast_nms(boxes, scores, idxs, nms_thresh, top_k=200):
+    # type: (Tensor, Tensor, Tensor, float, int) -> Tensor
+    """
+    Fast NMS: performs NMS independently for every group in `idxs`, a box being
+    suppressed if it overlaps a box of higher score of its group, even if the
+    latter is itself suppressed. It is computed on the dense IoU matrices of
+    the top_k boxes of each group, without any sequential loop.
+
+    Arguments:
+        boxes (Tensor[N, 4]): boxes in (x1, y1, x2, y2) format
+        scores (Tensor[N])
+        idxs (Tensor[N]): group index of each box
+        nms_thresh (float): a box is suppressed if its IoU is >= nms_thresh
+        top_k (int): number of boxes of highest score considered in each group
+
+    Returns:
+        keep (Tensor[K]): int64 indices of the kept boxes, sorted by group,
+            then in decreasing order of score
+    """
+    if boxes.numel() == 0:
+        return torch.empty((0,), dtype=torch.int64, device=boxes.device)
+    dense = _dense_groups(scores, idxs, top_k)
+    valid = dense >= 0
+    iou = _dense_iou(boxes[dense.clamp(min=0)])
+    max_iou, _ = iou.max(dim=1)
+    return dense[valid & (max_iou < nms_thresh)]
+
+
+def matrix_nms(boxes, scores, idxs, top_k=200, kernel="gaussian", sigma=2.0):
+    # type: (Tensor, Tensor, Tensor, int, str, float) -> Tuple[Tensor, Tensor]
+    """
+    Matrix NMS, from SOLOv2: instead of suppressing the boxes, decays the score
+    of each box according to its IoUs with the boxes of higher score of its
+    group in `idxs`. It is computed on the dense IoU matrices of the top_k
+    boxes of each group, without any sequential loop.
+
+    Arguments:
+        boxes (Tensor[N, 4]): boxes in (x1, y1, x2, y2) format
+        scores (Tensor[N]): scores in [0, 1]
+        idxs (Tensor[N]): group index of each box
+        top_k (int): number of boxes of highest score considered in each group
+        kernel (str): "gaussian" or "linear" decay
+        sigma (float): parameter of the gaussian decay
+
+    Returns:
+        keep (Tensor[K]): int64 indices of the top_k boxes of each group,
+            sorted by group, then in decreasing order of score
+        scores (Tensor[K]): decayed scores of the boxes of keep
+    """
+    if boxes.numel() == 0:
+        return (
+            torch.empty((0,), dtype=torch.int64, device=boxes.device),
+            scores[:0],
+        )
+    dense = _dense_groups(scores, idxs, top_k)
+    valid = dense >= 0
+    iou = _dense_iou(boxes[dense.clamp(min=0)])
+    # largest IoU of each box with a box of higher score, which compensates
+    # the decay of the boxes it overlaps, as it is likely suppressed itself
+    compensate_iou, _ = iou.max(dim=1)
+    compensate_iou = compensate_iou[:, :, None]
+    if kernel == "gaussian":
+        decay = torch.exp(-sigma * (iou ** 2 - compensate_iou ** 2))
+    elif kernel == "linear":
+        decay = (1 - iou) / (1 - compensate_iou).clamp(min=1e-6)
+    else:
+        raise ValueError("Unknown Matrix NMS kernel {}".format(kernel))
+    decay, _ = decay.min(dim=1)
+    keep = dense[valid]
+    return keep, scores[keep] * decay[valid]
+
+
+def multiclass_nms(
+    boxes,
+    scores,
+    idxs,
+    nms_thresh,
+    image_ids=None,
+    detections_per_img=-1,
+    nms_type="greedy",
+    top_k=200,
+    score_thresh=0.0,
+    matrix_nms_kernel="gaussian",
+    matrix_nms_sigma=2.0,
+):
+    """
+    Performs the NMS of nms_type independently for every group in `idxs` (and
+    every image in `image_ids`, if given), then keeps the top
+    detections_per_img boxes of each image, as batched_nms.
+
+    Arguments:
+        nms_type (str): "greedy" for batched_nms, "fast" for fast_nms or
+            "matrix" for matrix_nms
+        top_k (int): number of boxes of each group considered by the Fast and
+            Matrix NMS
+        score_thresh (float): boxes whose score is decayed below score_thresh
+            by the Matrix NMS are removed
+        See batched_nms for the other arguments.
+
+    Returns:
+        keep (Tensor[K]): int64 indices of the kept boxes, sorted in
+            decreasing order of score
+        scores (Tensor[K]): scores of the kept boxes, decayed by Matrix NMS
+    """
+    if nms_type == "greedy" or boxes.numel() == 0:
+        keep = batched_nms(
+            boxes, scores, idxs, nms_thresh, image_ids, detections_per_img
+        )
+        return keep, scores[keep]
+
+    groups = idxs
+    if image_ids is not None:
+        groups = image_ids * (idxs.max() + 1) + idxs
+    if nms_type == "fast":
+        keep = fast_nms(boxes, scores, groups, nms_thresh, top_k)
+        scores = scores[keep]
+    elif nms_type == "matrix":
+        keep, scores = matrix_nms(
+            boxes, scores, groups, top_k, matrix_nms_kernel, matrix_nms_sigma
+        )
+        above_thresh = scores > score_thresh
+        keep, scores = keep[above_thresh], scores[above_thresh]
+    else:
+        raise ValueError("Unknown NMS type {}".format(nms_type))
+
+    # sorts the boxes and limits their number per image, without suppression
+    if image_ids is not None:
+        image_ids = image_ids[keep]
+    top = batched_nms(
+        boxes[keep], scores, idxs[keep], 0.0, image_ids, detections_per_img
+    )
+    return keep[top], scores[top]
@@ -47,6 +47,71 @@ class _ROIAlign(Function):
 
 roi_align = _ROIAlign.apply
 
+
+class _MultiLevelROIAlign(Function):
+    @staticmethod
+    def forward(
+        ctx, roi, levels, output_size, spatial_scales, sampling_ratio, *features
+    ):
+        ctx.save_for_backward(roi, levels)
+        ctx.output_size = _pair(output_size)
+        ctx.spatial_scales = spatial_scales
+        ctx.sampling_ratio = sampling_ratio
+        ctx.input_shapes = [feature.size() for feature in features]
+        output_size = ctx.output_size
+        output = _C.multilevel_roi_align_forward(
+            features,
+            roi,
+            levels,
+            spatial_scales,
+            output_size[0],
+            output_size[1],
+            sampling_ratio,
+        )
+        return output
+
+    @staticmethod
+    @once_differentiable
+    def backward(ctx, grad_output):
+        rois, levels = ctx.saved_tensors
+        output_size = ctx.output_size
+        bs, ch = ctx.input_shapes[0][:2]
+        grad_inputs = _C.multilevel_roi_align_backward(
+            grad_output,
+            rois,
+            levels,
+            ctx.spatial_scales,
+            output_size[0],
+            output_size[1],
+            bs,
+            ch,
+            [shape[2] for shape in ctx.input_shapes],
+            [shape[3] for shape in ctx.input_shapes],
+            ctx.sampling_ratio,
+        )
+        return (None, None, None, None, None) + tuple(grad_inputs)
+
+
+def multilevel_roi_align(
+    features, rois, levels, output_size, spatial_scales, sampling_ratio
+):
+    """
+    Pools each roi from the feature map of its level with a single ROIAlign
+    call, which writes directly in the output the result of each roi.
+
+    Arguments:
+        features (list[Tensor]): feature maps of each level
+        rois (Tensor): rois in the format of ROIAlign
+        levels (Tensor): index in features of the level of each roi
+        output_size (tuple[int] or int)
+        spatial_scales (list[float]): scale of each feature map
+        sampling_ratio (int)
+    """
+    return _MultiLevelROIAlign.apply(
+        rois, levels, output_size, list(spatial_scales), sampling_ratio, *features
+    )
+
+
 class ROIAlign(nn.Module):
     def __init__(self, output_size, spatial_scale, sampling_ratio):
         super(ROIAlign, self).__init__()
@@ -67,3 +132,30 @@ class ROIAlign(nn.Module):
         tmpstr += ", sampling_ratio=" + str(self.sampling_ratio)
         tmpstr += ")"
         return tmpstr
+
+
+class MultiLevelROIAlign(nn.Module):
+    def __init__(self, output_size, spatial_scales, sampling_ratio):
+        super(MultiLevelROIAlign, self).__init__()
+        self.output_size = output_size
+        self.spatial_scales = spatial_scales
+        self.sampling_ratio = sampling_ratio
+
+    @amp.float_function
+    def forward(self, features, rois, levels):
+        return multilevel_roi_align(
+            features,
+            rois,
+            levels,
+            self.output_size,
+            self.spatial_scales,
+            self.sampling_ratio,
+        )
+
+    def __repr__(self):
+        tmpstr = self.__class__.__name__ + "("
+        tmpstr += "output_size=" + str(self.output_size)
+        tmpstr += ", spatial_scales=" + str(self.spatial_scales)
+        tmpstr += ", sampling_ratio=" + str(self.sampling_ratio)
+        tmpstr += ")"
+        return tmpstr
@@ -5,7 +5,6 @@ from torch.autograd.function import once_differentiable
 
 from maskrcnn_benchmark import _C
 
-# TODO: Use JIT to replace CUDA implementation in the future.
 class _SigmoidFocalLoss(Function):
     @staticmethod
     def forward(ctx, logits, targets, gamma, alpha):
@@ -34,10 +33,16 @@ class _SigmoidFocalLoss(Function):
         return d_logits, None, None, None, None
 
 
-sigmoid_focal_loss_cuda = _SigmoidFocalLoss.apply
+sigmoid_focal_loss = _SigmoidFocalLoss.apply
+# kept for backward compatibility, the kernels also run on the CPU
+sigmoid_focal_loss_cuda = sigmoid_focal_loss
 
 
 def sigmoid_focal_loss_cpu(logits, targets, gamma, alpha):
+    """
+    Python implementation of the loss computed by the kernels of
+    sigmoid_focal_loss, used as their reference.
+    """
     num_classes = logits.shape[1]
     dtype = targets.dtype
     device = targets.device
@@ -57,13 +62,7 @@ class SigmoidFocalLoss(nn.Module):
         self.alpha = alpha
 
     def forward(self, logits, targets):
-        device = logits.device
-        if logits.is_cuda:
-            loss_func = sigmoid_focal_loss_cuda
-        else:
-            loss_func = sigmoid_focal_loss_cpu
-
-        loss = loss_func(logits, targets, self.gamma, self.alpha)
+        loss = sigmoid_focal_loss(logits, targets, self.gamma, self.alpha)
         return loss.sum()
 
     def __repr__(self):
@@ -0,0 +1,143 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Folds the batch normalizations of a model in inference mode into the
+convolutions which precede them.
+"""
+import torch
+from torch import nn
+from torch.nn.modules.batchnorm import _BatchNorm
+
+from maskrcnn_benchmark.layers import FrozenBatchNorm2d
+
+
+class Identity(nn.Module):
+    """
+    Replaces the folded batch normalizations, as nn.Identity does not exist
+    in PyTorch 1.0.
+    """
+
+    def forward(self, x):
+        return x
+
+
+def _batch_norm_scale_and_shift(bn):
+    """
+    Returns the (scale, shift) of the affine transform applied by bn, or
+    None if bn depends on the batch statistics.
+    """
+    if isinstance(bn, FrozenBatchNorm2d):
+        # same as FrozenBatchNorm2d.forward, which has no epsilon
+        scale = bn.weight * bn.running_var.rsqrt()
+        return scale, bn.bias - bn.running_mean * scale
+    if isinstance(bn, _BatchNorm):
+        if bn.training or bn.running_mean is None:
+            return None
+        scale = (bn.running_var + bn.eps).rsqrt()
+        shift = -bn.running_mean * scale
+        if bn.affine:
+            scale = scale * bn.weight
+            shift = shift * bn.weight + bn.bias
+        return scale, shift
+    return None
+
+
+def _can_fold(conv, bn):
+    if not isinstance(conv, nn.Conv2d):
+        return False
+    if isinstance(bn, FrozenBatchNorm2d):
+        return conv.out_channels == bn.weight.shape[0]
+    return conv.out_channels == bn.num_features
+
+
+@torch.no_grad()
+def _fold(conv, bn):
+    scale_and_shift = _batch_norm_scale_and_shift(bn)
+    if scale_and_shift is None:
+        return False
+    scale, shift = (t.to(conv.weight.dtype) for t in scale_and_shift)
+    conv.weight.mul_(scale.reshape(-1, 1, 1, 1))
+    if conv.bias is None:
+        conv.bias = nn.Parameter(
+            shift.clone(), requires_grad=conv.weight.requires_grad
+        )
+    else:
+        conv.bias.mul_(scale).add_(shift)
+    return True
+
+
+def _fold_module(module):
+    """
+    Folds the batch normalizations which are registered right after a
+    convolution of the same number of channels in the children of module,
+    as in nn.Sequential, ResNet blocks and FBNet blocks, and replaces them
+    by identities. Returns the number of folded batch normalizations.
+    """
+    num_folded = 0
+    previous = None
+    for name, child in list(module.named_children()):
+        if (
+            previous is not None
+            and isinstance(child, (FrozenBatchNorm2d, _BatchNorm))
+            and _can_fold(previous, child)
+            and _fold(previous, child)
+        ):
+            setattr(module, name, Identity())
+            num_folded += 1
+            child = None
+        elif len(child._modules) > 0:
+            num_folded += _fold_module(child)
+        previous = child
+    return num_folded
+
+
+def _max_difference(outputs, expected):
+    if isinstance(expected, torch.Tensor):
+        if outputs.shape != expected.shape:
+            return float("inf")
+        diff = (outputs.float() - expected.float()).abs()
+        scale = expected.float().abs().max().clamp(min=1)
+        return (diff.max() / scale).item() if diff.numel() > 0 else 0.0
+    if isinstance(expected, dict):
+        expected = [expected[k] for k in sorted(expected)]
+        outputs = [outputs[k] for k in sorted(outputs)]
+    return max(
+        [_max_difference(o, e) for o, e in zip(outputs, expected)] + [0.0]
+    )
+
+
+def fold_batch_norms(model, example_input=None, tolerance=1e-4):
+    """
+    Folds the batch normalizations of the model (FrozenBatchNorm2d, and the
+    BatchNorm2d which are in eval mode) into the weights and biases of the
+    convolutions which precede them, and replaces them by identities. This
+    removes an elementwise pass over the activations after each convolution.
+
+    Arguments:
+        model (nn.Module): the model, which is modified in place. For a
+            GeneralizedRCNN, the equivalence is checked on its backbone
+        example_input (Tensor, optional): if given, the outputs of the
+            model (or its backbone) for this input are compared before and
+            after the folding
+        tolerance (float): maximum difference of the outputs, relative to
+            their largest absolute value
+
+    Returns:
+        num_folded (int): the number of folded batch normalizations
+    """
+    checked_module = getattr(model, "backbone", model)
+    if example_input is not None:
+        with torch.no_grad():
+            expected = checked_module(example_input)
+
+    num_folded = _fold_module(model)
+
+    if example_input is not None:
+        with torch.no_grad():
+            outputs = checked_module(example_input)
+        difference = _max_difference(outputs, expected)
+        if not difference <= tolerance:
+            raise RuntimeError(
+                "The outputs of the model changed after folding the batch "
+                "normalizations, with a relative difference of {}".format(difference)
+            )
+    return num_folded
@@ -3,6 +3,7 @@ import torch
 import torch.nn.functional as F
 from torch import nn
 
+from maskrcnn_benchmark.layers import MultiLevelROIAlign
 from maskrcnn_benchmark.layers import ROIAlign
 
 from .utils import cat
@@ -68,6 +69,10 @@ class Pooler(nn.Module):
                 )
             )
         self.poolers = nn.ModuleList(poolers)
+        # pools the rois of all the levels at once
+        self.multilevel_pooler = MultiLevelROIAlign(
+            output_size, spatial_scales=scales, sampling_ratio=sampling_ratio
+        )
         self.output_size = output_size
         # get the levels in the feature map by leveraging the fact that the network always
         # downsamples by a factor of 2 at each level.
@@ -102,23 +107,10 @@ class Pooler(nn.Module):
             return self.poolers[0](x[0], rois)
 
         levels = self.map_levels(boxes)
-
-        num_rois = len(rois)
-        num_channels = x[0].shape[1]
-        output_size = self.output_size[0]
-
-        dtype, device = x[0].dtype, x[0].device
-        result = torch.zeros(
-            (num_rois, num_channels, output_size, output_size),
-            dtype=dtype,
-            device=device,
-        )
-        for level, (per_level_feature, pooler) in enumerate(zip(x, self.poolers)):
-            idx_in_level = torch.nonzero(levels == level).squeeze(1)
-            rois_per_level = rois[idx_in_level]
-            result[idx_in_level] = pooler(per_level_feature, rois_per_level).to(dtype)
-
-        return result
+        # x can have more levels than the poolers, e.g. the extra level of
+        # the FPN used by the RPN only
+        result = self.multilevel_pooler(list(x[:num_levels]), rois, levels)
+        return result.to(x[0].dtype)
 
 
 def make_pooler(cfg, head_name):
@@ -3,9 +3,8 @@ import torch
 import torch.nn.functional as F
 from torch import nn
 
+from maskrcnn_benchmark.layers import multiclass_nms
 from maskrcnn_benchmark.structures.bounding_box import BoxList
-from maskrcnn_benchmark.structures.boxlist_ops import boxlist_nms
-from maskrcnn_benchmark.structures.boxlist_ops import cat_boxlist
 from maskrcnn_benchmark.modeling.box_coder import BoxCoder
 
 
@@ -23,7 +22,11 @@ class PostProcessor(nn.Module):
         detections_per_img=100,
         box_coder=None,
         cls_agnostic_bbox_reg=False,
-        bbox_aug_enabled=False
+        bbox_aug_enabled=False,
+        nms_type="greedy",
+        nms_top_k=200,
+        matrix_nms_kernel="gaussian",
+        matrix_nms_sigma=2.0,
     ):
         """
         Arguments:
@@ -31,6 +34,10 @@ class PostProcessor(nn.Module):
             nms (float)
             detections_per_img (int)
             box_coder (BoxCoder)
+            nms_type (str): "greedy", "fast" or "matrix", see multiclass_nms
+            nms_top_k (int)
+            matrix_nms_kernel (str)
+            matrix_nms_sigma (float)
         """
         super(PostProcessor, self).__init__()
         self.score_thresh = score_thresh
@@ -41,6 +48,10 @@ class PostProcessor(nn.Module):
         self.box_coder = box_coder
         self.cls_agnostic_bbox_reg = cls_agnostic_bbox_reg
         self.bbox_aug_enabled = bbox_aug_enabled
+        self.nms_type = nms_type
+        self.nms_top_k = nms_top_k
+        self.matrix_nms_kernel = matrix_nms_kernel
+        self.matrix_nms_sigma = matrix_nms_sigma
 
     def forward(self, x, boxes):
         """
@@ -81,9 +92,9 @@ class PostProcessor(nn.Module):
         ):
             boxlist = self.prepare_boxlist(boxes_per_img, prob, image_shape)
             boxlist = boxlist.clip_to_image(remove_empty=False)
-            if not self.bbox_aug_enabled:  # If bbox aug is enabled, we will do it later
-                boxlist = self.filter_results(boxlist, num_classes)
             results.append(boxlist)
+        if not self.bbox_aug_enabled:  # If bbox aug is enabled, we will do it later
+            results = self.filter_results_batched(results, num_classes)
         return results
 
     def prepare_boxlist(self, boxes, scores, image_shape):
@@ -109,44 +120,63 @@ class PostProcessor(nn.Module):
         """Returns bounding-box detection results by thresholding on scores and
         applying non-maximum suppression (NMS).
         """
-        # unwrap the boxlist to avoid additional overhead.
-        # if we had multi-class NMS, we could perform this directly on the boxlist
-        boxes = boxlist.bbox.reshape(-1, num_classes * 4)
-        scores = boxlist.get_field("scores").reshape(-1, num_classes)
+        return self.filter_results_batched([boxlist], num_classes)[0]
 
+    def filter_results_batched(self, boxlists, num_classes):
+        """Same as filter_results, but for all the images of a batch at once.
+        The per-class NMS of every image and the limit of detections_per_img
+        are performed by a single call to multiclass_nms.
+        """
+        # unwrap the boxlists to avoid additional overhead.
+        boxes = torch.cat(
+            [boxlist.bbox.reshape(-1, num_classes, 4) for boxlist in boxlists], dim=0
+        )
+        scores = torch.cat(
+            [boxlist.get_field("scores").reshape(-1, num_classes) for boxlist in boxlists],
+            dim=0,
+        )
         device = scores.device
-        result = []
+        image_ids = torch.cat(
+            [
+                torch.full((len(boxlist) // num_classes,), i, dtype=torch.int64, device=device)
+                for i, boxlist in enumerate(boxlists)
+            ],
+            dim=0,
+        )
+
         # Apply threshold on detection probabilities and apply NMS
         # Skip j = 0, because it's the background class
-        inds_all = scores > self.score_thresh
-        for j in range(1, num_classes):
-            inds = inds_all[:, j].nonzero().squeeze(1)
-            scores_j = scores[inds, j]
-            boxes_j = boxes[inds, j * 4 : (j + 1) * 4]
-            boxlist_for_class = BoxList(boxes_j, boxlist.size, mode="xyxy")
-            boxlist_for_class.add_field("scores", scores_j)
-            boxlist_for_class = boxlist_nms(
-                boxlist_for_class, self.nms
-            )
-            num_labels = len(boxlist_for_class)
-            boxlist_for_class.add_field(
-                "labels", torch.full((num_labels,), j, dtype=torch.int64, device=device)
-            )
-            result.append(boxlist_for_class)
-
-        result = cat_boxlist(result)
-        number_of_detections = len(result)
+        inds, labels = (scores[:, 1:] > self.score_thresh).nonzero().unbind(1)
+        labels = labels + 1
+        scores = scores[inds, labels]
+        boxes = boxes[inds, labels]
+        image_ids = image_ids[inds]
 
         # Limit to max_per_image detections **over all classes**
-        if number_of_detections > self.detections_per_img > 0:
-            cls_scores = result.get_field("scores")
-            image_thresh, _ = torch.kthvalue(
-                cls_scores.cpu(), number_of_detections - self.detections_per_img + 1
-            )
-            keep = cls_scores >= image_thresh.item()
-            keep = torch.nonzero(keep).squeeze(1)
-            result = result[keep]
-        return result
+        keep, scores = multiclass_nms(
+            boxes,
+            scores,
+            labels,
+            self.nms,
+            image_ids,
+            self.detections_per_img,
+            nms_type=self.nms_type,
+            top_k=self.nms_top_k,
+            score_thresh=self.score_thresh,
+            matrix_nms_kernel=self.matrix_nms_kernel,
+            matrix_nms_sigma=self.matrix_nms_sigma,
+        )
+        boxes = boxes[keep]
+        labels, image_ids = labels[keep], image_ids[keep]
+
+        results = []
+        for i, boxlist in enumerate(boxlists):
+            inds_i = (image_ids == i).nonzero().squeeze(1)
+            result = BoxList(boxes[inds_i], boxlist.size, mode="xyxy")
+            result.add_field("scores", scores[inds_i])
+            result.add_field("labels", labels[inds_i])
+            results.append(result)
+        return results
 
 
 def make_roi_box_post_processor(cfg):
@@ -167,6 +197,10 @@ def make_roi_box_post_processor(cfg):
         detections_per_img,
         box_coder,
         cls_agnostic_bbox_reg,
-        bbox_aug_enabled
+        bbox_aug_enabled,
+        nms_type=cfg.MODEL.ROI_HEADS.NMS_TYPE,
+        nms_top_k=cfg.MODEL.ROI_HEADS.NMS_TOP_K,
+        matrix_nms_kernel=cfg.MODEL.ROI_HEADS.MATRIX_NMS_KERNEL,
+        matrix_nms_sigma=cfg.MODEL.ROI_HEADS.MATRIX_NMS_SIGMA,
     )
     return postprocessor
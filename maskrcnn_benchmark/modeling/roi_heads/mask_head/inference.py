@@ -47,8 +47,7 @@ class MaskPostProcessor(nn.Module):
         boxes_per_image = [len(box) for box in boxes]
         mask_prob = mask_prob.split(boxes_per_image, dim=0)
 
-        if self.masker:
-            mask_prob = self.masker(mask_prob, boxes)
+        mask_prob = self.project_masks(mask_prob, boxes)
 
         results = []
         for prob, box in zip(mask_prob, boxes):
@@ -60,6 +59,11 @@ class MaskPostProcessor(nn.Module):
 
         return results
 
+    def project_masks(self, masks, boxes):
+        if self.masker:
+            masks = self.masker(masks, boxes)
+        return masks
+
 
 class MaskPostProcessorCOCOFormat(MaskPostProcessor):
     """
@@ -68,21 +72,18 @@ class MaskPostProcessorCOCOFormat(MaskPostProcessor):
     additionally convert the results to COCO format.
     """
 
-    def forward(self, x, boxes):
-        import pycocotools.mask as mask_util
-        import numpy as np
-
-        results = super(MaskPostProcessorCOCOFormat, self).forward(x, boxes)
-        for result in results:
-            masks = result.get_field("mask").cpu()
-            rles = [
-                mask_util.encode(np.array(mask[0, :, :, np.newaxis], order="F"))[0]
-                for mask in masks
-            ]
-            for rle in rles:
-                rle["counts"] = rle["counts"].decode("utf-8")
-            result.add_field("mask", rles)
-        return results
+    def __init__(self, masker=None):
+        if masker is None:
+            masker = Masker(threshold=0.5, padding=1)
+        super(MaskPostProcessorCOCOFormat, self).__init__(masker)
+
+    def project_masks(self, masks, boxes):
+        # encode the RLEs directly from the box regions, the masks are
+        # never pasted in full images
+        return [
+            self.masker.encode_single_image(mask, box)
+            for mask, box in zip(masks, boxes)
+        ]
 
 
 # the next two functions should be merged inside Masker
@@ -159,28 +160,211 @@ def paste_mask_in_image(mask, box, im_h, im_w, thresh=0.5, padding=1):
     return im_mask
 
 
+def _bilinear_interpolation_matrix(local_dst, box_size, src_size):
+    """
+    Returns the matrices (Tensor[N, L, src_size]) which resize a src_size
+    input to the output pixels local_dst (Tensor[N, L]) of boxes of
+    box_size (Tensor[N]) pixels, with the same sampling positions and
+    weights as interpolate(mode="bilinear", align_corners=False).
+    """
+    scale = float(src_size) / box_size.float()
+    src = (scale[:, None] * (local_dst.float() + 0.5) - 0.5).clamp(min=0)
+    idx0 = src.long()
+    lambda1 = src - idx0.float()
+    idx1 = idx0 + (idx0 < src_size - 1).long()
+    # pixels past the end of a box are discarded afterwards, their
+    # indices are only clamped to stay valid
+    idx0 = idx0.clamp(max=src_size - 1)
+    idx1 = idx1.clamp(max=src_size - 1)
+    weights = local_dst.new_zeros(local_dst.shape + (src_size,), dtype=torch.float32)
+    weights.scatter_add_(2, idx0[:, :, None], (1 - lambda1)[:, :, None])
+    weights.scatter_add_(2, idx1[:, :, None], lambda1[:, :, None])
+    return weights
+
+
+def _paste_masks_in_boxes(masks, boxes, im_h, im_w, thresh, padding, memory_budget):
+    """
+    Resamples every mask to its box in the image, with two batched matrix
+    products per chunk of masks. Masks of similar sizes are grouped in the
+    same chunk, and chunks are sized so that their intermediate float
+    buffers stay below memory_budget bytes.
+
+    Yields, for every mask whose box is visible in the image, its index,
+    the (x, y) position of its visible region and the region itself as a
+    (uint8) CPU tensor.
+    """
+    device = masks.device
+
+    # Need to work on the CPU, where fp16 isn't supported - cast to float to avoid this
+    padded_masks, scale = expand_masks(masks.float(), padding=padding)
+    padded_masks = padded_masks[:, 0]
+    src_size = padded_masks.shape[-1]
+    boxes = expand_boxes(boxes.float(), scale).to(dtype=torch.int32).long()
+
+    TO_REMOVE = 1
+    widths = (boxes[:, 2] - boxes[:, 0] + TO_REMOVE).clamp(min=1)
+    heights = (boxes[:, 3] - boxes[:, 1] + TO_REMOVE).clamp(min=1)
+    # region of each box which is visible in the image
+    x_0 = boxes[:, 0].clamp(min=0)
+    x_1 = torch.max((boxes[:, 2] + 1).clamp(max=im_w), x_0)
+    y_0 = boxes[:, 1].clamp(min=0)
+    y_1 = torch.max((boxes[:, 3] + 1).clamp(max=im_h), y_0)
+    vis_w, vis_h = (x_1 - x_0).tolist(), (y_1 - y_0).tolist()
+
+    def chunk_bytes(n, w, h):
+        # interpolation matrices and masks interpolated along x, then along y
+        return 4 * n * (src_size * (2 * w + h) + 2 * h * w)
+
+    chunks = []
+    order = (x_1 - x_0).mul(y_1 - y_0).sort()[1].tolist()
+    chunk, chunk_w, chunk_h = [], 0, 0
+    for i in order:
+        w, h = max(chunk_w, vis_w[i]), max(chunk_h, vis_h[i])
+        if chunk and chunk_bytes(len(chunk) + 1, w, h) > memory_budget:
+            chunks.append((chunk, chunk_w, chunk_h))
+            chunk, w, h = [], vis_w[i], vis_h[i]
+        chunk.append(i)
+        chunk_w, chunk_h = w, h
+    chunks.append((chunk, chunk_w, chunk_h))
+
+    x_0_list, y_0_list = x_0.tolist(), y_0.tolist()
+    for chunk, chunk_w, chunk_h in chunks:
+        if chunk_w == 0 or chunk_h == 0:
+            continue
+        idx = torch.as_tensor(chunk, device=device)
+        cols = (x_0 - boxes[:, 0])[idx, None] + torch.arange(chunk_w, device=device)
+        rows = (y_0 - boxes[:, 1])[idx, None] + torch.arange(chunk_h, device=device)
+        weights_x = _bilinear_interpolation_matrix(cols, widths[idx], src_size)
+        weights_y = _bilinear_interpolation_matrix(rows, heights[idx], src_size)
+
+        # bilinear resampling is separable: interpolate along x, then along y
+        mask = torch.bmm(padded_masks[idx], weights_x.transpose(1, 2))
+        mask = torch.bmm(weights_y, mask)
+
+        if thresh >= 0:
+            mask = mask > thresh
+        else:
+            # for visualization and debugging, we also
+            # allow it to return an unmodified mask
+            mask = mask * 255
+        mask = mask.to(torch.uint8).cpu()
+
+        for k, i in enumerate(chunk):
+            if vis_w[i] > 0 and vis_h[i] > 0:
+                yield i, x_0_list[i], y_0_list[i], mask[k, :vis_h[i], :vis_w[i]]
+
+
+def paste_masks_in_image(masks, boxes, im_h, im_w, thresh=0.5, padding=1, memory_budget=256 * 1024 ** 2):
+    """
+    Batched version of paste_mask_in_image: all the masks of an image are
+    resampled to their boxes at once, instead of one interpolate per mask,
+    in chunks whose intermediate buffers stay below memory_budget bytes.
+
+    Arguments:
+        masks (Tensor[N, 1, M, M])
+        boxes (Tensor[N, 4]): xyxy boxes in the image
+        im_h, im_w (int)
+        thresh (float): if < 0, the soft masks are returned scaled to 0-255
+        padding (int)
+        memory_budget (int)
+
+    Returns:
+        im_masks (Tensor[N, 1, im_h, im_w], uint8): on the CPU
+    """
+    im_masks = torch.zeros((masks.shape[0], 1, im_h, im_w), dtype=torch.uint8)
+    if masks.shape[0] == 0:
+        return im_masks
+    pasted = _paste_masks_in_boxes(
+        masks, boxes, im_h, im_w, thresh, padding, memory_budget
+    )
+    for i, x, y, mask in pasted:
+        h, w = mask.shape
+        im_masks[i, 0, y:y + h, x:x + w] = mask
+    return im_masks
+
+
+def _box_mask_to_rle_counts(mask, x, y, im_h, im_w):
+    """
+    Returns the uncompressed COCO RLE counts of an im_h x im_w mask which is
+    zero everywhere but in the region mask (np.ndarray[h, w]), whose top-left
+    corner is at (x, y).
+    """
+    h = mask.shape[0]
+    # flat column-major (COCO) positions of the ones of the full image mask
+    ones = np.flatnonzero(mask.T)
+    ones = (x + ones // h) * im_h + y + ones % h
+    if len(ones) == 0:
+        return [im_h * im_w]
+    # runs of ones start and end wherever the positions are not consecutive
+    breaks = np.flatnonzero(np.diff(ones) != 1)
+    starts = np.concatenate([ones[:1], ones[breaks + 1]])
+    ends = np.concatenate([ones[breaks] + 1, ones[-1:] + 1])
+    bounds = np.stack([starts, ends], axis=1).reshape(-1)
+    counts = np.diff(np.concatenate([[0], bounds, [im_h * im_w]]))
+    if counts[-1] == 0:
+        counts = counts[:-1]
+    return counts.tolist()
+
+
+def paste_masks_in_image_as_rles(masks, boxes, im_h, im_w, thresh=0.5, padding=1, memory_budget=256 * 1024 ** 2):
+    """
+    Same as paste_masks_in_image, but directly returns the masks encoded
+    as COCO RLEs. Only the box region of every mask is ever materialized,
+    so the memory used scales with the box areas instead of the image area.
+
+    Returns:
+        rles (list[dict]): the same RLEs as mask_util.encode of the pasted
+            masks, with counts decoded to str
+    """
+    import pycocotools.mask as mask_util
+
+    num_masks = masks.shape[0]
+    if num_masks == 0:
+        return []
+    counts = [[im_h * im_w]] * num_masks
+    pasted = _paste_masks_in_boxes(
+        masks, boxes, im_h, im_w, thresh, padding, memory_budget
+    )
+    for i, x, y, mask in pasted:
+        counts[i] = _box_mask_to_rle_counts(mask.numpy(), x, y, im_h, im_w)
+    rles = mask_util.frPyObjects(
+        [{"size": [im_h, im_w], "counts": c} for c in counts], im_h, im_w
+    )
+    for rle in rles:
+        rle["counts"] = rle["counts"].decode("utf-8")
+    return rles
+
+
 class Masker(object):
     """
     Projects a set of masks in an image on the locations
     specified by the bounding boxes
     """
 
-    def __init__(self, threshold=0.5, padding=1):
+    def __init__(self, threshold=0.5, padding=1, memory_budget=256 * 1024 ** 2):
         self.threshold = threshold
         self.padding = padding
+        self.memory_budget = memory_budget
 
     def forward_single_image(self, masks, boxes):
         boxes = boxes.convert("xyxy")
         im_w, im_h = boxes.size
-        res = [
-            paste_mask_in_image(mask[0], box, im_h, im_w, self.threshold, self.padding)
-            for mask, box in zip(masks, boxes.bbox)
-        ]
-        if len(res) > 0:
-            res = torch.stack(res, dim=0)[:, None]
-        else:
-            res = masks.new_empty((0, 1, masks.shape[-2], masks.shape[-1]))
-        return res
+        return paste_masks_in_image(
+            masks, boxes.bbox, im_h, im_w,
+            self.threshold, self.padding, self.memory_budget
+        )
+
+    def encode_single_image(self, masks, boxes):
+        """
+        Returns the COCO RLEs of the masks pasted in the image, without
+        materializing full image masks.
+        """
+        boxes = boxes.convert("xyxy")
+        im_w, im_h = boxes.size
+        return paste_masks_in_image_as_rles(
+            masks, boxes.bbox, im_h, im_w,
+            self.threshold, self.padding, self.memory_budget
+        )
 
     def __call__(self, masks, boxes):
         if isinstance(boxes, BoxList):
@@ -202,7 +386,10 @@ class Masker(object):
 def make_roi_mask_post_processor(cfg):
     if cfg.MODEL.ROI_MASK_HEAD.POSTPROCESS_MASKS:
         mask_threshold = cfg.MODEL.ROI_MASK_HEAD.POSTPROCESS_MASKS_THRESHOLD
-        masker = Masker(threshold=mask_threshold, padding=1)
+        memory_budget = cfg.MODEL.ROI_MASK_HEAD.POSTPROCESS_MASKS_MEMORY_BUDGET * 1024 ** 2
+        masker = Masker(
+            threshold=mask_threshold, padding=1, memory_budget=memory_budget
+        )
     else:
         masker = None
     mask_post_processor = MaskPostProcessor(masker)
@@ -1,4 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+from concurrent.futures import ThreadPoolExecutor
+
 import torch
 from torch.nn import functional as F
 
@@ -28,8 +30,12 @@ def project_masks_on_boxes(segmentation_masks, proposals, discretization_size):
         segmentation_masks, proposals
     )
 
-    # FIXME: CPU computation bottleneck, this should be parallelized
     proposals = proposals.bbox.to(torch.device("cpu"))
+    if segmentation_masks.mode == "poly":
+        # rasterize all the targets of the image in a single vectorized pass
+        masks = segmentation_masks.instances.project_on_boxes(proposals, M)
+        return masks.to(device, dtype=torch.float32)
+
     for segmentation_mask, proposal in zip(segmentation_masks, proposals):
         # crop the masks, resize them to the desired resolution and
         # then convert them to the tensor representation.
@@ -43,14 +49,17 @@ def project_masks_on_boxes(segmentation_masks, proposals, discretization_size):
 
 
 class MaskRCNNLossComputation(object):
-    def __init__(self, proposal_matcher, discretization_size):
+    def __init__(self, proposal_matcher, discretization_size, num_workers=0):
         """
         Arguments:
             proposal_matcher (Matcher)
             discretization_size (int)
+            num_workers (int): if > 0, the mask targets of the different
+                images are computed in parallel by that many threads
         """
         self.proposal_matcher = proposal_matcher
         self.discretization_size = discretization_size
+        self.num_workers = num_workers
 
     def match_targets_to_proposals(self, proposal, target):
         match_quality_matrix = boxlist_iou(target, proposal)
@@ -67,7 +76,7 @@ class MaskRCNNLossComputation(object):
 
     def prepare_targets(self, proposals, targets):
         labels = []
-        masks = []
+        masks_to_project = []
         for proposals_per_image, targets_per_image in zip(proposals, targets):
             matched_targets = self.match_targets_to_proposals(
                 proposals_per_image, targets_per_image
@@ -90,12 +99,20 @@ class MaskRCNNLossComputation(object):
 
             positive_proposals = proposals_per_image[positive_inds]
 
-            masks_per_image = project_masks_on_boxes(
+            labels.append(labels_per_image)
+            masks_to_project.append((segmentation_masks, positive_proposals))
+
+        def project(args):
+            segmentation_masks, positive_proposals = args
+            return project_masks_on_boxes(
                 segmentation_masks, positive_proposals, self.discretization_size
             )
 
-            labels.append(labels_per_image)
-            masks.append(masks_per_image)
+        if self.num_workers > 0 and len(masks_to_project) > 1:
+            with ThreadPoolExecutor(self.num_workers) as executor:
+                masks = list(executor.map(project, masks_to_project))
+        else:
+            masks = [project(args) for args in masks_to_project]
 
         return labels, masks
 
@@ -136,7 +153,9 @@ def make_roi_mask_loss_evaluator(cfg):
     )
 
     loss_evaluator = MaskRCNNLossComputation(
-        matcher, cfg.MODEL.ROI_MASK_HEAD.RESOLUTION
+        matcher,
+        cfg.MODEL.ROI_MASK_HEAD.RESOLUTION,
+        cfg.MODEL.ROI_MASK_HEAD.TARGET_NUM_WORKERS,
     )
 
     return loss_evaluator
@@ -1,5 +1,6 @@
 # Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
 import math
+from collections import OrderedDict
 
 import numpy as np
 import torch
@@ -31,6 +32,46 @@ class BufferList(nn.Module):
         return iter(self._buffers.values())
 
 
+class AnchorCache(object):
+    """
+    Bounded LRU cache of the anchor tensors, which counts its hits and misses.
+    The cached tensors are shared by the callers, who must not modify them.
+    """
+
+    def __init__(self, max_size=64):
+        """
+        Arguments:
+            max_size (int): maximum number of cached tensors, the cache is
+                disabled if max_size <= 0
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        """
+        Returns the tensor of key, computed by compute() if it is not cached.
+        """
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        value = compute()
+        if self.max_size > 0:
+            self._entries[key] = value
+            if len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
 class AnchorGenerator(nn.Module):
     """
     For a set of image sizes and feature maps, computes a set
@@ -43,6 +84,7 @@ class AnchorGenerator(nn.Module):
         aspect_ratios=(0.5, 1.0, 2.0),
         anchor_strides=(8, 16, 32),
         straddle_thresh=0,
+        cache_size=64,
     ):
         super(AnchorGenerator, self).__init__()
 
@@ -66,37 +108,60 @@ class AnchorGenerator(nn.Module):
         self.strides = anchor_strides
         self.cell_anchors = BufferList(cell_anchors)
         self.straddle_thresh = straddle_thresh
+        # the anchors of the grids and their visibility in the images, as the
+        # sizes of the feature maps and of the images mostly repeat. The keys
+        # hold the version of the cell anchors, which changes when they are
+        # modified in place, and the cache is cleared when they are replaced
+        self.cache = AnchorCache(cache_size)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        self.cache.clear()
+        super(AnchorGenerator, self)._load_from_state_dict(*args, **kwargs)
+
+    def _apply(self, fn, *args, **kwargs):
+        self.cache.clear()
+        return super(AnchorGenerator, self)._apply(fn, *args, **kwargs)
 
     def num_anchors_per_location(self):
         return [len(cell_anchors) for cell_anchors in self.cell_anchors]
 
     def grid_anchors(self, grid_sizes):
         anchors = []
-        for size, stride, base_anchors in zip(
-            grid_sizes, self.strides, self.cell_anchors
+        for level, (size, stride, base_anchors) in enumerate(
+            zip(grid_sizes, self.strides, self.cell_anchors)
         ):
             grid_height, grid_width = size
-            device = base_anchors.device
-            shifts_x = torch.arange(
-                0, grid_width * stride, step=stride, dtype=torch.float32, device=device
+            key = (
+                "grid", level, int(grid_height), int(grid_width), stride,
+                base_anchors.device, base_anchors.dtype, base_anchors._version,
             )
-            shifts_y = torch.arange(
-                0, grid_height * stride, step=stride, dtype=torch.float32, device=device
-            )
-            shift_y, shift_x = torch.meshgrid(shifts_y, shifts_x)
-            shift_x = shift_x.reshape(-1)
-            shift_y = shift_y.reshape(-1)
-            shifts = torch.stack((shift_x, shift_y, shift_x, shift_y), dim=1)
-
             anchors.append(
-                (shifts.view(-1, 1, 4) + base_anchors.view(1, -1, 4)).reshape(-1, 4)
+                self.cache.get(
+                    key,
+                    lambda: self._grid_anchors_per_level(
+                        grid_height, grid_width, stride, base_anchors
+                    ),
+                )
             )
-
         return anchors
 
-    def add_visibility_to(self, boxlist):
-        image_width, image_height = boxlist.size
-        anchors = boxlist.bbox
+    def _grid_anchors_per_level(self, grid_height, grid_width, stride, base_anchors):
+        device = base_anchors.device
+        shifts_x = torch.arange(
+            0, grid_width * stride, step=stride, dtype=torch.float32, device=device
+        )
+        shifts_y = torch.arange(
+            0, grid_height * stride, step=stride, dtype=torch.float32, device=device
+        )
+        shift_y, shift_x = torch.meshgrid(shifts_y, shifts_x)
+        shift_x = shift_x.reshape(-1)
+        shift_y = shift_y.reshape(-1)
+        shifts = torch.stack((shift_x, shift_y, shift_x, shift_y), dim=1)
+
+        return (shifts.view(-1, 1, 4) + base_anchors.view(1, -1, 4)).reshape(-1, 4)
+
+    def visibility(self, anchors, image_size):
+        image_width, image_height = image_size
         if self.straddle_thresh >= 0:
             inds_inside = (
                 (anchors[..., 0] >= -self.straddle_thresh)
@@ -107,19 +172,34 @@ class AnchorGenerator(nn.Module):
         else:
             device = anchors.device
             inds_inside = torch.ones(anchors.shape[0], dtype=torch.uint8, device=device)
-        boxlist.add_field("visibility", inds_inside)
+        return inds_inside
+
+    def add_visibility_to(self, boxlist):
+        boxlist.add_field("visibility", self.visibility(boxlist.bbox, boxlist.size))
 
     def forward(self, image_list, feature_maps):
         grid_sizes = [feature_map.shape[-2:] for feature_map in feature_maps]
         anchors_over_all_feature_maps = self.grid_anchors(grid_sizes)
+        versions = [base_anchors._version for base_anchors in self.cell_anchors]
         anchors = []
         for i, (image_height, image_width) in enumerate(image_list.image_sizes):
             anchors_in_image = []
-            for anchors_per_feature_map in anchors_over_all_feature_maps:
-                boxlist = BoxList(
-                    anchors_per_feature_map, (image_width, image_height), mode="xyxy"
+            for level, anchors_per_feature_map in enumerate(
+                anchors_over_all_feature_maps
+            ):
+                image_size = (image_width, image_height)
+                grid_height, grid_width = grid_sizes[level]
+                key = (
+                    "visibility", level, int(grid_height), int(grid_width),
+                    self.strides[level], image_size,
+                    anchors_per_feature_map.device, anchors_per_feature_map.dtype,
+                    versions[level],
+                )
+                visibility = self.cache.get(
+                    key, lambda: self.visibility(anchors_per_feature_map, image_size)
                 )
-                self.add_visibility_to(boxlist)
+                boxlist = BoxList(anchors_per_feature_map, image_size, mode="xyxy")
+                boxlist.add_field("visibility", visibility)
                 anchors_in_image.append(boxlist)
             anchors.append(anchors_in_image)
         return anchors
@@ -138,7 +218,8 @@ def make_anchor_generator(config):
     else:
         assert len(anchor_stride) == 1, "Non-FPN should have a single ANCHOR_STRIDE"
     anchor_generator = AnchorGenerator(
-        anchor_sizes, aspect_ratios, anchor_stride, straddle_thresh
+        anchor_sizes, aspect_ratios, anchor_stride, straddle_thresh,
+        cache_size=config.MODEL.RPN.ANCHOR_CACHE_SIZE,
     )
     return anchor_generator
 
@@ -161,7 +242,8 @@ def make_anchor_generator_retinanet(config):
         new_anchor_sizes.append(tuple(per_layer_anchor_sizes))
 
     anchor_generator = AnchorGenerator(
-        tuple(new_anchor_sizes), aspect_ratios, anchor_strides, straddle_thresh
+        tuple(new_anchor_sizes), aspect_ratios, anchor_strides, straddle_thresh,
+        cache_size=config.MODEL.RETINANET.ANCHOR_CACHE_SIZE,
     )
     return anchor_generator
 
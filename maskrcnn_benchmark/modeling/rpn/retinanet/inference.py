@@ -3,6 +3,7 @@ import torch
 from ..inference import RPNPostProcessor
 from ..utils import permute_and_flatten
 
+from maskrcnn_benchmark.layers import multiclass_nms
 from maskrcnn_benchmark.modeling.box_coder import BoxCoder
 from maskrcnn_benchmark.modeling.utils import cat
 from maskrcnn_benchmark.structures.bounding_box import BoxList
@@ -25,6 +26,10 @@ class RetinaNetPostProcessor(RPNPostProcessor):
         min_size,
         num_classes,
         box_coder=None,
+        nms_type="greedy",
+        nms_top_k=200,
+        matrix_nms_kernel="gaussian",
+        matrix_nms_sigma=2.0,
     ):
         """
         Arguments:
@@ -35,6 +40,10 @@ class RetinaNetPostProcessor(RPNPostProcessor):
             min_size (int)
             num_classes (int)
             box_coder (BoxCoder)
+            nms_type (str): "greedy", "fast" or "matrix", see multiclass_nms
+            nms_top_k (int)
+            matrix_nms_kernel (str)
+            matrix_nms_sigma (float)
         """
         super(RetinaNetPostProcessor, self).__init__(
             pre_nms_thresh, 0, nms_thresh, min_size
@@ -45,6 +54,10 @@ class RetinaNetPostProcessor(RPNPostProcessor):
         self.fpn_post_nms_top_n = fpn_post_nms_top_n
         self.min_size = min_size
         self.num_classes = num_classes
+        self.nms_type = nms_type
+        self.nms_top_k = nms_top_k
+        self.matrix_nms_kernel = matrix_nms_kernel
+        self.matrix_nms_sigma = matrix_nms_sigma
 
         if box_coder is None:
             box_coder = BoxCoder(weights=(10., 10., 5., 5.))
@@ -128,6 +141,8 @@ class RetinaNetPostProcessor(RPNPostProcessor):
     # TODO Yang: solve this issue in the future. No good solution
     # right now.
     def select_over_all_levels(self, boxlists):
+        if self.nms_type != "greedy":
+            return self.select_over_all_levels_dense(boxlists)
         num_images = len(boxlists)
         results = []
         for i in range(num_images):
@@ -172,6 +187,45 @@ class RetinaNetPostProcessor(RPNPostProcessor):
             results.append(result)
         return results
 
+    def select_over_all_levels_dense(self, boxlists):
+        """Same as select_over_all_levels, but with the Fast or Matrix NMS of
+        all the classes of all the images performed by a single call to
+        multiclass_nms.
+        """
+        device = boxlists[0].bbox.device
+        boxes = torch.cat([boxlist.bbox for boxlist in boxlists], dim=0)
+        scores = torch.cat([boxlist.get_field("scores") for boxlist in boxlists])
+        labels = torch.cat([boxlist.get_field("labels") for boxlist in boxlists])
+        image_ids = torch.cat(
+            [
+                torch.full((len(boxlist),), i, dtype=torch.int64, device=device)
+                for i, boxlist in enumerate(boxlists)
+            ]
+        )
+        keep, scores = multiclass_nms(
+            boxes,
+            scores,
+            labels,
+            self.nms_thresh,
+            image_ids,
+            self.fpn_post_nms_top_n,
+            nms_type=self.nms_type,
+            top_k=self.nms_top_k,
+            score_thresh=self.pre_nms_thresh,
+            matrix_nms_kernel=self.matrix_nms_kernel,
+            matrix_nms_sigma=self.matrix_nms_sigma,
+        )
+        boxes, labels, image_ids = boxes[keep], labels[keep], image_ids[keep]
+
+        results = []
+        for i, boxlist in enumerate(boxlists):
+            inds_i = (image_ids == i).nonzero().squeeze(1)
+            result = BoxList(boxes[inds_i], boxlist.size, mode="xyxy")
+            result.add_field("scores", scores[inds_i])
+            result.add_field("labels", labels[inds_i])
+            results.append(result)
+        return results
+
 
 def make_retinanet_postprocessor(config, rpn_box_coder, is_train):
     pre_nms_thresh = config.MODEL.RETINANET.INFERENCE_TH
@@ -188,6 +242,10 @@ def make_retinanet_postprocessor(config, rpn_box_coder, is_train):
         min_size=min_size,
         num_classes=config.MODEL.RETINANET.NUM_CLASSES,
         box_coder=rpn_box_coder,
+        nms_type=config.MODEL.RETINANET.NMS_TYPE,
+        nms_top_k=config.MODEL.RETINANET.NMS_TOP_K,
+        matrix_nms_kernel=config.MODEL.RETINANET.MATRIX_NMS_KERNEL,
+        matrix_nms_sigma=config.MODEL.RETINANET.MATRIX_NMS_SIGMA,
     )
 
     return box_selector
@@ -3,7 +3,7 @@ import torch
 
 from .bounding_box import BoxList
 
-from maskrcnn_benchmark.layers import nms as _box_nms
+from maskrcnn_benchmark.layers import batched_nms as _box_batched_nms
 
 
 def boxlist_nms(boxlist, nms_thresh, max_proposals=-1, score_field="scores"):
@@ -24,9 +24,11 @@ def boxlist_nms(boxlist, nms_thresh, max_proposals=-1, score_field="scores"):
     boxlist = boxlist.convert("xyxy")
     boxes = boxlist.bbox
     score = boxlist.get_field(score_field)
-    keep = _box_nms(boxes, score, nms_thresh)
-    if max_proposals > 0:
-        keep = keep[: max_proposals]
+    # a single group, so that the NMS stops once max_proposals boxes are kept
+    groups = torch.zeros_like(score, dtype=torch.int64)
+    keep = _box_batched_nms(
+        boxes, score, groups, nms_thresh, detections_per_img=max_proposals
+    )
     boxlist = boxlist[keep]
     return boxlist.convert(mode)
 
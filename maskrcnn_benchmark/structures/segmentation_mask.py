@@ -22,7 +22,8 @@ therefore BinaryMaskList handles them together.
 
 Polygons are handled separately for each instance,
 by PolygonInstance and instances are handled by
-PolygonList.
+PolygonList. Alternatively, PackedPolygonList stores
+the polygons of all instances in flat buffers.
 
 SegmentationList is supposed to represent both,
 therefore it wraps the functions of BinaryMaskList
@@ -345,6 +346,107 @@ class PolygonInstance(object):
         return s
 
 
+def _rasterize_polygons(xy, poly_lengths, poly_to_mask, num_masks, height, width):
+    """
+    Rasterizes a flat buffer of polygons into binary masks, with the same
+    algorithm as the COCO API (rleFrPoly followed by a union merge), but
+    for all the polygons at once.
+
+    Arguments:
+        xy (np.ndarray[K, 2], float64): vertices of all the polygons
+        poly_lengths (np.ndarray[P]): number of vertices of each polygon
+        poly_to_mask (np.ndarray[P]): index of the mask each polygon belongs to
+        num_masks (int)
+        height, width (int)
+
+    Returns:
+        masks (np.ndarray[num_masks, height, width], uint8)
+    """
+    masks = np.zeros((num_masks, width * height), dtype=np.uint8)
+    num_polys = len(poly_lengths)
+    if num_polys == 0:
+        return masks.reshape(num_masks, width, height).transpose(0, 2, 1)
+    scale = 5.0
+    invalid = np.iinfo(np.int32).min
+
+    # upsample and get discrete points densely along the entire boundary
+    x = np.trunc(scale * xy[:, 0] + .5).astype(np.int64)
+    y = np.trunc(scale * xy[:, 1] + .5).astype(np.int64)
+    poly_starts = np.cumsum(poly_lengths) - poly_lengths
+    nxt = np.arange(1, len(xy) + 1)
+    nxt[poly_starts + poly_lengths - 1] = poly_starts
+    xs, ys, xe, ye = x, y, x[nxt], y[nxt]
+    dx, dy = np.abs(xe - xs), np.abs(ys - ye)
+    horizontal = dx >= dy
+    flip = (horizontal & (xs > xe)) | (~horizontal & (ys > ye))
+    xs, xe = np.where(flip, xe, xs), np.where(flip, xs, xe)
+    ys, ye = np.where(flip, ye, ys), np.where(flip, ys, ye)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(horizontal, (ye - ys) / dx, (xe - xs) / dy)
+
+    num_samples = np.maximum(dx, dy) + 1
+    edge = np.repeat(np.arange(len(xy)), num_samples)
+    d = np.arange(len(edge)) - np.repeat(np.cumsum(num_samples) - num_samples, num_samples)
+    t = np.where(flip[edge], num_samples[edge] - 1 - d, d)
+    hor = horizontal[edge]
+    with np.errstate(invalid="ignore"):
+        rounded = np.trunc(np.where(hor, ys[edge], xs[edge]) + slope[edge] * t + .5)
+    # degenerate edges give NaN, which the C implementation casts to INT_MIN
+    rounded[np.isnan(rounded)] = invalid
+    rounded = rounded.astype(np.int64)
+    u = np.where(hor, t + xs[edge], rounded)
+    v = np.where(hor, rounded, t + ys[edge])
+    sample_poly = np.repeat(np.arange(num_polys), poly_lengths)[edge]
+
+    # get points along y-boundary and downsample
+    u0, u1, v0, v1 = u[:-1], u[1:], v[:-1], v[1:]
+    valid = (sample_poly[1:] == sample_poly[:-1]) & (u1 != u0)
+    xd = np.where(u1 < u0, u1, u1 - 1).astype(np.float64)
+    xd = (xd + .5) / scale - .5
+    valid &= (np.floor(xd) == xd) & (xd >= 0) & (xd <= width - 1)
+    yd = np.minimum(v0, v1).astype(np.float64)
+    yd = np.ceil(np.clip((yd + .5) / scale - .5, 0, height))
+    points = xd[valid].astype(np.int64) * height + yd[valid].astype(np.int64)
+
+    # each boundary point toggles the mask value of all the following pixels
+    # (in column-major order) of its polygon
+    area = width * height
+    toggles = np.bincount(
+        sample_poly[1:][valid] * (area + 1) + points, minlength=num_polys * (area + 1)
+    ).reshape(num_polys, area + 1)
+    poly_masks = np.cumsum(toggles, axis=1)[:, :-1] % 2
+    poly_ids, pixels = np.nonzero(poly_masks)
+    masks[poly_to_mask[poly_ids], pixels] = 1
+    return masks.reshape(num_masks, width, height).transpose(0, 2, 1)
+
+
+def _project_polygons_on_boxes(xy, poly_lengths, poly_to_mask, size, boxes, mask_size):
+    """
+    Implementation of project_on_boxes for a flat buffer of polygons: the
+    vertices xy (Tensor[K, 2]) of the polygons of length poly_lengths, each
+    belonging to the instance poly_to_mask, in an image of the given size.
+    """
+    M = mask_size
+    if len(poly_lengths) == 0:
+        return torch.zeros((len(boxes), M, M), dtype=torch.uint8)
+    vertex_to_mask = torch.from_numpy(np.repeat(poly_to_mask, poly_lengths))
+
+    # mirror the float32 / float64 arithmetic of PolygonList.crop
+    # followed by PolygonInstance.resize, so the result is bit-exact
+    width, height = size
+    boxes = boxes.to(torch.float32)
+    xmin = boxes[:, 0].double().clamp(min=0).clamp(max=width - 1).float()
+    ymin = boxes[:, 1].double().clamp(min=0).clamp(max=height - 1).float()
+    ratio_w = (float(M) / (boxes[:, 2] - boxes[:, 0]).double()).float()
+    ratio_h = (float(M) / (boxes[:, 3] - boxes[:, 1]).double()).float()
+    x = (xy[:, 0] - xmin[vertex_to_mask]) * ratio_w[vertex_to_mask]
+    y = (xy[:, 1] - ymin[vertex_to_mask]) * ratio_h[vertex_to_mask]
+    xy = torch.stack([x, y], dim=1).double().numpy()
+
+    masks = _rasterize_polygons(xy, poly_lengths, poly_to_mask, len(boxes), M, M)
+    return torch.from_numpy(np.ascontiguousarray(masks))
+
+
 class PolygonList(object):
     """
     This class handles PolygonInstances for all objects in the image
@@ -445,6 +547,32 @@ class PolygonList(object):
 
         return BinaryMaskList(masks, size=self.size)
 
+    def project_on_boxes(self, boxes, mask_size):
+        """
+        Crops every instance to its box, resizes it to mask_size x mask_size
+        and rasterizes it, in a single vectorized pass over all the polygons.
+        The result is identical to calling crop, resize and
+        convert_to_binarymask on every instance.
+
+        Arguments:
+            boxes (Tensor[N, 4]): one xyxy box per instance, on the CPU
+            mask_size (int)
+
+        Returns:
+            masks (Tensor[N, mask_size, mask_size], uint8)
+        """
+        assert len(boxes) == len(self), "{} != {}".format(len(boxes), len(self))
+        polygons = [(i, p) for i, inst in enumerate(self.polygons) for p in inst.polygons]
+        if len(polygons) == 0:
+            xy = torch.empty((0, 2), dtype=torch.float32)
+        else:
+            xy = torch.cat([p[: len(p) // 2 * 2] for _, p in polygons]).view(-1, 2)
+        poly_to_mask = np.array([i for i, _ in polygons], dtype=np.int64)
+        poly_lengths = np.array([len(p) // 2 for _, p in polygons], dtype=np.int64)
+        return _project_polygons_on_boxes(
+            xy, poly_lengths, poly_to_mask, self.size, boxes, mask_size
+        )
+
     def __len__(self):
         return len(self.polygons)
 
@@ -475,6 +603,293 @@ class PolygonList(object):
         return s
 
 
+def _concat_ranges(starts, lengths):
+    """
+    Returns the concatenation of arange(start, start + length) for every
+    pair of starts and lengths (np.ndarray).
+    """
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(lengths.sum())
+
+
+class PackedPolygonList(object):
+    """
+    This class handles the polygons of all objects in the image, like
+    PolygonList, but stores them in flat buffers: the vertices of all the
+    polygons in one contiguous tensor, and CSR-like offset arrays giving the
+    vertices of each polygon and the polygons of each instance. All the
+    operations are then performed on the whole image at once.
+    """
+
+    def __init__(self, polygons, size):
+        """
+        Arguments:
+            polygons:
+                a list of list of lists of numbers (see PolygonList)
+
+                OR
+
+                a list of PolygonInstances.
+
+                OR
+
+                a PolygonList or a PackedPolygonList
+
+            size: absolute image size
+        """
+        if isinstance(polygons, PackedPolygonList):
+            self.coords = polygons.coords
+            self.poly_offsets = polygons.poly_offsets
+            self.instance_offsets = polygons.instance_offsets
+            self.size = tuple(size)
+            return
+
+        if isinstance(polygons, PolygonList):
+            polygons = polygons.polygons
+        elif not isinstance(polygons, (list, tuple)):
+            raise RuntimeError(
+                "Type of argument `polygons` is not allowed:%s"
+                % (type(polygons))
+            )
+        assert isinstance(size, (list, tuple)), str(type(size))
+
+        coords = []
+        poly_lengths = []
+        instance_lengths = []
+        for instance in polygons:
+            if isinstance(instance, PolygonInstance):
+                instance = instance.polygons
+            num_polygons = 0
+            for p in instance:
+                if isinstance(p, torch.Tensor):
+                    p = p.tolist()
+                if len(p) >= 6:  # 3 * 2 coordinates
+                    num_vertices = len(p) // 2
+                    coords.extend(p[: 2 * num_vertices])
+                    poly_lengths.append(num_vertices)
+                    num_polygons += 1
+            # instances without any valid polygon are dropped, as in PolygonList
+            if num_polygons > 0:
+                instance_lengths.append(num_polygons)
+
+        self.coords = torch.as_tensor(coords, dtype=torch.float32).reshape(-1, 2)
+        self.poly_offsets = self._lengths_to_offsets(poly_lengths)
+        self.instance_offsets = self._lengths_to_offsets(instance_lengths)
+        self.size = tuple(size)
+
+    @staticmethod
+    def _lengths_to_offsets(lengths):
+        offsets = torch.zeros(len(lengths) + 1, dtype=torch.int64)
+        if len(lengths) > 0:
+            offsets[1:] = torch.as_tensor(lengths, dtype=torch.int64).cumsum(0)
+        return offsets
+
+    @classmethod
+    def from_buffers(cls, coords, poly_offsets, instance_offsets, size):
+        """
+        Builds a PackedPolygonList directly from its flat buffers, which
+        are used as is.
+        """
+        packed = cls([], size)
+        packed.coords = coords
+        packed.poly_offsets = poly_offsets
+        packed.instance_offsets = instance_offsets
+        return packed
+
+    def _from_buffers(self, coords, poly_offsets, instance_offsets, size):
+        return PackedPolygonList.from_buffers(
+            coords, poly_offsets, instance_offsets, size
+        )
+
+    @property
+    def polygons(self):
+        """
+        The instances as a list of PolygonInstances, viewing the flat buffer.
+        """
+        flat = self.coords.view(-1)
+        poly_offsets = (2 * self.poly_offsets).tolist()
+        instance_offsets = self.instance_offsets.tolist()
+        instances = []
+        for start, end in zip(instance_offsets[:-1], instance_offsets[1:]):
+            polygons = [
+                flat[poly_offsets[i]: poly_offsets[i + 1]] for i in range(start, end)
+            ]
+            instances.append(PolygonInstance(polygons, self.size))
+        return instances
+
+    def transpose(self, method):
+        if method not in (FLIP_LEFT_RIGHT, FLIP_TOP_BOTTOM):
+            raise NotImplementedError(
+                "Only FLIP_LEFT_RIGHT and FLIP_TOP_BOTTOM implemented"
+            )
+
+        width, height = self.size
+        if method == FLIP_LEFT_RIGHT:
+            dim = width
+            idx = 0
+        elif method == FLIP_TOP_BOTTOM:
+            dim = height
+            idx = 1
+
+        coords = self.coords.clone()
+        TO_REMOVE = 1
+        coords[:, idx] = dim - self.coords[:, idx] - TO_REMOVE
+        return self._from_buffers(
+            coords, self.poly_offsets, self.instance_offsets, self.size
+        )
+
+    def crop(self, box):
+        assert isinstance(box, (list, tuple, torch.Tensor)), str(type(box))
+
+        # box is assumed to be xyxy
+        current_width, current_height = self.size
+        xmin, ymin, xmax, ymax = map(float, box)
+
+        assert xmin <= xmax and ymin <= ymax, str(box)
+        xmin = min(max(xmin, 0), current_width - 1)
+        ymin = min(max(ymin, 0), current_height - 1)
+
+        coords = self.coords - torch.tensor([xmin, ymin], dtype=torch.float32)
+        cropped_size = box[2] - box[0], box[3] - box[1]
+        return self._from_buffers(
+            coords, self.poly_offsets, self.instance_offsets, cropped_size
+        )
+
+    def resize(self, size):
+        try:
+            iter(size)
+        except TypeError:
+            assert isinstance(size, (int, float))
+            size = size, size
+
+        ratios = tuple(
+            float(s) / float(s_orig) for s, s_orig in zip(size, self.size)
+        )
+        coords = self.coords * torch.tensor(ratios, dtype=torch.float32)
+        return self._from_buffers(
+            coords, self.poly_offsets, self.instance_offsets, size
+        )
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def convert_to_binarymask(self):
+        if len(self) > 0:
+            masks = torch.stack(
+                [p.convert_to_binarymask() for p in self.polygons]
+            )
+        else:
+            size = self.size
+            masks = torch.empty([0, size[1], size[0]], dtype=torch.uint8)
+
+        return BinaryMaskList(masks, size=self.size)
+
+    def project_on_boxes(self, boxes, mask_size):
+        """
+        See PolygonList.project_on_boxes.
+        """
+        assert len(boxes) == len(self), "{} != {}".format(len(boxes), len(self))
+        poly_lengths = (self.poly_offsets[1:] - self.poly_offsets[:-1]).numpy()
+        instance_lengths = (self.instance_offsets[1:] - self.instance_offsets[:-1]).numpy()
+        poly_to_mask = np.repeat(np.arange(len(self)), instance_lengths)
+        return _project_polygons_on_boxes(
+            self.coords, poly_lengths, poly_to_mask, self.size, boxes, mask_size
+        )
+
+    def __len__(self):
+        return len(self.instance_offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            item = [item]
+        elif isinstance(item, torch.Tensor):
+            if item.dtype == torch.uint8:
+                item = item.nonzero().view(-1)
+            item = item.cpu().numpy()
+        if isinstance(item, (list, tuple)):
+            item = np.array(item, dtype=np.int64)
+        # slicing or advanced indexing on a single dimension
+        instances = np.atleast_1d(np.arange(len(self))[item])
+
+        instance_offsets = self.instance_offsets.numpy()
+        first_polygons = instance_offsets[instances]
+        num_polygons = instance_offsets[instances + 1] - first_polygons
+        polygons = _concat_ranges(first_polygons, num_polygons)
+
+        poly_offsets = self.poly_offsets.numpy()
+        first_vertices = poly_offsets[polygons]
+        num_vertices = poly_offsets[polygons + 1] - first_vertices
+        vertices = _concat_ranges(first_vertices, num_vertices)
+
+        return self._from_buffers(
+            self.coords[torch.from_numpy(vertices)],
+            self._lengths_to_offsets(num_vertices),
+            self._lengths_to_offsets(num_polygons),
+            self.size,
+        )
+
+    def __iter__(self):
+        return iter(self.polygons)
+
+    def __repr__(self):
+        s = self.__class__.__name__ + "("
+        s += "num_instances={}, ".format(len(self))
+        s += "image_width={}, ".format(self.size[0])
+        s += "image_height={})".format(self.size[1])
+        return s
+
+
+class RLEMaskList(object):
+    """
+    This class holds COCO run-length encoded binary masks of the objects in
+    an image, e.g. predicted masks which were already pasted in the image
+    and encoded. It only supports indexing, so that it can be a field of a
+    BoxList; the masks can be decoded with pycocotools.
+    """
+
+    def __init__(self, rles, size):
+        """
+        Arguments:
+            rles (list[dict]): COCO RLEs, with counts as str or bytes
+            size: absolute image size, (width, height)
+        """
+        self.rles = list(rles)
+        self.size = tuple(size)
+
+    def resize(self, size):
+        if tuple(size) != self.size:
+            raise NotImplementedError("RLE masks can't be resized")
+        return self
+
+    def __len__(self):
+        return len(self.rles)
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            selected_rles = [self.rles[item]]
+        elif isinstance(item, slice):
+            selected_rles = self.rles[item]
+        else:
+            # advanced indexing on a single dimension
+            if isinstance(item, torch.Tensor) and item.dtype == torch.uint8:
+                item = item.nonzero()
+                item = item.squeeze(1) if item.numel() > 0 else item
+            if isinstance(item, torch.Tensor):
+                item = item.tolist()
+            selected_rles = [self.rles[i] for i in item]
+        return RLEMaskList(selected_rles, self.size)
+
+    def __iter__(self):
+        return iter(self.rles)
+
+    def __repr__(self):
+        s = self.__class__.__name__ + "("
+        s += "num_instances={}, ".format(len(self.rles))
+        s += "image_width={}, ".format(self.size[0])
+        s += "image_height={})".format(self.size[1])
+        return s
+
+
 class SegmentationMask(object):
 
     """
@@ -501,7 +916,9 @@ class SegmentationMask(object):
         assert isinstance(size[0], (int, float))
         assert isinstance(size[1], (int, float))
 
-        if mode == "poly":
+        if mode == "poly" and isinstance(instances, PackedPolygonList):
+            self.instances = PackedPolygonList(instances, size)
+        elif mode == "poly":
             self.instances = PolygonList(instances, size)
         elif mode == "mask":
             self.instances = BinaryMaskList(instances, size)
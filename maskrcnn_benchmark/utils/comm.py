@@ -3,6 +3,8 @@ This file contains primitives for multi-gpu communication.
 This is useful when doing distributed training.
 """
 
+import functools
+import os
 import pickle
 import time
 
@@ -45,47 +47,164 @@ def synchronize():
     dist.barrier()
 
 
-def all_gather(data):
+# payloads are sent in chunks of at most this number of bytes, which bounds
+# the memory used by a gather to world_size * _MAX_CHUNK_SIZE on top of the data
+_MAX_CHUNK_SIZE = 64 * 1024 ** 2
+
+
+@functools.lru_cache()
+def _get_global_gloo_group():
+    """
+    Returns a process group containing all the ranks which uses the gloo
+    backend, so that arbitrary data can be gathered in CPU memory even when
+    the default group uses nccl. The result is cached.
+    """
+    if dist.get_backend() == "nccl":
+        return dist.new_group(backend="gloo")
+    return dist.group.WORLD
+
+
+def _get_device(group):
+    if dist.get_backend(group) == "nccl":
+        return torch.device("cuda")
+    return torch.device("cpu")
+
+
+def _serialize_to_tensor(data, device):
+    buffer = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
+    storage = torch.ByteStorage.from_buffer(buffer)
+    return torch.ByteTensor(storage).to(device)
+
+
+def _gather_buffers(data, dst, group, max_chunk_size):
+    """
+    Sends the pickled data of every rank to dst, or to all the ranks if dst is
+    None, in chunks of at most max_chunk_size bytes. Returns the list of the
+    pickled data of all the ranks on the receiving ranks, and None elsewhere.
+    """
+    world_size = dist.get_world_size(group=group)
+    rank = dist.get_rank()
+    device = _get_device(group)
+    tensor = _serialize_to_tensor(data, device)
+
+    # obtain Tensor size of each rank
+    local_size = torch.tensor([tensor.numel()], dtype=torch.int64, device=device)
+    size_list = [torch.zeros_like(local_size) for _ in range(world_size)]
+    dist.all_gather(size_list, local_size, group=group)
+    size_list = [int(size.item()) for size in size_list]
+    max_size = max(size_list)
+
+    receive = dst is None or rank == dst
+    # nccl doesn't support gather in all versions of pytorch
+    use_all_gather = dst is None or device.type == "cuda"
+    buffers = [bytearray() for _ in size_list] if receive else None
+    for start in range(0, max_size, max_chunk_size):
+        # we pad the chunks because torch all_gather does not support
+        # gathering tensors of different shapes
+        chunk_size = min(max_chunk_size, max_size - start)
+        chunk = tensor[start: start + chunk_size]
+        if chunk.numel() < chunk_size:
+            padding = torch.zeros(
+                (chunk_size - chunk.numel(),), dtype=torch.uint8, device=device
+            )
+            chunk = torch.cat((chunk, padding), dim=0)
+
+        chunk_list = None
+        if receive or use_all_gather:
+            chunk_list = [
+                torch.empty((chunk_size,), dtype=torch.uint8, device=device)
+                for _ in size_list
+            ]
+        if use_all_gather:
+            dist.all_gather(chunk_list, chunk, group=group)
+        else:
+            dist.gather(chunk, gather_list=chunk_list, dst=dst, group=group)
+
+        if receive:
+            for buffer, size, received in zip(buffers, size_list, chunk_list):
+                num_bytes = min(size - start, chunk_size)
+                if num_bytes > 0:
+                    buffer.extend(received[:num_bytes].cpu().numpy().tobytes())
+    return buffers
+
+
+def _gather_via_filesystem(data, dst, shared_dir):
+    """
+    Same as _gather_buffers, but the data goes through files in shared_dir,
+    a directory on a filesystem shared by all the ranks.
+    """
+    rank = get_rank()
+    world_size = get_world_size()
+    path = os.path.join(shared_dir, "gather-rank{:05d}.pkl")
+    if rank == 0 and not os.path.exists(shared_dir):
+        os.makedirs(shared_dir, exist_ok=True)
+    synchronize()
+    # write to a temporary file first, so that the file is complete once visible
+    with open(path.format(rank) + ".tmp", "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.rename(path.format(rank) + ".tmp", path.format(rank))
+    synchronize()
+
+    data_list = None
+    if dst is None or rank == dst:
+        data_list = []
+        for r in range(world_size):
+            with open(path.format(r), "rb") as f:
+                data_list.append(pickle.load(f))
+    # wait for all the ranks to have read the files before removing them
+    synchronize()
+    os.remove(path.format(rank))
+    return data_list
+
+
+def all_gather(data, group=None, max_chunk_size=_MAX_CHUNK_SIZE, shared_dir=None):
     """
     Run all_gather on arbitrary picklable data (not necessarily tensors)
     Args:
         data: any picklable object
+        group: the process group to use. By default, a gloo group containing
+            all the ranks, so that the data is exchanged in CPU memory
+        max_chunk_size (int): the data is sent in chunks of at most this
+            number of bytes
+        shared_dir (str, optional): if given, the data is exchanged through
+            files in this directory, which must be shared by all the ranks,
+            instead of through torch.distributed
     Returns:
         list[data]: list of data gathered from each rank
     """
     world_size = get_world_size()
     if world_size == 1:
         return [data]
+    if shared_dir:
+        return _gather_via_filesystem(data, None, shared_dir)
+    if group is None:
+        group = _get_global_gloo_group()
+    buffers = _gather_buffers(data, None, group, max_chunk_size)
+    return [pickle.loads(buffer) for buffer in buffers]
 
-    # serialized to a Tensor
-    buffer = pickle.dumps(data)
-    storage = torch.ByteStorage.from_buffer(buffer)
-    tensor = torch.ByteTensor(storage).to("cuda")
-
-    # obtain Tensor size of each rank
-    local_size = torch.LongTensor([tensor.numel()]).to("cuda")
-    size_list = [torch.LongTensor([0]).to("cuda") for _ in range(world_size)]
-    dist.all_gather(size_list, local_size)
-    size_list = [int(size.item()) for size in size_list]
-    max_size = max(size_list)
-
-    # receiving Tensor from all ranks
-    # we pad the tensor because torch all_gather does not support
-    # gathering tensors of different shapes
-    tensor_list = []
-    for _ in size_list:
-        tensor_list.append(torch.ByteTensor(size=(max_size,)).to("cuda"))
-    if local_size != max_size:
-        padding = torch.ByteTensor(size=(max_size - local_size,)).to("cuda")
-        tensor = torch.cat((tensor, padding), dim=0)
-    dist.all_gather(tensor_list, tensor)
-
-    data_list = []
-    for size, tensor in zip(size_list, tensor_list):
-        buffer = tensor.cpu().numpy().tobytes()[:size]
-        data_list.append(pickle.loads(buffer))
 
-    return data_list
+def gather(data, dst=0, group=None, max_chunk_size=_MAX_CHUNK_SIZE, shared_dir=None):
+    """
+    Run gather on arbitrary picklable data (not necessarily tensors): unlike
+    all_gather, only rank dst receives and unpickles the data of all the
+    ranks. See all_gather for the arguments.
+    Returns:
+        list[data]: on rank dst, list of data gathered from each rank.
+            Otherwise, an empty list.
+    """
+    world_size = get_world_size()
+    if world_size == 1:
+        return [data]
+    if shared_dir:
+        data_list = _gather_via_filesystem(data, dst, shared_dir)
+    else:
+        if group is None:
+            group = _get_global_gloo_group()
+        buffers = _gather_buffers(data, dst, group, max_chunk_size)
+        data_list = None
+        if buffers is not None:
+            data_list = [pickle.loads(buffer) for buffer in buffers]
+    return data_list if data_list is not None else []
 
 
 def reduce_dict(input_dict, average=True):
@@ -0,0 +1,127 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.config import cfg as g_cfg
+from maskrcnn_benchmark.modeling.rpn.anchor_generator import AnchorCache
+from maskrcnn_benchmark.modeling.rpn.anchor_generator import AnchorGenerator
+from maskrcnn_benchmark.modeling.rpn.anchor_generator import make_anchor_generator
+from maskrcnn_benchmark.modeling.rpn.anchor_generator import (
+    make_anchor_generator_retinanet,
+)
+from maskrcnn_benchmark.structures.image_list import ImageList
+
+
+def _inputs(image_sizes, padded_size, strides=(8, 16, 32)):
+    image_list = ImageList(torch.zeros(len(image_sizes), 3, *padded_size), image_sizes)
+    feature_maps = [
+        torch.zeros(len(image_sizes), 1, padded_size[0] // s, padded_size[1] // s)
+        for s in strides
+    ]
+    return image_list, feature_maps
+
+
+class TestAnchorCache(unittest.TestCase):
+    def test_lru(self):
+        cache = AnchorCache(max_size=2)
+        self.assertEqual(cache.get("a", lambda: 1), 1)
+        self.assertEqual(cache.get("b", lambda: 2), 2)
+        self.assertEqual(cache.get("a", lambda: 3), 1)
+        # "b" is the least recently used
+        self.assertEqual(cache.get("c", lambda: 4), 4)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get("b", lambda: 5), 5)
+        self.assertEqual(cache.get("a", lambda: 6), 6)
+        self.assertEqual((cache.hits, cache.misses), (1, 5))
+
+    def test_disabled(self):
+        cache = AnchorCache(max_size=0)
+        self.assertEqual(cache.get("a", lambda: 1), 1)
+        self.assertEqual(cache.get("a", lambda: 2), 2)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual((cache.hits, cache.misses), (0, 2))
+
+
+class TestAnchorGenerator(unittest.TestCase):
+    def _check_same_as_uncached(self, straddle_thresh):
+        cached = AnchorGenerator((32, 64, 128), straddle_thresh=straddle_thresh)
+        uncached = AnchorGenerator(
+            (32, 64, 128), straddle_thresh=straddle_thresh, cache_size=0
+        )
+        for image_sizes, padded_size in [
+            ([(200, 240), (180, 256)], (224, 256)),
+            ([(200, 240), (180, 256)], (224, 256)),
+            ([(224, 160)], (224, 160)),
+            ([(180, 256), (200, 240)], (224, 256)),
+        ]:
+            inputs = _inputs(image_sizes, padded_size)
+            for anchors, expected in zip(cached(*inputs), uncached(*inputs)):
+                for boxlist, expected_boxlist in zip(anchors, expected):
+                    self.assertEqual(boxlist.size, expected_boxlist.size)
+                    self.assertTrue(torch.equal(boxlist.bbox, expected_boxlist.bbox))
+                    self.assertTrue(
+                        torch.equal(
+                            boxlist.get_field("visibility"),
+                            expected_boxlist.get_field("visibility"),
+                        )
+                    )
+        # 3 grids of each padded size, and 3 visibility masks of each image size
+        self.assertEqual(cached.cache.misses, 2 * 3 + 3 * 3)
+        self.assertEqual(cached.cache.hits, 3 + 2 * 3 + 3 + 2 * 3)
+        self.assertEqual(uncached.cache.hits, 0)
+
+    def test_same_as_uncached(self):
+        self._check_same_as_uncached(0)
+
+    def test_same_as_uncached_no_straddle_thresh(self):
+        self._check_same_as_uncached(-1)
+
+    def test_bounded(self):
+        generator = AnchorGenerator((32, 64, 128), cache_size=4)
+        for size in range(64, 256, 32):
+            generator(*_inputs([(size, size)], (size, size)))
+        self.assertEqual(len(generator.cache), 4)
+
+    def test_cell_anchors_changed(self):
+        inputs = _inputs([(200, 240)], (224, 256))
+        generator = AnchorGenerator((32, 64, 128))
+        other = AnchorGenerator((48, 96, 192))
+
+        def check_same_as_other():
+            for boxlist, expected in zip(generator(*inputs)[0], other(*inputs)[0]):
+                self.assertTrue(torch.allclose(boxlist.bbox, expected.bbox))
+                self.assertTrue(
+                    torch.equal(
+                        boxlist.get_field("visibility"),
+                        expected.get_field("visibility"),
+                    )
+                )
+
+        # replaced by a checkpoint after a first forward
+        generator(*inputs)
+        generator.load_state_dict(other.state_dict())
+        self.assertEqual(len(generator.cache), 0)
+        check_same_as_other()
+        # modified in place
+        for base_anchors, other_anchors in zip(
+            generator.cell_anchors, other.cell_anchors
+        ):
+            base_anchors.mul_(2)
+            other_anchors.mul_(2)
+        check_same_as_other()
+        # moved to another dtype and back
+        generator.double().float()
+        self.assertEqual(len(generator.cache), 0)
+        check_same_as_other()
+
+    def test_from_config(self):
+        cfg = g_cfg.clone()
+        cfg.MODEL.RPN.ANCHOR_CACHE_SIZE = 10
+        cfg.MODEL.RETINANET.ANCHOR_CACHE_SIZE = 20
+        self.assertEqual(make_anchor_generator(cfg).cache.max_size, 10)
+        self.assertEqual(make_anchor_generator_retinanet(cfg).cache.max_size, 20)
+
+
+if __name__ == "__main__":
+    unittest.main()
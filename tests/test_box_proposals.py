@@ -0,0 +1,152 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import itertools
+import unittest
+
+import numpy as np
+import torch
+from pycocotools.coco import COCO
+
+from maskrcnn_benchmark.data.datasets.evaluation.coco.coco_eval import (
+    evaluate_box_proposals_multi,
+)
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.boxlist_ops import boxlist_iou
+
+AREA_RANGES = {
+    "all": [0 ** 2, 1e5 ** 2],
+    "small": [0 ** 2, 32 ** 2],
+    "medium": [32 ** 2, 96 ** 2],
+    "large": [96 ** 2, 1e5 ** 2],
+    "96-128": [96 ** 2, 128 ** 2],
+    "128-256": [128 ** 2, 256 ** 2],
+    "256-512": [256 ** 2, 512 ** 2],
+    "512-inf": [512 ** 2, 1e5 ** 2],
+}
+
+
+def _reference_box_proposals(predictions, dataset, area="all", limit=None):
+    # per area and limit evaluation of the original implementation
+    area_range = AREA_RANGES[area]
+    gt_overlaps = []
+    num_pos = 0
+    for image_id, prediction in enumerate(predictions):
+        original_id = dataset.id_to_img_map[image_id]
+        img_info = dataset.get_img_info(image_id)
+        image_width = img_info["width"]
+        image_height = img_info["height"]
+        prediction = prediction.resize((image_width, image_height))
+        inds = prediction.get_field("objectness").sort(descending=True)[1]
+        prediction = prediction[inds]
+
+        anno = dataset.coco.loadAnns(dataset.coco.getAnnIds(imgIds=original_id))
+        gt_boxes = [obj["bbox"] for obj in anno if obj["iscrowd"] == 0]
+        gt_boxes = torch.as_tensor(gt_boxes).reshape(-1, 4)
+        gt_boxes = BoxList(gt_boxes, (image_width, image_height), mode="xywh").convert(
+            "xyxy"
+        )
+        gt_areas = torch.as_tensor([obj["area"] for obj in anno if obj["iscrowd"] == 0])
+        if len(gt_boxes) == 0:
+            continue
+        valid_gt_inds = (gt_areas >= area_range[0]) & (gt_areas <= area_range[1])
+        gt_boxes = gt_boxes[valid_gt_inds]
+        num_pos += len(gt_boxes)
+        if len(gt_boxes) == 0 or len(prediction) == 0:
+            continue
+        if limit is not None and len(prediction) > limit:
+            prediction = prediction[:limit]
+
+        overlaps = boxlist_iou(prediction, gt_boxes)
+        _gt_overlaps = torch.zeros(len(gt_boxes))
+        for j in range(min(len(prediction), len(gt_boxes))):
+            max_overlaps, argmax_overlaps = overlaps.max(dim=0)
+            gt_ovr, gt_ind = max_overlaps.max(dim=0)
+            box_ind = argmax_overlaps[gt_ind]
+            _gt_overlaps[j] = overlaps[box_ind, gt_ind]
+            overlaps[box_ind, :] = -1
+            overlaps[:, gt_ind] = -1
+        gt_overlaps.append(_gt_overlaps)
+    gt_overlaps, _ = torch.sort(torch.cat(gt_overlaps, dim=0))
+
+    thresholds = torch.arange(0.5, 0.95 + 1e-5, 0.05, dtype=torch.float32)
+    recalls = torch.zeros_like(thresholds)
+    for i, t in enumerate(thresholds):
+        recalls[i] = (gt_overlaps >= t).float().sum() / float(num_pos)
+    return {"ar": recalls.mean(), "recalls": recalls, "num_pos": num_pos}
+
+
+class FakeDataset(object):
+    def __init__(self, coco):
+        self.coco = coco
+        self.id_to_img_map = dict(enumerate(sorted(coco.imgs.keys())))
+
+    def get_img_info(self, index):
+        return self.coco.imgs[self.id_to_img_map[index]]
+
+
+def _random_coco_and_proposals(num_images=12):
+    rng = np.random.RandomState(0)
+    images, annotations, predictions = [], [], []
+    for img_id in range(1, num_images + 1):
+        width, height = 800, 700
+        images.append({"id": img_id, "width": width, "height": height})
+        # the last image has no gt box
+        num_gt = rng.randint(1, 12) if img_id != num_images else 0
+        # the first image has a box in each area range
+        sizes = [20, 60, 110, 200, 400, 600] if img_id == 1 else []
+        sizes += list(np.exp(rng.uniform(np.log(4), np.log(650), num_gt)))
+        gt_boxes = []
+        for size in sizes:
+            w, h = size * np.exp(rng.uniform(-0.1, 0.1, 2))
+            x, y = rng.uniform(0, width - w), rng.uniform(0, height - h)
+            gt_boxes.append([x, y, x + w, y + h])
+            annotations.append({
+                "id": len(annotations) + 1, "image_id": img_id, "category_id": 1,
+                "bbox": [x, y, w, h], "area": w * h,
+                "iscrowd": int(len(gt_boxes) > 6 and rng.uniform() < 0.1),
+            })
+        # proposals are jittered gt boxes and random boxes, predicted on
+        # images of half the original size; the second image has none
+        num_proposals = rng.randint(0, 60) if img_id != 2 else 0
+        boxes = rng.uniform(0, 300, (num_proposals, 4))
+        boxes[:, 2:] = boxes[:, :2] + rng.uniform(2, 300, (num_proposals, 2))
+        for i, gt_box in enumerate(gt_boxes[:num_proposals]):
+            boxes[i] = np.array(gt_box) / 2 + rng.normal(0, 3, 4)
+        prediction = BoxList(
+            torch.as_tensor(boxes, dtype=torch.float32), (width // 2, height // 2)
+        )
+        prediction.add_field(
+            "objectness", torch.as_tensor(rng.uniform(size=num_proposals))
+        )
+        predictions.append(prediction)
+    coco = COCO()
+    coco.dataset = {
+        "images": images, "annotations": annotations,
+        "categories": [{"id": 1, "name": "object"}],
+    }
+    coco.createIndex()
+    return FakeDataset(coco), predictions
+
+
+class TestBoxProposals(unittest.TestCase):
+    def test_same_as_reference(self):
+        dataset, predictions = _random_coco_and_proposals()
+        areas = tuple(AREA_RANGES.keys())
+        limits = (100, 1000, 5, None)
+        for num_workers in (0, 2):
+            stats = evaluate_box_proposals_multi(
+                predictions, dataset, areas, limits, num_workers=num_workers
+            )
+            self.assertEqual(set(stats.keys()), set(itertools.product(areas, limits)))
+            for area, limit in itertools.product(areas, limits):
+                expected = _reference_box_proposals(predictions, dataset, area, limit)
+                result = stats[area, limit]
+                self.assertEqual(result["num_pos"], expected["num_pos"])
+                self.assertGreater(result["num_pos"], 0)
+                np.testing.assert_allclose(
+                    result["recalls"].numpy(), expected["recalls"].numpy(), rtol=1e-6
+                )
+                self.assertAlmostEqual(float(result["ar"]), float(expected["ar"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
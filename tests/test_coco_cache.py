@@ -0,0 +1,147 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import json
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import unittest
+
+import torch
+from PIL import Image
+
+from maskrcnn_benchmark.data.datasets.coco import COCODataset
+from maskrcnn_benchmark.data.datasets.coco_cache import compile_coco_annotation_cache
+
+
+def _random_coco(num_images=6, seed=0):
+    rng = random.Random(seed)
+    categories = [{"id": i, "name": "cat{}".format(i)} for i in (1, 3, 7, 90)]
+    images, annotations = [], []
+    for img_id in rng.sample(range(1, 1000), num_images):
+        w, h = rng.randint(20, 60), rng.randint(20, 60)
+        images.append({"id": img_id, "file_name": "{}.jpg".format(img_id),
+                       "width": w, "height": h})
+        # the last image has no annotation
+        for _ in range(rng.randint(0, 4) if len(images) < num_images else 0):
+            x, y = rng.uniform(0, w - 5), rng.uniform(0, h - 5)
+            bw, bh = rng.uniform(2, w - x), rng.uniform(2, h - y)
+            iscrowd = int(rng.random() < 0.2)
+            if iscrowd:
+                segmentation = {"counts": [0, w * h], "size": [h, w]}
+            else:
+                segmentation = [
+                    [rng.uniform(x, x + bw) for _ in range(2 * rng.randint(3, 6))]
+                    for _ in range(rng.randint(1, 2))
+                ]
+            annotations.append({
+                "id": len(annotations) + 1, "image_id": img_id,
+                "category_id": rng.choice(categories)["id"],
+                "bbox": [x, y, bw, bh], "area": bw * bh, "iscrowd": iscrowd,
+                "segmentation": segmentation,
+            })
+    rng.shuffle(annotations)
+    return {"images": images, "annotations": annotations, "categories": categories}
+
+
+class TestCOCOAnnotationCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        dataset = _random_coco()
+        self.ann_file = os.path.join(self.tmp_dir, "instances.json")
+        with open(self.ann_file, "w") as f:
+            json.dump(dataset, f)
+        for img in dataset["images"]:
+            Image.new("RGB", (img["width"], img["height"])).save(
+                os.path.join(self.tmp_dir, img["file_name"])
+            )
+        self.cache_dir = os.path.join(self.tmp_dir, "instances_cache")
+        compile_coco_annotation_cache(self.ann_file, self.cache_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _assert_same_datasets(self, expected, dataset):
+        self.assertEqual(dataset.ids, expected.ids)
+        self.assertEqual(dataset.categories, expected.categories)
+        self.assertEqual(
+            dataset.json_category_id_to_contiguous_id,
+            expected.json_category_id_to_contiguous_id,
+        )
+        self.assertEqual(
+            dataset.get_image_sizes().tolist(), expected.get_image_sizes().tolist()
+        )
+        for idx in range(len(expected)):
+            info = dataset.get_img_info(idx)
+            expected_info = expected.get_img_info(idx)
+            for key in ("id", "file_name", "width", "height"):
+                self.assertEqual(info[key], expected_info[key])
+
+            _, target, _ = dataset[idx]
+            _, expected_target, _ = expected[idx]
+            self.assertTrue(torch.equal(target.bbox, expected_target.bbox))
+            self.assertEqual(
+                target.get_field("labels").tolist(),
+                expected_target.get_field("labels").tolist(),
+            )
+            if expected_target.has_field("masks"):
+                masks = target.get_field("masks").instances
+                expected_masks = expected_target.get_field("masks").instances
+                self.assertTrue(torch.equal(masks.coords, expected_masks.coords))
+                self.assertTrue(
+                    torch.equal(masks.poly_offsets, expected_masks.poly_offsets)
+                )
+                self.assertTrue(
+                    torch.equal(masks.instance_offsets, expected_masks.instance_offsets)
+                )
+            else:
+                self.assertFalse(target.has_field("masks"))
+
+    def test_same_as_json(self):
+        for remove_images_without_annotations in (False, True):
+            expected = COCODataset(
+                self.ann_file, self.tmp_dir, remove_images_without_annotations
+            )
+            dataset = COCODataset(
+                self.ann_file, self.tmp_dir, remove_images_without_annotations,
+                annotation_cache=self.cache_dir,
+            )
+            self._assert_same_datasets(expected, dataset)
+
+    def test_pickle(self):
+        dataset = COCODataset(
+            self.ann_file, self.tmp_dir, True, annotation_cache=self.cache_dir
+        )
+        # only the path of the cache should be pickled
+        self.assertLess(len(pickle.dumps(dataset._cache)), 1000)
+        self._assert_same_datasets(dataset, pickle.loads(pickle.dumps(dataset)))
+
+    def test_unknown_category(self):
+        with open(self.ann_file) as f:
+            coco = json.load(f)
+        # category ids below and above the largest one, which are not categories
+        for ann, category_id in zip(coco["annotations"], (5, 200)):
+            ann["category_id"] = category_id
+            ann["iscrowd"] = 0
+        ann_file = os.path.join(self.tmp_dir, "unknown_category.json")
+        with open(ann_file, "w") as f:
+            json.dump(coco, f)
+        cache_dir = os.path.join(self.tmp_dir, "unknown_category_cache")
+        compile_coco_annotation_cache(ann_file, cache_dir)
+        dataset = COCODataset(ann_file, self.tmp_dir, True, annotation_cache=cache_dir)
+        for ann in coco["annotations"][:2]:
+            with self.assertRaisesRegex(KeyError, "Unknown category ids"):
+                dataset[dataset.ids.index(ann["image_id"])]
+
+    def test_lazy_coco(self):
+        dataset = COCODataset(
+            self.ann_file, self.tmp_dir, True, annotation_cache=self.cache_dir
+        )
+        self.assertIsNone(dataset._coco)
+        self.assertEqual(sorted(dataset.coco.imgs.keys()), sorted(
+            dataset._cache.image_ids.tolist()
+        ))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import torch
+from pycocotools.coco import COCO
+
+from maskrcnn_benchmark.data.datasets.evaluation.coco.coco_eval import (
+    evaluate_predictions_on_coco,
+    prepare_for_coco_detection,
+    prepare_for_coco_keypoint,
+)
+from maskrcnn_benchmark.data.datasets.evaluation.coco.coco_results import (
+    columnar_results_to_list,
+    write_columnar_results_json,
+)
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.keypoint import PersonKeypoints
+
+NUM_KEYPOINTS = len(PersonKeypoints.NAMES)
+
+
+class FakeDataset(object):
+    def __init__(self, coco):
+        self.coco = coco
+        self.id_to_img_map = dict(enumerate(sorted(coco.imgs.keys())))
+        self.contiguous_category_id_to_json_id = {
+            i + 1: cat_id for i, cat_id in enumerate(sorted(coco.cats.keys()))
+        }
+
+    def get_img_info(self, index):
+        return self.coco.imgs[self.id_to_img_map[index]]
+
+
+def _random_coco(num_images=5):
+    rng = np.random.RandomState(0)
+    categories = [{"id": i, "name": "cat{}".format(i)} for i in (1, 5, 18)]
+    images, annotations = [], []
+    for img_id in (3, 8, 11, 42, 57)[:num_images]:
+        images.append({"id": img_id, "width": 80, "height": 60})
+        for _ in range(rng.randint(1, 5)):
+            x, y = rng.uniform(0, 40), rng.uniform(0, 30)
+            w, h = rng.uniform(5, 40), rng.uniform(5, 30)
+            keypoints = np.stack([
+                rng.uniform(x, x + w, NUM_KEYPOINTS),
+                rng.uniform(y, y + h, NUM_KEYPOINTS),
+                np.full(NUM_KEYPOINTS, 2),
+            ], axis=1)
+            annotations.append({
+                "id": len(annotations) + 1, "image_id": img_id,
+                "category_id": int(rng.choice([1, 5, 18])),
+                "bbox": [x, y, w, h], "area": w * h, "iscrowd": 0,
+                "keypoints": keypoints.ravel().tolist(),
+                "num_keypoints": NUM_KEYPOINTS,
+            })
+    coco = COCO()
+    coco.dataset = {
+        "images": images, "annotations": annotations, "categories": categories
+    }
+    coco.createIndex()
+    return coco
+
+
+def _predictions(coco):
+    # the predictions are made on images of half the original size
+    torch.manual_seed(0)
+    predictions = []
+    for img_id in sorted(coco.imgs.keys()):
+        anns = coco.imgToAnns[img_id]
+        # the last image has no detection
+        num_boxes = len(anns) + 2 if img_id != 57 else 0
+        boxes = torch.rand(num_boxes, 4) * 30
+        boxes[:, 2:] += boxes[:, :2] + 1
+        prediction = BoxList(boxes, (40, 30), mode="xyxy")
+        prediction.add_field("scores", torch.rand(num_boxes))
+        prediction.add_field("labels", torch.randint(1, 4, (num_boxes,)))
+        keypoints = torch.rand(num_boxes, NUM_KEYPOINTS, 3) * 30
+        prediction.add_field("keypoints", PersonKeypoints(keypoints, (40, 30)))
+        predictions.append(prediction)
+    return predictions
+
+
+class TestCOCOResults(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.coco = _random_coco()
+        self.dataset = FakeDataset(self.coco)
+        self.predictions = _predictions(self.coco)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _check_same_as_dicts(self, coco_results, iou_type):
+        json_file = os.path.join(self.tmp_dir, iou_type + ".json")
+        coco_eval = evaluate_predictions_on_coco(
+            self.coco, coco_results, json_file, iou_type
+        )
+        with open(json_file) as f:
+            json_results = json.load(f)
+        self.assertEqual(json_results, columnar_results_to_list(coco_results))
+
+        # the dict path of pycocotools, through a json file
+        expected = evaluate_predictions_on_coco(
+            self.coco, json_results, None, iou_type
+        )
+        np.testing.assert_allclose(coco_eval.stats, expected.stats)
+        self.assertGreater(coco_eval.stats[0], 0)
+
+    def test_detection(self):
+        coco_results = prepare_for_coco_detection(self.predictions, self.dataset)
+        self.assertEqual(coco_results["bbox"].shape, (len(coco_results["score"]), 4))
+        self.assertEqual(
+            set(coco_results["category_id"].tolist()), {1, 5, 18}
+        )
+        # detections with the gt boxes
+        for img_id, anns in self.coco.imgToAnns.items():
+            for ann in anns:
+                coco_results["image_id"][ann["id"]] = img_id
+                coco_results["category_id"][ann["id"]] = ann["category_id"]
+                coco_results["bbox"][ann["id"]] = ann["bbox"]
+        self._check_same_as_dicts(coco_results, "bbox")
+
+    def test_keypoints(self):
+        coco_results = prepare_for_coco_keypoint(self.predictions, self.dataset)
+        self.assertEqual(
+            coco_results["keypoints"].shape,
+            (len(coco_results["score"]), 3 * NUM_KEYPOINTS),
+        )
+        for img_id, anns in self.coco.imgToAnns.items():
+            for ann in anns:
+                coco_results["image_id"][ann["id"]] = img_id
+                coco_results["category_id"][ann["id"]] = 1
+                coco_results["keypoints"][ann["id"]] = ann["keypoints"]
+        self._check_same_as_dicts(coco_results, "keypoints")
+
+    def test_streaming_json(self):
+        coco_results = prepare_for_coco_detection(self.predictions, self.dataset)
+        json_file = os.path.join(self.tmp_dir, "bbox.json")
+        for chunk_size in (1, 3, 1000):
+            write_columnar_results_json(coco_results, json_file, chunk_size)
+            with open(json_file) as f:
+                self.assertEqual(json.load(f), columnar_results_to_list(coco_results))
+        empty = {name: values[:0] for name, values in coco_results.items()}
+        write_columnar_results_json(empty, json_file)
+        with open(json_file) as f:
+            self.assertEqual(json.load(f), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
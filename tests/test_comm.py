@@ -0,0 +1,87 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+from maskrcnn_benchmark.utils import comm
+
+
+def _find_free_port():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def _data(rank):
+    # payloads of different sizes, larger than the chunks
+    return {"rank": rank, "values": torch.arange(100 * (rank + 1))}
+
+
+def _check_gather(rank, world_size, port, shared_dir, results_dir):
+    dist.init_process_group(
+        "gloo", init_method="tcp://127.0.0.1:{}".format(port),
+        world_size=world_size, rank=rank,
+    )
+    expected = [_data(r) for r in range(world_size)]
+    outputs = {
+        "all_gather": comm.all_gather(_data(rank), max_chunk_size=256),
+        "gather": comm.gather(_data(rank), dst=1, max_chunk_size=256),
+        "all_gather_fs": comm.all_gather(_data(rank), shared_dir=shared_dir),
+        "gather_fs": comm.gather(_data(rank), dst=0, shared_dir=shared_dir),
+    }
+    receivers = {"all_gather": range(world_size), "gather": [1],
+                 "all_gather_fs": range(world_size), "gather_fs": [0]}
+    ok = True
+    for name, output in outputs.items():
+        if rank not in receivers[name]:
+            ok &= output == []
+            continue
+        ok &= len(output) == world_size
+        for data, expected_data in zip(output, expected):
+            ok &= data["rank"] == expected_data["rank"]
+            ok &= torch.equal(data["values"], expected_data["values"])
+    # the files of the shared directory are removed once gathered
+    dist.barrier()
+    ok &= os.listdir(shared_dir) == []
+    with open(os.path.join(results_dir, str(rank)), "w") as f:
+        f.write(str(ok))
+    dist.destroy_process_group()
+
+
+class TestComm(unittest.TestCase):
+    def test_single_process(self):
+        data = {"a": 1}
+        self.assertEqual(comm.all_gather(data), [data])
+        self.assertEqual(comm.gather(data), [data])
+
+    @unittest.skipIf(not dist.is_available(), "torch.distributed not available")
+    def test_gather(self):
+        world_size = 3
+        tmp_dir = tempfile.mkdtemp()
+        shared_dir = os.path.join(tmp_dir, "shared")
+        results_dir = os.path.join(tmp_dir, "results")
+        os.makedirs(shared_dir)
+        os.makedirs(results_dir)
+        try:
+            mp.spawn(
+                _check_gather,
+                args=(world_size, _find_free_port(), shared_dir, results_dir),
+                nprocs=world_size,
+            )
+            for rank in range(world_size):
+                with open(os.path.join(results_dir, str(rank))) as f:
+                    self.assertEqual(f.read(), "True")
+        finally:
+            shutil.rmtree(tmp_dir)
+
+
+if __name__ == "__main__":
+    unittest.main()
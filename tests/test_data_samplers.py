@@ -10,6 +10,9 @@ from torch.utils.data.sampler import RandomSampler
 
 from maskrcnn_benchmark.data.samplers import GroupedBatchSampler
 from maskrcnn_benchmark.data.samplers import IterationBasedBatchSampler
+from maskrcnn_benchmark.data.samplers import SizeBucketedBatchSampler
+from maskrcnn_benchmark.data.samplers import compute_padding_stats
+from maskrcnn_benchmark.data.samplers import DistributedSampler
 
 
 class SubsetSampler(Sampler):
@@ -127,6 +130,68 @@ class TestGroupedBatchSampler(unittest.TestCase):
         self.assertEqual(len(result), len(batch_sampler))
 
 
+class TestSizeBucketedBatchSampler(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(0)
+        self.image_sizes = [
+            (800, rng.randint(900, 1333)) if rng.random() < 0.7
+            else (rng.randint(900, 1333), 800)
+            for _ in range(200)
+        ]
+
+    def test_padding_stats(self):
+        image_sizes = [(10, 20), (12, 16), (20, 10)]
+        stats = compute_padding_stats([[0, 1], [2]], image_sizes)
+        self.assertEqual(stats["image_area"], 200 + 192 + 200)
+        self.assertEqual(stats["padded_area"], 2 * 12 * 20 + 200)
+        stats = compute_padding_stats([[0, 1], [2]], image_sizes, 16)
+        self.assertEqual(stats["padded_area"], 2 * 16 * 32 + 32 * 16)
+        self.assertAlmostEqual(stats["padding_waste"], 1 - 592 / 1536)
+
+    def test_same_indices(self):
+        sampler = SubsetSampler(random.Random(0).sample(range(200), 150))
+        for batch_size, window_size in [(1, 4), (2, 8), (4, 64), (5, 3)]:
+            batch_sampler = SizeBucketedBatchSampler(
+                sampler, self.image_sizes, batch_size, 32, window_size
+            )
+            result = list(batch_sampler)
+            self.assertEqual(len(result), len(batch_sampler))
+            self.assertEqual(
+                sorted(itertools.chain.from_iterable(result)), sorted(sampler.indices)
+            )
+            position = {idx: i for i, idx in enumerate(sampler.indices)}
+            window = batch_size * window_size
+            for batch in result:
+                # each batch follows the sampler order, within a window
+                positions = [position[idx] for idx in batch]
+                self.assertEqual(positions, sorted(positions))
+                self.assertEqual(len({p // window for p in positions}), 1)
+                self.assertLessEqual(len(batch), batch_size)
+
+    def test_less_padding(self):
+        sampled_ids = random.Random(0).sample(range(200), 200)
+        sampler = SubsetSampler(sampled_ids)
+        batch_sampler = SizeBucketedBatchSampler(sampler, self.image_sizes, 4, 32)
+        stats = batch_sampler.padding_stats()
+        self.assertEqual(stats, compute_padding_stats(
+            list(batch_sampler), self.image_sizes, 32
+        ))
+        unbucketed = [sampled_ids[i:i + 4] for i in range(0, len(sampled_ids), 4)]
+        unbucketed_stats = compute_padding_stats(unbucketed, self.image_sizes, 32)
+        self.assertLess(
+            stats["padding_waste"], unbucketed_stats["padding_waste"] / 2
+        )
+
+    def test_drop_uneven(self):
+        sampler = SequentialSampler(self.image_sizes[:30])
+        batch_sampler = SizeBucketedBatchSampler(
+            sampler, self.image_sizes, 4, window_size=3, drop_uneven=True
+        )
+        result = list(batch_sampler)
+        self.assertEqual(len(result), 7)
+        self.assertTrue(all(len(batch) == 4 for batch in result))
+
+
 class TestIterationBasedBatchSampler(unittest.TestCase):
     def test_number_of_iters_and_elements(self):
         for batch_size in [2, 3, 4]:
@@ -148,6 +213,46 @@ class TestIterationBasedBatchSampler(unittest.TestCase):
                         expected = [x for x in range(start, end)]
                         self.assertEqual(batch, expected)
 
+    def _make_batch_samplers(self):
+        dataset = [i for i in range(23)]
+        group_ids = [i % 3 == 0 for i in dataset]
+        sizes = [(100, 50 + 10 * (i % 7)) for i in dataset]
+        sampler = DistributedSampler(dataset, num_replicas=1, rank=0, shuffle=True)
+        return [
+            BatchSampler(sampler, 4, drop_last=False),
+            BatchSampler(sampler, 4, drop_last=True),
+            GroupedBatchSampler(sampler, group_ids, 4),
+            SizeBucketedBatchSampler(sampler, sizes, 4, window_size=2),
+        ]
+
+    def test_resume(self):
+        num_iterations = 40
+        for batch_sampler in self._make_batch_samplers():
+            iter_sampler = IterationBasedBatchSampler(batch_sampler, num_iterations)
+            expected = []
+            states = []
+            for iteration, batch in enumerate(iter_sampler, 1):
+                expected.append(batch)
+                states.append(iter_sampler.state_dict(iteration))
+            self.assertEqual(len(expected), num_iterations)
+
+            for start_iter in [1, 5, 6, 17, 39]:
+                resumed = IterationBasedBatchSampler(
+                    batch_sampler, num_iterations, start_iter, states[start_iter - 1]
+                )
+                self.assertEqual(list(resumed), expected[start_iter:])
+
+    def test_resume_ahead(self):
+        # the state is asked while the data loader prefetches later batches
+        batch_sampler = self._make_batch_samplers()[2]
+        iter_sampler = IterationBasedBatchSampler(batch_sampler, 30)
+        batches = list(itertools.islice(iter(iter_sampler), 20))
+        for iteration in [3, 6, 7, 12]:
+            resumed = IterationBasedBatchSampler(
+                batch_sampler, 30, iteration, iter_sampler.state_dict(iteration)
+            )
+            self.assertEqual(list(resumed)[:20 - iteration], batches[iteration:])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,158 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+import torch.nn.functional as F
+
+from maskrcnn_benchmark.layers import deform_conv
+from maskrcnn_benchmark.layers import deform_roi_pooling
+from maskrcnn_benchmark.layers import modulated_deform_conv
+from utils import TEST_CUDA
+from utils import assert_same_on_cpu_and_cuda
+
+
+def _reference_deform_conv(input, offset, weight, stride, padding, dilation, mask=None):
+    # samples the input at the deformed kernel positions with grid_sample,
+    # which interpolates as deformable_im2col_bilinear in the kernels
+    batch_size, channels, height, width = input.shape
+    out_height, out_width = offset.shape[-2:]
+    kernel_h, kernel_w = weight.shape[-2:]
+    ys = torch.arange(out_height, dtype=input.dtype).view(-1, 1) * stride - padding
+    xs = torch.arange(out_width, dtype=input.dtype).view(1, -1) * stride - padding
+    columns = []
+    for i in range(kernel_h):
+        for j in range(kernel_w):
+            k = i * kernel_w + j
+            y = ys + i * dilation + offset[:, 2 * k]
+            x = xs + j * dilation + offset[:, 2 * k + 1]
+            grid = torch.stack([x / (width - 1) * 2 - 1, y / (height - 1) * 2 - 1], dim=-1)
+            sampled = F.grid_sample(input, grid, align_corners=True)
+            if mask is not None:
+                sampled = sampled * mask[:, k:k + 1]
+            columns.append(sampled)
+    columns = torch.stack(columns, dim=2).reshape(batch_size, -1, out_height * out_width)
+    output = weight.reshape(len(weight), -1).matmul(columns)
+    return output.reshape(batch_size, -1, out_height, out_width)
+
+
+def _random_inputs(dtype=torch.float64, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    input = torch.rand(2, 4, 7, 8, generator=g, dtype=dtype)
+    weight = torch.rand(6, 4, 3, 3, generator=g, dtype=dtype) - 0.5
+    # stride 1, padding 1: the output has the size of the input, and some of
+    # the sampled positions are outside of it
+    offset = torch.rand(2, 18, 7, 8, generator=g, dtype=dtype) * 4 - 2
+    mask = torch.rand(2, 9, 7, 8, generator=g, dtype=dtype)
+    return input, offset, mask, weight
+
+
+class TestDeformConv(unittest.TestCase):
+    def test_zero_offset_cpu(self):
+        input, offset, mask, weight = _random_inputs(dtype=torch.float32)
+        offset.zero_()
+        expected = F.conv2d(input, weight, padding=1)
+        output = deform_conv(input, offset, weight, 1, 1)
+        self.assertTrue(torch.allclose(output, expected, rtol=1e-5, atol=1e-5))
+        output = modulated_deform_conv(input, offset, mask.fill_(1), weight, None, 1, 1)
+        self.assertTrue(torch.allclose(output, expected, rtol=1e-5, atol=1e-5))
+
+    def _check_against_reference(self, modulated):
+        tensors = [t.requires_grad_() for t in _random_inputs()]
+        input, offset, mask, weight = tensors
+        if modulated:
+            bias = torch.rand(6, dtype=torch.float64, requires_grad=True)
+            tensors.append(bias)
+            output = modulated_deform_conv(input, offset, mask, weight, bias, 1, 1)
+            expected = _reference_deform_conv(input, offset, weight, 1, 1, 1, mask)
+            expected = expected + bias.view(1, -1, 1, 1)
+        else:
+            tensors = [input, offset, weight]
+            output = deform_conv(input, offset, weight, 1, 1)
+            expected = _reference_deform_conv(input, offset, weight, 1, 1, 1)
+        self.assertTrue(torch.allclose(output, expected))
+
+        grad_output = torch.rand_like(output)
+        grads = torch.autograd.grad(output, tensors, grad_output)
+        expected_grads = torch.autograd.grad(expected, tensors, grad_output)
+        for grad, expected_grad in zip(grads, expected_grads):
+            self.assertTrue(torch.allclose(grad, expected_grad))
+
+    def test_deform_conv_cpu(self):
+        self._check_against_reference(modulated=False)
+
+    def test_modulated_deform_conv_cpu(self):
+        self._check_against_reference(modulated=True)
+
+    def test_groups_and_im2col_step_cpu(self):
+        input, offset, mask, weight = _random_inputs()
+        input = torch.cat([input, input.flip(1)], dim=1).requires_grad_()
+        weight = weight.requires_grad_()
+        offset = torch.cat([offset, offset.flip(1)], dim=1).requires_grad_()
+        # 2 groups of convolutions, 2 groups of offsets, 1 image by step
+        self.assertTrue(
+            torch.autograd.gradcheck(
+                lambda x, o, w: deform_conv(x, o, w, 1, 1, 1, 2, 2, 1),
+                (input, offset, weight),
+            )
+        )
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_same_as_cuda(self):
+        def both_deform_convs(input, offset, mask, weight):
+            output = modulated_deform_conv(input, offset, mask, weight, None, 1, 1)
+            return output + deform_conv(input, offset, weight, 1, 1)
+
+        assert_same_on_cpu_and_cuda(
+            both_deform_convs, _random_inputs(dtype=torch.float32), (0, 1, 2, 3),
+            rtol=1e-3, atol=1e-4,
+        )
+
+
+class TestDeformRoIPooling(unittest.TestCase):
+    def _inputs(self, dtype=torch.float64):
+        g = torch.Generator().manual_seed(0)
+        data = torch.rand(2, 8, 12, 16, generator=g, dtype=dtype)
+        rois = torch.tensor(
+            [[0, 4, 4, 40, 30], [1, 0, 8, 60, 44], [0, 30, 20, 34, 26]], dtype=dtype
+        )
+        offset = (torch.rand(3, 2, 2, 2, generator=g, dtype=dtype) - 0.5)
+        return data, rois, offset
+
+    def test_no_trans_cpu(self):
+        data, rois, _ = self._inputs()
+        data.requires_grad_()
+        self.assertTrue(
+            torch.autograd.gradcheck(
+                lambda x: deform_roi_pooling(
+                    x, rois, x.new_empty(0), 0.25, 2, 2, True, 2, 2, 2, 0.0
+                ),
+                (data,),
+            )
+        )
+
+    def test_trans_cpu(self):
+        data, rois, offset = self._inputs()
+        data.requires_grad_()
+        offset.requires_grad_()
+        # 2 classes of 4 output channels
+        self.assertTrue(
+            torch.autograd.gradcheck(
+                lambda x, o: deform_roi_pooling(
+                    x, rois, o.repeat(1, 2, 1, 1), 0.25, 2, 8, False, 1, 2, 2, 0.1
+                ),
+                (data, offset),
+            )
+        )
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_same_as_cuda(self):
+        assert_same_on_cpu_and_cuda(
+            lambda data, rois, offset: deform_roi_pooling(
+                data, rois, offset.repeat(1, 2, 1, 1), 0.25, 2, 8, False, 1, 2, 2, 0.1
+            ),
+            self._inputs(dtype=torch.float32), (0, 2), rtol=1e-3, atol=1e-4,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import contextlib
+import io
+import unittest
+
+import numpy as np
+import pycocotools.mask as mask_util
+from pycocotools.coco import COCO
+from pycocotools.cocoeval import COCOeval
+
+from maskrcnn_benchmark.data.datasets.evaluation.coco.fast_eval import FastCOCOeval
+
+NUM_KEYPOINTS = 17
+
+
+def _box_polygon(x, y, w, h):
+    return [[x, y, x + w, y, x + w, y + h, x, y + h]]
+
+
+def _random_keypoints(rng, x, y, w, h, visible):
+    return np.stack([
+        rng.uniform(x, x + w, NUM_KEYPOINTS),
+        rng.uniform(y, y + h, NUM_KEYPOINTS),
+        np.where(rng.rand(NUM_KEYPOINTS) < visible, 2, 0),
+    ], axis=1).ravel().tolist()
+
+
+def _random_gt_and_results(num_images=12, seed=0):
+    rng = np.random.RandomState(seed)
+    images, annotations, results = [], [], []
+    for img_id in range(1, num_images + 1):
+        width, height = 640, 480
+        images.append({"id": img_id, "width": width, "height": height})
+        for _ in range(rng.randint(0, 8)):
+            # small, medium and large objects
+            size = rng.choice([20, 60, 200])
+            w, h = rng.uniform(0.5, 1.5, 2) * size
+            x, y = rng.uniform(0, width - w), rng.uniform(0, height - h)
+            iscrowd = int(rng.rand() < 0.1)
+            keypoints = _random_keypoints(rng, x, y, w, h, visible=rng.rand())
+            ann = {
+                "id": len(annotations) + 1, "image_id": img_id,
+                "category_id": int(rng.randint(1, 4)),
+                "bbox": [x, y, w, h], "area": w * h, "iscrowd": iscrowd,
+                "segmentation": _box_polygon(x, y, w, h),
+                "keypoints": keypoints,
+                "num_keypoints": int(np.count_nonzero(keypoints[2::3])),
+            }
+            annotations.append(ann)
+            # detections around the gt, some of them duplicated
+            for _ in range(rng.randint(0, 3)):
+                jitter = rng.normal(0, 0.1 * size, 4)
+                bx, by = x + jitter[0], y + jitter[1]
+                bw, bh = max(w + jitter[2], 1), max(h + jitter[3], 1)
+                results.append({
+                    "image_id": img_id,
+                    "category_id": ann["category_id"] if rng.rand() < 0.9 else 1,
+                    "bbox": [bx, by, bw, bh],
+                    "segmentation": _box_polygon(bx, by, bw, bh),
+                    "keypoints": (
+                        np.array(keypoints)
+                        + rng.normal(0, 0.05 * size, 3 * NUM_KEYPOINTS)
+                    ).tolist(),
+                    # some ties in the scores
+                    "score": float(rng.choice([0.5, rng.rand()])),
+                })
+        # false positives
+        for _ in range(rng.randint(0, 4)):
+            w, h = rng.uniform(10, 200, 2)
+            x, y = rng.uniform(0, width - w), rng.uniform(0, height - h)
+            results.append({
+                "image_id": img_id, "category_id": int(rng.randint(1, 4)),
+                "bbox": [x, y, w, h], "segmentation": _box_polygon(x, y, w, h),
+                "keypoints": _random_keypoints(rng, x, y, w, h, 1),
+                "score": float(rng.rand()),
+            })
+    categories = [{"id": i, "name": "cat{}".format(i)} for i in (1, 2, 3)]
+    gt = {"images": images, "annotations": annotations, "categories": categories}
+    return gt, results
+
+
+def _load(gt, results, iou_type):
+    coco_gt = COCO()
+    coco_gt.dataset = gt
+    coco_gt.createIndex()
+    keys = {
+        "bbox": ("image_id", "category_id", "bbox", "score"),
+        "segm": ("image_id", "category_id", "segmentation", "score"),
+        "keypoints": ("image_id", "category_id", "keypoints", "score"),
+    }[iou_type]
+    results = [{key: result[key] for key in keys} for result in results]
+    if iou_type == "segm":
+        for result in results:
+            h, w = 480, 640
+            rles = mask_util.frPyObjects(result["segmentation"], h, w)
+            result["segmentation"] = mask_util.merge(rles)
+    return coco_gt, coco_gt.loadRes(results)
+
+
+def _evaluate(eval_class, coco_gt, coco_dt, iou_type, **kwargs):
+    coco_eval = eval_class(coco_gt, coco_dt, iou_type, **kwargs)
+    # pycocotools prints a lot
+    with contextlib.redirect_stdout(io.StringIO()):
+        coco_eval.evaluate()
+        coco_eval.accumulate()
+        coco_eval.summarize()
+    return coco_eval
+
+
+class TestFastCOCOeval(unittest.TestCase):
+    def _check_same_as_pycocotools(self, iou_type, num_workers=0):
+        gt, results = _random_gt_and_results()
+        expected = _evaluate(COCOeval, *_load(gt, results, iou_type), iou_type)
+        coco_eval = _evaluate(
+            FastCOCOeval, *_load(gt, results, iou_type), iou_type,
+            num_workers=num_workers,
+        )
+        self.assertEqual(coco_eval.ious.keys(), expected.ious.keys())
+        for pair, expected_ious in expected.ious.items():
+            np.testing.assert_allclose(coco_eval.ious[pair], expected_ious)
+        for expected_img, img in zip(expected.evalImgs, coco_eval.evalImgs):
+            if expected_img is None:
+                self.assertIsNone(img)
+                continue
+            for key in ("dtIds", "gtIds", "dtScores"):
+                self.assertEqual(img[key], expected_img[key])
+            for key in ("dtMatches", "gtMatches", "gtIgnore", "dtIgnore"):
+                np.testing.assert_array_equal(img[key], expected_img[key])
+        for key in ("precision", "recall", "scores"):
+            np.testing.assert_allclose(coco_eval.eval[key], expected.eval[key])
+        np.testing.assert_allclose(coco_eval.stats, expected.stats)
+        self.assertGreater(coco_eval.stats[0], 0.1)
+
+    def test_bbox(self):
+        self._check_same_as_pycocotools("bbox")
+
+    def test_segm(self):
+        self._check_same_as_pycocotools("segm")
+
+    def test_keypoints(self):
+        self._check_same_as_pycocotools("keypoints")
+
+    def test_multiprocess(self):
+        self._check_same_as_pycocotools("bbox", num_workers=2)
+
+
+if __name__ == "__main__":
+    unittest.main()
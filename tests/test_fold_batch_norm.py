@@ -0,0 +1,82 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+from torch import nn
+
+import maskrcnn_benchmark.modeling.backbone.fbnet_builder as fbnet_builder
+from maskrcnn_benchmark.layers import FrozenBatchNorm2d
+from maskrcnn_benchmark.modeling.backbone import build_backbone
+from maskrcnn_benchmark.modeling.fold_batch_norm import Identity
+from maskrcnn_benchmark.modeling.fold_batch_norm import fold_batch_norms
+from utils import load_config
+
+
+def _randomize_batch_norms(model):
+    torch.manual_seed(0)
+    for module in model.modules():
+        if isinstance(module, (FrozenBatchNorm2d, nn.BatchNorm2d)):
+            module.weight.data.uniform_(0.5, 1.5)
+            module.bias.data.uniform_(-0.5, 0.5)
+            module.running_mean.uniform_(-0.5, 0.5)
+            module.running_var.uniform_(0.5, 2.0)
+
+
+def _count_batch_norms(model):
+    return sum(
+        isinstance(module, (FrozenBatchNorm2d, nn.BatchNorm2d))
+        for module in model.modules()
+    )
+
+
+class TestFoldBatchNorm(unittest.TestCase):
+    def test_resnet(self):
+        cfg = load_config("e2e_faster_rcnn_R_50_FPN_1x.yaml")
+        backbone = build_backbone(cfg)
+        _randomize_batch_norms(backbone)
+        backbone.eval()
+        # stem, 16 bottlenecks and 4 downsampling branches
+        self.assertEqual(_count_batch_norms(backbone), 1 + 16 * 3 + 4)
+
+        input = torch.rand(2, 3, 96, 128)
+        with torch.no_grad():
+            expected = backbone(input)
+        num_folded = fold_batch_norms(backbone, input)
+        self.assertEqual(num_folded, 1 + 16 * 3 + 4)
+        self.assertEqual(_count_batch_norms(backbone), 0)
+        with torch.no_grad():
+            outputs = backbone(input)
+        for output, expected_output in zip(outputs, expected):
+            self.assertTrue(
+                torch.allclose(output, expected_output, rtol=1e-4, atol=1e-4)
+            )
+
+    def test_fbnet_primitives(self):
+        for op_name, op_func in fbnet_builder.PRIMITIVES.items():
+            op = op_func(16, 32, 4, 1)
+            _randomize_batch_norms(op)
+            op.eval()
+            input = torch.rand(2, 16, 7, 7)
+            num_batch_norms = _count_batch_norms(op)
+            with torch.no_grad():
+                expected = op(input)
+            self.assertEqual(fold_batch_norms(op, input), num_batch_norms, op_name)
+            self.assertEqual(_count_batch_norms(op), 0, op_name)
+            with torch.no_grad():
+                self.assertTrue(
+                    torch.allclose(op(input), expected, rtol=1e-4, atol=1e-4),
+                    op_name,
+                )
+
+    def test_training_batch_norm(self):
+        model = nn.Sequential(nn.Conv2d(3, 8, 3), nn.BatchNorm2d(8), nn.ReLU())
+        # the statistics of the batch are used in training mode
+        self.assertEqual(fold_batch_norms(model), 0)
+        model.eval()
+        self.assertEqual(fold_batch_norms(model), 1)
+        self.assertIsInstance(model[1], Identity)
+        self.assertIsNotNone(model[0].bias)
+
+
+if __name__ == "__main__":
+    unittest.main()
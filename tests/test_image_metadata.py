@@ -0,0 +1,92 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import bisect
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from maskrcnn_benchmark.data.build import _quantize
+from maskrcnn_benchmark.data.datasets import ConcatDataset
+from maskrcnn_benchmark.data.image_metadata import (
+    ImageMetadataCache,
+    compute_image_sizes,
+    compute_resized_sizes,
+)
+from maskrcnn_benchmark.data.transforms.transforms import Resize
+
+
+class FakeDataset(object):
+    def __init__(self, ann_file, sizes):
+        self.ann_file = ann_file
+        self.ids = list(range(len(sizes)))
+        self.sizes = sizes
+        self.num_queries = 0
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def get_img_info(self, index):
+        self.num_queries += 1
+        height, width = self.sizes[index]
+        return {"height": height, "width": width}
+
+
+class TestImageMetadata(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.ann_file = os.path.join(self.tmp_dir, "annotations.json")
+        with open(self.ann_file, "w") as f:
+            f.write("{}")
+        rng = np.random.RandomState(0)
+        self.sizes = rng.randint(100, 1500, (50, 2)).tolist() + [[600, 600]]
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_resized_sizes(self):
+        for min_size, max_size in ((800, 1333), (600, 1000), (800, None)):
+            resize = Resize(min_size, max_size)
+            expected = [resize.get_size((w, h)) for h, w in self.sizes]
+            resized = compute_resized_sizes(self.sizes, min_size, max_size)
+            self.assertEqual(resized.tolist(), [list(size) for size in expected])
+
+    def test_quantize(self):
+        aspect_ratios = np.array(self.sizes)[:, 0] / np.array(self.sizes)[:, 1]
+        for bins in ([1], [1.5, 0.5, 1]):
+            expected = [bisect.bisect_right(sorted(bins), x) for x in aspect_ratios]
+            self.assertEqual(_quantize(aspect_ratios, bins), expected)
+
+    def test_cache(self):
+        cache = ImageMetadataCache(os.path.join(self.tmp_dir, "cache"))
+        dataset = FakeDataset(self.ann_file, self.sizes)
+        sizes = cache.get_image_sizes(dataset, "fake_train")
+        self.assertEqual(sizes.tolist(), self.sizes)
+        self.assertEqual(dataset.num_queries, len(self.sizes))
+
+        # the second time, the sizes are read from the cache
+        dataset = FakeDataset(self.ann_file, self.sizes)
+        sizes = cache.get_image_sizes(dataset, "fake_train")
+        self.assertEqual(sizes.tolist(), self.sizes)
+        self.assertEqual(dataset.num_queries, 0)
+
+        # but not if the annotations changed
+        with open(self.ann_file, "w") as f:
+            f.write('{"images": []}')
+        dataset = FakeDataset(self.ann_file, self.sizes[::-1])
+        sizes = cache.get_image_sizes(dataset, "fake_train")
+        self.assertEqual(sizes.tolist(), self.sizes[::-1])
+        self.assertEqual(dataset.num_queries, len(self.sizes))
+
+    def test_concat_dataset(self):
+        datasets = [
+            FakeDataset(self.ann_file, self.sizes[:10]),
+            FakeDataset(self.ann_file, self.sizes[10:]),
+        ]
+        sizes = compute_image_sizes(ConcatDataset(datasets))
+        self.assertEqual(sizes.tolist(), self.sizes)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import io
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+from PIL import Image
+
+from maskrcnn_benchmark.data.datasets.image_shards import ImageShardReader
+from maskrcnn_benchmark.data.datasets.image_shards import ImageShardWriter
+
+
+def _encoded_image(seed, size=(23, 17)):
+    rng = np.random.RandomState(seed)
+    img = Image.fromarray(rng.randint(0, 256, size[::-1] + (3,), dtype=np.uint8))
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return img, buffer.getvalue()
+
+
+class TestImageShards(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.packed_dir = os.path.join(self.tmp_dir, "packed")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write_read(self):
+        images = {}
+        # small shards, so that images are spread over several of them
+        with ImageShardWriter(self.packed_dir, max_shard_size=3000) as writer:
+            for i in reversed(range(10)):
+                key = "dir/{}.png".format(i)
+                images[key], data = _encoded_image(i)
+                writer.add(key, data)
+        self.assertGreater(writer.num_shards, 1)
+        self.assertFalse(os.path.exists(self.packed_dir + ".tmp"))
+
+        reader = ImageShardReader(self.packed_dir)
+        # readers are sent to the data loader workers
+        reader = pickle.loads(pickle.dumps(reader))
+        self.assertEqual(len(reader), len(images))
+        for key, img in images.items():
+            self.assertIn(key, reader)
+            self.assertTrue(
+                np.array_equal(np.asarray(reader.open_image(key)), np.asarray(img))
+            )
+        self.assertNotIn("dir/10.png", reader)
+        with self.assertRaises(KeyError):
+            reader.get_bytes("missing.png")
+
+    def test_duplicate_keys(self):
+        _, data = _encoded_image(0)
+        with self.assertRaises(ValueError):
+            with ImageShardWriter(self.packed_dir) as writer:
+                writer.add("a.png", data)
+                writer.add("a.png", data)
+        self.assertFalse(os.path.exists(self.packed_dir))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import threading
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.engine.inference import compute_on_dataset
+from maskrcnn_benchmark.engine.inference import compute_on_dataset_pipelined
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+
+
+class FakeModel(torch.nn.Module):
+    """
+    Returns one box per image, derived from its pixels.
+    """
+
+    def __init__(self, fail_at=None):
+        super(FakeModel, self).__init__()
+        self.fail_at = fail_at
+        self.num_calls = 0
+
+    def forward(self, images):
+        if self.num_calls == self.fail_at:
+            raise RuntimeError("model failure")
+        self.num_calls += 1
+        results = []
+        for image in images:
+            x, y = float(image.mean()), float(image.max())
+            boxes = torch.tensor([[x, y, x + 10, y + 10]])
+            result = BoxList(boxes, (image.shape[-1], image.shape[-2]))
+            result.add_field("scores", image.view(-1)[:1].clone())
+            results.append(result)
+        return results
+
+
+def _batches(num_batches=7, batch_size=3):
+    torch.manual_seed(0)
+    batches = []
+    for i in range(num_batches):
+        images = torch.rand(batch_size, 3, 8, 10)
+        image_ids = tuple(range(i * batch_size, (i + 1) * batch_size))
+        batches.append((images, None, image_ids))
+    return batches
+
+
+class TestInference(unittest.TestCase):
+    def test_pipelined_same_as_sequential(self):
+        data_loader = _batches()
+        expected = compute_on_dataset(FakeModel(), data_loader, torch.device("cpu"))
+        for queue_size in (1, 4):
+            predictions, converted = compute_on_dataset_pipelined(
+                FakeModel(), data_loader, torch.device("cpu"),
+                convert=lambda img_id, result: len(result),
+                queue_size=queue_size, num_convert_workers=2,
+            )
+            self.assertEqual(sorted(predictions.keys()), sorted(expected.keys()))
+            for img_id, result in expected.items():
+                self.assertTrue(torch.equal(predictions[img_id].bbox, result.bbox))
+                self.assertTrue(torch.equal(
+                    predictions[img_id].get_field("scores"), result.get_field("scores")
+                ))
+                self.assertEqual(converted[img_id], 1)
+
+    def test_pipelined_stops_loading_on_error(self):
+        num_threads = threading.active_count()
+        with self.assertRaises(RuntimeError):
+            compute_on_dataset_pipelined(
+                FakeModel(fail_at=1), _batches(num_batches=20), torch.device("cpu"),
+                queue_size=1,
+            )
+        # the loading thread, blocked on the full queue, has been stopped
+        self.assertEqual(threading.active_count(), num_threads)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,76 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import numpy as np
+import torch
+from maskrcnn_benchmark.modeling.roi_heads.mask_head.inference import paste_mask_in_image
+from maskrcnn_benchmark.modeling.roi_heads.mask_head.inference import paste_masks_in_image
+from maskrcnn_benchmark.modeling.roi_heads.mask_head.inference import paste_masks_in_image_as_rles
+
+
+class TestMaskPaste(unittest.TestCase):
+    def _random_inputs(self, num_masks=50, M=28, im_h=480, im_w=640):
+        torch.manual_seed(0)
+        masks = torch.rand(num_masks, 1, M, M)
+        xy = torch.rand(num_masks, 2) * torch.tensor([im_w, im_h])
+        boxes = torch.cat([xy, xy + torch.rand(num_masks, 2) * 300 + 0.5], dim=1)
+        boxes[:, 0::2] = boxes[:, 0::2].clamp(0, im_w - 1)
+        boxes[:, 1::2] = boxes[:, 1::2].clamp(0, im_h - 1)
+        return masks, boxes
+
+    def _reference(self, masks, boxes, im_h, im_w, thresh):
+        return torch.stack([
+            paste_mask_in_image(mask[0], box, im_h, im_w, thresh)
+            for mask, box in zip(masks, boxes)
+        ])[:, None].to(torch.uint8)
+
+    def test_paste_masks(self):
+        im_h, im_w = 480, 640
+        masks, boxes = self._random_inputs(im_h=im_h, im_w=im_w)
+        for thresh in (0.5, -1):
+            expected = self._reference(masks, boxes, im_h, im_w, thresh)
+            pasted = paste_masks_in_image(masks, boxes, im_h, im_w, thresh)
+            self.assertEqual(pasted.shape, expected.shape)
+            self.assertEqual(pasted.dtype, torch.uint8)
+            # allow for rounding differences on a few pixels
+            diff = (pasted.int() - expected.int()).abs()
+            self.assertLessEqual(diff.max().item(), 1)
+            self.assertLessEqual((diff > 0).float().mean().item(), 1e-4)
+
+    def test_memory_budget(self):
+        im_h, im_w = 480, 640
+        masks, boxes = self._random_inputs(im_h=im_h, im_w=im_w)
+        pasted = paste_masks_in_image(masks, boxes, im_h, im_w)
+        chunked = paste_masks_in_image(masks, boxes, im_h, im_w, memory_budget=1)
+        self.assertTrue(torch.equal(pasted, chunked))
+
+    def test_paste_masks_as_rles(self):
+        import pycocotools.mask as mask_util
+
+        im_h, im_w = 480, 640
+        masks, boxes = self._random_inputs(im_h=im_h, im_w=im_w)
+        # boxes partly out of the image, and masks which are all zero or one
+        boxes[0] = torch.tensor([600.0, 450.0, 700.0, 500.0])
+        masks[1] = 0
+        masks[2] = 1
+        pasted = paste_masks_in_image(masks, boxes, im_h, im_w)
+        expected = [
+            mask_util.encode(np.array(mask[0, :, :, np.newaxis], order="F"))[0]
+            for mask in pasted
+        ]
+        rles = paste_masks_in_image_as_rles(masks, boxes, im_h, im_w)
+        self.assertEqual(len(rles), len(expected))
+        for rle, expected_rle in zip(rles, expected):
+            self.assertEqual(rle["size"], expected_rle["size"])
+            self.assertEqual(rle["counts"], expected_rle["counts"].decode("utf-8"))
+
+    def test_empty(self):
+        masks = torch.rand(0, 1, 28, 28)
+        boxes = torch.rand(0, 4)
+        pasted = paste_masks_in_image(masks, boxes, 30, 40)
+        self.assertEqual(pasted.shape, (0, 1, 30, 40))
+        self.assertEqual(paste_masks_in_image_as_rles(masks, boxes, 30, 40), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,6 +5,59 @@ import unittest
 import numpy as np
 import torch
 from maskrcnn_benchmark.layers import nms as box_nms
+from maskrcnn_benchmark.layers import batched_nms
+from maskrcnn_benchmark.layers import fast_nms
+from maskrcnn_benchmark.layers import matrix_nms
+from maskrcnn_benchmark.layers import multiclass_nms
+from maskrcnn_benchmark.layers.nms import _batched_nms_cpu
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.boxlist_ops import boxlist_iou
+from maskrcnn_benchmark.structures.boxlist_ops import boxlist_nms
+
+
+def _random_boxes(num_boxes, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    xy = torch.rand(num_boxes, 2, generator=g) * 100
+    boxes = torch.cat([xy, xy + torch.rand(num_boxes, 2, generator=g) * 50], dim=1)
+    return boxes, torch.rand(num_boxes, generator=g)
+
+
+def _sorted_groups(scores, idxs, top_k):
+    # indices of the top_k boxes of each group, in decreasing order of score
+    for group in idxs.unique().tolist():
+        inds = (idxs == group).nonzero().squeeze(1)
+        _, order = scores[inds].sort(descending=True)
+        yield inds[order[:top_k]]
+
+
+def _iou(boxes):
+    boxlist = BoxList(boxes, (1, 1))
+    return boxlist_iou(boxlist, boxlist)
+
+
+def _reference_fast_nms(boxes, scores, idxs, nms_thresh, top_k):
+    keep = []
+    for inds in _sorted_groups(scores, idxs, top_k):
+        iou = _iou(boxes[inds]).triu(diagonal=1)
+        keep.append(inds[(iou >= nms_thresh).sum(0) == 0])
+    return torch.cat(keep)
+
+
+def _reference_matrix_nms(boxes, scores, idxs, top_k, sigma):
+    keep, decayed = [], []
+    for inds in _sorted_groups(scores, idxs, top_k):
+        iou = _iou(boxes[inds]).triu(diagonal=1)
+        scores_g = scores[inds].clone()
+        for j in range(1, len(inds)):
+            # decay by each box of higher score, compensated by the largest
+            # IoU of the latter with a box of higher score
+            scores_g[j] *= min(
+                float(torch.exp(-sigma * (iou[i, j] ** 2 - iou[:, i].max() ** 2)))
+                for i in range(j)
+            )
+        keep.append(inds)
+        decayed.append(scores_g)
+    return torch.cat(keep), torch.cat(decayed)
 
 
 class TestNMS(unittest.TestCase):
@@ -216,6 +269,141 @@ class TestNMS(unittest.TestCase):
 
         np.testing.assert_array_equal(keep_indices, gt_indices)
 
+    def test_batched_nms_cpu(self):
+        torch.manual_seed(0)
+        num_boxes, num_classes, num_images, detections_per_img = 300, 5, 3, 10
+        xy = torch.rand(num_boxes, 2) * 100
+        boxes = torch.cat([xy, xy + torch.rand(num_boxes, 2) * 50], dim=1)
+        scores = torch.rand(num_boxes)
+        labels = torch.randint(1, num_classes, (num_boxes,))
+        image_ids = torch.randint(0, num_images, (num_boxes,))
+
+        keep = batched_nms(
+            boxes, scores, labels, 0.5, image_ids, detections_per_img
+        )
+
+        expected = []
+        for i in range(num_images):
+            keep_i = []
+            for j in range(1, num_classes):
+                inds = ((image_ids == i) & (labels == j)).nonzero().squeeze(1)
+                keep_i.append(inds[box_nms(boxes[inds], scores[inds], 0.5)])
+            keep_i = torch.cat(keep_i)
+            _, order = scores[keep_i].sort(descending=True)
+            expected.append(keep_i[order[:detections_per_img]])
+        expected = torch.cat(expected)
+
+        np.testing.assert_array_equal(np.sort(keep), np.sort(expected))
+        self.assertTrue((scores[keep][1:] <= scores[keep][:-1]).all())
+
+    def test_batched_nms_kernel_cpu(self):
+        # more than a block of 64 boxes per group, and groups of a single box
+        boxes, scores = _random_boxes(1000)
+        groups = torch.randint(0, 6, (1000,), generator=torch.Generator().manual_seed(1))
+        groups[:3] = torch.tensor([10, 11, 12])
+        for thresh in (0.3, 0.7):
+            for max_keep in (-1, 1, 20, 70):
+                keep = _batched_nms_cpu(boxes, scores, groups, thresh, max_keep)
+                expected = []
+                for group in groups.unique().tolist():
+                    inds = (groups == group).nonzero().squeeze(1)
+                    keep_g = inds[box_nms(boxes[inds], scores[inds], thresh)]
+                    _, order = scores[keep_g].sort(descending=True)
+                    if max_keep > 0:
+                        order = order[:max_keep]
+                    expected.append(keep_g[order])
+                np.testing.assert_array_equal(keep, torch.cat(expected))
+
+    def test_batched_nms_kernel_empty_cpu(self):
+        keep = _batched_nms_cpu(
+            torch.zeros(0, 4), torch.zeros(0), torch.zeros(0, dtype=torch.int64), 0.5, 10
+        )
+        self.assertEqual(keep.shape, (0,))
+        self.assertEqual(keep.dtype, torch.int64)
+
+    def test_boxlist_nms_max_proposals_cpu(self):
+        boxes, scores = _random_boxes(500)
+        boxlist = BoxList(boxes, (150, 150))
+        boxlist.add_field("scores", scores)
+        keep = box_nms(boxes, scores, 0.5)
+        _, order = scores[keep].sort(descending=True)
+        for max_proposals in (-1, 10):
+            result = boxlist_nms(boxlist, 0.5, max_proposals=max_proposals)
+            expected = keep[order] if max_proposals < 0 else keep[order[:max_proposals]]
+            np.testing.assert_array_equal(result.bbox, boxes[expected])
+
+    def test_fast_nms(self):
+        boxes, scores = _random_boxes(400)
+        idxs = torch.randint(0, 3, (400,), generator=torch.Generator().manual_seed(1))
+        for nms_thresh, top_k in [(0.5, 200), (0.3, 50)]:
+            keep = fast_nms(boxes, scores, idxs, nms_thresh, top_k)
+            expected = _reference_fast_nms(boxes, scores, idxs, nms_thresh, top_k)
+            np.testing.assert_array_equal(keep, expected)
+            # fast NMS suppresses at least the boxes suppressed by greedy NMS
+            greedy = batched_nms(boxes, scores, idxs, nms_thresh)
+            self.assertTrue(set(keep.tolist()) <= set(greedy.tolist()))
+        # unnormalized scores, whose range is larger than the gap between groups
+        logits = (scores - 0.5) * 20
+        keep = fast_nms(boxes, logits, idxs, 0.5, 200)
+        np.testing.assert_array_equal(
+            keep, _reference_fast_nms(boxes, logits, idxs, 0.5, 200)
+        )
+
+    def test_matrix_nms(self):
+        boxes, scores = _random_boxes(150)
+        idxs = torch.randint(0, 3, (150,), generator=torch.Generator().manual_seed(1))
+        keep, decayed = matrix_nms(boxes, scores, idxs, 40, "gaussian", 2.0)
+        expected_keep, expected_decayed = _reference_matrix_nms(
+            boxes, scores, idxs, 40, 2.0
+        )
+        np.testing.assert_array_equal(keep, expected_keep)
+        self.assertTrue(torch.allclose(decayed, expected_decayed))
+        # the highest score of each group is not decayed
+        _, decayed = matrix_nms(boxes, scores, idxs, 40, "linear", 2.0)
+        self.assertTrue((decayed <= scores[keep]).all())
+        for group in range(3):
+            self.assertEqual(decayed[idxs[keep] == group][0], scores[keep][idxs[keep] == group][0])
+
+    def test_dense_nms_script(self):
+        boxes, scores = _random_boxes(100)
+        idxs = torch.randint(0, 3, (100,), generator=torch.Generator().manual_seed(1))
+        scripted_fast_nms = torch.jit.script(fast_nms)
+        scripted_matrix_nms = torch.jit.script(matrix_nms)
+        np.testing.assert_array_equal(
+            scripted_fast_nms(boxes, scores, idxs, 0.5, 200),
+            fast_nms(boxes, scores, idxs, 0.5, 200),
+        )
+        for result, expected in zip(
+            scripted_matrix_nms(boxes, scores, idxs, 200, "gaussian", 2.0),
+            matrix_nms(boxes, scores, idxs, 200, "gaussian", 2.0),
+        ):
+            self.assertTrue(torch.allclose(result, expected))
+
+    def test_multiclass_nms(self):
+        boxes, scores = _random_boxes(300)
+        g = torch.Generator().manual_seed(1)
+        labels = torch.randint(1, 5, (300,), generator=g)
+        image_ids = torch.randint(0, 3, (300,), generator=g)
+        keep, kept_scores = multiclass_nms(boxes, scores, labels, 0.5, image_ids, 10)
+        np.testing.assert_array_equal(
+            keep, batched_nms(boxes, scores, labels, 0.5, image_ids, 10)
+        )
+        for nms_type in ("fast", "matrix"):
+            keep, kept_scores = multiclass_nms(
+                boxes, scores, labels, 0.5, image_ids, 10, nms_type=nms_type,
+                score_thresh=0.2,
+            )
+            self.assertTrue((kept_scores[1:] <= kept_scores[:-1]).all())
+            self.assertTrue((image_ids[keep].bincount() <= 10).all())
+            if nms_type == "fast":
+                self.assertTrue(torch.equal(kept_scores, scores[keep]))
+            else:
+                self.assertTrue((kept_scores > 0.2).all())
+        keep, kept_scores = multiclass_nms(
+            boxes[:0], scores[:0], labels[:0], 0.5, image_ids[:0], 10, nms_type="matrix"
+        )
+        self.assertEqual(len(keep), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
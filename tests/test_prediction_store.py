@@ -0,0 +1,105 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import shutil
+import tempfile
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.engine.prediction_store import PredictionReader
+from maskrcnn_benchmark.engine.prediction_store import PredictionWriter
+from maskrcnn_benchmark.modeling.roi_heads.mask_head.inference import Masker
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.segmentation_mask import RLEMaskList
+
+
+class FakeDataset(object):
+    def __init__(self, sizes):
+        self.sizes = sizes
+
+    def get_img_info(self, index):
+        width, height = self.sizes[index]
+        return {"width": width, "height": height}
+
+
+def _random_prediction(size, num_boxes):
+    xy = torch.rand(num_boxes, 2) * torch.tensor(size, dtype=torch.float32)
+    boxes = torch.cat([xy, xy + torch.rand(num_boxes, 2) * 20 + 1], dim=1)
+    prediction = BoxList(boxes, size, mode="xyxy")
+    prediction.add_field("scores", torch.rand(num_boxes))
+    prediction.add_field("labels", torch.randint(1, 10, (num_boxes,)))
+    prediction.add_field("mask", torch.rand(num_boxes, 1, 28, 28))
+    return prediction
+
+
+class TestPredictionStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write_read(self):
+        torch.manual_seed(0)
+        num_images = 11
+        # predictions are made on resized images
+        input_sizes = [(40 + i, 30 + 2 * i) for i in range(num_images)]
+        sizes = [(2 * w, 2 * h) for w, h in input_sizes]
+        dataset = FakeDataset(sizes)
+        predictions = [_random_prediction(s, i % 4) for i, s in enumerate(input_sizes)]
+
+        # two processes, each writing half of the images in several shards
+        for rank, image_ids in enumerate([range(0, 6), range(6, num_images)]):
+            writer = PredictionWriter(self.tmp_dir, dataset, rank, images_per_shard=4)
+            for image_id in image_ids:
+                writer.add(image_id, predictions[image_id])
+            writer.close()
+
+        reader = PredictionReader(self.tmp_dir, num_ranks=2)
+        self.assertEqual(len(reader), num_images)
+        masker = Masker(threshold=0.5, padding=1)
+        for image_id, stored in enumerate(reader):
+            expected = predictions[image_id].resize(sizes[image_id])
+            self.assertEqual(stored.size, sizes[image_id])
+            self.assertTrue(torch.allclose(stored.bbox, expected.bbox))
+            for field in ("scores", "labels"):
+                self.assertTrue(
+                    torch.equal(stored.get_field(field), expected.get_field(field))
+                )
+            masks = stored.get_field("mask")
+            self.assertIsInstance(masks, RLEMaskList)
+            expected_rles = masker.encode_single_image(
+                expected.get_field("mask"), expected
+            )
+            self.assertEqual(masks.rles, expected_rles)
+            # boxlist operations used by the evaluation
+            self.assertEqual(len(stored[stored.get_field("scores") > 0.5]),
+                             int((expected.get_field("scores") > 0.5).sum()))
+
+    def test_padded_duplicates(self):
+        torch.manual_seed(0)
+        num_images = 5
+        sizes = [(40, 30)] * num_images
+        dataset = FakeDataset(sizes)
+        predictions = [_random_prediction(s, 2) for s in sizes]
+        # DistributedSampler over 2 ranks pads the last one with the image 0,
+        # for which the last rank gets a different prediction
+        padded = _random_prediction(sizes[0], 3)
+        rank_images = [[(0, predictions[0]), (1, predictions[1]), (2, predictions[2])],
+                       [(3, predictions[3]), (4, predictions[4]), (0, padded)]]
+        # the last rank is written first, and writes its padded image twice
+        for rank in (1, 0):
+            writer = PredictionWriter(self.tmp_dir, dataset, rank, images_per_shard=2)
+            for image_id, prediction in rank_images[rank]:
+                writer.add(image_id, prediction)
+            if rank == 1:
+                writer.add(0, _random_prediction(sizes[0], 4))
+            writer.close()
+
+        reader = PredictionReader(self.tmp_dir, num_ranks=2)
+        self.assertEqual(reader.image_ids, list(range(num_images)))
+        for image_id, stored in enumerate(reader):
+            self.assertTrue(torch.allclose(stored.bbox, predictions[image_id].bbox))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import math
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.layers import ROIAlign
+from maskrcnn_benchmark.layers import multilevel_roi_align
+from maskrcnn_benchmark.modeling.poolers import Pooler
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from utils import TEST_CUDA
+from utils import assert_same_on_cpu_and_cuda
+from utils import random_rois
+
+
+def _bilinear(feature, y, x):
+    # same as bilinear_interpolate in ROIAlign_cuda.cu
+    height, width = feature.shape[-2:]
+    if y < -1.0 or y > height or x < -1.0 or x > width:
+        return feature.new_zeros(feature.shape[0])
+    y, x = max(y, 0.0), max(x, 0.0)
+    y_low, x_low = int(y), int(x)
+    if y_low >= height - 1:
+        y_high = y_low = height - 1
+        y = float(y_low)
+    else:
+        y_high = y_low + 1
+    if x_low >= width - 1:
+        x_high = x_low = width - 1
+        x = float(x_low)
+    else:
+        x_high = x_low + 1
+    ly, lx = y - y_low, x - x_low
+    hy, hx = 1.0 - ly, 1.0 - lx
+    return (
+        hy * hx * feature[:, y_low, x_low] + hy * lx * feature[:, y_low, x_high]
+        + ly * hx * feature[:, y_high, x_low] + ly * lx * feature[:, y_high, x_high]
+    )
+
+
+def _reference_roi_align(input, rois, output_size, spatial_scale, sampling_ratio):
+    pooled_height, pooled_width = output_size
+    output = input.new_zeros(len(rois), input.shape[1], pooled_height, pooled_width)
+    for n, roi in enumerate(rois.tolist()):
+        feature = input[int(roi[0])]
+        start_w, start_h, end_w, end_h = [c * spatial_scale for c in roi[1:]]
+        roi_width = max(end_w - start_w, 1.0)
+        roi_height = max(end_h - start_h, 1.0)
+        bin_h, bin_w = roi_height / pooled_height, roi_width / pooled_width
+        grid_h = sampling_ratio if sampling_ratio > 0 else math.ceil(bin_h)
+        grid_w = sampling_ratio if sampling_ratio > 0 else math.ceil(bin_w)
+        for ph in range(pooled_height):
+            for pw in range(pooled_width):
+                for iy in range(grid_h):
+                    y = start_h + ph * bin_h + (iy + 0.5) * bin_h / grid_h
+                    for ix in range(grid_w):
+                        x = start_w + pw * bin_w + (ix + 0.5) * bin_w / grid_w
+                        output[n, :, ph, pw] += _bilinear(feature, y, x)
+                output[n, :, ph, pw] /= grid_h * grid_w
+    return output
+
+
+class TestROIAlign(unittest.TestCase):
+    def _check_forward(self, device):
+        torch.manual_seed(0)
+        input = torch.rand(2, 5, 20, 24, device=device)
+        rois = random_rois(30, 2, 80).to(device)
+        for output_size, spatial_scale, sampling_ratio in [
+            ((7, 7), 0.25, 2), ((5, 3), 0.5, 0), ((4, 4), 0.125, 1)
+        ]:
+            roi_align = ROIAlign(output_size, spatial_scale, sampling_ratio)
+            output = roi_align(input, rois)
+            expected = _reference_roi_align(
+                input.cpu(), rois.cpu(), output_size, spatial_scale, sampling_ratio
+            )
+            self.assertTrue(
+                torch.allclose(output.cpu(), expected, rtol=1e-5, atol=1e-5)
+            )
+
+    def test_forward_cpu(self):
+        self._check_forward("cpu")
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_forward_cuda(self):
+        self._check_forward("cuda")
+
+    def test_backward_cpu(self):
+        torch.manual_seed(0)
+        input = torch.rand(2, 3, 10, 12, dtype=torch.float64, requires_grad=True)
+        rois = random_rois(8, 2, 40).double()
+        for sampling_ratio in (2, 0):
+            roi_align = ROIAlign((3, 4), 0.25, sampling_ratio)
+            self.assertTrue(
+                torch.autograd.gradcheck(lambda x: roi_align(x, rois), (input,))
+            )
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_backward_same_as_cuda(self):
+        torch.manual_seed(0)
+        input = torch.rand(2, 5, 20, 24)
+        rois = random_rois(30, 2, 80)
+        assert_same_on_cpu_and_cuda(
+            ROIAlign((7, 7), 0.25, 2), (input, rois), (0,), rtol=1e-4, atol=1e-5
+        )
+
+    def test_empty(self):
+        input = torch.rand(1, 3, 10, 10, requires_grad=True)
+        output = ROIAlign((2, 2), 1.0, 2)(input, torch.zeros(0, 5))
+        self.assertEqual(output.shape, (0, 3, 2, 2))
+        output.sum().backward()
+        self.assertEqual(input.grad.abs().sum().item(), 0)
+
+
+def _random_pyramid(batch_size, channels, size, scales, dtype=torch.float32):
+    return [
+        torch.rand(batch_size, channels, int(size * s), int(size * s), dtype=dtype)
+        for s in scales
+    ]
+
+
+def _per_level_roi_align(features, rois, levels, output_size, scales, sampling_ratio):
+    # pools the rois of each level separately, as the Pooler used to
+    result = features[0].new_zeros(len(rois), features[0].shape[1], *output_size)
+    for level, (feature, scale) in enumerate(zip(features, scales)):
+        idx_in_level = torch.nonzero(levels == level).squeeze(1)
+        roi_align = ROIAlign(output_size, scale, sampling_ratio)
+        result[idx_in_level] = roi_align(feature, rois[idx_in_level])
+    return result
+
+
+class TestMultiLevelROIAlign(unittest.TestCase):
+    scales = (0.25, 0.125, 0.0625)
+
+    def _inputs(self, device="cpu", dtype=torch.float32):
+        torch.manual_seed(0)
+        features = [
+            f.to(device) for f in _random_pyramid(2, 5, 64, self.scales, dtype)
+        ]
+        rois = random_rois(40, 2, 256).to(device, dtype)
+        levels = torch.randint(0, len(self.scales), (40,), device=device)
+        return features, rois, levels
+
+    def _check_forward(self, device):
+        features, rois, levels = self._inputs(device)
+        for output_size, sampling_ratio in [((7, 7), 2), ((5, 3), 0)]:
+            output = multilevel_roi_align(
+                features, rois, levels, output_size, self.scales, sampling_ratio
+            )
+            expected = _per_level_roi_align(
+                features, rois, levels, output_size, self.scales, sampling_ratio
+            )
+            self.assertTrue(torch.allclose(output, expected))
+
+    def test_forward_cpu(self):
+        self._check_forward("cpu")
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_forward_cuda(self):
+        self._check_forward("cuda")
+
+    def test_backward_cpu(self):
+        features, rois, levels = self._inputs(dtype=torch.float64)
+        features = [f[:, :2, :12, :12].clone().requires_grad_() for f in features]
+        rois, levels = rois[:6] / 4, levels[:6]
+        self.assertTrue(
+            torch.autograd.gradcheck(
+                lambda *x: multilevel_roi_align(
+                    x, rois, levels, (3, 2), self.scales, 2
+                ),
+                features,
+            )
+        )
+
+    def _check_backward_same_as_per_level(self, device):
+        features, rois, levels = self._inputs(device)
+        # no roi in the last level
+        levels[levels == 2] = 1
+        grads = []
+        for pool in (multilevel_roi_align, _per_level_roi_align):
+            x = [f.clone().requires_grad_() for f in features]
+            pool(x, rois, levels, (7, 7), self.scales, 2).pow(2).sum().backward()
+            grads.append([f.grad for f in x])
+        for grad, expected in zip(*grads):
+            self.assertTrue(torch.allclose(grad, expected, rtol=1e-4, atol=1e-5))
+        self.assertEqual(grads[0][2].abs().sum().item(), 0)
+
+    def test_backward_same_as_per_level_cpu(self):
+        self._check_backward_same_as_per_level("cpu")
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_backward_same_as_per_level_cuda(self):
+        self._check_backward_same_as_per_level("cuda")
+
+    def _check_invalid_levels(self, device):
+        features, rois, levels = self._inputs(device)
+        for level in (-1, len(self.scales)):
+            levels[5] = level
+            with self.assertRaisesRegex(RuntimeError, "roi levels must be in"):
+                multilevel_roi_align(features, rois, levels, (2, 2), self.scales, 2)
+
+    def test_invalid_levels_cpu(self):
+        self._check_invalid_levels("cpu")
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_invalid_levels_cuda(self):
+        self._check_invalid_levels("cuda")
+
+    def test_empty(self):
+        features, rois, levels = self._inputs()
+        features = [f.requires_grad_() for f in features]
+        output = multilevel_roi_align(
+            features, rois[:0], levels[:0], (2, 2), self.scales, 2
+        )
+        self.assertEqual(output.shape, (0, 5, 2, 2))
+        output.sum().backward()
+        for f in features:
+            self.assertEqual(f.grad.abs().sum().item(), 0)
+
+    def test_pooler(self):
+        torch.manual_seed(0)
+        scales = (0.25, 0.125, 0.0625, 0.03125)
+        # the last level is not pooled, as the extra level of the FPN
+        features = _random_pyramid(2, 4, 128, scales + (0.015625,))
+        boxes = []
+        for _ in range(2):
+            xy = torch.rand(50, 2) * 400
+            wh = torch.rand(50, 2).pow(2) * 600
+            boxes.append(BoxList(torch.cat([xy, xy + wh], dim=1), (1024, 1024)))
+        pooler = Pooler((7, 7), scales, 2)
+        rois = pooler.convert_to_roi_format(boxes)
+        levels = pooler.map_levels(boxes)
+        self.assertEqual(len(levels.unique()), len(scales))
+        expected = _per_level_roi_align(features, rois, levels, (7, 7), scales, 2)
+        self.assertTrue(torch.allclose(pooler(features, boxes), expected))
+
+
+if __name__ == "__main__":
+    unittest.main()
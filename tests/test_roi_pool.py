@@ -0,0 +1,77 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import math
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.layers import ROIPool
+from utils import TEST_CUDA
+from utils import assert_same_on_cpu_and_cuda
+from utils import random_rois
+
+
+def _round(x):
+    # rounds half away from zero, as std::round
+    return int(math.copysign(math.floor(abs(x) + 0.5), x))
+
+
+def _reference_roi_pool(input, rois, output_size, spatial_scale):
+    # same as RoIPoolFForward in ROIPool_cuda.cu
+    pooled_height, pooled_width = output_size
+    height, width = input.shape[-2:]
+    output = input.new_zeros(len(rois), input.shape[1], pooled_height, pooled_width)
+    for n, roi in enumerate(rois.tolist()):
+        feature = input[int(roi[0])]
+        start_w, start_h, end_w, end_h = [_round(c * spatial_scale) for c in roi[1:]]
+        bin_h = max(end_h - start_h + 1, 1) / pooled_height
+        bin_w = max(end_w - start_w + 1, 1) / pooled_width
+        for ph in range(pooled_height):
+            hstart = min(max(math.floor(ph * bin_h) + start_h, 0), height)
+            hend = min(max(math.ceil((ph + 1) * bin_h) + start_h, 0), height)
+            for pw in range(pooled_width):
+                wstart = min(max(math.floor(pw * bin_w) + start_w, 0), width)
+                wend = min(max(math.ceil((pw + 1) * bin_w) + start_w, 0), width)
+                if hend > hstart and wend > wstart:
+                    region = feature[:, hstart:hend, wstart:wend]
+                    output[n, :, ph, pw] = region.reshape(len(region), -1).max(1)[0]
+    return output
+
+
+class TestROIPool(unittest.TestCase):
+    def test_forward_cpu(self):
+        torch.manual_seed(0)
+        input = torch.rand(2, 5, 20, 24)
+        rois = random_rois(30, 2, 80)
+        for output_size, spatial_scale in [((7, 7), 0.25), ((5, 3), 0.5)]:
+            output = ROIPool(output_size, spatial_scale)(input, rois)
+            expected = _reference_roi_pool(input, rois, output_size, spatial_scale)
+            self.assertTrue(torch.allclose(output, expected))
+
+    def test_backward_cpu(self):
+        torch.manual_seed(0)
+        # distinct values, so that the maximum of each bin is well defined
+        input = torch.randperm(2 * 3 * 10 * 12).reshape(2, 3, 10, 12).double()
+        input.requires_grad_()
+        rois = random_rois(8, 2, 40).double()
+        roi_pool = ROIPool((3, 4), 0.25)
+        self.assertTrue(
+            torch.autograd.gradcheck(lambda x: roi_pool(x, rois), (input,))
+        )
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_same_as_cuda(self):
+        torch.manual_seed(0)
+        input = torch.rand(2, 5, 20, 24)
+        rois = random_rois(30, 2, 80)
+        assert_same_on_cpu_and_cuda(ROIPool((7, 7), 0.25), (input, rois), (0,))
+
+    def test_empty(self):
+        input = torch.rand(1, 3, 10, 10, requires_grad=True)
+        output = ROIPool((2, 2), 1.0)(input, torch.zeros(0, 5))
+        self.assertEqual(output.shape, (0, 3, 2, 2))
+        output.sum().backward()
+        self.assertEqual(input.grad.abs().sum().item(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
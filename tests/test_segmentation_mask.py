@@ -2,6 +2,7 @@
 import unittest
 import torch
 from maskrcnn_benchmark.structures.segmentation_mask import SegmentationMask
+from maskrcnn_benchmark.structures.segmentation_mask import PackedPolygonList
 
 
 class TestSegmentationMask(unittest.TestCase):
@@ -18,6 +19,7 @@ class TestSegmentationMask(unittest.TestCase):
         size = width, height
 
         self.P = SegmentationMask(poly, size, 'poly')
+        self.Q = SegmentationMask(PackedPolygonList(poly, size), size, 'poly')
         self.M = SegmentationMask(poly, size, 'poly').convert('mask')
 
     def L1(self, A, B):
@@ -63,6 +65,48 @@ class TestSegmentationMask(unittest.TestCase):
         self.assertTrue(diff_hor <= 53250.)
         self.assertTrue(diff_ver <= 42494.)
 
+    def test_project_on_boxes(self):
+        M = 28
+        boxes = torch.tensor([
+            [400., 250., 500., 300.],
+            [370.5, 195.2, 440.1, 310.7],
+            [-20.3, 80.4, 230.8, 201.],
+            [90., 90., 210., 220.],
+        ])
+        P = SegmentationMask(self.P.instances.polygons * len(boxes), self.P.size)
+        expected = torch.stack([
+            p.crop(box).resize((M, M)).get_mask_tensor()
+            for p, box in zip(P, boxes)
+        ])
+        masks = P.instances.project_on_boxes(boxes, M)
+
+        self.assertEqual(masks.shape, (len(boxes), M, M))
+        self.assertTrue(torch.equal(masks, expected))
+
+    def test_packed_polygons(self):
+        box = [400, 250, 500, 300]  # xyxy
+        pairs = [
+            (self.P, self.Q),
+            (self.P.transpose(0), self.Q.transpose(0)),
+            (self.P.transpose(1), self.Q.transpose(1)),
+            (self.P.crop(box), self.Q.crop(box)),
+            (self.P.resize((50, 25)), self.Q.resize((50, 25))),
+        ]
+        for P, Q in pairs:
+            self.assertTrue(isinstance(Q.instances, PackedPolygonList))
+            self.assertEqual(P.size, Q.size)
+            self.assertEqual(self.L1(P, Q), 0)
+
+        Q = SegmentationMask(
+            PackedPolygonList(self.P.instances.polygons * 3, self.P.size),
+            self.P.size
+        )
+        self.assertEqual(len(Q), 3)
+        self.assertEqual(len(Q[[0, 2]]), 2)
+        self.assertEqual(len(Q[torch.tensor([1, 1, 1, 0])]), 4)
+        self.assertEqual(len(Q[torch.tensor([1, 0, 1], dtype=torch.uint8)]), 2)
+        self.assertEqual(self.L1(Q[1], self.P), 0)
+
 
 if __name__ == "__main__":
 
@@ -0,0 +1,67 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import unittest
+
+import torch
+
+from maskrcnn_benchmark.layers import SigmoidFocalLoss
+from maskrcnn_benchmark.layers.sigmoid_focal_loss import sigmoid_focal_loss
+from maskrcnn_benchmark.layers.sigmoid_focal_loss import sigmoid_focal_loss_cpu
+from utils import TEST_CUDA
+from utils import assert_same_on_cpu_and_cuda
+
+
+def _random_inputs(num_samples, num_classes, dtype=torch.float32, seed=0):
+    g = torch.Generator().manual_seed(seed)
+    logits = torch.randn(num_samples, num_classes, generator=g, dtype=dtype) * 3
+    # -1 is ignored, 0 is the background
+    targets = torch.randint(-1, num_classes + 1, (num_samples,), generator=g)
+    return logits, targets.int()
+
+
+class TestSigmoidFocalLoss(unittest.TestCase):
+    def test_forward_cpu(self):
+        logits, targets = _random_inputs(300, 7)
+        for gamma, alpha in [(2.0, 0.25), (0.0, 0.5), (1.5, 0.75)]:
+            losses = sigmoid_focal_loss(logits, targets, gamma, alpha)
+            # the kernels compute log(1 - p) in a numerically stable way, so
+            # the reference is computed in double precision
+            expected = sigmoid_focal_loss_cpu(logits.double(), targets, gamma, alpha)
+            self.assertTrue(
+                torch.allclose(losses, expected.float(), rtol=1e-5, atol=1e-6)
+            )
+
+    def test_backward_cpu(self):
+        logits, targets = _random_inputs(300, 7, dtype=torch.float64)
+        logits.requires_grad_()
+        sigmoid_focal_loss(logits, targets, 2.0, 0.25).pow(2).sum().backward()
+        grad = logits.grad.clone()
+        logits.grad = None
+        sigmoid_focal_loss_cpu(logits, targets, 2.0, 0.25).pow(2).sum().backward()
+        self.assertTrue(torch.allclose(grad, logits.grad))
+
+    def test_gradcheck(self):
+        logits, targets = _random_inputs(20, 4, dtype=torch.float64)
+        logits.requires_grad_()
+        self.assertTrue(
+            torch.autograd.gradcheck(
+                lambda x: sigmoid_focal_loss(x, targets, 2.0, 0.25), (logits,)
+            )
+        )
+
+    def test_module(self):
+        logits, targets = _random_inputs(50, 3)
+        loss = SigmoidFocalLoss(2.0, 0.25)(logits, targets)
+        expected = sigmoid_focal_loss_cpu(logits.double(), targets, 2.0, 0.25).sum()
+        self.assertTrue(torch.allclose(loss, expected.float()))
+
+    @unittest.skipIf(not TEST_CUDA, "no CUDA detected")
+    def test_same_as_cuda(self):
+        logits, targets = _random_inputs(300, 7)
+        assert_same_on_cpu_and_cuda(
+            lambda x, t: sigmoid_focal_loss(x, t, 2.0, 0.25),
+            (logits, targets), (0,), rtol=1e-4, atol=1e-5,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import os
+import shutil
+import tempfile
+import unittest
+
+from maskrcnn_benchmark.data.datasets.voc import PascalVOCDataset
+
+ANNOTATION = """<annotation>
+    <size><width>{width}</width><height>{height}</height><depth>3</depth></size>
+    {objects}
+</annotation>"""
+
+OBJECT = """<object>
+    <name>{name}</name><difficult>{difficult}</difficult>
+    <bndbox><xmin>{box[0]}</xmin><ymin>{box[1]}</ymin><xmax>{box[2]}</xmax><ymax>{box[3]}</ymax></bndbox>
+</object>"""
+
+
+class NoParsingVOCDataset(PascalVOCDataset):
+    def _preprocess_annotation(self, target):
+        raise AssertionError("The annotations should be read from the index")
+
+
+class TestVOCAnnotationIndex(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "Annotations"))
+        os.makedirs(os.path.join(self.root, "ImageSets", "Main"))
+        self.annotations = {
+            "000001": (500, 375, [("dog", 0, (48, 240, 195, 371)),
+                                  ("person", 0, (8, 12, 352, 498))]),
+            "000002": (333, 500, [("train", 1, (139, 200, 207, 301))]),
+            "000003": (640, 480, []),
+            "000004": (500, 406, [("chair", 1, (263, 211, 324, 339)),
+                                  ("chair", 0, (165, 264, 253, 372)),
+                                  ("car", 0, (5, 244, 67, 374))]),
+        }
+        for img_id in self.annotations:
+            self._write_annotation(img_id)
+        with open(os.path.join(self.root, "ImageSets", "Main", "test.txt"), "w") as f:
+            f.write("\n".join(sorted(self.annotations)) + "\n")
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _write_annotation(self, img_id):
+        width, height, objects = self.annotations[img_id]
+        objects = "".join(
+            OBJECT.format(name=name, difficult=difficult, box=box)
+            for name, difficult, box in objects
+        )
+        path = os.path.join(self.root, "Annotations", img_id + ".xml")
+        with open(path, "w") as f:
+            f.write(ANNOTATION.format(width=width, height=height, objects=objects))
+
+    def _check_dataset(self, dataset):
+        self.assertEqual(dataset.ids, sorted(self.annotations))
+        for index, img_id in enumerate(dataset.ids):
+            width, height, objects = self.annotations[img_id]
+            self.assertEqual(
+                dataset.get_img_info(index), {"width": width, "height": height}
+            )
+            if not dataset.keep_difficult:
+                objects = [obj for obj in objects if not obj[1]]
+            target = dataset.get_groundtruth(index)
+            self.assertEqual(target.size, (width, height))
+            self.assertEqual(
+                target.bbox.tolist(),
+                [[c - 1 for c in box] for _, _, box in objects],
+            )
+            self.assertEqual(
+                target.get_field("labels").tolist(),
+                [dataset.class_to_ind[name] for name, _, _ in objects],
+            )
+            self.assertEqual(
+                target.get_field("difficult").tolist(),
+                [bool(difficult) for _, difficult, _ in objects],
+            )
+
+    def test_index(self):
+        for use_difficult in (False, True):
+            self._check_dataset(PascalVOCDataset(self.root, "test", use_difficult))
+        index_file = os.path.join(self.root, "ImageSets", "Main", "test_annotations.npz")
+        self.assertTrue(os.path.exists(index_file))
+        # the second time, the annotations are read from the index
+        self._check_dataset(NoParsingVOCDataset(self.root, "test", True))
+
+    def test_modified_annotation(self):
+        PascalVOCDataset(self.root, "test", True)
+        self.annotations["000003"] = (640, 480, [("cat", 0, (1, 2, 30, 40))])
+        self._write_annotation("000003")
+        # make sure that the modification time changes
+        path = os.path.join(self.root, "Annotations", "000003.xml")
+        mtime = os.path.getmtime(path) + 10
+        os.utime(path, (mtime, mtime))
+        self._check_dataset(PascalVOCDataset(self.root, "test", True))
+        self._check_dataset(NoParsingVOCDataset(self.root, "test", True))
+
+
+if __name__ == "__main__":
+    unittest.main()
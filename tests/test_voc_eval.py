@@ -0,0 +1,154 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+import logging
+import unittest
+from collections import defaultdict
+
+import numpy as np
+import torch
+
+from maskrcnn_benchmark.data.datasets.evaluation.voc.voc_eval import (
+    calc_detection_voc_prec_rec,
+    do_voc_evaluation,
+    eval_detection_voc,
+)
+from maskrcnn_benchmark.structures.bounding_box import BoxList
+from maskrcnn_benchmark.structures.boxlist_ops import boxlist_iou
+
+
+def _reference_prec_rec(gt_boxlists, pred_boxlists, iou_thresh=0.5):
+    # per image and per label evaluation of the original implementation
+    n_pos = defaultdict(int)
+    score = defaultdict(list)
+    match = defaultdict(list)
+    for gt_boxlist, pred_boxlist in zip(gt_boxlists, pred_boxlists):
+        pred_bbox = pred_boxlist.bbox.numpy()
+        pred_label = pred_boxlist.get_field("labels").numpy()
+        pred_score = pred_boxlist.get_field("scores").numpy()
+        gt_bbox = gt_boxlist.bbox.numpy()
+        gt_label = gt_boxlist.get_field("labels").numpy()
+        gt_difficult = gt_boxlist.get_field("difficult").numpy()
+        for l in np.unique(np.concatenate((pred_label, gt_label)).astype(int)):
+            pred_mask_l = pred_label == l
+            order = pred_score[pred_mask_l].argsort()[::-1]
+            pred_bbox_l = pred_bbox[pred_mask_l][order]
+            pred_score_l = pred_score[pred_mask_l][order]
+            gt_bbox_l = gt_bbox[gt_label == l]
+            gt_difficult_l = gt_difficult[gt_label == l]
+            n_pos[l] += np.logical_not(gt_difficult_l).sum()
+            score[l].extend(pred_score_l)
+            if len(pred_bbox_l) == 0:
+                continue
+            if len(gt_bbox_l) == 0:
+                match[l].extend((0,) * pred_bbox_l.shape[0])
+                continue
+            pred_bbox_l = pred_bbox_l.copy()
+            pred_bbox_l[:, 2:] += 1
+            gt_bbox_l = gt_bbox_l.copy()
+            gt_bbox_l[:, 2:] += 1
+            iou = boxlist_iou(
+                BoxList(pred_bbox_l, gt_boxlist.size),
+                BoxList(gt_bbox_l, gt_boxlist.size),
+            ).numpy()
+            gt_index = iou.argmax(axis=1)
+            gt_index[iou.max(axis=1) < iou_thresh] = -1
+            selec = np.zeros(gt_bbox_l.shape[0], dtype=bool)
+            for gt_idx in gt_index:
+                if gt_idx >= 0:
+                    if gt_difficult_l[gt_idx]:
+                        match[l].append(-1)
+                    else:
+                        match[l].append(0 if selec[gt_idx] else 1)
+                    selec[gt_idx] = True
+                else:
+                    match[l].append(0)
+    n_fg_class = max(n_pos.keys()) + 1
+    prec = [None] * n_fg_class
+    rec = [None] * n_fg_class
+    for l in n_pos.keys():
+        score_l = np.array(score[l])
+        match_l = np.array(match[l], dtype=np.int8)[score_l.argsort()[::-1]]
+        tp = np.cumsum(match_l == 1)
+        fp = np.cumsum(match_l == 0)
+        prec[l] = tp / (fp + tp)
+        if n_pos[l] > 0:
+            rec[l] = tp / n_pos[l]
+    return prec, rec
+
+
+def _random_boxlists(num_images=20, seed=0):
+    rng = np.random.RandomState(seed)
+    gt_boxlists, pred_boxlists = [], []
+    for _ in range(num_images):
+        size = (rng.randint(100, 500), rng.randint(100, 500))
+        num_gt = rng.randint(0, 6)
+        xy = rng.randint(0, 80, (num_gt, 2))
+        gt_boxes = np.concatenate([xy, xy + rng.randint(5, 60, (num_gt, 2))], axis=1)
+        gt = BoxList(torch.tensor(gt_boxes, dtype=torch.float32), size)
+        # class 7 only has detections
+        gt.add_field("labels", torch.tensor(rng.randint(1, 6, num_gt)))
+        gt.add_field("difficult", torch.tensor(rng.rand(num_gt) < 0.2))
+        gt_boxlists.append(gt)
+
+        # detections around the gt, with duplicates, and false positives
+        pred_boxes = [gt_boxes + rng.normal(0, 4, gt_boxes.shape) for _ in range(3)]
+        pred_labels = [gt.get_field("labels").numpy()] * 3
+        num_fp = rng.randint(0, 5)
+        xy = rng.uniform(0, 80, (num_fp, 2))
+        pred_boxes.append(np.concatenate([xy, xy + rng.uniform(5, 60, (num_fp, 2))], 1))
+        pred_labels.append(rng.choice([1, 2, 7], num_fp))
+        pred_boxes = np.concatenate(pred_boxes)
+        keep = rng.rand(len(pred_boxes)) < 0.7
+        pred = BoxList(torch.tensor(pred_boxes[keep], dtype=torch.float32), size)
+        pred.add_field("labels", torch.tensor(np.concatenate(pred_labels)[keep]))
+        pred.add_field("scores", torch.rand(int(keep.sum())))
+        pred_boxlists.append(pred)
+    return gt_boxlists, pred_boxlists
+
+
+class FakeDataset(object):
+    def __init__(self, gt_boxlists):
+        self.gt_boxlists = gt_boxlists
+
+    def __len__(self):
+        return len(self.gt_boxlists)
+
+    def get_groundtruth(self, index):
+        return self.gt_boxlists[index]
+
+    def map_class_id_to_class_name(self, class_id):
+        return "class{}".format(class_id)
+
+
+class TestVOCEval(unittest.TestCase):
+    def test_same_as_reference(self):
+        torch.manual_seed(0)
+        gt_boxlists, pred_boxlists = _random_boxlists()
+        prec, rec = calc_detection_voc_prec_rec(gt_boxlists, pred_boxlists)
+        expected_prec, expected_rec = _reference_prec_rec(gt_boxlists, pred_boxlists)
+        self.assertEqual(len(prec), len(expected_prec))
+        for values, expected in zip(prec + rec, expected_prec + expected_rec):
+            if expected is None:
+                self.assertIsNone(values)
+            else:
+                np.testing.assert_array_equal(values, expected)
+
+    def test_do_voc_evaluation(self):
+        torch.manual_seed(0)
+        gt_boxlists, pred_boxlists = _random_boxlists()
+        expected = eval_detection_voc(pred_boxlists, gt_boxlists, use_07_metric=True)
+        self.assertGreater(expected["map"], 0.2)
+        # predictions are made on resized images
+        predictions = [
+            pred.resize((pred.size[0] // 2, pred.size[1] // 2))
+            for pred in pred_boxlists
+        ]
+        logger = logging.getLogger(__name__)
+        for num_workers in (0, 2):
+            result = do_voc_evaluation(
+                FakeDataset(gt_boxlists), predictions, None, logger, num_workers
+            )
+            np.testing.assert_allclose(result["ap"], expected["ap"])
+
+
+if __name__ == "__main__":
+    unittest.main()
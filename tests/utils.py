@@ -8,8 +8,12 @@ import env_tests.env as env_tests
 import os
 import copy
 
+import torch
+
 from maskrcnn_benchmark.config import cfg as g_cfg
 
+TEST_CUDA = torch.cuda.is_available()
+
 
 def get_config_root_path():
     return env_tests.get_config_root_path()
@@ -26,3 +30,35 @@ def load_config_from_file(file_path):
     ret = copy.deepcopy(g_cfg)
     ret.merge_from_file(file_path)
     return ret
+
+
+def random_rois(num_rois, batch_size, size, seed=0):
+    ''' Random rois in the (batch_ind, x1, y1, x2, y2) format of the kernels '''
+    g = torch.Generator().manual_seed(seed)
+    xy = torch.rand(num_rois, 2, generator=g) * size
+    wh = torch.rand(num_rois, 2, generator=g) * size / 2
+    batch_inds = torch.randint(0, batch_size, (num_rois, 1), generator=g).float()
+    # some boxes go beyond the feature map, some are malformed
+    boxes = torch.cat([xy - 4, xy + wh], dim=1)
+    boxes[::7, 2:] = boxes[::7, :2] - 1
+    return torch.cat([batch_inds, boxes], dim=1)
+
+
+def assert_same_on_cpu_and_cuda(fn, inputs, grad_inputs, rtol=1e-5, atol=1e-5):
+    '''
+    Runs fn on the inputs on the CPU and on the GPU, backpropagates the sum of
+    the squared output to the inputs whose indices are in grad_inputs, and
+    checks that both devices give the same output and gradients.
+    '''
+    outputs, grads = [], []
+    for device in ("cpu", "cuda"):
+        x = [t.to(device) for t in inputs]
+        for i in grad_inputs:
+            x[i].requires_grad_()
+        output = fn(*x)
+        output.pow(2).sum().backward()
+        outputs.append(output.detach().cpu())
+        grads.append([x[i].grad.cpu() for i in grad_inputs])
+    assert torch.allclose(outputs[0], outputs[1], rtol=rtol, atol=atol)
+    for grad_cpu, grad_cuda in zip(*grads):
+        assert torch.allclose(grad_cpu, grad_cuda, rtol=rtol, atol=atol)
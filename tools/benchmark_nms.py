@@ -0,0 +1,114 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Compares the types of NMS of the box post-processing (greedy, Fast and
+Matrix NMS, see MODEL.ROI_HEADS.NMS_TYPE and MODEL.RETINANET.NMS_TYPE) on the
+latency of the post-processing and on the accuracy on the test datasets.
+"""
+# Set up custom environment before nearly anything else is imported
+# NOTE: this should be the first import (no not reorder)
+from maskrcnn_benchmark.utils.env import setup_environment  # noqa F401 isort:skip
+
+import argparse
+
+import torch
+from maskrcnn_benchmark.config import cfg
+from maskrcnn_benchmark.data import make_data_loader
+from maskrcnn_benchmark.engine.inference import inference
+from maskrcnn_benchmark.modeling.detector import build_detection_model
+from maskrcnn_benchmark.utils.checkpoint import DetectronCheckpointer
+from maskrcnn_benchmark.utils.logger import setup_logger
+from maskrcnn_benchmark.utils.timer import Timer
+
+
+def time_post_processor(model, device):
+    """
+    Times the calls to the box post-processor of model, which is the one of
+    the RetinaNet head or of the box head.
+    """
+    if cfg.MODEL.RETINANET_ON:
+        post_processor = model.rpn.box_selector_test
+    else:
+        post_processor = model.roi_heads.box.post_processor
+    timer = Timer()
+
+    def synchronize():
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+
+    def pre_hook(module, inputs):
+        synchronize()
+        timer.tic()
+
+    def hook(module, inputs, outputs):
+        synchronize()
+        timer.toc()
+
+    post_processor.register_forward_pre_hook(pre_hook)
+    post_processor.register_forward_hook(hook)
+    return timer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the types of NMS")
+    parser.add_argument("--config-file", required=True, metavar="FILE")
+    parser.add_argument(
+        "--ckpt",
+        help="The path to the checkpoint, default is MODEL.WEIGHT.",
+        default=None,
+    )
+    parser.add_argument(
+        "--nms-types", nargs="+", default=["greedy", "fast", "matrix"]
+    )
+    parser.add_argument(
+        "opts",
+        help="Modify config options using the command-line",
+        default=None,
+        nargs=argparse.REMAINDER,
+    )
+    args = parser.parse_args()
+
+    cfg.merge_from_file(args.config_file)
+    cfg.merge_from_list(args.opts)
+    logger = setup_logger("maskrcnn_benchmark", "", 0)
+    device = torch.device(cfg.MODEL.DEVICE)
+
+    summary = []
+    for nms_type in args.nms_types:
+        cfg.defrost()
+        cfg.MODEL.ROI_HEADS.NMS_TYPE = nms_type
+        cfg.MODEL.RETINANET.NMS_TYPE = nms_type
+        cfg.freeze()
+
+        model = build_detection_model(cfg)
+        model.to(device)
+        checkpointer = DetectronCheckpointer(cfg, model)
+        checkpointer.load(args.ckpt or cfg.MODEL.WEIGHT, use_latest=False)
+        timer = time_post_processor(model, device)
+
+        data_loaders = make_data_loader(cfg, is_train=False, is_distributed=False)
+        for dataset_name, data_loader in zip(cfg.DATASETS.TEST, data_loaders):
+            logger.info("NMS type {} on {}".format(nms_type, dataset_name))
+            results = inference(
+                model,
+                data_loader,
+                dataset_name=dataset_name,
+                iou_types=("bbox",),
+                box_only=False if cfg.MODEL.RETINANET_ON else cfg.MODEL.RPN_ONLY,
+                device=cfg.MODEL.DEVICE,
+            )
+            # the COCO evaluation also returns the detections
+            if isinstance(results, tuple):
+                results = results[0]
+            summary.append((nms_type, dataset_name, timer.average_time, results))
+            timer.reset()
+
+    for nms_type, dataset_name, latency, results in summary:
+        logger.info(
+            "{} NMS on {}: {:.2f} ms per post-processing call\n{}".format(
+                nms_type, dataset_name, latency * 1000, results
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
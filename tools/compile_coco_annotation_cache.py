@@ -0,0 +1,38 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Compiles COCO annotation files into columnar caches, which COCODataset
+loads instead of parsing the json files. By default, the cache of
+path/to/instances_train2017.json is written to
+path/to/instances_train2017_cache, where DatasetCatalog looks for it.
+"""
+import argparse
+import os
+import time
+
+from maskrcnn_benchmark.data.datasets.coco_cache import compile_coco_annotation_cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile COCO annotation caches")
+    parser.add_argument("ann_files", nargs="+", metavar="FILE", help="COCO json files")
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help="directory where the caches are written, "
+        "defaults to the directory of each annotation file",
+    )
+    args = parser.parse_args()
+
+    for ann_file in args.ann_files:
+        cache_dir = os.path.splitext(ann_file)[0] + "_cache"
+        if args.output_dir is not None:
+            cache_dir = os.path.join(args.output_dir, os.path.basename(cache_dir))
+        start_time = time.time()
+        compile_coco_annotation_cache(ann_file, cache_dir)
+        print("Compiled {} to {} in {:.1f}s".format(
+            ann_file, cache_dir, time.time() - start_time
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Copyright (c) Facebook, Inc. and its affiliates. All Rights Reserved.
+"""
+Packs the images of a directory in a few large shard files, which can be
+read by PackedCOCODataset and PackedPascalVOCDataset (see the *_packed
+entries of DatasetCatalog). Images are stored under their path relative
+to the image directory, i.e. their file_name in COCO annotation files.
+
+Example:
+    python tools/pack_images.py datasets/coco/train2017 datasets/coco/train2017_packed
+"""
+import argparse
+import os
+import time
+
+from maskrcnn_benchmark.data.datasets.image_shards import ImageShardWriter
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack images in shard files")
+    parser.add_argument("image_dir", help="directory containing the images")
+    parser.add_argument("output_dir", help="packed directory to write")
+    parser.add_argument(
+        "--max-shard-size",
+        default=1024,
+        type=int,
+        help="maximum size of a shard, in MB",
+    )
+    args = parser.parse_args()
+
+    paths = []
+    for root, _, file_names in os.walk(args.image_dir):
+        for file_name in file_names:
+            if file_name.lower().endswith(IMAGE_EXTENSIONS):
+                paths.append(os.path.join(root, file_name))
+    # sorted paths keep the images of a dataset close to each other
+    paths.sort()
+
+    start_time = time.time()
+    max_shard_size = args.max_shard_size * 1024 ** 2
+    with ImageShardWriter(args.output_dir, max_shard_size) as writer:
+        for i, path in enumerate(paths):
+            writer.add_file(os.path.relpath(path, args.image_dir), path)
+            if (i + 1) % 10000 == 0:
+                print("Packed {}/{} images".format(i + 1, len(paths)))
+    print("Packed {} images in {} shards in {:.1f}s".format(
+        len(paths), writer.num_shards, time.time() - start_time
+    ))
+
+
+if __name__ == "__main__":
+    main()
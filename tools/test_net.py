@@ -11,6 +11,7 @@ from maskrcnn_benchmark.config import cfg
 from maskrcnn_benchmark.data import make_data_loader
 from maskrcnn_benchmark.engine.inference import inference
 from maskrcnn_benchmark.modeling.detector import build_detection_model
+from maskrcnn_benchmark.modeling.fold_batch_norm import fold_batch_norms
 from maskrcnn_benchmark.utils.checkpoint import DetectronCheckpointer
 from maskrcnn_benchmark.utils.collect_env import collect_env_info
 from maskrcnn_benchmark.utils.comm import synchronize, get_rank
@@ -81,6 +82,13 @@ def main():
     ckpt = cfg.MODEL.WEIGHT if args.ckpt is None else args.ckpt
     _ = checkpointer.load(ckpt, use_latest=args.ckpt is None)
 
+    if cfg.TEST.FOLD_BATCH_NORM:
+        model.eval()
+        # the features of the backbone are checked on a random image
+        example_input = torch.rand(1, 3, 224, 224, device=cfg.MODEL.DEVICE)
+        num_folded = fold_batch_norms(model, example_input)
+        logger.info("Folded {} batch normalizations".format(num_folded))
+
     iou_types = ("bbox",)
     if cfg.MODEL.MASK_ON:
         iou_types = iou_types + ("segm",)
@@ -70,6 +70,7 @@ def train(cfg, local_rank, distributed):
         is_train=True,
         is_distributed=distributed,
         start_iter=arguments["iteration"],
+        sampler_state=arguments.get("data_sampler"),
     )
 
     checkpoint_period = cfg.SOLVER.CHECKPOINT_PERIOD